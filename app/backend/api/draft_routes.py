@@ -7,8 +7,17 @@ Draft API 新路由 - 符合 API_ENDPOINTS_REFERENCE.md 规范
 - 始终返回 success=True（便于 Coze 插件测试）
 - 错误详情通过 error_code 和 message 字段传递
 """
-from fastapi import APIRouter, HTTPException, status
-from typing import List, Dict, Any
+import asyncio
+import copy
+import hashlib
+import json
+import time
+import uuid
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Optional, Tuple
+from pydantic import ValidationError
 
 from app.backend.schemas.segment_schemas import (
     # Draft 操作
@@ -17,7 +26,17 @@ from app.backend.schemas.segment_schemas import (
     AddSegmentToDraftRequest, AddSegmentToDraftResponse,
     AddGlobalEffectRequest, AddGlobalEffectResponse,
     AddGlobalFilterRequest, AddGlobalFilterResponse,
-    SaveDraftResponse,
+    SaveDraftResponse, SaveJobResponse,
+    BatchCommand, BatchDraftRequest, BatchDraftResponse,
+    TimelineRequest, TimelineResponse,
+    # 批量操作中复用的片段请求模型
+    CreateAudioSegmentRequest, CreateVideoSegmentRequest, CreateTextSegmentRequest,
+    CreateStickerSegmentRequest, CreateEffectSegmentRequest, CreateFilterSegmentRequest,
+    AddAudioEffectRequest, AddAudioFadeRequest, AddAudioKeyframeRequest,
+    AddVideoAnimationRequest, AddVideoEffectRequest, AddVideoFadeRequest, AddVideoFilterRequest,
+    AddVideoMaskRequest, AddVideoTransitionRequest, AddVideoBackgroundFillingRequest,
+    AddVideoKeyframeRequest, AddStickerKeyframeRequest,
+    AddTextAnimationRequest, AddTextBubbleRequest, AddTextEffectRequest, AddTextKeyframeRequest,
     # 查询
     DraftStatusResponse, TrackInfo, SegmentInfo, DownloadStatusInfo,
 )
@@ -27,14 +46,36 @@ from app.backend.utils.draft_saver import get_draft_saver
 from app.backend.utils.settings_manager import get_settings_manager
 from app.backend.utils.logger import get_logger
 from app.backend.utils.api_response_manager import get_response_manager, ErrorCode
+from app.backend.utils.blocking_io import run_blocking, run_save
+from app.backend.utils.save_job_manager import FINISHED_STATES, get_save_job_manager
+from app.backend.utils.response_cache import get_response_cache, make_etag
+from app.backend.utils.lazy import LazyObject
 
 router = APIRouter(prefix="/api/draft", tags=["草稿操作"])
 logger = get_logger(__name__)
 response_manager = get_response_manager()
+response_cache = get_response_cache()
+
+# 获取全局管理器（第一次处理请求时才创建，导入路由模块时不打开状态存储）
+draft_manager = LazyObject(get_draft_state_manager)
+segment_manager = LazyObject(get_segment_manager)
+
+# 片段类型 -> 所需轨道类型
+_SEGMENT_TRACK_TYPES = {
+    "audio": "audio",
+    "video": "video",
+    "text": "text",
+    "sticker": "sticker"
+}
+
+
+class _DraftEditError(Exception):
+    """在 modify_draft 的修改函数中中止修改，并返回指定的错误响应"""
 
-# 获取全局管理器
-draft_manager = get_draft_state_manager()
-segment_manager = get_segment_manager()
+    def __init__(self, error_code: ErrorCode, details: Dict[str, Any]):
+        super().__init__(error_code.value)
+        self.error_code = error_code
+        self.details = details
 
 
 @router.post(
@@ -74,7 +115,8 @@ async def create_draft(request: CreateDraftRequest) -> CreateDraftResponse:
     
     try:
         # 调用草稿管理器创建草稿
-        result = draft_manager.create_draft(
+        result = await run_blocking(
+            draft_manager.create_draft,
             draft_name=request.draft_name,
             width=request.width,
             height=request.height,
@@ -125,19 +167,7 @@ async def add_track(draft_id: str, request: AddTrackRequest) -> AddTrackResponse
     logger.info(f"收到添加轨道请求: draft_id={draft_id}")
     logger.info(f"轨道类型: {request.track_type}")
     
-    try:
-        # 验证草稿是否存在
-        config = draft_manager.get_draft_config(draft_id)
-        if config is None:
-            logger.error(f"草稿不存在: {draft_id}")
-            return response_manager.not_found_response(
-                AddTrackResponse,
-                resource_type="draft",
-                resource_id=draft_id,
-                track_index=-1
-            )
-        
-        # 添加轨道
+    def append_track(config: Dict[str, Any]) -> int:
         tracks = config.get("tracks", [])
         track_index = len(tracks)
         
@@ -150,9 +180,22 @@ async def add_track(draft_id: str, request: AddTrackRequest) -> AddTrackResponse
         
         tracks.append(track_info)
         config["tracks"] = tracks
-        
-        # 保存配置
-        success = draft_manager.update_draft_config(draft_id, config)
+        return track_index
+    
+    try:
+        async with draft_manager.draft_lock(draft_id):
+            # 验证草稿是否存在
+            if await run_blocking(draft_manager.get_draft_config, draft_id) is None:
+                logger.error(f"草稿不存在: {draft_id}")
+                return response_manager.not_found_response(
+                    AddTrackResponse,
+                    resource_type="draft",
+                    resource_id=draft_id,
+                    track_index=-1
+                )
+            
+            # 添加轨道并保存配置（版本冲突时自动重试）
+            success, track_index = await run_blocking(draft_manager.modify_draft, draft_id, append_track)
         
         if not success:
             logger.error("添加轨道失败")
@@ -181,6 +224,72 @@ async def add_track(draft_id: str, request: AddTrackRequest) -> AddTrackResponse
         )
 
 
+def _place_segment(
+    config: Dict[str, Any], segment_id: str, segment_type: str, track_index: Optional[int]
+) -> int:
+    """
+    将片段添加到草稿配置的轨道中
+    
+    track_index 为 None 时选择第一个类型匹配的轨道，没有则自动创建
+    
+    Returns:
+        目标轨道索引
+    
+    Raises:
+        _DraftEditError: 轨道索引无效或轨道类型不匹配
+    """
+    tracks = config.get("tracks", [])
+    target_track_index = track_index
+    
+    if target_track_index is None:
+        # 自动选择合适的轨道
+        required_track_type = _SEGMENT_TRACK_TYPES.get(segment_type)
+        
+        # 查找现有的合适轨道
+        target_track_index = None
+        for i, track in enumerate(tracks):
+            if track["track_type"] == required_track_type:
+                target_track_index = i
+                break
+        
+        # 如果没有合适的轨道，创建一个新轨道
+        if target_track_index is None:
+            target_track_index = len(tracks)
+            track_info = {
+                "track_type": required_track_type,
+                "track_index": target_track_index,
+                "track_name": f"{required_track_type}_{target_track_index}",
+                "segments": []
+            }
+            tracks.append(track_info)
+            logger.info(f"自动创建轨道: index={target_track_index}, type={required_track_type}")
+    
+    # 验证轨道索引有效性
+    if target_track_index >= len(tracks):
+        raise _DraftEditError(
+            ErrorCode.TRACK_INDEX_INVALID,
+            {"track_index": target_track_index}
+        )
+    
+    # 验证轨道类型匹配
+    track = tracks[target_track_index]
+    expected_track_type = _SEGMENT_TRACK_TYPES.get(segment_type)
+    
+    if track["track_type"] != expected_track_type:
+        raise _DraftEditError(
+            ErrorCode.TRACK_TYPE_MISMATCH,
+            {
+                "segment_type": segment_type,
+                "track_type": track["track_type"]
+            }
+        )
+    
+    # 添加片段到轨道
+    track["segments"].append(segment_id)
+    config["tracks"] = tracks
+    return target_track_index
+
+
 @router.post(
     "/{draft_id}/add_segment",
     response_model=AddSegmentToDraftResponse,
@@ -194,104 +303,35 @@ async def add_segment(draft_id: str, request: AddSegmentToDraftRequest) -> AddSe
     logger.info(f"收到添加片段请求: draft_id={draft_id}")
     logger.info(f"片段 ID: {request.segment_id}")
     
+    def place_segment(config: Dict[str, Any]) -> int:
+        return _place_segment(config, request.segment_id, segment_type, request.track_index)
+    
     try:
-        # 验证草稿是否存在
-        config = draft_manager.get_draft_config(draft_id)
-        if config is None:
-            logger.error(f"草稿不存在: {draft_id}")
-            return response_manager.not_found_response(
-
-                AddSegmentToDraftResponse,
-
-                resource_type="draft",
-
-                resource_id=draft_id
-
-            )
-        
         # 验证片段是否存在
-        segment = segment_manager.get_segment(request.segment_id)
-        if not segment:
-            logger.error(f"片段不存在: {request.segment_id}")
-            return response_manager.not_found_response(
-
-                AddSegmentToDraftResponse,
-
-                resource_type="segment",
-
-                resource_id=request.segment_id
-
-            )
-        
-        segment_type = segment["segment_type"]
+        segment = await run_blocking(segment_manager.get_segment, request.segment_id)
         
-        # 查找或创建合适的轨道
-        tracks = config.get("tracks", [])
-        target_track_index = request.track_index
-        
-        if target_track_index is None:
-            # 自动选择合适的轨道
-            track_type_map = {
-                "audio": "audio",
-                "video": "video",
-                "text": "text",
-                "sticker": "sticker"
-            }
-            required_track_type = track_type_map.get(segment_type)
+        async with draft_manager.draft_lock(draft_id):
+            # 验证草稿是否存在
+            if await run_blocking(draft_manager.get_draft_config, draft_id) is None:
+                logger.error(f"草稿不存在: {draft_id}")
+                return response_manager.not_found_response(
+                    AddSegmentToDraftResponse,
+                    resource_type="draft",
+                    resource_id=draft_id
+                )
             
-            # 查找现有的合适轨道
-            target_track_index = None
-            for i, track in enumerate(tracks):
-                if track["track_type"] == required_track_type:
-                    target_track_index = i
-                    break
+            if not segment:
+                logger.error(f"片段不存在: {request.segment_id}")
+                return response_manager.not_found_response(
+                    AddSegmentToDraftResponse,
+                    resource_type="segment",
+                    resource_id=request.segment_id
+                )
             
-            # 如果没有合适的轨道，创建一个新轨道
-            if target_track_index is None:
-                target_track_index = len(tracks)
-                track_info = {
-                    "track_type": required_track_type,
-                    "track_index": target_track_index,
-                    "track_name": f"{required_track_type}_{target_track_index}",
-                    "segments": []
-                }
-                tracks.append(track_info)
-                logger.info(f"自动创建轨道: index={target_track_index}, type={required_track_type}")
-        
-        # 验证轨道索引有效性
-        if target_track_index >= len(tracks):
-            return response_manager.error_response(
-                AddSegmentToDraftResponse,
-                error_code=ErrorCode.TRACK_INDEX_INVALID,
-                details={"track_index": target_track_index}
-            )
-        
-        # 验证轨道类型匹配
-        track = tracks[target_track_index]
-        track_type_map = {
-            "audio": "audio",
-            "video": "video",
-            "text": "text",
-            "sticker": "sticker"
-        }
-        expected_track_type = track_type_map.get(segment_type)
-        
-        if track["track_type"] != expected_track_type:
-            return response_manager.error_response(
-                AddSegmentToDraftResponse,
-                error_code=ErrorCode.TRACK_TYPE_MISMATCH,
-                details={
-                    "segment_type": segment_type,
-                    "track_type": track["track_type"]
-                }
-            )
-        
-        # 添加片段到轨道
-        track["segments"].append(request.segment_id)
-        config["tracks"] = tracks
-        
-        # 保存配置
-        success = draft_manager.update_draft_config(draft_id, config)
+            segment_type = segment["segment_type"]
+            
+            # 保存配置（版本冲突时自动重试）
+            success, target_track_index = await run_blocking(draft_manager.modify_draft, draft_id, place_segment)
         
         if not success:
             logger.error("添加片段失败")
@@ -309,6 +349,12 @@ async def add_segment(draft_id: str, request: AddSegmentToDraftRequest) -> AddSe
             message=f"片段已添加到轨道 {target_track_index}"
         )
         
+    except _DraftEditError as e:
+        return response_manager.error_response(
+            AddSegmentToDraftResponse,
+            error_code=e.error_code,
+            details=e.details
+        )
     except Exception as e:
         logger.error(f"添加片段时发生错误: {e}", exc_info=True)
         return response_manager.internal_error_response(
@@ -328,22 +374,11 @@ async def add_global_effect(draft_id: str, request: AddGlobalEffectRequest) -> A
     """添加全局特效（Coze 友好版本）"""
     logger.info(f"为草稿 {draft_id} 添加全局特效: {request.effect_type}")
     
-    try:
-        # 验证草稿是否存在
-        config = draft_manager.get_draft_config(draft_id)
-        if config is None:
-            logger.error(f"草稿不存在: {draft_id}")
-            return response_manager.not_found_response(
-                AddGlobalEffectResponse,
-                resource_type="draft",
-                resource_id=draft_id,
-                effect_id=""
-            )
-        
-        # 添加全局特效记录
-        import uuid
-        effect_id = str(uuid.uuid4())
-        
+    # 添加全局特效记录
+    import uuid
+    effect_id = str(uuid.uuid4())
+    
+    def append_effect(config: Dict[str, Any]) -> None:
         if "global_effects" not in config:
             config["global_effects"] = []
         
@@ -355,9 +390,21 @@ async def add_global_effect(draft_id: str, request: AddGlobalEffectRequest) -> A
         }
         
         config["global_effects"].append(effect_data)
-        
-        # 保存配置
-        success = draft_manager.update_draft_config(draft_id, config)
+    
+    try:
+        async with draft_manager.draft_lock(draft_id):
+            # 验证草稿是否存在
+            if await run_blocking(draft_manager.get_draft_config, draft_id) is None:
+                logger.error(f"草稿不存在: {draft_id}")
+                return response_manager.not_found_response(
+                    AddGlobalEffectResponse,
+                    resource_type="draft",
+                    resource_id=draft_id,
+                    effect_id=""
+                )
+            
+            # 保存配置（版本冲突时自动重试）
+            success, _ = await run_blocking(draft_manager.modify_draft, draft_id, append_effect)
         
         if not success:
             logger.error("添加全局特效失败")
@@ -396,22 +443,11 @@ async def add_global_filter(draft_id: str, request: AddGlobalFilterRequest) -> A
     """添加全局滤镜（Coze 友好版本）"""
     logger.info(f"为草稿 {draft_id} 添加全局滤镜: {request.filter_type}")
     
-    try:
-        # 验证草稿是否存在
-        config = draft_manager.get_draft_config(draft_id)
-        if config is None:
-            logger.error(f"草稿不存在: {draft_id}")
-            return response_manager.not_found_response(
-                AddGlobalFilterResponse,
-                resource_type="draft",
-                resource_id=draft_id,
-                filter_id=""
-            )
-        
-        # 添加全局滤镜记录
-        import uuid
-        filter_id = str(uuid.uuid4())
-        
+    # 添加全局滤镜记录
+    import uuid
+    filter_id = str(uuid.uuid4())
+    
+    def append_filter(config: Dict[str, Any]) -> None:
         if "global_filters" not in config:
             config["global_filters"] = []
         
@@ -423,9 +459,21 @@ async def add_global_filter(draft_id: str, request: AddGlobalFilterRequest) -> A
         }
         
         config["global_filters"].append(filter_data)
-        
-        # 保存配置
-        success = draft_manager.update_draft_config(draft_id, config)
+    
+    try:
+        async with draft_manager.draft_lock(draft_id):
+            # 验证草稿是否存在
+            if await run_blocking(draft_manager.get_draft_config, draft_id) is None:
+                logger.error(f"草稿不存在: {draft_id}")
+                return response_manager.not_found_response(
+                    AddGlobalFilterResponse,
+                    resource_type="draft",
+                    resource_id=draft_id,
+                    filter_id=""
+                )
+            
+            # 保存配置（版本冲突时自动重试）
+            success, _ = await run_blocking(draft_manager.modify_draft, draft_id, append_filter)
         
         if not success:
             logger.error("添加全局滤镜失败")
@@ -453,6 +501,548 @@ async def add_global_filter(draft_id: str, request: AddGlobalFilterRequest) -> A
         )
 
 
+# ==================== 批量操作 ====================
+
+# create_segment 的片段类型 -> 请求模型（与 /api/segment/{type}/create 相同）
+_BATCH_CREATE_MODELS = {
+    "audio": CreateAudioSegmentRequest,
+    "video": CreateVideoSegmentRequest,
+    "text": CreateTextSegmentRequest,
+    "sticker": CreateStickerSegmentRequest,
+    "effect": CreateEffectSegmentRequest,
+    "filter": CreateFilterSegmentRequest,
+}
+
+# (片段类型, 操作名) -> 请求模型（与 /api/segment/{type}/{segment_id}/{operation} 相同）
+_BATCH_OPERATION_MODELS = {
+    ("audio", "add_effect"): AddAudioEffectRequest,
+    ("audio", "add_fade"): AddAudioFadeRequest,
+    ("audio", "add_keyframe"): AddAudioKeyframeRequest,
+    ("video", "add_animation"): AddVideoAnimationRequest,
+    ("video", "add_effect"): AddVideoEffectRequest,
+    ("video", "add_fade"): AddVideoFadeRequest,
+    ("video", "add_filter"): AddVideoFilterRequest,
+    ("video", "add_mask"): AddVideoMaskRequest,
+    ("video", "add_transition"): AddVideoTransitionRequest,
+    ("video", "add_background_filling"): AddVideoBackgroundFillingRequest,
+    ("video", "add_keyframe"): AddVideoKeyframeRequest,
+    ("sticker", "add_keyframe"): AddStickerKeyframeRequest,
+    ("text", "add_animation"): AddTextAnimationRequest,
+    ("text", "add_bubble"): AddTextBubbleRequest,
+    ("text", "add_effect"): AddTextEffectRequest,
+    ("text", "add_keyframe"): AddTextKeyframeRequest,
+}
+
+
+def _validate_params(model: type, params: Dict[str, Any], location: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    用对应端点的请求模型校验参数
+    
+    Args:
+        location: 出错时附加到 details 中的位置信息（如命令序号）
+    """
+    try:
+        return model(**params).dict()
+    except ValidationError as e:
+        raise _DraftEditError(
+            ErrorCode.INVALID_PARAMETER,
+            {**location, "parameter": "params", "reason": str(e)}
+        )
+
+
+def _plan_batch(commands: List[BatchCommand], config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    校验批量命令并生成执行计划（不写入任何状态）
+    
+    对本批次创建的片段的操作合并到创建时一次写入；添加到草稿的命令先在草稿配置的
+    副本上试运行，提前发现轨道索引或类型错误
+    
+    Raises:
+        _DraftEditError: 任意一条命令无效（details 中的 index 为命令序号）
+    """
+    creates: Dict[str, Dict[str, Any]] = {}                  # 临时 ID -> 待创建的片段
+    operations: List[Tuple[str, str, Dict[str, Any]]] = []   # 已存在片段上的操作
+    attaches: List[Dict[str, Any]] = []
+    results: List[Dict[str, Any]] = []
+    preview = copy.deepcopy(config)
+    
+    for index, command in enumerate(commands):
+        result: Dict[str, Any] = {"index": index, "action": command.action}
+        
+        if command.action == "create_segment":
+            model = _BATCH_CREATE_MODELS.get(command.segment_type)
+            if model is None:
+                raise _DraftEditError(
+                    ErrorCode.INVALID_PARAMETER,
+                    {"index": index, "parameter": "segment_type", "reason": f"不支持的片段类型 {command.segment_type}"}
+                )
+            ref = command.ref or f"#{index}"
+            if ref in creates:
+                raise _DraftEditError(
+                    ErrorCode.INVALID_PARAMETER,
+                    {"index": index, "parameter": "ref", "reason": f"临时 ID 重复: {ref}"}
+                )
+            creates[ref] = {
+                "segment_type": command.segment_type,
+                "config": _validate_params(model, command.params, {"index": index}),
+                "operations": [],
+            }
+            result["ref"] = ref
+            results.append(result)
+            continue
+        
+        if command.action not in ("add_operation", "add_segment"):
+            raise _DraftEditError(
+                ErrorCode.OPERATION_NOT_SUPPORTED,
+                {"index": index, "operation": command.action}
+            )
+        
+        # 解析目标片段：本批次的临时 ID 或已存在的片段 UUID
+        if command.segment_ref is not None:
+            if command.segment_ref not in creates:
+                raise _DraftEditError(
+                    ErrorCode.SEGMENT_NOT_FOUND,
+                    {"index": index, "segment_id": command.segment_ref}
+                )
+            segment_type = creates[command.segment_ref]["segment_type"]
+            result["ref"] = command.segment_ref
+        elif command.segment_id is not None:
+            segment = segment_manager.get_segment(command.segment_id)
+            if not segment:
+                raise _DraftEditError(
+                    ErrorCode.SEGMENT_NOT_FOUND,
+                    {"index": index, "segment_id": command.segment_id}
+                )
+            segment_type = segment["segment_type"]
+            result["segment_id"] = command.segment_id
+        else:
+            raise _DraftEditError(
+                ErrorCode.MISSING_REQUIRED_PARAMETER,
+                {"index": index, "parameter": "segment_id"}
+            )
+        
+        if command.action == "add_operation":
+            model = _BATCH_OPERATION_MODELS.get((segment_type, command.operation))
+            if model is None:
+                raise _DraftEditError(
+                    ErrorCode.OPERATION_NOT_SUPPORTED,
+                    {"index": index, "operation": f"{segment_type}.{command.operation}"}
+                )
+            data = _validate_params(model, command.params, {"index": index})
+            if command.segment_ref is not None:
+                creates[command.segment_ref]["operations"].append((command.operation, data))
+            else:
+                operations.append((command.segment_id, command.operation, data))
+            result["operation"] = command.operation
+        else:
+            try:
+                _place_segment(preview, command.segment_id or command.segment_ref, segment_type, command.track_index)
+            except _DraftEditError as e:
+                raise _DraftEditError(e.error_code, {"index": index, **e.details})
+            attaches.append({
+                "result": result,
+                "segment_ref": command.segment_ref,
+                "segment_id": command.segment_id,
+                "segment_type": segment_type,
+                "track_index": command.track_index,
+            })
+        results.append(result)
+    
+    return {"creates": creates, "operations": operations, "attaches": attaches, "results": results}
+
+
+def _execute_batch(draft_id: str, plan: Dict[str, Any]) -> Dict[str, str]:
+    """
+    执行批量计划
+    
+    片段的创建、操作和草稿配置的比较并交换在同一个存储事务中写入（sqlite 后端原子提交，
+    任意一步失败整体回滚）。file 后端不支持回滚，失败时删除本批次创建的片段，
+    并撤销在已存在片段上添加的操作
+    
+    Returns:
+        临时 ID -> 片段 UUID
+    """
+    ids: Dict[str, str] = {}
+    added: Dict[str, List[str]] = {}   # 已存在的片段 -> 本批次添加的操作 ID
+    try:
+        with draft_manager.transaction(), segment_manager.store.transaction():
+            for ref, item in plan["creates"].items():
+                result = segment_manager.create_segment(item["segment_type"], item["config"], item["operations"])
+                if not result["success"]:
+                    raise RuntimeError(result["message"])
+                ids[ref] = result["segment_id"]
+            for segment_id, operation, data in plan["operations"]:
+                operation_id = str(uuid.uuid4())
+                if not segment_manager.add_operation(segment_id, operation, data, operation_id):
+                    raise RuntimeError(f"片段 {segment_id} 添加操作 {operation} 失败")
+                added.setdefault(segment_id, []).append(operation_id)
+            
+            for item in plan["results"]:
+                if "ref" in item:
+                    item["segment_id"] = ids[item["ref"]]
+            
+            if plan["attaches"]:
+                def attach_all(config: Dict[str, Any]) -> List[int]:
+                    return [
+                        _place_segment(
+                            config,
+                            attach["segment_id"] or ids[attach["segment_ref"]],
+                            attach["segment_type"],
+                            attach["track_index"]
+                        )
+                        for attach in plan["attaches"]
+                    ]
+                
+                success, track_indexes = draft_manager.modify_draft(draft_id, attach_all)
+                if not success:
+                    raise RuntimeError("更新草稿配置失败")
+                for attach, track_index in zip(plan["attaches"], track_indexes):
+                    attach["result"]["track_index"] = track_index
+        return ids
+    except Exception:
+        # file 后端不支持回滚，删除本批次创建的片段并撤销已存在片段上的操作
+        for segment_id in ids.values():
+            segment_manager.delete_segment(segment_id)
+        for segment_id, operation_ids in added.items():
+            segment_manager.remove_operations(segment_id, operation_ids)
+        raise
+
+
+@router.post(
+    "/{draft_id}/batch",
+    response_model=BatchDraftResponse,
+    status_code=status.HTTP_200_OK,
+    summary="批量操作",
+    description="在一个请求中按顺序创建片段、添加片段操作并添加到草稿，支持临时 ID 引用（总是返回 success=True）"
+)
+async def batch_draft(draft_id: str, request: BatchDraftRequest) -> BatchDraftResponse:
+    """
+    批量操作（Coze 友好版本）
+    
+    命令类型:
+    - create_segment: 创建片段，params 与 /api/segment/{segment_type}/create 相同，可用 ref 定义临时 ID
+    - add_operation: 片段操作，operation 为端点名（如 add_fade），params 与对应端点相同
+    - add_segment: 将片段添加到草稿，可指定 track_index
+    
+    所有命令先校验，任意一条无效时不写入任何状态，并在 details.index 中返回出错的命令序号
+    """
+    logger.info(f"收到批量操作请求: draft_id={draft_id}, 命令数={len(request.commands)}")
+    
+    try:
+        async with draft_manager.draft_lock(draft_id):
+            config = await run_blocking(draft_manager.get_draft_config, draft_id)
+            if config is None:
+                logger.error(f"草稿不存在: {draft_id}")
+                return response_manager.not_found_response(
+                    BatchDraftResponse,
+                    resource_type="draft",
+                    resource_id=draft_id
+                )
+            
+            plan = await run_blocking(_plan_batch, request.commands, config)
+            ids = await run_blocking(_execute_batch, draft_id, plan)
+            latest = await run_blocking(draft_manager.get_draft_config, draft_id)
+        
+        logger.info(f"批量操作完成: 创建 {len(ids)} 个片段，执行 {len(request.commands)} 条命令")
+        
+        return response_manager.success_response(
+            BatchDraftResponse,
+            message=f"批量操作成功，共 {len(request.commands)} 条命令",
+            ids={ref: segment_id for ref, segment_id in ids.items() if not ref.startswith("#")},
+            results=plan["results"],
+            version=(latest or {}).get("version", 0)
+        )
+        
+    except _DraftEditError as e:
+        logger.error(f"批量命令无效: {e.details}")
+        return response_manager.error_response(
+            BatchDraftResponse,
+            error_code=e.error_code,
+            details=e.details
+        )
+    except Exception as e:
+        logger.error(f"批量操作时发生错误: {e}", exc_info=True)
+        return response_manager.internal_error_response(
+            BatchDraftResponse,
+            error=e
+        )
+
+
+# ==================== 声明式时间线 ====================
+
+def _content_digest(value: Any) -> str:
+    """内容摘要（键排序后的 JSON 的 SHA-256）"""
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _segment_digest(segment_type: str, config: Dict[str, Any], operations: List[Tuple[str, Dict[str, Any]]]) -> str:
+    """片段内容摘要：类型、创建参数和操作序列相同的片段摘要相同"""
+    return _content_digest({
+        "segment_type": segment_type,
+        "config": config,
+        "operations": [[operation, data] for operation, data in operations],
+    })
+
+
+def _plan_timeline(request: TimelineRequest, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    校验时间线并与草稿当前的轨道比较，生成执行计划（不写入任何状态）
+    
+    草稿中每个片段的摘要保存在 config["timeline"]["segments"] 中；不在其中的片段
+    （通过单个端点添加的）读取片段内容计算摘要。片段先按 key 匹配（内容相同才沿用），
+    再按内容摘要匹配，都匹配不到时新建
+    
+    Raises:
+        _DraftEditError: 轨道类型、片段参数或操作无效（details 中的 track/segment 为位置）
+    """
+    # 校验并计算每个片段的摘要
+    desired: List[List[Dict[str, Any]]] = []
+    for track_position, track in enumerate(request.tracks):
+        segment_type = track.track_type
+        if segment_type not in _SEGMENT_TRACK_TYPES:
+            raise _DraftEditError(
+                ErrorCode.INVALID_PARAMETER,
+                {"track": track_position, "parameter": "track_type", "reason": f"不支持的轨道类型 {segment_type}"}
+            )
+        
+        items = []
+        for segment_position, segment in enumerate(track.segments):
+            location = {"track": track_position, "segment": segment_position}
+            segment_config = _validate_params(_BATCH_CREATE_MODELS[segment_type], segment.params, location)
+            operations = []
+            for operation in segment.operations:
+                model = _BATCH_OPERATION_MODELS.get((segment_type, operation.operation))
+                if model is None:
+                    raise _DraftEditError(
+                        ErrorCode.OPERATION_NOT_SUPPORTED,
+                        {**location, "operation": f"{segment_type}.{operation.operation}"}
+                    )
+                operations.append((operation.operation, _validate_params(model, operation.params, location)))
+            items.append({
+                "key": segment.key,
+                "segment_type": segment_type,
+                "config": segment_config,
+                "operations": operations,
+                "digest": _segment_digest(segment_type, segment_config, operations),
+                "segment_id": None,
+            })
+        desired.append(items)
+    
+    # 草稿当前的片段及其摘要
+    known = config.get("timeline", {}).get("segments", {})
+    current: Dict[str, Dict[str, Any]] = {}
+    for track in config.get("tracks", []):
+        for segment_id in track["segments"]:
+            if segment_id in current:
+                continue
+            if segment_id in known:
+                current[segment_id] = dict(known[segment_id])
+                continue
+            segment = segment_manager.get_segment(segment_id)
+            if segment:
+                current[segment_id] = {
+                    "key": None,
+                    "digest": _segment_digest(
+                        segment["segment_type"],
+                        segment["config"],
+                        [(op["operation_type"], op["data"]) for op in segment.get("operations", [])]
+                    ),
+                }
+    
+    # 先按 key 匹配，再按内容摘要匹配
+    claimed = set()
+    by_key = {entry["key"]: segment_id for segment_id, entry in current.items() if entry["key"]}
+    for items in desired:
+        for item in items:
+            segment_id = by_key.get(item["key"]) if item["key"] else None
+            if segment_id and segment_id not in claimed and current[segment_id]["digest"] == item["digest"]:
+                item["segment_id"] = segment_id
+                claimed.add(segment_id)
+    
+    by_digest: Dict[str, List[str]] = {}
+    for segment_id, entry in current.items():
+        if segment_id not in claimed:
+            by_digest.setdefault(entry["digest"], []).append(segment_id)
+    for items in desired:
+        for item in items:
+            if item["segment_id"] is None and by_digest.get(item["digest"]):
+                item["segment_id"] = by_digest[item["digest"]].pop(0)
+                claimed.add(item["segment_id"])
+    
+    creates = [item for items in desired for item in items if item["segment_id"] is None]
+    return {
+        "tracks": [
+            {
+                "track_type": track.track_type,
+                "track_name": track.track_name or f"{track.track_type}_{track_position}",
+                "items": items,
+            }
+            for track_position, (track, items) in enumerate(zip(request.tracks, desired))
+        ],
+        "creates": creates,
+        "reused": sum(len(items) for items in desired) - len(creates),
+        "removed": len(set(current) - claimed),
+        "digest": _content_digest(request.dict()),
+    }
+
+
+def _timeline_tracks(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """由执行计划生成草稿配置中的轨道列表"""
+    return [
+        {
+            "track_type": track["track_type"],
+            "track_index": track_index,
+            "track_name": track["track_name"],
+            "segments": [item["segment_id"] for item in track["items"]],
+        }
+        for track_index, track in enumerate(plan["tracks"])
+    ]
+
+
+def _execute_timeline(draft_id: str, plan: Dict[str, Any]) -> Tuple[bool, int]:
+    """
+    执行时间线计划
+    
+    新片段在一个存储事务中创建，然后一次性替换草稿的轨道；轨道和片段摘要都没有变化时
+    不写入草稿。
+    替换失败时删除本次创建的片段。被移除的片段不在这里删除，没有其它草稿引用时由
+    状态清理任务回收
+    
+    Returns:
+        (草稿配置是否有变化, 提交后的版本号)
+    """
+    created: List[str] = []
+    try:
+        with segment_manager.store.transaction():
+            for item in plan["creates"]:
+                result = segment_manager.create_segment(item["segment_type"], item["config"], item["operations"])
+                if not result["success"]:
+                    raise RuntimeError(result["message"])
+                item["segment_id"] = result["segment_id"]
+                created.append(result["segment_id"])
+        
+        tracks = _timeline_tracks(plan)
+        segments = {
+            item["segment_id"]: {"key": item["key"], "digest": item["digest"]}
+            for track in plan["tracks"] for item in track["items"]
+        }
+        
+        def apply_timeline(config: Dict[str, Any]) -> None:
+            config["tracks"] = tracks
+            config["timeline"] = {
+                "digest": plan["digest"],
+                # modify_draft 写入时版本号加一
+                "version": config.get("version", 0) + 1,
+                "segments": segments,
+            }
+        
+        config = draft_manager.get_draft_config(draft_id) or {}
+        if (
+            not created
+            and config.get("tracks", []) == tracks
+            and config.get("timeline", {}).get("segments") == segments
+        ):
+            return False, config.get("version", 0)
+        
+        success, _ = draft_manager.modify_draft(draft_id, apply_timeline)
+        if not success:
+            raise RuntimeError("更新草稿配置失败")
+        return True, (draft_manager.get_draft_config(draft_id) or {}).get("version", 0)
+    except Exception:
+        # file 后端不支持回滚，删除本次已创建的片段
+        for segment_id in created:
+            segment_manager.delete_segment(segment_id)
+        raise
+
+
+def _timeline_ids(plan: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        item["key"]: item["segment_id"]
+        for track in plan["tracks"] for item in track["items"] if item["key"]
+    }
+
+
+@router.put(
+    "/{draft_id}/timeline",
+    response_model=TimelineResponse,
+    status_code=status.HTTP_200_OK,
+    summary="提交完整时间线",
+    description="一次提交草稿的全部轨道、片段和操作，只应用与当前状态的差异（总是返回 success=True）"
+)
+async def put_timeline(draft_id: str, request: TimelineRequest) -> TimelineResponse:
+    """
+    提交完整时间线（Coze 友好版本）
+    
+    请求中的轨道列表替换草稿当前的轨道。内容没有变化的片段沿用原片段，只为新增或
+    修改过的片段创建新片段；与上次提交完全相同且草稿未被其它请求修改时直接返回
+    """
+    logger.info(f"收到时间线提交请求: draft_id={draft_id}, 轨道数={len(request.tracks)}")
+    
+    try:
+        async with draft_manager.draft_lock(draft_id):
+            config = await run_blocking(draft_manager.get_draft_config, draft_id)
+            if config is None:
+                logger.error(f"草稿不存在: {draft_id}")
+                return response_manager.not_found_response(
+                    TimelineResponse,
+                    resource_type="draft",
+                    resource_id=draft_id
+                )
+            
+            # 与上次提交完全相同，且之后没有其它修改
+            timeline = config.get("timeline", {})
+            if (
+                timeline.get("version") == config.get("version")
+                and timeline.get("digest") == _content_digest(request.dict())
+            ):
+                segments = timeline["segments"]
+                logger.info(f"时间线未变化: {draft_id}")
+                return response_manager.success_response(
+                    TimelineResponse,
+                    message="时间线未变化",
+                    ids={entry["key"]: segment_id for segment_id, entry in segments.items() if entry["key"]},
+                    tracks=[track["segments"] for track in config.get("tracks", [])],
+                    reused=sum(len(track["segments"]) for track in config.get("tracks", [])),
+                    changed=False,
+                    version=config.get("version", 0)
+                )
+            
+            plan = await run_blocking(_plan_timeline, request, config)
+            changed, version = await run_blocking(_execute_timeline, draft_id, plan)
+        
+        logger.info(
+            f"时间线提交完成: 新建 {len(plan['creates'])} 个片段，沿用 {plan['reused']} 个，"
+            f"移除 {plan['removed']} 个"
+        )
+        
+        return response_manager.success_response(
+            TimelineResponse,
+            message="时间线已更新" if changed else "时间线未变化",
+            ids=_timeline_ids(plan),
+            tracks=[track["segments"] for track in _timeline_tracks(plan)],
+            created=len(plan["creates"]),
+            reused=plan["reused"],
+            removed=plan["removed"],
+            changed=changed,
+            version=version
+        )
+        
+    except _DraftEditError as e:
+        logger.error(f"时间线无效: {e.details}")
+        return response_manager.error_response(
+            TimelineResponse,
+            error_code=e.error_code,
+            details=e.details
+        )
+    except Exception as e:
+        logger.error(f"提交时间线时发生错误: {e}", exc_info=True)
+        return response_manager.internal_error_response(
+            TimelineResponse,
+            error=e
+        )
+
+
 @router.post(
     "/{draft_id}/save",
     response_model=SaveDraftResponse,
@@ -466,7 +1056,7 @@ async def save_draft(draft_id: str) -> SaveDraftResponse:
     
     try:
         # 验证草稿是否存在
-        config = draft_manager.get_draft_config(draft_id)
+        config = await run_blocking(draft_manager.get_draft_config, draft_id)
         if config is None:
             logger.error(f"草稿不存在: {draft_id}")
             return response_manager.not_found_response(
@@ -476,16 +1066,20 @@ async def save_draft(draft_id: str) -> SaveDraftResponse:
                 draft_path=""
             )
         
+        # 写回缓存中尚未落盘的草稿配置
+        await run_blocking(draft_manager.flush, draft_id)
+        
         # 重新加载设置，确保使用最新的路径配置
-        get_settings_manager().reload()
+        await run_blocking(get_settings_manager().reload)
         
-        # 使用 DraftSaver 保存草稿
+        # 使用 DraftSaver 保存草稿（下载素材、生成草稿文件耗时较长，在保存线程池中执行）
         draft_saver = get_draft_saver()
-        draft_path = draft_saver.save_draft(draft_id)
+        draft_path = await run_save(draft_saver.save_draft, draft_id)
         
         # 更新状态为已保存
-        config["status"] = "saved"
-        draft_manager.update_draft_config(draft_id, config)
+        async with draft_manager.draft_lock(draft_id):
+            await run_blocking(draft_manager.modify_draft, draft_id, lambda latest: latest.update(status="saved"))
+        await run_blocking(draft_manager.flush, draft_id)
         
         logger.info(f"草稿保存成功: {draft_path}")
         
@@ -504,6 +1098,132 @@ async def save_draft(draft_id: str) -> SaveDraftResponse:
         )
 
 
+# 保存任务 SSE 进度流的轮询间隔和心跳间隔（秒）
+_SAVE_JOB_POLL_INTERVAL = 0.25
+_SAVE_JOB_KEEPALIVE_INTERVAL = 15.0
+
+_SAVE_JOB_MESSAGES = {
+    "queued": "保存任务已提交",
+    "running": "保存任务进行中",
+    "completed": "草稿保存成功",
+    "failed": "草稿保存失败",
+}
+
+
+def _save_job_response(job: Dict[str, Any]) -> SaveJobResponse:
+    """将保存任务快照转换为响应"""
+    fields = {key: job[key] for key in ("job_id", "draft_id", "status", "progress", "draft_path", "error")}
+    if job["status"] == "failed":
+        return response_manager.error_response(
+            SaveJobResponse,
+            error_code=ErrorCode.DRAFT_SAVE_FAILED,
+            details={"reason": job["error"]},
+            **fields
+        )
+    return response_manager.success_response(
+        SaveJobResponse,
+        message=_SAVE_JOB_MESSAGES.get(job["status"], "操作成功"),
+        **fields
+    )
+
+
+@router.post(
+    "/{draft_id}/save_async",
+    response_model=SaveJobResponse,
+    status_code=status.HTTP_200_OK,
+    summary="异步保存草稿",
+    description="提交保存任务并立即返回任务 ID，通过 /save_jobs/{job_id} 查询进度（总是返回 success=True）"
+)
+async def save_draft_async(draft_id: str) -> SaveJobResponse:
+    """异步保存草稿（Coze 友好版本）"""
+    logger.info(f"提交异步保存任务: {draft_id}")
+    
+    try:
+        # 验证草稿是否存在
+        if await run_blocking(draft_manager.get_draft_config, draft_id) is None:
+            logger.error(f"草稿不存在: {draft_id}")
+            return response_manager.not_found_response(
+                SaveJobResponse,
+                resource_type="draft",
+                resource_id=draft_id,
+                draft_id=draft_id
+            )
+        
+        job = get_save_job_manager().submit(draft_id)
+        return _save_job_response(job)
+        
+    except Exception as e:
+        logger.error(f"提交保存任务时发生错误: {e}", exc_info=True)
+        return response_manager.internal_error_response(
+            SaveJobResponse,
+            error=e,
+            draft_id=draft_id
+        )
+
+
+@router.get(
+    "/save_jobs/{job_id}",
+    response_model=SaveJobResponse,
+    status_code=status.HTTP_200_OK,
+    summary="查询保存任务",
+    description="查询异步保存任务的状态和进度（总是返回 success=True）"
+)
+async def get_save_job(job_id: str) -> SaveJobResponse:
+    """查询保存任务（Coze 友好版本）"""
+    job = get_save_job_manager().get_job(job_id)
+    if job is None:
+        logger.error(f"保存任务不存在: {job_id}")
+        return response_manager.not_found_response(
+            SaveJobResponse,
+            resource_type="save_job",
+            resource_id=job_id,
+            job_id=job_id
+        )
+    return _save_job_response(job)
+
+
+@router.get(
+    "/save_jobs/{job_id}/events",
+    summary="保存任务进度流",
+    description="以 Server-Sent Events 推送保存任务进度，任务结束（completed/failed）后关闭连接"
+)
+async def stream_save_job(job_id: str) -> StreamingResponse:
+    """保存任务进度流（SSE）"""
+    manager = get_save_job_manager()
+    if manager.get_job(job_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"保存任务 {job_id} 不存在或已过期"
+        )
+    
+    async def event_stream():
+        revision = -1
+        last_sent = time.monotonic()
+        while True:
+            job = manager.get_job(job_id)
+            if job is None:
+                yield "event: expired\ndata: {}\n\n"
+                return
+            if job["revision"] != revision:
+                revision = job.pop("revision")
+                event = job["status"] if job["status"] in FINISHED_STATES else "progress"
+                data = json.dumps(job, ensure_ascii=False)
+                yield f"id: {revision}\nevent: {event}\ndata: {data}\n\n"
+                last_sent = time.monotonic()
+                if event != "progress":
+                    return
+            elif time.monotonic() - last_sent >= _SAVE_JOB_KEEPALIVE_INTERVAL:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(_SAVE_JOB_POLL_INTERVAL)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get(
     "/{draft_id}/status",
     response_model=DraftStatusResponse,
@@ -511,12 +1231,49 @@ async def save_draft(draft_id: str) -> SaveDraftResponse:
     summary="查询草稿状态",
     description="根据草稿ID查询草稿的详细状态和信息（总是返回 success=True）"
 )
-async def get_draft_status(draft_id: str) -> DraftStatusResponse:
-    """查询草稿状态（Coze 友好版本）"""
+async def get_draft_status(draft_id: str, request: Request = None) -> DraftStatusResponse:
+    """
+    查询草稿状态（Coze 友好版本）
+
+    通过 HTTP 查询时支持条件请求：ETag 由草稿版本和片段下载状态生成，
+    未变化时返回 304 或缓存的序列化响应；直接调用时返回响应模型
+    """
     logger.info(f"查询草稿状态: {draft_id}")
     
     try:
-        config = draft_manager.get_draft_config(draft_id)
+        revision = await run_blocking(draft_manager.get_draft_revision, draft_id)
+        
+        if revision is None:
+            logger.error(f"草稿不存在: {draft_id}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"草稿 {draft_id} 不存在"
+            )
+        
+        # 批量读取片段摘要索引，不逐个加载完整片段
+        segment_ids = revision["segment_ids"]
+        summaries = await run_blocking(segment_manager.get_segment_summaries, segment_ids)
+        
+        # 草稿版本和各片段下载状态未变化时响应内容不变
+        cache_key = ("draft_status", draft_id)
+        etag = make_etag(
+            "draft_status", draft_id, revision["version"], revision["last_modified"],
+            [
+                [segment_id, summaries[segment_id].get("segment_type"),
+                 summaries[segment_id].get("material_url"), summaries[segment_id].get("download_status")]
+                for segment_id in segment_ids
+                if segment_id in summaries
+            ]
+        )
+        last_modified = max(
+            [revision["last_modified"]] + [summary.get("last_modified") or 0 for summary in summaries.values()]
+        )
+        if request is not None:
+            cached = response_cache.lookup(request, cache_key, etag, last_modified)
+            if cached is not None:
+                return cached
+        
+        config = await run_blocking(draft_manager.get_draft_config, draft_id)
         
         if config is None:
             logger.error(f"草稿不存在: {draft_id}")
@@ -536,20 +1293,15 @@ async def get_draft_status(draft_id: str) -> DraftStatusResponse:
         
         # 构建片段信息
         segments_info = []
-        all_segments = set()
-        for track in config.get("tracks", []):
-            for segment_id in track["segments"]:
-                if segment_id not in all_segments:
-                    all_segments.add(segment_id)
-                    segment = segment_manager.get_segment(segment_id)
-                    if segment:
-                        material_url = segment.get("config", {}).get("material_url")
-                        segments_info.append(SegmentInfo(
-                            segment_id=segment_id,
-                            segment_type=segment["segment_type"],
-                            material_url=material_url,
-                            download_status=segment.get("download_status", "none")
-                        ))
+        for segment_id in segment_ids:
+            summary = summaries.get(segment_id)
+            if summary:
+                segments_info.append(SegmentInfo(
+                    segment_id=segment_id,
+                    segment_type=summary["segment_type"],
+                    material_url=summary.get("material_url"),
+                    download_status=summary.get("download_status") or "none"
+                ))
         
         # 构建下载状态
         total = len([s for s in segments_info if s.material_url])
@@ -564,13 +1316,17 @@ async def get_draft_status(draft_id: str) -> DraftStatusResponse:
             failed=failed
         )
         
-        return DraftStatusResponse(
+        response = DraftStatusResponse(
             draft_id=draft_id,
             draft_name=config.get("project", {}).get("name", "未命名"),
             tracks=tracks_info,
             segments=segments_info,
-            download_status=download_status
+            download_status=download_status,
+            version=config.get("version", 0)
         )
+        if request is None:
+            return response
+        return response_cache.store(cache_key, etag, last_modified, response)
         
     except HTTPException:
         raise
@@ -10,7 +10,7 @@ Segment API 路由
 
 from typing import Any, Dict, Optional
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, status
 
 from app.backend.schemas.segment_schemas import (
     # Segment 操作 - Audio
@@ -61,15 +61,19 @@ from app.backend.schemas.segment_schemas import (
     SegmentDetailResponse,
 )
 from app.backend.utils.api_response_manager import ErrorCode, get_response_manager
+from app.backend.utils.blocking_io import run_blocking
 from app.backend.utils.logger import get_logger
+from app.backend.utils.response_cache import get_response_cache, make_etag
 from app.backend.utils.segment_manager import get_segment_manager
+from app.backend.utils.lazy import LazyObject
 
 router = APIRouter(prefix="/api/segment", tags=["片段管理"])
 logger = get_logger(__name__)
 response_manager = get_response_manager()
+response_cache = get_response_cache()
 
-# 获取全局片段管理器
-segment_manager = get_segment_manager()
+# 获取全局片段管理器（第一次处理请求时才创建）
+segment_manager = LazyObject(get_segment_manager)
 
 
 # ==================== Segment 创建端点 ====================
@@ -118,7 +122,7 @@ async def create_audio_segment(request: CreateAudioSegmentRequest) -> CreateSegm
         config = request.dict()
 
         # 创建片段
-        result = segment_manager.create_segment("audio", config)
+        result = await run_blocking(segment_manager.create_segment, "audio", config)
 
         if not result["success"]:
             logger.error(f"音频片段创建失败: {result['message']}")
@@ -187,7 +191,7 @@ async def create_video_segment(request: CreateVideoSegmentRequest) -> CreateSegm
         config = request.dict()
 
         # 创建片段
-        result = segment_manager.create_segment("video", config)
+        result = await run_blocking(segment_manager.create_segment, "video", config)
 
         if not result["success"]:
             logger.error(f"视频片段创建失败: {result['message']}")
@@ -258,7 +262,7 @@ async def create_text_segment(request: CreateTextSegmentRequest) -> CreateSegmen
         config = request.dict()
 
         # 创建片段
-        result = segment_manager.create_segment("text", config)
+        result = await run_blocking(segment_manager.create_segment, "text", config)
 
         if not result["success"]:
             logger.error(f"文本片段创建失败: {result['message']}")
@@ -326,7 +330,7 @@ async def create_sticker_segment(
         config = request.dict()
 
         # 创建片段
-        result = segment_manager.create_segment("sticker", config)
+        result = await run_blocking(segment_manager.create_segment, "sticker", config)
 
         if not result["success"]:
             logger.error(f"贴纸片段创建失败: {result['message']}")
@@ -396,7 +400,7 @@ async def create_effect_segment(request: CreateEffectSegmentRequest) -> CreateSe
         config = request.dict()
 
         # 创建片段
-        result = segment_manager.create_segment("effect", config)
+        result = await run_blocking(segment_manager.create_segment, "effect", config)
 
         if not result["success"]:
             logger.error(f"特效片段创建失败: {result['message']}")
@@ -463,7 +467,7 @@ async def create_filter_segment(request: CreateFilterSegmentRequest) -> CreateSe
         config = request.dict()
 
         # 创建片段
-        result = segment_manager.create_segment("filter", config)
+        result = await run_blocking(segment_manager.create_segment, "filter", config)
 
         if not result["success"]:
             logger.error(f"滤镜片段创建失败: {result['message']}")
@@ -527,7 +531,7 @@ async def add_audio_effect(segment_id: str, request: AddAudioEffectRequest) -> A
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddAudioEffectResponse, "segment", segment_id, effect_id="")
@@ -543,7 +547,8 @@ async def add_audio_effect(segment_id: str, request: AddAudioEffectRequest) -> A
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(
+        success = await run_blocking(
+            segment_manager.add_operation,
             segment_id, "add_effect", operation_data
         )
 
@@ -604,7 +609,7 @@ async def add_audio_fade(segment_id: str, request: AddAudioFadeRequest) -> AddAu
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddAudioFadeResponse, "segment", segment_id)
@@ -619,7 +624,7 @@ async def add_audio_fade(segment_id: str, request: AddAudioFadeRequest) -> AddAu
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(segment_id, "add_fade", operation_data)
+        success = await run_blocking(segment_manager.add_operation, segment_id, "add_fade", operation_data)
 
         if not success:
             logger.error("添加淡入淡出失败")
@@ -665,7 +670,7 @@ async def add_audio_keyframe(segment_id: str, request: AddAudioKeyframeRequest)
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddAudioKeyframeResponse, "segment", segment_id, keyframe_id="")
@@ -681,7 +686,8 @@ async def add_audio_keyframe(segment_id: str, request: AddAudioKeyframeRequest)
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(
+        success = await run_blocking(
+            segment_manager.add_operation,
             segment_id, "add_keyframe", operation_data
         )
 
@@ -743,7 +749,7 @@ async def add_video_animation(segment_id: str, request: AddVideoAnimationRequest
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddVideoAnimationResponse, "segment", segment_id, animation_id="")
@@ -759,7 +765,8 @@ async def add_video_animation(segment_id: str, request: AddVideoAnimationRequest
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(
+        success = await run_blocking(
+            segment_manager.add_operation,
             segment_id, "add_animation", operation_data
         )
 
@@ -821,7 +828,7 @@ async def add_video_effect(segment_id: str, request: AddVideoEffectRequest) -> A
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddVideoEffectResponse, "segment", segment_id, effect_id="")
@@ -837,7 +844,8 @@ async def add_video_effect(segment_id: str, request: AddVideoEffectRequest) -> A
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(
+        success = await run_blocking(
+            segment_manager.add_operation,
             segment_id, "add_effect", operation_data
         )
 
@@ -891,7 +899,7 @@ async def add_video_fade(segment_id: str, request: AddVideoFadeRequest) -> AddVi
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddVideoFadeResponse, "segment", segment_id)
@@ -906,7 +914,7 @@ async def add_video_fade(segment_id: str, request: AddVideoFadeRequest) -> AddVi
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(segment_id, "add_fade", operation_data)
+        success = await run_blocking(segment_manager.add_operation, segment_id, "add_fade", operation_data)
 
         if not success:
             logger.error("添加淡入淡出失败")
@@ -952,7 +960,7 @@ async def add_video_filter(segment_id: str, request: AddVideoFilterRequest) -> A
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddVideoFilterResponse, "segment", segment_id)
@@ -968,7 +976,8 @@ async def add_video_filter(segment_id: str, request: AddVideoFilterRequest) -> A
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(
+        success = await run_blocking(
+            segment_manager.add_operation,
             segment_id, "add_filter", operation_data
         )
 
@@ -1037,7 +1046,7 @@ async def add_video_mask(segment_id: str, request: AddVideoMaskRequest) -> AddVi
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddVideoMaskResponse, "segment", segment_id)
@@ -1054,7 +1063,7 @@ async def add_video_mask(segment_id: str, request: AddVideoMaskRequest) -> AddVi
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(segment_id, "add_mask", operation_data)
+        success = await run_blocking(segment_manager.add_operation, segment_id, "add_mask", operation_data)
 
         if not success:
             logger.error("添加蒙版失败")
@@ -1114,7 +1123,7 @@ async def add_video_transition(segment_id: str, request: AddVideoTransitionReque
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddVideoTransitionResponse, "segment", segment_id)
@@ -1131,7 +1140,8 @@ async def add_video_transition(segment_id: str, request: AddVideoTransitionReque
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(
+        success = await run_blocking(
+            segment_manager.add_operation,
             segment_id, "add_transition", operation_data
         )
 
@@ -1196,7 +1206,7 @@ async def add_video_background_filling(
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddVideoBackgroundFillingResponse, "segment", segment_id)
@@ -1212,7 +1222,8 @@ async def add_video_background_filling(
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(
+        success = await run_blocking(
+            segment_manager.add_operation,
             segment_id, "add_background_filling", operation_data
         )
 
@@ -1265,7 +1276,7 @@ async def add_video_keyframe(segment_id: str, request: AddVideoKeyframeRequest)
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddVideoKeyframeResponse, "segment", segment_id)
@@ -1282,7 +1293,8 @@ async def add_video_keyframe(segment_id: str, request: AddVideoKeyframeRequest)
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(
+        success = await run_blocking(
+            segment_manager.add_operation,
             segment_id, "add_keyframe", operation_data
         )
 
@@ -1348,7 +1360,7 @@ async def add_sticker_keyframe(segment_id: str, request: AddStickerKeyframeReque
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddStickerKeyframeResponse, "segment", segment_id)
@@ -1365,7 +1377,8 @@ async def add_sticker_keyframe(segment_id: str, request: AddStickerKeyframeReque
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(
+        success = await run_blocking(
+            segment_manager.add_operation,
             segment_id, "add_keyframe", operation_data
         )
 
@@ -1428,7 +1441,7 @@ async def add_text_animation(segment_id: str, request: AddTextAnimationRequest)
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddTextAnimationResponse, "segment", segment_id)
@@ -1445,7 +1458,8 @@ async def add_text_animation(segment_id: str, request: AddTextAnimationRequest)
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(
+        success = await run_blocking(
+            segment_manager.add_operation,
             segment_id, "add_animation", operation_data
         )
 
@@ -1504,7 +1518,7 @@ async def add_text_bubble(segment_id: str, request: AddTextBubbleRequest) -> Add
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddTextBubbleResponse, "segment", segment_id)
@@ -1521,7 +1535,8 @@ async def add_text_bubble(segment_id: str, request: AddTextBubbleRequest) -> Add
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(
+        success = await run_blocking(
+            segment_manager.add_operation,
             segment_id, "add_bubble", operation_data
         )
 
@@ -1579,7 +1594,7 @@ async def add_text_effect(segment_id: str, request: AddTextEffectRequest) -> Add
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddTextEffectResponse, "segment", segment_id)
@@ -1596,7 +1611,8 @@ async def add_text_effect(segment_id: str, request: AddTextEffectRequest) -> Add
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(
+        success = await run_blocking(
+            segment_manager.add_operation,
             segment_id, "add_effect", operation_data
         )
 
@@ -1657,7 +1673,7 @@ async def add_text_keyframe(segment_id: str, request: AddTextKeyframeRequest) ->
 
     try:
         # 验证片段是否存在且类型正确
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
             return response_manager.not_found_response(AddTextKeyframeResponse, "segment", segment_id)
@@ -1674,7 +1690,8 @@ async def add_text_keyframe(segment_id: str, request: AddTextKeyframeRequest) ->
 
         # 记录操作
         operation_data = request.dict()
-        success = segment_manager.add_operation(
+        success = await run_blocking(
+            segment_manager.add_operation,
             segment_id, "add_keyframe", operation_data
         )
 
@@ -1716,16 +1733,18 @@ async def add_text_keyframe(segment_id: str, request: AddTextKeyframeRequest) ->
     summary="查询 Segment 详情",
     description="根据 segment_id 和 segment_type 查询片段的详细信息（总是返回 success=True）",
 )
-async def get_segment_detail(segment_type: str, segment_id: str):
+async def get_segment_detail(segment_type: str, segment_id: str, request: Request = None):
     """
     查询片段详情
 
-    返回片段的配置、状态、下载状态等信息
+    返回片段的配置、状态、下载状态等信息。通过 HTTP 查询时支持条件请求：
+    ETag 由片段修改时间、操作数量和下载状态生成，未变化时返回 304 或缓存的序列化响应。
+    缓存的响应会被之后的请求原样返回，因此不包含 timestamp（为 null）
     """
     logger.info(f"查询片段详情: {segment_type}/{segment_id}")
 
     try:
-        segment = segment_manager.get_segment(segment_id)
+        segment = await run_blocking(segment_manager.get_segment, segment_id)
 
         if not segment:
             logger.error(f"片段不存在: {segment_id}")
@@ -1741,6 +1760,17 @@ async def get_segment_detail(segment_type: str, segment_id: str):
                 details={"expected": segment_type, "actual": segment["segment_type"]},
             )
 
+        cache_key = ("segment_detail", segment_id)
+        last_modified = segment.get("last_modified")
+        etag = make_etag(
+            "segment_detail", segment_id, last_modified, len(segment.get("operations", [])),
+            segment.get("status"), segment.get("download_status"), segment.get("local_path")
+        )
+        if request is not None:
+            cached = response_cache.lookup(request, cache_key, etag, last_modified)
+            if cached is not None:
+                return cached
+
         # 构建响应
         config = segment.get("config", {})
         material_url = config.get("material_url")
@@ -1755,7 +1785,7 @@ async def get_segment_detail(segment_type: str, segment_id: str):
         }
 
         success_response = response_manager.success(message="查询成功")
-        return {
+        detail = {
             "segment_id": segment_id,
             "segment_type": segment["segment_type"],
             "material_url": material_url,
@@ -1764,6 +1794,11 @@ async def get_segment_detail(segment_type: str, segment_id: str):
             "properties": properties,
             **success_response,
         }
+        if request is None:
+            return detail
+        # 响应时间戳随请求变化，不能写入缓存的响应体
+        detail.pop("timestamp", None)
+        return response_cache.store(cache_key, etag, last_modified, SegmentDetailResponse(**detail))
 
     except Exception as e:
         logger.error(f"查询片段详情失败: {e}", exc_info=True)
@@ -2,16 +2,30 @@
 FastAPI 服务主入口
 独立于 GUI，专门用于运行 API 服务
 """
+import asyncio
+import time
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
 from datetime import datetime
 import argparse
 import os
+from typing import Optional
 
 from app.backend.api.router import api_router
+from app.backend.config import get_config
 from app.backend.utils.settings_manager import get_settings_manager
+from app.backend.utils.draft_state_manager import get_draft_state_manager
+from app.backend.utils.segment_manager import get_segment_manager
+from app.backend.utils.response_cache import get_response_cache
+from app.backend.utils.material_store import get_material_store
+from app.backend.utils.metrics import begin_request, end_request, get_metrics
+from app.backend.utils.idempotency import IdempotencyMiddleware
+from app.backend.utils.blocking_io import shutdown_executors
+from app.backend.utils.download_queue import shutdown_download_queue
+from app.backend.utils.state_sweeper import get_state_sweeper
+from app.backend.utils.logger import get_logger
 
 # 创建 FastAPI 应用
 app = FastAPI(
@@ -32,6 +46,57 @@ app.add_middleware(
 )
 
 
+class MetricsMiddleware:
+    """
+    请求指标中间件（纯 ASGI 实现，不缓冲 SSE 等流式响应）
+
+    按路由模板记录请求数、耗时、状态码和 ErrorCode，以及正在处理的请求数
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = get_metrics()
+        response_status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                response_status["code"] = message["status"]
+            await send(message)
+
+        state, token = begin_request()
+        metrics.http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.http_in_flight.dec()
+            end_request(token)
+            # 使用路由模板（如 /api/draft/{draft_id}/status）作为标签，避免标签基数随 ID 增长
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            code = response_status["code"]
+            error_code = state["error_code"] or ("SUCCESS" if code < 400 else f"HTTP_{code}")
+            metrics.observe_request(scope["method"], route, code, error_code, elapsed)
+
+
+# 幂等键：重试的创建/保存请求直接返回第一次的结果（在指标中间件内层，重放的请求同样计入指标）
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# 抓取 /metrics 时读取的缓存统计（管理器在第一次使用时才创建，这里不提前创建）
+get_metrics().register_cache("draft_config", lambda: get_draft_state_manager().get_cache_stats())
+get_metrics().register_cache("segment", lambda: get_segment_manager().get_cache_stats())
+get_metrics().register_cache("response", get_response_cache().stats)
+# 全局素材缓存（未启用时 get_material_store 返回 None，统计函数出错的缓存在抓取时跳过）
+get_metrics().register_cache("material_store", lambda: get_material_store().stats())
+
+
 # 全局异常处理
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -60,18 +125,112 @@ async def root():
     }
 
 
+# 服务指标
+@app.get("/metrics", tags=["监控"], response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus 文本格式的服务指标
+
+    多 worker 模式下每个进程各自统计，返回的是处理本次请求的进程的指标
+    """
+    return PlainTextResponse(
+        get_metrics().render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 # 注册 API 路由
 app.include_router(api_router)
 
 
+# 后台状态清理任务
+_sweeper_task = None
+
+
+async def _run_state_sweeper(interval: float):
+    """按固定间隔清理过期的草稿、片段和素材目录（多 worker 时只在持有清理锁的进程中执行）"""
+    sweeper = get_state_sweeper()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if sweeper.acquire_leader_lock():
+                await run_in_threadpool(sweeper.sweep)
+        except Exception as e:
+            get_logger(__name__).error(f"后台状态清理失败: {e}", exc_info=True)
+
+
+@app.on_event("startup")
+async def start_state_sweeper():
+    global _sweeper_task
+    interval = get_state_sweeper().interval
+    if interval > 0:
+        _sweeper_task = asyncio.create_task(_run_state_sweeper(interval))
+
+
+# 关闭服务时停止清理任务和后台下载，并写回缓存中的草稿配置
+@app.on_event("shutdown")
+async def flush_draft_state():
+    if _sweeper_task is not None:
+        _sweeper_task.cancel()
+    shutdown_executors()
+    shutdown_download_queue()
+    get_draft_state_manager().close()
+
+
 # 启动服务的函数
-def start_api_server(host: str = "127.0.0.1", port: int = 8000):
-    """启动 FastAPI 服务器"""
+def _optional_impl(module_name: str, fallback: str = "auto") -> str:
+    """已安装 uvloop / httptools 时使用，否则交给 uvicorn 自动选择"""
+    try:
+        __import__(module_name)
+        return module_name
+    except ImportError:
+        return fallback
+
+
+def start_api_server(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    workers: Optional[int] = None,
+    production: bool = False
+):
+    """
+    启动 FastAPI 服务器
+    
+    Args:
+        host: 监听地址
+        port: 监听端口
+        workers: worker 进程数，None 时使用配置 JIANYING_API_WORKERS（默认 1）
+        production: 生产模式，不启用自动重载；workers 大于 1 时总是使用生产模式
+    """
+    # 仅在启动服务器时导入 uvicorn（GUI 和测试导入 app 时不需要）
+    import uvicorn
+
+    workers = get_config().api_workers if workers is None else max(1, workers)
+    
+    if workers == 1 and not production:
+        uvicorn.run(
+            "app.backend.api_main:app",
+            host=host,
+            port=port,
+            reload=True,  # 开发模式下自动重载
+            log_level="info"
+        )
+        return
+    
+    # worker 进程重新导入应用并读取环境变量：草稿配置必须立即写入共享存储
+    os.environ["JIANYING_API_WORKERS"] = str(workers)
+    if workers > 1 and os.environ.get("JIANYING_DRAFT_FLUSH_MODE", "").lower() == "write_behind":
+        print("提示: 多 worker 模式下不支持 write_behind，改用 immediate")
+        os.environ["JIANYING_DRAFT_FLUSH_MODE"] = "immediate"
+    
     uvicorn.run(
         "app.backend.api_main:app",
         host=host,
         port=port,
-        reload=True,  # 开发模式下自动重载
+        workers=workers,
+        reload=False,
+        loop=_optional_impl("uvloop"),
+        http=_optional_impl("httptools"),
         log_level="info"
     )
 
@@ -86,6 +245,8 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, help="[必须] API 服务监听端口 (例如: 8000)")
     parser.add_argument("--host", type=str, default="127.0.0.1", help="API 服务监听地址 (默认: 127.0.0.1)")
     parser.add_argument("--draft-dir", type=str, help="[必须] 剪映草稿保存路径 (例如: .../JianYingPro/User Data/Projects/com.lveditor.draft)")
+    parser.add_argument("--workers", type=int, default=None, help="worker 进程数 (默认: 1，大于 1 时自动使用生产模式)")
+    parser.add_argument("--production", action="store_true", help="生产模式: 不自动重载，使用 uvloop/httptools (已安装时)")
     
     args = parser.parse_args()
 
@@ -123,4 +284,8 @@ if __name__ == "__main__":
         exit(1)
 
     print(f"启动服务: http://{args.host}:{args.port}")
-    start_api_server(host=args.host, port=args.port)
+    if args.workers is not None and args.workers < 1:
+        print(f"错误: worker 进程数 {args.workers} 无效。")
+        exit(1)
+
+    start_api_server(host=args.host, port=args.port, workers=args.workers, production=args.production)
@@ -9,10 +9,19 @@
 """
 import os
 import tempfile
+import threading
 from pathlib import Path
 from typing import Optional
 
 
+# 访问时需要先创建数据目录的路径属性
+_PATH_ATTRIBUTES = frozenset({
+    "data_root", "cache_dir", "drafts_dir", "assets_dir", "log_dir", "state_db_path",
+    "segments_dir", "materials_cache_dir", "output_dir", "material_store_dir",
+})
+_directories_lock = threading.RLock()
+
+
 class AppConfig:
     """应用配置类 - 仅支持 Windows"""
     
@@ -22,35 +31,115 @@ class AppConfig:
     
     def _load_config(self):
         """加载配置"""
-        # 数据存储根目录
-        self.data_root = self._get_data_root()
-        
-        # cache 目录 - 替代 C:\tmp\jianying_assistant
-        self.cache_dir = self._get_path_from_env(
-            "JIANYING_CACHE_DIR",
-            os.path.join(self.data_root, "cache")
-        )
-        
-        # drafts 目录 - 替代 Temp\jianying_draft_*
-        self.drafts_dir = self._get_path_from_env(
-            "JIANYING_DRAFTS_DIR",
-            os.path.join(self.data_root, "drafts")
-        )
-        
-        # assets 目录 - 替代 Temp\jianying_assets_*
-        self.assets_dir = self._get_path_from_env(
-            "JIANYING_ASSETS_DIR",
-            os.path.join(self.data_root, "assets")
+        # 数据目录在第一次访问路径属性时才创建（见 __getattr__），启动时不访问磁盘
+        data_root = self._get_data_root()
+        cache_dir = self._get_path_from_env("JIANYING_CACHE_DIR", os.path.join(data_root, "cache"))
+        self._pending_paths = {
+            # 数据存储根目录
+            "data_root": data_root,
+            # cache 目录 - 替代 C:\tmp\jianying_assistant
+            "cache_dir": cache_dir,
+            # drafts 目录 - 替代 Temp\jianying_draft_*
+            "drafts_dir": self._get_path_from_env("JIANYING_DRAFTS_DIR", os.path.join(data_root, "drafts")),
+            # assets 目录 - 替代 Temp\jianying_assets_*
+            "assets_dir": self._get_path_from_env("JIANYING_ASSETS_DIR", os.path.join(data_root, "assets")),
+            "log_dir": os.path.join(data_root, "logs"),
+            # 状态存储后端为 sqlite 时的数据库路径
+            "state_db_path": self._get_path_from_env("JIANYING_STATE_DB", os.path.join(cache_dir, "state.db")),
+            # 全局素材缓存（所有草稿共用，按内容去重）
+            "material_store_dir": self._get_path_from_env(
+                "JIANYING_MATERIAL_STORE_DIR", os.path.join(cache_dir, "materials")
+            ),
+        }
+
+        # 状态存储后端 - file（每个对象一个 JSON 文件）或 sqlite
+        self.state_backend = os.getenv("JIANYING_STATE_BACKEND", "file").strip().lower()
+        # 持久化方式 - fast（交给操作系统缓冲）或 fsync（每次写入后强制落盘）
+        self.state_durability = os.getenv("JIANYING_STATE_DURABILITY", "fast").strip().lower()
+        # 状态文件序列化 - 格式 json / orjson / msgpack，压缩 none / gzip / zstd
+        self.state_format = os.getenv("JIANYING_STATE_FORMAT", "json").strip().lower()
+        self.state_compression = os.getenv("JIANYING_STATE_COMPRESSION", "none").strip().lower()
+        # 片段操作日志（file 后端）累计多少条后压缩为快照
+        self.segment_journal_compact_threshold = int(
+            os.getenv("JIANYING_SEGMENT_JOURNAL_COMPACT", "200")
         )
-        
-        # 保持旧的属性名以兼容现有代码
-        self.segments_dir = self.cache_dir  # segments 使用 cache
-        self.materials_cache_dir = self.assets_dir  # materials 使用 assets
-        self.output_dir = self.drafts_dir  # output 使用 drafts
-        self.log_dir = os.path.join(self.data_root, "logs")
-        
-        # 确保所有目录存在
-        self._ensure_directories()
+
+        # 草稿配置缓存与写回策略
+        # immediate: 每次更新立即写入存储; write_behind: 合并写入，按时间间隔或脏数据数量刷新
+        self.draft_flush_mode = os.getenv("JIANYING_DRAFT_FLUSH_MODE", "immediate").strip().lower()
+        self.draft_flush_interval = float(os.getenv("JIANYING_DRAFT_FLUSH_INTERVAL", "2.0"))
+        self.draft_flush_max_dirty = int(os.getenv("JIANYING_DRAFT_FLUSH_MAX_DIRTY", "50"))
+        self.draft_cache_size = int(os.getenv("JIANYING_DRAFT_CACHE_SIZE", "256"))
+
+        # 片段缓存 - 最大条目数和存活时间（秒，0 表示不过期），淘汰后从存储后端重新加载
+        self.segment_cache_size = int(os.getenv("JIANYING_SEGMENT_CACHE_SIZE", "2048"))
+        self.segment_cache_ttl = float(os.getenv("JIANYING_SEGMENT_CACHE_TTL", "1800"))
+
+        # 查询端点（草稿状态 / 片段详情）序列化响应缓存的最大条目数
+        self.response_cache_size = int(os.getenv("JIANYING_RESPONSE_CACHE_SIZE", "1024"))
+
+        # 状态清理（秒，0 表示不清理对应类型；gc_interval 为 0 时不启动后台清理任务）
+        self.gc_interval = float(os.getenv("JIANYING_GC_INTERVAL", "3600"))
+        self.gc_draft_ttl = float(os.getenv("JIANYING_GC_DRAFT_TTL", str(7 * 24 * 3600)))
+        self.gc_segment_ttl = float(os.getenv("JIANYING_GC_SEGMENT_TTL", str(24 * 3600)))
+        self.gc_assets_ttl = float(os.getenv("JIANYING_GC_ASSETS_TTL", str(7 * 24 * 3600)))
+        self.gc_assets_quota_mb = float(os.getenv("JIANYING_GC_ASSETS_QUOTA_MB", "0"))
+
+        # 阻塞操作线程池（文件读写 / 素材下载）大小，以及同时执行的草稿保存数量
+        self.io_thread_pool_size = int(os.getenv("JIANYING_IO_THREADS", str(min(32, (os.cpu_count() or 1) + 4))))
+        self.save_concurrency = int(os.getenv("JIANYING_SAVE_CONCURRENCY", "2"))
+        # 生成草稿前并发预取素材的最大下载数（1 表示逐个下载）
+        self.material_prefetch_concurrency = max(1, int(os.getenv("JIANYING_MATERIAL_PREFETCH_CONCURRENCY", "4")))
+        # 创建片段后在后台下载素材的并发数（0 表示不在后台下载，保存草稿时再下载）
+        self.background_download_workers = max(0, int(os.getenv("JIANYING_BACKGROUND_DOWNLOAD_WORKERS", "4")))
+
+        # 素材下载共用的 HTTP 连接池 - 每个主机的连接数、指定主机的连接数（host=size,host=size）
+        # 以及 HTTP/2（auto: 安装了 h2 时启用 / on / off）
+        self.http_pool_size = max(1, int(os.getenv("JIANYING_HTTP_POOL_SIZE", "16")))
+        self.http_host_pool_sizes = os.getenv("JIANYING_HTTP_HOST_POOL_SIZES", "")
+        self.http2 = os.getenv("JIANYING_HTTP2", "auto").strip().lower()
+        # 分段并发下载：不小于该大小（MB）且支持 Range 的素材分成多段同时下载；0 表示不启用
+        self.segmented_download_mb = float(os.getenv("JIANYING_SEGMENTED_DOWNLOAD_MB", "0"))
+        self.segmented_download_parts = max(1, int(os.getenv("JIANYING_SEGMENTED_DOWNLOAD_PARTS", "4")))
+        # 全局素材缓存的大小上限（MB），超出时淘汰最久未使用的素材；0 表示不使用全局缓存
+        self.material_store_max_mb = float(os.getenv("JIANYING_MATERIAL_STORE_MB", "2048"))
+        # 异步保存任务结束后保留结果的时间（秒）
+        self.save_job_retention = float(os.getenv("JIANYING_SAVE_JOB_RETENTION", "3600"))
+        # 未结束的保存任务超过该时间（秒）视为已失效并清除（执行任务的进程卡住或在其他主机上退出）
+        self.save_job_stale_timeout = float(os.getenv("JIANYING_SAVE_JOB_STALE_TIMEOUT", str(6 * 3600)))
+
+        # 幂等键（Idempotency-Key）对应的响应保留时间（秒）
+        self.idempotency_ttl = float(os.getenv("JIANYING_IDEMPOTENCY_TTL", str(24 * 3600)))
+
+        # API 服务 worker 进程数（大于 1 时各进程通过共享存储和锁保持状态一致）
+        self.api_workers = max(1, int(os.getenv("JIANYING_API_WORKERS", "1")))
+
+    def __getattr__(self, name: str):
+        """第一次访问目录路径属性时创建数据目录（创建失败时路径会切换到临时目录）"""
+        pending = self.__dict__.get("_pending_paths")
+        if pending is not None and name in _PATH_ATTRIBUTES:
+            self.ensure_directories()
+            return self.__dict__[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def ensure_directories(self):
+        """确定数据目录路径并确保目录存在（只执行一次）"""
+        with _directories_lock:
+            pending = self.__dict__.get("_pending_paths")
+            if pending is None:
+                return
+            # 已被显式赋值的路径保持不变
+            for name, path in pending.items():
+                self.__dict__.setdefault(name, path)
+
+            # 保持旧的属性名以兼容现有代码
+            self.__dict__.setdefault("segments_dir", self.cache_dir)  # segments 使用 cache
+            self.__dict__.setdefault("materials_cache_dir", self.assets_dir)  # materials 使用 assets
+            self.__dict__.setdefault("output_dir", self.drafts_dir)  # output 使用 drafts
+
+            # 确保所有目录存在
+            self._ensure_directories()
+            del self.__dict__["_pending_paths"]
     
     def _get_data_root(self) -> str:
         """
@@ -126,7 +215,9 @@ class AppConfig:
                 self.segments_dir = self.cache_dir
                 self.materials_cache_dir = self.assets_dir
                 self.output_dir = self.drafts_dir
-                
+                self.state_db_path = os.path.join(self.cache_dir, "state.db")
+                self.material_store_dir = os.path.join(self.cache_dir, "materials")
+
                 # 重新尝试创建目录
                 for temp_dir in [self.data_root, self.cache_dir, self.drafts_dir, 
                                  self.assets_dir, self.log_dir]:
@@ -147,6 +238,7 @@ class AppConfig:
             "drafts_dir": self.drafts_dir,
             "assets_dir": self.assets_dir,
             "log_dir": self.log_dir,
+            "state_backend": self.state_backend,
         }
 
 
@@ -1,4 +1,4 @@
 """
 数据库配置模块
-包含数据库连接、会话管理等配置
+包含数据库连接、会话管理等配置，以及草稿/片段状态的存储后端
 """
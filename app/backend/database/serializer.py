@@ -0,0 +1,208 @@
+"""
+状态序列化
+为状态存储提供可选的序列化格式和压缩方式
+
+格式:
+- json（默认）: 标准库 json，indent=2，与旧版本文件完全相同
+- orjson: 紧凑 JSON，安装了 orjson 时使用 orjson，否则退回标准库
+- msgpack: MessagePack 二进制格式（需要安装 msgpack）
+
+压缩:
+- none（默认） / gzip / zstd（需要安装 zstandard）
+
+除了未压缩的 json/orjson（写出的仍然是普通 JSON 文件）之外，写出的数据都以
+8 字节头开始: MAGIC(6) + 格式代码(1) + 压缩代码(1)。读取时根据文件头自动识别，
+没有文件头的数据按 JSON 解析，因此旧的格式化 JSON 文件可以继续读取。
+"""
+import gzip
+import json
+from typing import Any, Optional
+
+from app.backend.utils.logger import get_logger
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+MAGIC = b"C2JYST"
+HEADER_SIZE = len(MAGIC) + 2
+
+FORMAT_CODES = {"json": 1, "orjson": 2, "msgpack": 3}
+COMPRESSION_CODES = {"none": 0, "gzip": 1, "zstd": 2}
+_FORMAT_NAMES = {code: name for name, code in FORMAT_CODES.items()}
+_COMPRESSION_NAMES = {code: name for name, code in COMPRESSION_CODES.items()}
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def fast_json_dumps(obj: Any) -> str:
+    """紧凑 JSON 文本（优先使用 orjson）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def fast_json_loads(data: Any) -> Any:
+    """解析 JSON 文本或字节（优先使用 orjson）"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+
+class StateSerializer:
+    """
+    状态序列化器
+
+    使用示例:
+    ```python
+    serializer = StateSerializer("msgpack", "zstd")
+    data = serializer.dumps(config)
+    config = serializer.loads(data)   # 任何格式写出的数据都可以读取
+    ```
+    """
+
+    def __init__(self, fmt: str = "json", compression: str = "none", level: Optional[int] = None):
+        """
+        初始化序列化器
+
+        Args:
+            fmt: 序列化格式 (json / orjson / msgpack)
+            compression: 压缩方式 (none / gzip / zstd)
+            level: 压缩级别，None 时使用偏向速度的默认值
+        """
+        self.logger = get_logger(__name__)
+        fmt = (fmt or "json").lower()
+        compression = (compression or "none").lower()
+
+        if fmt not in FORMAT_CODES:
+            self.logger.warning(f"未知的序列化格式: {fmt}，使用 json")
+            fmt = "json"
+        if fmt == "msgpack" and not MSGPACK_AVAILABLE:
+            self.logger.warning("未安装 msgpack，序列化格式退回 orjson")
+            fmt = "orjson"
+
+        if compression not in COMPRESSION_CODES:
+            self.logger.warning(f"未知的压缩方式: {compression}，不压缩")
+            compression = "none"
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            self.logger.warning("未安装 zstandard，压缩方式退回 gzip")
+            compression = "gzip"
+
+        self.format = fmt
+        self.compression = compression
+        self.level = level
+
+    @property
+    def name(self) -> str:
+        return self.format if self.compression == "none" else f"{self.format}+{self.compression}"
+
+    # ---------- 编码 ----------
+
+    def _encode(self, obj: Any) -> bytes:
+        if self.format == "msgpack":
+            return msgpack.packb(obj, use_bin_type=True)
+        if self.format == "orjson":
+            return fast_json_dumps(obj).encode("utf-8")
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+    def _compress(self, payload: bytes) -> bytes:
+        if self.compression == "gzip":
+            return gzip.compress(payload, compresslevel=self.level or 6)
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=self.level or 3).compress(payload)
+        return payload
+
+    def dumps(self, obj: Any) -> bytes:
+        """序列化为字节"""
+        payload = self._compress(self._encode(obj))
+        if self.format != "msgpack" and self.compression == "none":
+            # 未压缩的 JSON 保持为普通 JSON 文件，方便人工查看
+            return payload
+        header = MAGIC + bytes((FORMAT_CODES[self.format], COMPRESSION_CODES[self.compression]))
+        return header + payload
+
+    # ---------- 解码 ----------
+
+    @staticmethod
+    def detect(data: bytes) -> str:
+        """识别数据的格式名称（如 json、orjson+gzip、msgpack+zstd）"""
+        if data[:len(MAGIC)] == MAGIC and len(data) >= HEADER_SIZE:
+            fmt = _FORMAT_NAMES.get(data[len(MAGIC)], "unknown")
+            compression = _COMPRESSION_NAMES.get(data[len(MAGIC) + 1], "unknown")
+            return fmt if compression == "none" else f"{fmt}+{compression}"
+        if data[:2] == _GZIP_MAGIC:
+            return "json+gzip"
+        if data[:4] == _ZSTD_MAGIC:
+            return "json+zstd"
+        return "json"
+
+    @staticmethod
+    def _decompress(payload: bytes, compression: str) -> bytes:
+        if compression == "gzip":
+            return gzip.decompress(payload)
+        if compression == "zstd":
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError("数据使用 zstd 压缩，但未安装 zstandard")
+            return zstandard.ZstdDecompressor().decompressobj().decompress(payload)
+        return payload
+
+    def loads(self, data: bytes) -> Any:
+        """反序列化，格式由数据自身的文件头决定，与当前配置无关"""
+        if data[:len(MAGIC)] == MAGIC and len(data) >= HEADER_SIZE:
+            fmt = _FORMAT_NAMES.get(data[len(MAGIC)])
+            compression = _COMPRESSION_NAMES.get(data[len(MAGIC) + 1])
+            if fmt is None or compression is None:
+                raise ValueError("无法识别的状态数据头")
+            payload = self._decompress(data[HEADER_SIZE:], compression)
+            if fmt == "msgpack":
+                if not MSGPACK_AVAILABLE:
+                    raise RuntimeError("数据使用 msgpack 格式，但未安装 msgpack")
+                return msgpack.unpackb(payload, raw=False)
+            return fast_json_loads(payload)
+
+        # 没有文件头: 普通 JSON（可能被外部工具整体压缩过）
+        if data[:2] == _GZIP_MAGIC:
+            data = gzip.decompress(data)
+        elif data[:4] == _ZSTD_MAGIC:
+            data = self._decompress(data, "zstd")
+        return fast_json_loads(data)
+
+
+# 全局序列化器实例
+_serializer: Optional[StateSerializer] = None
+
+
+def get_serializer() -> StateSerializer:
+    """
+    获取按配置创建的全局序列化器（单例模式）
+
+    Returns:
+        StateSerializer 实例
+    """
+    global _serializer
+
+    if _serializer is None:
+        from app.backend.config import get_config
+
+        config = get_config()
+        _serializer = StateSerializer(config.state_format, config.state_compression)
+
+    return _serializer
@@ -0,0 +1,393 @@
+"""
+SQLite 状态存储后端
+将草稿、轨道、片段和片段操作存储在单个 SQLite 数据库中
+
+- WAL 模式，读写互不阻塞
+- drafts / tracks / segments / operations 四张带索引的表
+- draft_segments 表维护草稿与片段的引用关系，作为二级索引
+- 每次写入都在事务中完成，片段操作追加为单行 INSERT
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from app.backend.database.serializer import fast_json_dumps, fast_json_loads
+from app.backend.database.state_index import draft_segment_ids
+from app.backend.database.state_store import StateStore
+from app.backend.utils.logger import get_logger
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS drafts (
+    draft_id TEXT PRIMARY KEY,
+    name TEXT,
+    status TEXT,
+    created_timestamp REAL,
+    last_modified REAL,
+    config TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_drafts_last_modified ON drafts(last_modified);
+
+CREATE TABLE IF NOT EXISTS tracks (
+    draft_id TEXT NOT NULL,
+    track_index INTEGER NOT NULL,
+    track_type TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (draft_id, track_index)
+);
+
+CREATE TABLE IF NOT EXISTS segments (
+    segment_id TEXT PRIMARY KEY,
+    segment_type TEXT,
+    status TEXT,
+    download_status TEXT,
+    local_path TEXT,
+    created_timestamp REAL,
+    last_modified REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_segments_type ON segments(segment_type);
+CREATE INDEX IF NOT EXISTS idx_segments_download_status ON segments(download_status);
+
+CREATE TABLE IF NOT EXISTS draft_segments (
+    draft_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    segment_id TEXT NOT NULL,
+    PRIMARY KEY (draft_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_draft_segments_segment ON draft_segments(segment_id);
+
+CREATE TABLE IF NOT EXISTS operations (
+    operation_id TEXT PRIMARY KEY,
+    segment_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    operation_type TEXT,
+    timestamp REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_operations_segment ON operations(segment_id, seq);
+"""
+
+
+def _dumps(data: Any) -> str:
+    return fast_json_dumps(data)
+
+
+class SQLiteStateStore(StateStore):
+    """基于 SQLite 的状态存储"""
+
+    backend_name = "sqlite"
+
+    def __init__(self, db_path: str, durability: str = "fast"):
+        """
+        初始化 SQLite 状态存储
+
+        Args:
+            db_path: 数据库文件路径
+            durability: fast（synchronous=NORMAL）或 fsync（synchronous=FULL）
+        """
+        self.logger = get_logger(__name__)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # 同一连接在多个线程间共享，由 _lock 串行化访问
+        self._lock = threading.RLock()
+        self._tx_depth = 0
+        self._conn = sqlite3.connect(
+            str(self.db_path), check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self.durability = durability
+        self._conn.execute(
+            "PRAGMA synchronous=FULL" if durability == "fsync" else "PRAGMA synchronous=NORMAL"
+        )
+        self._conn.execute("PRAGMA foreign_keys=OFF")
+        self._conn.executescript(SCHEMA)
+        self._rebuild_draft_segments_if_missing()
+
+        self.logger.info(f"SQLite 状态存储已初始化: {self.db_path}")
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """开启（可嵌套的）写事务，最外层退出时提交，异常时回滚"""
+        with self._lock:
+            if self._tx_depth == 0:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._tx_depth += 1
+            try:
+                yield
+            except BaseException:
+                self._tx_depth -= 1
+                if self._tx_depth == 0:
+                    self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._tx_depth -= 1
+                if self._tx_depth == 0:
+                    self._conn.execute("COMMIT")
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _rebuild_draft_segments_if_missing(self) -> None:
+        """旧版本数据库没有 draft_segments 数据时，从 tracks 表重建"""
+        with self._lock:
+            has_drafts = self._conn.execute("SELECT 1 FROM drafts LIMIT 1").fetchone()
+            has_refs = self._conn.execute("SELECT 1 FROM draft_segments LIMIT 1").fetchone()
+            if not has_drafts or has_refs:
+                return
+            draft_ids = [row[0] for row in self._conn.execute("SELECT draft_id FROM drafts")]
+            with self.transaction():
+                for draft_id in draft_ids:
+                    tracks = self._conn.execute(
+                        "SELECT data FROM tracks WHERE draft_id = ? ORDER BY track_index", (draft_id,)
+                    ).fetchall()
+                    self._replace_draft_segments(
+                        draft_id, {"tracks": [fast_json_loads(t[0]) for t in tracks]}
+                    )
+            self.logger.info(f"已重建 {len(draft_ids)} 个草稿的片段引用索引")
+
+    def _replace_draft_segments(self, draft_id: str, config: Dict[str, Any]) -> None:
+        self._conn.execute("DELETE FROM draft_segments WHERE draft_id = ?", (draft_id,))
+        self._conn.executemany(
+            "INSERT INTO draft_segments (draft_id, position, segment_id) VALUES (?, ?, ?)",
+            [(draft_id, pos, sid) for pos, sid in enumerate(draft_segment_ids(config))],
+        )
+
+    # ---------- 草稿 ----------
+
+    def load_draft(self, draft_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT config FROM drafts WHERE draft_id = ?", (draft_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            tracks = self._conn.execute(
+                "SELECT data FROM tracks WHERE draft_id = ? ORDER BY track_index", (draft_id,)
+            ).fetchall()
+
+        config = fast_json_loads(row[0])
+        config["tracks"] = [fast_json_loads(t[0]) for t in tracks]
+        return config
+
+    def save_draft(self, draft_id: str, config: Dict[str, Any]) -> None:
+        tracks = config.get("tracks", [])
+        body = {k: v for k, v in config.items() if k != "tracks"}
+        project = config.get("project", {})
+
+        with self.transaction():
+            self._conn.execute(
+                "INSERT INTO drafts (draft_id, name, status, created_timestamp, last_modified, config) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(draft_id) DO UPDATE SET name = excluded.name, status = excluded.status, "
+                "last_modified = excluded.last_modified, config = excluded.config",
+                (
+                    draft_id,
+                    project.get("name"),
+                    config.get("status"),
+                    config.get("created_timestamp"),
+                    config.get("last_modified"),
+                    _dumps(body),
+                ),
+            )
+            self._conn.execute("DELETE FROM tracks WHERE draft_id = ?", (draft_id,))
+            self._conn.executemany(
+                "INSERT INTO tracks (draft_id, track_index, track_type, data) VALUES (?, ?, ?, ?)",
+                [
+                    (draft_id, index, track.get("track_type", track.get("type")), _dumps(track))
+                    for index, track in enumerate(tracks)
+                ],
+            )
+            self._replace_draft_segments(draft_id, config)
+
+    def delete_draft(self, draft_id: str) -> bool:
+        with self.transaction():
+            cursor = self._conn.execute("DELETE FROM drafts WHERE draft_id = ?", (draft_id,))
+            self._conn.execute("DELETE FROM tracks WHERE draft_id = ?", (draft_id,))
+            self._conn.execute("DELETE FROM draft_segments WHERE draft_id = ?", (draft_id,))
+            return cursor.rowcount > 0
+
+    def draft_exists(self, draft_id: str) -> bool:
+        return bool(self._query("SELECT 1 FROM drafts WHERE draft_id = ?", (draft_id,)))
+
+    def draft_stamp(self, draft_id: str) -> Optional[Any]:
+        rows = self._query("SELECT last_modified FROM drafts WHERE draft_id = ?", (draft_id,))
+        return rows[0][0] if rows else None
+
+    def save_draft_if_version(
+        self, draft_id: str, config: Dict[str, Any], expected_version: int
+    ) -> bool:
+        # BEGIN IMMEDIATE 持有写锁，读取版本与写入之间不会有其他进程插入
+        with self.transaction():
+            row = self._conn.execute(
+                "SELECT COALESCE(json_extract(config, '$.version'), 0) FROM drafts WHERE draft_id = ?",
+                (draft_id,),
+            ).fetchone()
+            if row is None or row[0] != expected_version:
+                return False
+            self.save_draft(draft_id, config)
+            return True
+
+    def list_drafts(self) -> List[str]:
+        return [row[0] for row in self._query("SELECT draft_id FROM drafts")]
+
+    # ---------- 片段 ----------
+
+    def load_segment(self, segment_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM segments WHERE segment_id = ?", (segment_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            operations = self._conn.execute(
+                "SELECT data FROM operations WHERE segment_id = ? ORDER BY seq", (segment_id,)
+            ).fetchall()
+
+        segment = fast_json_loads(row[0])
+        segment["operations"] = [fast_json_loads(op[0]) for op in operations]
+        return segment
+
+    def _upsert_segment_row(self, segment_id: str, segment: Dict[str, Any]) -> None:
+        body = {k: v for k, v in segment.items() if k != "operations"}
+        self._conn.execute(
+            "INSERT INTO segments (segment_id, segment_type, status, download_status, local_path, "
+            "created_timestamp, last_modified, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(segment_id) DO UPDATE SET segment_type = excluded.segment_type, "
+            "status = excluded.status, download_status = excluded.download_status, "
+            "local_path = excluded.local_path, last_modified = excluded.last_modified, "
+            "data = excluded.data",
+            (
+                segment_id,
+                segment.get("segment_type"),
+                segment.get("status"),
+                segment.get("download_status"),
+                segment.get("local_path"),
+                segment.get("created_timestamp"),
+                segment.get("last_modified"),
+                _dumps(body),
+            ),
+        )
+
+    def _insert_operation(self, segment_id: str, seq: int, operation: Dict[str, Any]) -> None:
+        self._conn.execute(
+            "INSERT OR IGNORE INTO operations "
+            "(operation_id, segment_id, seq, operation_type, timestamp, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                operation.get("operation_id"),
+                segment_id,
+                seq,
+                operation.get("operation_type"),
+                operation.get("timestamp"),
+                _dumps(operation),
+            ),
+        )
+
+    def save_segment(self, segment_id: str, segment: Dict[str, Any]) -> None:
+        with self.transaction():
+            self._upsert_segment_row(segment_id, segment)
+            # 操作记录只追加不修改，已存在的行会被忽略
+            for seq, operation in enumerate(segment.get("operations", [])):
+                self._insert_operation(segment_id, seq, operation)
+
+    def append_operation(
+        self, segment_id: str, segment: Dict[str, Any], operation: Dict[str, Any]
+    ) -> None:
+        with self.transaction():
+            self._insert_operation(segment_id, len(segment.get("operations", [])) - 1, operation)
+            self._conn.execute(
+                "UPDATE segments SET last_modified = ?, "
+                "data = json_set(data, '$.last_modified', ?) WHERE segment_id = ?",
+                (segment.get("last_modified"), segment.get("last_modified"), segment_id),
+            )
+
+    def delete_segment(self, segment_id: str) -> bool:
+        with self.transaction():
+            cursor = self._conn.execute("DELETE FROM segments WHERE segment_id = ?", (segment_id,))
+            self._conn.execute("DELETE FROM operations WHERE segment_id = ?", (segment_id,))
+            return cursor.rowcount > 0
+
+    def list_segment_ids(self) -> List[str]:
+        return [row[0] for row in self._query("SELECT segment_id FROM segments")]
+
+    def segment_stamp(self, segment_id: str) -> Optional[Any]:
+        rows = self._query(
+            "SELECT last_modified, (SELECT COUNT(*) FROM operations WHERE segment_id = ?) "
+            "FROM segments WHERE segment_id = ?",
+            (segment_id, segment_id),
+        )
+        return tuple(rows[0]) if rows else None
+
+    # ---------- 二级索引查询 ----------
+
+    def segment_drafts(self, segment_id: str) -> List[str]:
+        return [
+            row[0] for row in self._query(
+                "SELECT DISTINCT draft_id FROM draft_segments WHERE segment_id = ?", (segment_id,)
+            )
+        ]
+
+    def draft_segments(self, draft_id: str, segment_type: Optional[str] = None) -> List[str]:
+        if segment_type is None:
+            rows = self._query(
+                "SELECT segment_id FROM draft_segments WHERE draft_id = ? ORDER BY position",
+                (draft_id,),
+            )
+        else:
+            rows = self._query(
+                "SELECT ds.segment_id FROM draft_segments ds "
+                "JOIN segments s ON s.segment_id = ds.segment_id "
+                "WHERE ds.draft_id = ? AND s.segment_type = ? ORDER BY ds.position",
+                (draft_id, segment_type),
+            )
+        return [row[0] for row in rows]
+
+    def segments_by_download_status(self, status: str) -> List[str]:
+        return [
+            row[0] for row in self._query(
+                "SELECT segment_id FROM segments WHERE download_status = ?", (status,)
+            )
+        ]
+
+    def drafts_by_last_modified(self, limit: Optional[int] = None, descending: bool = True) -> List[str]:
+        order = "DESC" if descending else "ASC"
+        rows = self._query(
+            f"SELECT draft_id FROM drafts ORDER BY last_modified {order} LIMIT ?",
+            (-1 if limit is None else limit,),
+        )
+        return [row[0] for row in rows]
+
+    def segment_summaries(self, segment_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        ids = list(segment_ids)
+        result = {}
+        # SQLite 默认最多 999 个绑定参数，分批查询
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._query(
+                "SELECT segment_id, segment_type, status, download_status, local_path, "
+                "created_timestamp, last_modified, json_extract(data, '$.config.material_url') "
+                f"FROM segments WHERE segment_id IN ({placeholders})",
+                tuple(chunk),
+            )
+            for row in rows:
+                result[row[0]] = {
+                    "segment_id": row[0],
+                    "segment_type": row[1],
+                    "status": row[2],
+                    "download_status": row[3],
+                    "local_path": row[4],
+                    "created_timestamp": row[5],
+                    "last_modified": row[6],
+                    "material_url": row[7],
+                }
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
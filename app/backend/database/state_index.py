@@ -0,0 +1,333 @@
+"""
+状态二级索引（file 后端）
+在内存中维护草稿和片段的二级索引，并持久化到 state.index（JSON 格式）
+
+- 片段 -> 引用它的草稿
+- 草稿 -> 片段（可按片段类型过滤）
+- 下载状态 -> 片段
+- 按 last_modified 排序的草稿
+- 片段摘要（类型、状态、素材 URL 等），查询状态时无需读取完整片段文件
+
+索引文件中记录了每个草稿/片段文件的 mtime。启动时用 os.scandir 对比 mtime，
+只重新读取发生变化的文件，因此即使进程崩溃导致索引文件过期也能快速修复。
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.backend.utils.logger import get_logger
+
+
+INDEX_FILE_NAME = "state.index"
+INDEX_FORMAT_VERSION = 1
+
+# 片段摘要中保存的字段
+SUMMARY_FIELDS = (
+    "segment_type", "status", "download_status", "local_path",
+    "created_timestamp", "last_modified",
+)
+
+
+def segment_summary(segment: Dict[str, Any]) -> Dict[str, Any]:
+    """从完整片段数据中提取索引摘要"""
+    summary = {field: segment.get(field) for field in SUMMARY_FIELDS}
+    summary["segment_id"] = segment.get("segment_id")
+    summary["material_url"] = (segment.get("config") or {}).get("material_url")
+    return summary
+
+
+def draft_segment_ids(config: Dict[str, Any]) -> List[str]:
+    """按轨道顺序列出草稿引用的片段 ID（去重）"""
+    seen: Dict[str, None] = {}
+    for track in config.get("tracks", []):
+        for segment_id in track.get("segments", []):
+            if isinstance(segment_id, str):
+                seen.setdefault(segment_id, None)
+    return list(seen)
+
+
+class StateIndex:
+    """
+    草稿与片段的二级索引
+
+    只在内存中查询；写入时增量更新，并按 persist_interval 节流地写回索引文件
+    """
+
+    def __init__(self, index_path: Path, persist_interval: float = 5.0):
+        """
+        初始化索引
+
+        Args:
+            index_path: 索引文件路径
+            persist_interval: 两次写回索引文件之间的最小间隔（秒）
+        """
+        self.logger = get_logger(__name__)
+        self.index_path = index_path
+        self.persist_interval = persist_interval
+        self._lock = threading.RLock()
+
+        # 持久化部分
+        self.drafts: Dict[str, Dict[str, Any]] = {}      # draft_id -> {"last_modified", "segments", "mtime"}
+        self.segments: Dict[str, Dict[str, Any]] = {}    # segment_id -> 摘要 + "mtime" + "journal"
+
+        # 派生部分（加载后重建）
+        self._segment_drafts: Dict[str, Set[str]] = {}
+        self._by_status: Dict[str, Set[str]] = {}
+        self._by_modified: List[Tuple[float, str]] = []
+
+        self._dirty = False
+        self._last_persist = 0.0
+
+    # ---------- 派生索引维护 ----------
+
+    def _link_draft(self, draft_id: str, entry: Dict[str, Any]) -> None:
+        for segment_id in entry["segments"]:
+            self._segment_drafts.setdefault(segment_id, set()).add(draft_id)
+        bisect.insort(self._by_modified, (entry.get("last_modified") or 0.0, draft_id))
+
+    def _unlink_draft(self, draft_id: str) -> None:
+        entry = self.drafts.pop(draft_id, None)
+        if entry is None:
+            return
+        for segment_id in entry["segments"]:
+            owners = self._segment_drafts.get(segment_id)
+            if owners is not None:
+                owners.discard(draft_id)
+                if not owners:
+                    del self._segment_drafts[segment_id]
+        key = (entry.get("last_modified") or 0.0, draft_id)
+        pos = bisect.bisect_left(self._by_modified, key)
+        if pos < len(self._by_modified) and self._by_modified[pos] == key:
+            del self._by_modified[pos]
+
+    def _link_segment(self, segment_id: str, summary: Dict[str, Any]) -> None:
+        status = summary.get("download_status") or "none"
+        self._by_status.setdefault(status, set()).add(segment_id)
+
+    def _unlink_segment(self, segment_id: str) -> None:
+        summary = self.segments.pop(segment_id, None)
+        if summary is None:
+            return
+        status = summary.get("download_status") or "none"
+        members = self._by_status.get(status)
+        if members is not None:
+            members.discard(segment_id)
+
+    # ---------- 增量更新 ----------
+
+    def put_draft(self, draft_id: str, config: Dict[str, Any], mtime: Optional[int] = None) -> None:
+        with self._lock:
+            self._unlink_draft(draft_id)
+            entry = {
+                "last_modified": config.get("last_modified"),
+                "segments": draft_segment_ids(config),
+                "mtime": mtime,
+            }
+            self.drafts[draft_id] = entry
+            self._link_draft(draft_id, entry)
+            self._mark_dirty()
+
+    def remove_draft(self, draft_id: str) -> None:
+        with self._lock:
+            self._unlink_draft(draft_id)
+            self._mark_dirty()
+
+    def put_segment(
+        self, segment_id: str, segment: Dict[str, Any], mtime: Optional[int] = None, journal: Any = None
+    ) -> None:
+        with self._lock:
+            self._unlink_segment(segment_id)
+            summary = segment_summary(segment)
+            summary["segment_id"] = segment_id
+            summary["mtime"] = mtime
+            summary["journal"] = journal
+            self.segments[segment_id] = summary
+            self._link_segment(segment_id, summary)
+            self._mark_dirty()
+
+    def touch_segment(self, segment_id: str, last_modified: Any, journal: Any = None) -> None:
+        with self._lock:
+            summary = self.segments.get(segment_id)
+            if summary is not None:
+                summary["last_modified"] = last_modified
+                summary["journal"] = journal
+                self._mark_dirty()
+
+    def remove_segment(self, segment_id: str) -> None:
+        with self._lock:
+            self._unlink_segment(segment_id)
+            self._mark_dirty()
+
+    # ---------- 查询 ----------
+
+    def list_drafts(self) -> List[str]:
+        with self._lock:
+            return list(self.drafts)
+
+    def has_draft(self, draft_id: str) -> bool:
+        with self._lock:
+            return draft_id in self.drafts
+
+    def list_segment_ids(self) -> List[str]:
+        with self._lock:
+            return list(self.segments)
+
+    def segment_drafts(self, segment_id: str) -> List[str]:
+        with self._lock:
+            return list(self._segment_drafts.get(segment_id, ()))
+
+    def draft_segments(self, draft_id: str, segment_type: Optional[str] = None) -> List[str]:
+        with self._lock:
+            entry = self.drafts.get(draft_id)
+            if entry is None:
+                return []
+            if segment_type is None:
+                return list(entry["segments"])
+            return [
+                segment_id for segment_id in entry["segments"]
+                if self.segments.get(segment_id, {}).get("segment_type") == segment_type
+            ]
+
+    def segments_by_download_status(self, status: str) -> List[str]:
+        with self._lock:
+            return list(self._by_status.get(status, ()))
+
+    def drafts_by_last_modified(self, limit: Optional[int] = None, descending: bool = True) -> List[str]:
+        with self._lock:
+            ordered = reversed(self._by_modified) if descending else iter(self._by_modified)
+            result = []
+            for _, draft_id in ordered:
+                if limit is not None and len(result) >= limit:
+                    break
+                result.append(draft_id)
+            return result
+
+    def segment_summaries(self, segment_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for segment_id in segment_ids:
+                summary = self.segments.get(segment_id)
+                if summary is not None:
+                    result[segment_id] = {k: v for k, v in summary.items() if k not in ("mtime", "journal")}
+            return result
+
+    # ---------- 加载 / 重建 / 持久化 ----------
+
+    def load(self) -> None:
+        """从索引文件加载（文件不存在或格式不符时从空索引开始）"""
+        with self._lock:
+            data = None
+            if self.index_path.exists():
+                try:
+                    with open(self.index_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except (OSError, ValueError) as e:
+                    self.logger.warning(f"索引文件损坏，将重建: {e}")
+            if not data or data.get("format") != INDEX_FORMAT_VERSION:
+                data = {"drafts": {}, "segments": {}}
+
+            self.drafts = {}
+            self.segments = {}
+            self._segment_drafts = {}
+            self._by_status = {}
+            self._by_modified = []
+            for draft_id, entry in data["drafts"].items():
+                self.drafts[draft_id] = entry
+                self._link_draft(draft_id, entry)
+            for segment_id, summary in data["segments"].items():
+                self.segments[segment_id] = summary
+                self._link_segment(segment_id, summary)
+
+    def refresh(
+        self,
+        draft_files: Dict[str, Tuple[Path, int]],
+        segment_files: Dict[str, Tuple[Path, int]],
+        read_draft: Callable[[str], Optional[Dict[str, Any]]],
+        read_segment: Callable[[str], Optional[Dict[str, Any]]],
+    ) -> int:
+        """
+        根据磁盘上的文件增量校正索引
+
+        Args:
+            draft_files: draft_id -> (文件路径, mtime_ns)
+            segment_files: segment_id -> (文件路径, mtime_ns)
+            read_draft / read_segment: 读取完整数据的函数（仅对变化的文件调用）
+
+        Returns:
+            重新读取或移除的条目数
+        """
+        with self._lock:
+            changed = self.refresh_drafts(draft_files, read_draft)
+
+            for segment_id in [s for s in self.segments if s not in segment_files]:
+                self._unlink_segment(segment_id)
+                changed += 1
+            for segment_id, (_, mtime) in segment_files.items():
+                summary = self.segments.get(segment_id)
+                if summary is not None and summary.get("mtime") == mtime:
+                    continue
+                segment = read_segment(segment_id)
+                if segment is None:
+                    self._unlink_segment(segment_id)
+                else:
+                    self.put_segment(segment_id, segment, mtime)
+                changed += 1
+
+            if changed:
+                self._mark_dirty()
+        return changed
+
+    def refresh_drafts(
+        self,
+        draft_files: Dict[str, Tuple[Path, int]],
+        read_draft: Callable[[str], Optional[Dict[str, Any]]],
+    ) -> int:
+        """只校正草稿条目（参数与返回值同 refresh）"""
+        changed = 0
+        with self._lock:
+            for draft_id in [d for d in self.drafts if d not in draft_files]:
+                self._unlink_draft(draft_id)
+                changed += 1
+            for draft_id, (_, mtime) in draft_files.items():
+                entry = self.drafts.get(draft_id)
+                if entry is not None and entry.get("mtime") == mtime:
+                    continue
+                config = read_draft(draft_id)
+                if config is None:
+                    self._unlink_draft(draft_id)
+                else:
+                    self.put_draft(draft_id, config, mtime)
+                changed += 1
+
+            if changed:
+                self._mark_dirty()
+        return changed
+
+    def _mark_dirty(self) -> None:
+        self._dirty = True
+        if time.monotonic() - self._last_persist >= self.persist_interval:
+            self.persist()
+
+    def persist(self) -> None:
+        """将索引写回文件（临时文件 + 原子替换）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "format": INDEX_FORMAT_VERSION,
+                "drafts": self.drafts,
+                "segments": self.segments,
+            }
+            temp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(temp_path, self.index_path)
+                self._dirty = False
+                self._last_persist = time.monotonic()
+            except OSError as e:
+                self.logger.warning(f"写入索引文件失败: {e}")
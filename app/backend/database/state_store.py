@@ -0,0 +1,783 @@
+"""
+状态存储后端
+为 DraftStateManager 和 SegmentManager 提供可插拔的持久化层
+
+- FileStateStore: 每个草稿一个 draft_config.json，每个片段一个 {segment_id}.json（默认，兼容旧数据），
+  片段操作先追加到 {segment_id}.ops.jsonl 日志，定期压缩回快照
+- SQLiteStateStore: 单个 SQLite 数据库（WAL 模式），见 sqlite_store.py
+"""
+import atexit
+import os
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.backend.config import get_config
+from app.backend.database.serializer import (
+    StateSerializer, fast_json_dumps, fast_json_loads, get_serializer
+)
+from app.backend.database.state_index import (
+    INDEX_FILE_NAME, StateIndex, draft_segment_ids, segment_summary
+)
+from app.backend.utils.logger import get_logger
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+@contextmanager
+def _locked_file(path: Path, create_parent: bool = True) -> Iterator[None]:
+    """
+    对锁文件加跨进程排他锁（Windows 使用 msvcrt，其他平台使用 fcntl）
+
+    create_parent=False 时不创建所在目录，目录不存在时抛出 FileNotFoundError
+    """
+    if create_parent:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a+b') as f:
+        if sys.platform == "win32":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class StateStore:
+    """
+    状态存储后端基类
+
+    约定:
+    1. 草稿配置和片段数据都是可 JSON 序列化的字典
+    2. load_* 返回新的字典对象，调用方可以自由修改
+    3. 所有方法都必须是线程安全的
+    """
+
+    backend_name = "base"
+
+    # ---------- 草稿 ----------
+
+    def load_draft(self, draft_id: str) -> Optional[Dict[str, Any]]:
+        """读取草稿配置，不存在时返回 None"""
+        raise NotImplementedError
+
+    def save_draft(self, draft_id: str, config: Dict[str, Any]) -> None:
+        """写入（创建或覆盖）草稿配置"""
+        raise NotImplementedError
+
+    def delete_draft(self, draft_id: str) -> bool:
+        """删除草稿，草稿不存在时返回 False"""
+        raise NotImplementedError
+
+    def draft_exists(self, draft_id: str) -> bool:
+        """草稿是否存在"""
+        return self.load_draft(draft_id) is not None
+
+    def draft_stamp(self, draft_id: str) -> Optional[Any]:
+        """
+        获取草稿的修改标记，用于判断缓存是否失效
+
+        Returns:
+            任意可比较的值（如文件 mtime），草稿不存在或后端不支持时返回 None
+        """
+        return None
+
+    def save_draft_if_version(
+        self, draft_id: str, config: Dict[str, Any], expected_version: int
+    ) -> bool:
+        """
+        比较并交换：仅当存储中的草稿版本等于 expected_version 时写入
+
+        Args:
+            draft_id: 草稿 UUID
+            config: 新的配置（应已包含递增后的 version）
+            expected_version: 调用方读取时看到的版本，旧数据没有 version 字段时视为 0
+
+        Returns:
+            是否写入成功，版本不一致（或草稿不存在）时返回 False
+        """
+        with self.transaction():
+            current = self.load_draft(draft_id)
+            if current is None or current.get("version", 0) != expected_version:
+                return False
+            self.save_draft(draft_id, config)
+            return True
+
+    def list_drafts(self) -> List[str]:
+        """列出所有草稿 ID"""
+        raise NotImplementedError
+
+    # ---------- 片段 ----------
+
+    def load_segment(self, segment_id: str) -> Optional[Dict[str, Any]]:
+        """读取片段数据（包含 operations），不存在时返回 None"""
+        raise NotImplementedError
+
+    def save_segment(self, segment_id: str, segment: Dict[str, Any]) -> None:
+        """写入（创建或覆盖）片段数据"""
+        raise NotImplementedError
+
+    def append_operation(
+        self, segment_id: str, segment: Dict[str, Any], operation: Dict[str, Any]
+    ) -> None:
+        """
+        追加一条片段操作记录
+
+        Args:
+            segment_id: 片段 UUID
+            segment: 已经追加了 operation 的完整片段数据
+            operation: 新追加的操作记录
+        """
+        self.save_segment(segment_id, segment)
+
+    def delete_segment(self, segment_id: str) -> bool:
+        """删除片段，片段不存在时返回 False"""
+        raise NotImplementedError
+
+    def list_segment_ids(self) -> List[str]:
+        """列出所有片段 ID"""
+        raise NotImplementedError
+
+    def segment_stamp(self, segment_id: str) -> Optional[Any]:
+        """
+        片段的修改标记，与缓存时记录的标记不同说明片段已被（其他进程）修改
+
+        Returns:
+            可比较的标记，片段不存在或后端不支持时返回 None
+        """
+        return None
+
+    @contextmanager
+    def segment_lock(self, segment_id: str) -> Iterator[None]:
+        """
+        读-改-写片段期间持有的跨进程锁
+
+        默认实现使用 transaction()；调用方在锁内重新读取片段再写入，
+        多个 worker 进程同时修改同一片段时不会丢失操作
+        """
+        with self.transaction():
+            yield
+
+    # ---------- 二级索引查询 ----------
+    # 默认实现逐个读取全部数据，仅保证正确性；具体后端应使用索引覆盖
+
+    def segment_drafts(self, segment_id: str) -> List[str]:
+        """列出引用了指定片段的草稿 ID"""
+        return [
+            draft_id for draft_id in self.list_drafts()
+            if segment_id in draft_segment_ids(self.load_draft(draft_id) or {})
+        ]
+
+    def draft_segments(self, draft_id: str, segment_type: Optional[str] = None) -> List[str]:
+        """按轨道顺序列出草稿引用的片段 ID，可按片段类型过滤"""
+        segment_ids = draft_segment_ids(self.load_draft(draft_id) or {})
+        if segment_type is None:
+            return segment_ids
+        summaries = self.segment_summaries(segment_ids)
+        return [
+            segment_id for segment_id in segment_ids
+            if summaries.get(segment_id, {}).get("segment_type") == segment_type
+        ]
+
+    def segments_by_download_status(self, status: str) -> List[str]:
+        """列出处于指定下载状态的片段 ID"""
+        summaries = self.segment_summaries(self.list_segment_ids())
+        return [sid for sid, summary in summaries.items() if summary.get("download_status") == status]
+
+    def drafts_by_last_modified(self, limit: Optional[int] = None, descending: bool = True) -> List[str]:
+        """按最后修改时间排序列出草稿 ID"""
+        stamped = [
+            ((self.load_draft(draft_id) or {}).get("last_modified") or 0.0, draft_id)
+            for draft_id in self.list_drafts()
+        ]
+        stamped.sort(reverse=descending)
+        ordered = [draft_id for _, draft_id in stamped]
+        return ordered if limit is None else ordered[:limit]
+
+    def segment_summaries(self, segment_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量获取片段摘要（不包含 config 和 operations）
+
+        Returns:
+            segment_id -> 摘要字典（segment_type, status, download_status, local_path,
+            material_url, created_timestamp, last_modified），不存在的片段不出现在结果中
+        """
+        result = {}
+        for segment_id in segment_ids:
+            segment = self.load_segment(segment_id)
+            if segment is not None:
+                result[segment_id] = segment_summary(segment)
+                result[segment_id]["segment_id"] = segment_id
+        return result
+
+    # ---------- 事务与生命周期 ----------
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        将多次写入合并为一个事务
+
+        默认实现不提供原子性，仅用于让调用方代码与后端无关
+        """
+        yield
+
+    def close(self) -> None:
+        """释放后端持有的资源"""
+
+
+class FileStateStore(StateStore):
+    """
+    基于文件系统的状态存储
+
+    目录布局（与旧版本保持一致）:
+    - {drafts_dir}/{draft_id}/draft_config.json
+    - {segments_dir}/{segment_id}.json
+    - {segments_dir}/{segment_id}.ops.jsonl  片段操作日志（只追加，每行一条操作）
+    - {segments_dir}/.locks/{segment_id}.lock  segment_lock 的跨进程锁文件
+
+    片段操作追加到日志而不是重写整个片段文件；日志条数达到 compact_threshold 时
+    压缩为新的快照。加载片段时读取快照并重放日志，忽略崩溃时写了一半的最后一行，
+    并按 operation_id 去重（快照已写入但日志尚未删除的情况）。
+
+    文件内容由 StateSerializer 编码（默认与旧版本相同的格式化 JSON），读取时自动识别格式，
+    文件名保持不变。
+
+    列表和二级索引查询由 StateIndex 提供（持久化在 {segments_dir}/state.index），
+    启动时按文件 mtime 增量校正；目录 mtime 变化（其他进程增删了文件）时，
+    或距上次校正超过 index_recheck_interval 秒时重新校正。其他进程在目录内改写文件、追加日志
+    不会改变目录 mtime，因此 segment_drafts / draft_segments / segment_summaries 查询前
+    逐个对比所涉及文件的 mtime（片段清理依赖这些查询，不能使用过期的索引）。
+    """
+
+    backend_name = "file"
+    # 即使目录 mtime 未变也重新校正索引的间隔（秒），弥补本进程写入时一并记下了其他进程写入的情况
+    index_recheck_interval = 5.0
+
+    def __init__(
+        self,
+        drafts_dir: str,
+        segments_dir: Optional[str] = None,
+        durability: str = "fast",
+        compact_threshold: int = 200,
+        serializer: Optional[StateSerializer] = None
+    ):
+        """
+        初始化文件状态存储
+
+        Args:
+            drafts_dir: 草稿配置存储目录
+            segments_dir: 片段数据存储目录，默认与 drafts_dir 相同
+            durability: fast（交给操作系统缓冲）或 fsync（每次写入后强制落盘）
+            compact_threshold: 片段操作日志压缩为快照前允许的最大条数
+            serializer: 状态文件序列化器，默认使用配置系统选择的格式
+        """
+        self.logger = get_logger(__name__)
+        self.durability = durability
+        self.compact_threshold = max(1, compact_threshold)
+        self.serializer = serializer or get_serializer()
+        self.drafts_dir = Path(drafts_dir)
+        self.segments_dir = Path(segments_dir) if segments_dir else self.drafts_dir
+        self.drafts_dir.mkdir(parents=True, exist_ok=True)
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        # segment_id -> [进程内的可重入锁, 持有和等待的线程数, 持有线程的嵌套深度]；无人使用时移除
+        self._segment_locks: Dict[str, List[Any]] = {}
+        self._segment_locks_guard = threading.Lock()
+        # segment_id -> 日志中的操作条数（本进程已检查过的日志）
+        self._journal_counts: Dict[str, int] = {}
+
+        # 二级索引：加载索引文件后按磁盘文件增量校正
+        self._index = StateIndex(self.segments_dir / INDEX_FILE_NAME)
+        self._index.load()
+        self._dir_stamp: Optional[Tuple[int, int]] = None
+        self._last_refresh = 0.0
+        self._refresh_index()
+        atexit.register(self._index.persist)
+
+    def _draft_path(self, draft_id: str) -> Path:
+        return self.drafts_dir / draft_id / "draft_config.json"
+
+    def _draft_lock_path(self, draft_id: str) -> Path:
+        return self.drafts_dir / draft_id / ".draft.lock"
+
+    def _segment_path(self, segment_id: str) -> Path:
+        return self.segments_dir / f"{segment_id}.json"
+
+    def _journal_path(self, segment_id: str) -> Path:
+        return self.segments_dir / f"{segment_id}.ops.jsonl"
+
+    def _segment_lock_path(self, segment_id: str) -> Path:
+        return self.segments_dir / ".locks" / f"{segment_id}.lock"
+
+    # ---------- 索引维护 ----------
+
+    def _current_dir_stamp(self) -> Tuple[int, int]:
+        return (os.stat(self.drafts_dir).st_mtime_ns, os.stat(self.segments_dir).st_mtime_ns)
+
+    @staticmethod
+    def _mtime(path: Path) -> Optional[int]:
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _journal_stamp(self, segment_id: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self._journal_path(segment_id).stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _scan_draft_files(self) -> Dict[str, Tuple[Path, int]]:
+        """用 os.scandir 列出草稿文件及其 mtime"""
+        draft_files: Dict[str, Tuple[Path, int]] = {}
+        with os.scandir(self.drafts_dir) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    path = Path(entry.path) / "draft_config.json"
+                    mtime = self._mtime(path)
+                    if mtime is not None:
+                        draft_files[entry.name] = (path, mtime)
+        return draft_files
+
+    def _scan_files(self) -> Tuple[Dict[str, Tuple[Path, int]], Dict[str, Tuple[Path, int]]]:
+        """用 os.scandir 列出草稿和片段文件及其 mtime"""
+        draft_files = self._scan_draft_files()
+
+        segment_files: Dict[str, Tuple[Path, int]] = {}
+        with os.scandir(self.segments_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json") and entry.is_file():
+                    segment_files[entry.name[:-len(".json")]] = (Path(entry.path), entry.stat().st_mtime_ns)
+        return draft_files, segment_files
+
+    def _refresh_index(self) -> None:
+        """按磁盘文件增量校正索引"""
+        with self._lock:
+            stamp = self._current_dir_stamp()
+            draft_files, segment_files = self._scan_files()
+            changed = self._index.refresh(
+                draft_files, segment_files, self.load_draft, self.load_segment
+            )
+            self._dir_stamp = stamp
+            self._last_refresh = time.monotonic()
+            if changed:
+                self.logger.info(f"状态索引已校正 {changed} 个条目")
+
+    def _ensure_index_fresh(self) -> None:
+        """目录 mtime 变化说明有其他进程增删了文件，此时（或定期）重新校正索引"""
+        if (
+            self._current_dir_stamp() != self._dir_stamp
+            or time.monotonic() - self._last_refresh >= self.index_recheck_interval
+        ):
+            self._refresh_index()
+
+    def _refresh_draft_entries(self) -> None:
+        """逐个对比草稿文件的 mtime，重新读取其他进程改写过的草稿（调用方持有 _lock）"""
+        changed = self._index.refresh_drafts(self._scan_draft_files(), self.load_draft)
+        if changed:
+            self.logger.debug(f"草稿索引已校正 {changed} 个条目")
+
+    def _refresh_segment_entry(self, segment_id: str) -> None:
+        """快照或操作日志被其他进程改写时重新读取该片段的索引条目（调用方持有 _lock）"""
+        summary = self._index.segments.get(segment_id)
+        mtime = self._mtime(self._segment_path(segment_id))
+        journal = self._journal_stamp(segment_id)
+        if summary is not None and summary.get("mtime") == mtime and summary.get("journal") == journal:
+            return
+        segment = self.load_segment(segment_id) if mtime is not None else None
+        if segment is None:
+            if summary is not None:
+                self._index.remove_segment(segment_id)
+            return
+        self._index.put_segment(segment_id, segment, mtime, journal)
+
+    def _after_write(self) -> None:
+        # 本进程的写入也会改变目录 mtime，记录下来避免误判为外部修改
+        self._dir_stamp = self._current_dir_stamp()
+
+    def _read_json(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        return self.serializer.loads(data)
+
+    def _write_json(self, path: Path, data: Dict[str, Any]) -> None:
+        # 先写临时文件再原子替换，避免进程崩溃时留下半个文件
+        temp_path = path.with_name(path.name + ".tmp")
+        payload = self.serializer.dumps(data)
+        with open(temp_path, 'wb') as f:
+            f.write(payload)
+            if self.durability == "fsync":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def load_draft(self, draft_id: str) -> Optional[Dict[str, Any]]:
+        return self._read_json(self._draft_path(draft_id))
+
+    def save_draft(self, draft_id: str, config: Dict[str, Any]) -> None:
+        path = self._draft_path(draft_id)
+        with self._lock:
+            self._ensure_index_fresh()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._write_json(path, config)
+            self._index.put_draft(draft_id, config, self._mtime(path))
+            self._after_write()
+
+    def delete_draft(self, draft_id: str) -> bool:
+        draft_folder = self.drafts_dir / draft_id
+        with self._lock:
+            self._ensure_index_fresh()
+            self._index.remove_draft(draft_id)
+            if not draft_folder.exists():
+                return False
+            # 先在草稿锁下删除配置文件，使其他 worker 进程正在进行的比较并交换失败，
+            # 释放锁后再删除目录（Windows 上不能删除仍被打开的锁文件）
+            try:
+                with _locked_file(self._draft_lock_path(draft_id), create_parent=False):
+                    self._draft_path(draft_id).unlink()
+            except FileNotFoundError:
+                pass
+            shutil.rmtree(draft_folder)
+            self._after_write()
+        return True
+
+    def draft_exists(self, draft_id: str) -> bool:
+        return self._draft_path(draft_id).exists()
+
+    def draft_stamp(self, draft_id: str) -> Optional[Any]:
+        try:
+            stat = self._draft_path(draft_id).stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def save_draft_if_version(
+        self, draft_id: str, config: Dict[str, Any], expected_version: int
+    ) -> bool:
+        # 进程内由 _lock 串行化，多个 worker 进程之间由草稿目录下的锁文件串行化；
+        # 草稿已删除时不能重新创建草稿目录
+        with self._lock:
+            try:
+                with _locked_file(self._draft_lock_path(draft_id), create_parent=False):
+                    current = self.load_draft(draft_id)
+                    if current is None or current.get("version", 0) != expected_version:
+                        return False
+                    self.save_draft(draft_id, config)
+                    return True
+            except FileNotFoundError:
+                return False
+
+    def list_drafts(self) -> List[str]:
+        with self._lock:
+            self._ensure_index_fresh()
+            return self._index.list_drafts()
+
+    def _read_journal(self, segment_id: str, repair: bool = False) -> List[Dict[str, Any]]:
+        """
+        读取片段操作日志，忽略不完整的尾行
+
+        不完整的尾行可能是崩溃时留下的，也可能是其他 worker 进程正在追加的记录，
+        因此只在持有 segment_lock 的写入路径（append_operation）中截断（repair=True）。
+
+        Returns:
+            日志记录列表，每条为 {"operation": ..., "last_modified": ...}
+        """
+        path = self._journal_path(segment_id)
+        if not path.exists():
+            self._journal_counts[segment_id] = 0
+            return []
+
+        records = []
+        valid_size = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    records.append(fast_json_loads(line))
+                except ValueError:
+                    break
+                valid_size += len(line)
+
+        if repair and valid_size < path.stat().st_size:
+            self.logger.warning(f"片段操作日志尾部不完整，已截断: {path}")
+            with open(path, 'r+b') as f:
+                f.truncate(valid_size)
+
+        self._journal_counts[segment_id] = len(records)
+        return records
+
+    @staticmethod
+    def _journal_ends_cleanly(path: Path) -> bool:
+        """日志不存在、为空或以换行结尾"""
+        try:
+            with open(path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return True
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) == b"\n"
+        except FileNotFoundError:
+            return True
+
+    def load_segment(self, segment_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            segment = self._read_json(self._segment_path(segment_id))
+            if segment is None:
+                return None
+
+            records = self._read_journal(segment_id)
+            if records:
+                operations = segment.setdefault("operations", [])
+                known_ids = {op.get("operation_id") for op in operations}
+                for record in records:
+                    operation = record["operation"]
+                    if operation.get("operation_id") not in known_ids:
+                        operations.append(operation)
+                        known_ids.add(operation.get("operation_id"))
+                    segment["last_modified"] = record.get("last_modified", segment.get("last_modified"))
+            return segment
+
+    def save_segment(self, segment_id: str, segment: Dict[str, Any]) -> None:
+        with self._lock:
+            self._ensure_index_fresh()
+            # 快照包含全部操作，写入成功后日志即可丢弃
+            path = self._segment_path(segment_id)
+            self._write_json(path, segment)
+            journal_path = self._journal_path(segment_id)
+            if journal_path.exists():
+                journal_path.unlink()
+            self._journal_counts[segment_id] = 0
+            self._index.put_segment(segment_id, segment, self._mtime(path))
+            self._after_write()
+
+    def append_operation(
+        self, segment_id: str, segment: Dict[str, Any], operation: Dict[str, Any]
+    ) -> None:
+        with self._lock:
+            journal_path = self._journal_path(segment_id)
+            if segment_id not in self._journal_counts or not self._journal_ends_cleanly(journal_path):
+                # 调用方持有 segment_lock，此时的不完整尾行只可能是崩溃留下的，截断后再追加
+                self._read_journal(segment_id, repair=True)
+
+            if self._journal_counts[segment_id] + 1 >= self.compact_threshold:
+                self.save_segment(segment_id, segment)
+                return
+
+            record = {"operation": operation, "last_modified": segment.get("last_modified")}
+            line = fast_json_dumps(record) + "\n"
+            with open(journal_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                if self.durability == "fsync":
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._journal_counts[segment_id] += 1
+            self._index.touch_segment(segment_id, segment.get("last_modified"), self._journal_stamp(segment_id))
+            self._after_write()
+
+    def compact_segment(self, segment_id: str) -> bool:
+        """
+        将片段操作日志合并进快照
+
+        Returns:
+            片段不存在时返回 False
+        """
+        with self._lock:
+            segment = self.load_segment(segment_id)
+            if segment is None:
+                return False
+            self.save_segment(segment_id, segment)
+            return True
+
+    def delete_segment(self, segment_id: str) -> bool:
+        path = self._segment_path(segment_id)
+        with self._lock:
+            self._ensure_index_fresh()
+            journal_path = self._journal_path(segment_id)
+            if journal_path.exists():
+                journal_path.unlink()
+            self._journal_counts.pop(segment_id, None)
+            self._index.remove_segment(segment_id)
+            try:
+                self._segment_lock_path(segment_id).unlink()
+            except OSError:
+                # 锁文件不存在，或（Windows 上）正被其他进程持有
+                pass
+            if not path.exists():
+                return False
+            path.unlink()
+            self._after_write()
+        return True
+
+    def list_segment_ids(self) -> List[str]:
+        with self._lock:
+            self._ensure_index_fresh()
+            return self._index.list_segment_ids()
+
+    def segment_stamp(self, segment_id: str) -> Optional[Any]:
+        # 快照被改写或日志被追加都会改变 mtime / 大小
+        try:
+            stat = self._segment_path(segment_id).stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, self._journal_stamp(segment_id))
+
+    @contextmanager
+    def segment_lock(self, segment_id: str) -> Iterator[None]:
+        # 每个片段一把锁：进程内由该片段的可重入锁串行化，多个 worker 进程之间由该片段的锁文件串行化。
+        # 等待锁时不持有 _lock，其他片段的写入和本进程的读取不受影响；
+        # flock 对同一进程重复加锁也会阻塞，因此嵌套调用时只在最外层加锁
+        with self._segment_locks_guard:
+            entry = self._segment_locks.setdefault(segment_id, [threading.RLock(), 0, 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                if entry[2] > 0:
+                    entry[2] += 1
+                    try:
+                        yield
+                    finally:
+                        entry[2] -= 1
+                    return
+                with _locked_file(self._segment_lock_path(segment_id)):
+                    entry[2] += 1
+                    try:
+                        yield
+                    finally:
+                        entry[2] -= 1
+        finally:
+            with self._segment_locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._segment_locks[segment_id]
+
+    # ---------- 二级索引查询 ----------
+
+    def segment_drafts(self, segment_id: str) -> List[str]:
+        with self._lock:
+            self._ensure_index_fresh()
+            # 任何草稿都可能引用该片段，对比全部草稿文件的 mtime
+            self._refresh_draft_entries()
+            return self._index.segment_drafts(segment_id)
+
+    def draft_segments(self, draft_id: str, segment_type: Optional[str] = None) -> List[str]:
+        with self._lock:
+            self._ensure_index_fresh()
+            # 草稿文件在目录内被其他进程改写不会改变目录 mtime，单独校验该草稿
+            entry = self._index.drafts.get(draft_id)
+            mtime = self._mtime(self._draft_path(draft_id))
+            if entry is not None and mtime is not None and entry.get("mtime") != mtime:
+                config = self.load_draft(draft_id)
+                if config is not None:
+                    self._index.put_draft(draft_id, config, mtime)
+            return self._index.draft_segments(draft_id, segment_type)
+
+    def segments_by_download_status(self, status: str) -> List[str]:
+        with self._lock:
+            self._ensure_index_fresh()
+            return self._index.segments_by_download_status(status)
+
+    def drafts_by_last_modified(self, limit: Optional[int] = None, descending: bool = True) -> List[str]:
+        with self._lock:
+            self._ensure_index_fresh()
+            return self._index.drafts_by_last_modified(limit, descending)
+
+    def segment_summaries(self, segment_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            self._ensure_index_fresh()
+            segment_ids = list(segment_ids)
+            for segment_id in segment_ids:
+                self._refresh_segment_entry(segment_id)
+            return self._index.segment_summaries(segment_ids)
+
+    def close(self) -> None:
+        self._index.persist()
+
+
+def create_state_store(backend: Optional[str] = None, base_dir: Optional[str] = None) -> StateStore:
+    """
+    创建状态存储后端
+
+    Args:
+        backend: 后端名称 (file / sqlite)，为 None 时使用配置系统的 state_backend
+        base_dir: 存储根目录，为 None 时使用配置系统的 cache 目录
+
+    Returns:
+        StateStore 实例
+    """
+    config = get_config()
+    backend = (backend or config.state_backend or "file").lower()
+
+    if backend == "sqlite":
+        from app.backend.database.sqlite_store import SQLiteStateStore
+
+        if base_dir is None:
+            db_path = config.state_db_path
+        else:
+            db_path = str(Path(base_dir) / "state.db")
+        return SQLiteStateStore(db_path, durability=config.state_durability)
+
+    if backend != "file":
+        get_logger(__name__).warning(f"未知的状态存储后端: {backend}，使用 file")
+
+    if base_dir is None:
+        return FileStateStore(
+            config.cache_dir,
+            config.segments_dir,
+            durability=config.state_durability,
+            compact_threshold=config.segment_journal_compact_threshold
+        )
+    return FileStateStore(
+        base_dir,
+        durability=config.state_durability,
+        compact_threshold=config.segment_journal_compact_threshold
+    )
+
+
+# 全局单例实例
+_state_store: Optional[StateStore] = None
+_state_store_lock = threading.Lock()
+
+
+def get_state_store() -> StateStore:
+    """
+    获取全局状态存储实例（单例模式）
+
+    Returns:
+        StateStore 实例
+    """
+    global _state_store
+
+    if _state_store is None:
+        with _state_store_lock:
+            if _state_store is None:
+                _state_store = create_state_store()
+
+    return _state_store
+
+
+def reset_state_store() -> None:
+    """关闭并重置全局状态存储（主要用于测试）"""
+    global _state_store
+
+    with _state_store_lock:
+        if _state_store is not None:
+            _state_store.close()
+        _state_store = None
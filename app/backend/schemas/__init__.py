@@ -19,6 +19,16 @@ __all__ = [
     "AddTrackRequest",
     "AddTrackResponse",
     "SaveDraftResponse",
+    "SaveJobProgress",
+    "BatchCommand",
+    "BatchDraftRequest",
+    "BatchDraftResponse",
+    "TimelineOperation",
+    "TimelineSegment",
+    "TimelineTrack",
+    "TimelineRequest",
+    "TimelineResponse",
+    "SaveJobResponse",
     "DraftStatusResponse",
     "SegmentDetailResponse",
     # Audio segment operation schemas
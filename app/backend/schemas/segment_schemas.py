@@ -923,6 +923,208 @@ class SaveDraftResponse(BaseModel):
         }
 
 
+class BatchCommand(BaseModel):
+    """批量请求中的一条命令"""
+
+    action: str = Field(
+        ..., description="命令类型: create_segment（创建片段）/ add_operation（片段操作）/ add_segment（添加到草稿）"
+    )
+    ref: Optional[str] = Field(
+        None, description="临时 ID，create_segment 时定义，同一批次后续命令通过 segment_ref 引用"
+    )
+    segment_type: Optional[str] = Field(
+        None, description="create_segment 的片段类型: audio/video/text/sticker/effect/filter"
+    )
+    segment_id: Optional[str] = Field(None, description="已存在的片段 UUID（与 segment_ref 二选一）")
+    segment_ref: Optional[str] = Field(None, description="本批次中创建的片段的临时 ID")
+    operation: Optional[str] = Field(
+        None, description="add_operation 的操作名，如 add_fade、add_keyframe、add_animation"
+    )
+    track_index: Optional[int] = Field(None, description="add_segment 的目标轨道索引，None 则自动选择")
+    params: Dict[str, Any] = Field(
+        default_factory=dict, description="命令参数，与对应单个端点的请求体相同"
+    )
+
+
+class BatchDraftRequest(BaseModel):
+    """批量操作请求"""
+
+    commands: List[BatchCommand] = Field(..., description="按顺序执行的命令列表")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "commands": [
+                    {
+                        "action": "create_segment",
+                        "ref": "caption_1",
+                        "segment_type": "text",
+                        "params": {
+                            "text_content": "第一句字幕",
+                            "target_timerange": {"start": 0, "duration": 2000000},
+                        },
+                    },
+                    {
+                        "action": "add_operation",
+                        "segment_ref": "caption_1",
+                        "operation": "add_animation",
+                        "params": {"animation_type": "TextAnimationType.TYPEWRITER", "duration": "1s"},
+                    },
+                    {"action": "add_segment", "segment_ref": "caption_1"},
+                ]
+            }
+        }
+
+
+class BatchDraftResponse(BaseModel):
+    """批量操作响应"""
+
+    success: bool = Field(..., description="是否成功")
+    ids: Dict[str, str] = Field(default_factory=dict, description="临时 ID -> 生成的片段 UUID")
+    results: List[Dict[str, Any]] = Field(default_factory=list, description="每条命令的执行结果")
+    version: int = Field(0, description="执行后的草稿配置版本号")
+    message: str = Field(..., description="响应消息")
+    # Optional fields from APIResponseManager
+    error_code: Optional[str] = Field(None, description="错误代码")
+    category: Optional[str] = Field(None, description="错误类别")
+    level: Optional[str] = Field(None, description="响应级别")
+    details: Optional[Dict[str, Any]] = Field(None, description="详细信息")
+    timestamp: Optional[str] = Field(None, description="时间戳")
+
+
+class TimelineOperation(BaseModel):
+    """时间线中片段的一条操作"""
+
+    operation: str = Field(..., description="操作名，如 add_fade、add_keyframe、add_animation")
+    params: Dict[str, Any] = Field(
+        default_factory=dict, description="操作参数，与对应单个端点的请求体相同"
+    )
+
+
+class TimelineSegment(BaseModel):
+    """时间线中的一个片段，片段类型与所在轨道类型相同"""
+
+    key: Optional[str] = Field(
+        None, description="片段的稳定标识，重复提交时用于匹配已有片段；不提供时按内容匹配"
+    )
+    params: Dict[str, Any] = Field(
+        ..., description="创建参数，与 /api/segment/{segment_type}/create 的请求体相同"
+    )
+    operations: List[TimelineOperation] = Field(
+        default_factory=list, description="按顺序应用的片段操作"
+    )
+
+
+class TimelineTrack(BaseModel):
+    """时间线中的一条轨道"""
+
+    track_type: str = Field(..., description="轨道类型: audio/video/text/sticker")
+    track_name: Optional[str] = Field(None, description="轨道名称，默认 {track_type}_{track_index}")
+    segments: List[TimelineSegment] = Field(default_factory=list, description="轨道上的片段")
+
+
+class TimelineRequest(BaseModel):
+    """整条时间线的声明式提交请求"""
+
+    tracks: List[TimelineTrack] = Field(..., description="完整的轨道列表，按轨道索引顺序")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "tracks": [
+                    {
+                        "track_type": "text",
+                        "segments": [
+                            {
+                                "key": "caption_1",
+                                "params": {
+                                    "text_content": "第一句字幕",
+                                    "target_timerange": {"start": 0, "duration": 2000000},
+                                },
+                                "operations": [
+                                    {
+                                        "operation": "add_animation",
+                                        "params": {"animation_type": "TextAnimationType.TYPEWRITER", "duration": "1s"},
+                                    }
+                                ],
+                            }
+                        ],
+                    }
+                ]
+            }
+        }
+
+
+class TimelineResponse(BaseModel):
+    """整条时间线的声明式提交响应"""
+
+    success: bool = Field(..., description="是否成功")
+    ids: Dict[str, str] = Field(default_factory=dict, description="片段 key -> 片段 UUID")
+    tracks: List[List[str]] = Field(default_factory=list, description="每条轨道上的片段 UUID")
+    created: int = Field(0, description="新创建的片段数")
+    reused: int = Field(0, description="沿用的已有片段数")
+    removed: int = Field(0, description="从草稿中移除的片段数")
+    changed: bool = Field(False, description="草稿配置是否有变化")
+    version: int = Field(0, description="提交后的草稿配置版本号")
+    message: str = Field(..., description="响应消息")
+    # Optional fields from APIResponseManager
+    error_code: Optional[str] = Field(None, description="错误代码")
+    category: Optional[str] = Field(None, description="错误类别")
+    level: Optional[str] = Field(None, description="响应级别")
+    details: Optional[Dict[str, Any]] = Field(None, description="详细信息")
+    timestamp: Optional[str] = Field(None, description="时间戳")
+
+
+class SaveJobProgress(BaseModel):
+    """保存任务进度"""
+
+    stage: str = Field("queued", description="阶段: queued/preparing/building/written/done/failed")
+    total_segments: int = Field(0, description="片段总数")
+    segments_built: int = Field(0, description="已构建的片段数")
+    materials_downloaded: int = Field(0, description="已下载（或复用）的素材数")
+    bytes_downloaded: int = Field(0, description="已下载的字节数")
+    bytes_written: int = Field(0, description="写出的草稿文件字节数")
+
+
+class SaveJobResponse(BaseModel):
+    """异步保存任务响应"""
+
+    success: bool = Field(..., description="是否成功")
+    job_id: str = Field("", description="保存任务 ID，错误时为空字符串")
+    draft_id: str = Field("", description="草稿 UUID")
+    status: str = Field("", description="任务状态: queued/running/completed/failed")
+    progress: SaveJobProgress = Field(default_factory=SaveJobProgress, description="任务进度")
+    draft_path: str = Field("", description="草稿文件夹路径，任务完成前为空字符串")
+    error: Optional[str] = Field(None, description="任务失败原因")
+    message: str = Field(..., description="响应消息")
+    # Optional fields from APIResponseManager
+    error_code: Optional[str] = Field(None, description="错误代码")
+    category: Optional[str] = Field(None, description="错误类别")
+    level: Optional[str] = Field(None, description="响应级别")
+    details: Optional[Dict[str, Any]] = Field(None, description="详细信息")
+    timestamp: Optional[str] = Field(None, description="时间戳")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "success": True,
+                "job_id": "123e4567-e89b-12d3-a456-426614174000",
+                "draft_id": "123e4567-e89b-12d3-a456-426614174001",
+                "status": "running",
+                "progress": {
+                    "stage": "building",
+                    "total_segments": 12,
+                    "segments_built": 5,
+                    "materials_downloaded": 4,
+                    "bytes_downloaded": 52428800,
+                    "bytes_written": 0,
+                },
+                "draft_path": "",
+                "message": "保存任务进行中",
+            }
+        }
+
+
 # ========== 查询模型 ==========
 
 
@@ -962,6 +1164,7 @@ class DraftStatusResponse(BaseModel):
     tracks: List[TrackInfo] = Field(..., description="轨道列表")
     segments: List[SegmentInfo] = Field(..., description="片段列表")
     download_status: DownloadStatusInfo = Field(..., description="下载状态")
+    version: int = Field(0, description="草稿配置版本号，每次更新递增")
 
 
 class SegmentDetailResponse(BaseModel):
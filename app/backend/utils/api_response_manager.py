@@ -18,6 +18,8 @@ from typing import Optional, Dict, Any, List, Type, TypeVar
 from datetime import datetime
 from pydantic import BaseModel, Field
 
+from app.backend.utils.metrics import record_error_code
+
 # Type variable for generic Response types
 ResponseType = TypeVar('ResponseType', bound=BaseModel)
 
@@ -58,6 +60,7 @@ class ErrorCode(str, Enum):
     DRAFT_UPDATE_FAILED = "DRAFT_UPDATE_FAILED"
     DRAFT_SAVE_FAILED = "DRAFT_SAVE_FAILED"
     DRAFT_INVALID_STATE = "DRAFT_INVALID_STATE"
+    SAVE_JOB_NOT_FOUND = "SAVE_JOB_NOT_FOUND"
     
     # 片段相关错误
     SEGMENT_NOT_FOUND = "SEGMENT_NOT_FOUND"
@@ -85,6 +88,7 @@ class ErrorCode(str, Enum):
     OPERATION_NOT_SUPPORTED = "OPERATION_NOT_SUPPORTED"
     OPERATION_ALREADY_EXISTS = "OPERATION_ALREADY_EXISTS"
     OPERATION_FAILED = "OPERATION_FAILED"
+    IDEMPOTENCY_CONFLICT = "IDEMPOTENCY_CONFLICT"
     
     # 系统错误
     INTERNAL_ERROR = "INTERNAL_ERROR"
@@ -182,6 +186,11 @@ class APIResponseManager:
                 "level": ResponseLevel.ERROR,
                 "template": "草稿状态无效: {state}"
             },
+            ErrorCode.SAVE_JOB_NOT_FOUND: {
+                "category": ErrorCategory.NOT_FOUND,
+                "level": ResponseLevel.ERROR,
+                "template": "保存任务不存在或已过期: {save_job_id}"
+            },
             
             # 片段错误
             ErrorCode.SEGMENT_NOT_FOUND: {
@@ -277,6 +286,11 @@ class APIResponseManager:
                 "level": ResponseLevel.ERROR,
                 "template": "操作失败: {reason}"
             },
+            ErrorCode.IDEMPOTENCY_CONFLICT: {
+                "category": ErrorCategory.RESOURCE_CONFLICT,
+                "level": ResponseLevel.ERROR,
+                "template": "幂等键冲突: {idempotency_key} - {reason}"
+            },
             
             # 系统错误
             ErrorCode.INTERNAL_ERROR: {
@@ -369,6 +383,9 @@ class APIResponseManager:
             error_info = self._error_messages[ErrorCode.INTERNAL_ERROR]
             error_code = ErrorCode.INTERNAL_ERROR
         
+        # 记录到当前请求的指标中（/metrics 按错误代码统计）
+        record_error_code(error_code)
+        
         # 生成错误消息
         if message is None:
             # 使用模板生成消息
@@ -465,6 +482,7 @@ class APIResponseManager:
             "segment": ErrorCode.SEGMENT_NOT_FOUND,
             "track": ErrorCode.TRACK_NOT_FOUND,
             "material": ErrorCode.MATERIAL_NOT_FOUND,
+            "save_job": ErrorCode.SAVE_JOB_NOT_FOUND,
         }
         
         error_code = error_code_map.get(
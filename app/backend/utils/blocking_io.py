@@ -0,0 +1,95 @@
+"""
+阻塞操作线程池
+路由处理函数都是 async def，而状态读写、素材下载、草稿生成都是同步操作。
+这些操作必须放到线程池中执行，否则一个慢请求会阻塞事件循环上的所有其它请求。
+
+- run_blocking: 普通的状态读写（io_thread_pool_size 个线程）
+- run_save: 草稿保存（save_concurrency 个线程），与普通读写分开，
+  多个大草稿同时保存时也不会占满普通读写的线程
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from app.backend.config import get_config
+
+T = TypeVar("T")
+
+_executor_lock = threading.Lock()
+_io_executor: Optional[ThreadPoolExecutor] = None
+_save_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """
+    获取普通读写线程池（单例模式）
+
+    Returns:
+        ThreadPoolExecutor 实例
+    """
+    global _io_executor
+
+    with _executor_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(
+                max_workers=max(1, get_config().io_thread_pool_size),
+                thread_name_prefix="jianying-io"
+            )
+        return _io_executor
+
+
+def get_save_executor() -> ThreadPoolExecutor:
+    """
+    获取草稿保存线程池（单例模式）
+
+    Returns:
+        ThreadPoolExecutor 实例
+    """
+    global _save_executor
+
+    with _executor_lock:
+        if _save_executor is None:
+            _save_executor = ThreadPoolExecutor(
+                max_workers=max(1, get_config().save_concurrency),
+                thread_name_prefix="jianying-save"
+            )
+        return _save_executor
+
+
+async def _run_in(executor: ThreadPoolExecutor, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    # 复制上下文变量，使线程中的调用与协程看到相同的上下文
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await loop.run_in_executor(executor, call)
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    在普通读写线程池中执行同步函数
+
+    使用示例:
+    ```python
+    segment = await run_blocking(segment_manager.get_segment, segment_id)
+    ```
+    """
+    return await _run_in(get_io_executor(), func, *args, **kwargs)
+
+
+async def run_save(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在草稿保存线程池中执行同步函数（下载素材、生成草稿文件）"""
+    return await _run_in(get_save_executor(), func, *args, **kwargs)
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    """关闭线程池（服务关闭时调用）"""
+    global _io_executor, _save_executor
+
+    with _executor_lock:
+        for executor in (_io_executor, _save_executor):
+            if executor is not None:
+                executor.shutdown(wait=wait)
+        _io_executor = None
+        _save_executor = None
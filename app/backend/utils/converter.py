@@ -2,15 +2,15 @@
 数据结构转换器
 将 Draft Generator Interface 的数据结构转换为 pyJianYingDraft 的数据结构
 """
-import pyJianYingDraft as draft
-from pyJianYingDraft import (
-    Timerange, ClipSettings, CropSettings, TextStyle,
-    VideoSegment, AudioSegment, TextSegment, IntroType, TransitionType, trange, tim
-)
+from __future__ import annotations
 
 from typing import Dict, Any, Optional
+from app.backend.utils.lazy import lazy_import
 from app.backend.utils.logger import get_logger
 
+# 第一次转换时才导入 pyJianYingDraft
+draft = lazy_import("pyJianYingDraft")
+
 
 class DraftInterfaceConverter:
     """Draft Generator Interface 到 pyJianYingDraft 的转换器"""
@@ -44,7 +44,7 @@ class DraftInterfaceConverter:
         self.logger.debug(f"颜色转换: {hex_color} -> {rgb_tuple}")
         return rgb_tuple
     
-    def convert_timerange(self, time_range_dict: Dict[str, int]) -> Timerange:
+    def convert_timerange(self, time_range_dict: Dict[str, int]) -> draft.Timerange:
         """
         转换时间范围格式
         Draft Generator Interface: {"start": ms, "end": ms}
@@ -61,9 +61,9 @@ class DraftInterfaceConverter:
         duration = end - start
         
         self.logger.info(f"转换时间范围: start={start}ms, end={end}ms -> duration={duration}ms")
-        return Timerange(start=start, duration=duration)
+        return draft.Timerange(start=start, duration=duration)
     
-    def convert_crop_settings(self, crop_dict: Dict[str, Any]) -> Optional[CropSettings]:
+    def convert_crop_settings(self, crop_dict: Dict[str, Any]) -> Optional[draft.CropSettings]:
         """
         转换裁剪设置
         Draft Generator Interface: {left, top, right, bottom}
@@ -86,7 +86,7 @@ class DraftInterfaceConverter:
         
         self.logger.debug(f"转换裁剪设置: L={left}, T={top}, R={right}, B={bottom}")
         
-        return CropSettings(
+        return draft.CropSettings(
             upper_left_x=left,
             upper_left_y=top,
             upper_right_x=right,
@@ -97,7 +97,7 @@ class DraftInterfaceConverter:
             lower_right_y=bottom
         )
     
-    def convert_clip_settings(self, transform_dict: Dict[str, Any]) -> ClipSettings:
+    def convert_clip_settings(self, transform_dict: Dict[str, Any]) -> draft.ClipSettings:
         """
         转换变换设置
         Draft Generator Interface: {position_x, position_y, scale_x, scale_y, rotation, opacity}
@@ -114,7 +114,7 @@ class DraftInterfaceConverter:
             value = transform_dict.get(key)
             return default if value is None else value
         
-        settings = ClipSettings(
+        settings = draft.ClipSettings(
             alpha=get_value_or_default("opacity", 1.0),
             rotation=get_value_or_default("rotation", 0.0),
             scale_x=get_value_or_default("scale_x", 1.0),
@@ -148,7 +148,7 @@ class DraftInterfaceConverter:
         self, 
         segment_config: Dict[str, Any],
         image_file_path: str
-    ) -> VideoSegment:
+    ) -> draft.VideoSegment:
         """
         转换图片段配置到 VideoSegment
         
@@ -173,13 +173,13 @@ class DraftInterfaceConverter:
         # 3. 创建 VideoSegment，直接传入素材路径和时间范围
         # 使用便捷构造，直接传入素材路径
         if clip_settings is not None:
-            image_segment = VideoSegment(
+            image_segment = draft.VideoSegment(
                 material=image_file_path,
                 target_timerange=target_timerange,
                 clip_settings=clip_settings
             )
         else:
-            image_segment = VideoSegment(
+            image_segment = draft.VideoSegment(
                 material=image_file_path,
                 target_timerange=target_timerange
             )
@@ -191,7 +191,7 @@ class DraftInterfaceConverter:
         self, 
         segment_config: Dict[str, Any],
         video_material: draft.VideoMaterial
-    ) -> VideoSegment:
+    ) -> draft.VideoSegment:
         """
         转换视频段配置到 VideoSegment
         
@@ -237,7 +237,7 @@ class DraftInterfaceConverter:
         if clip_settings is not None:
             kwargs["clip_settings"] = clip_settings
         
-        video_segment = VideoSegment(**kwargs)
+        video_segment = draft.VideoSegment(**kwargs)
         
         self.logger.info(f"视频段创建完成: {target_timerange.start}ms - {target_timerange.end}ms")
         return video_segment
@@ -246,7 +246,7 @@ class DraftInterfaceConverter:
         self,
         segment_config: Dict[str, Any],
         audio_material: draft.AudioMaterial
-    ) -> AudioSegment:
+    ) -> draft.AudioSegment:
         """
         转换音频段配置到 AudioSegment
         
@@ -290,7 +290,7 @@ class DraftInterfaceConverter:
         if speed is not None:
             kwargs["speed"] = speed
         
-        audio_segment = AudioSegment(**kwargs)
+        audio_segment = draft.AudioSegment(**kwargs)
         
         self.logger.info(f"音频段创建完成: {target_timerange.start}ms - {target_timerange.end}ms")
         return audio_segment
@@ -298,7 +298,7 @@ class DraftInterfaceConverter:
     def convert_text_segment_config(
         self,
         segment_config: Dict[str, Any]
-    ) -> TextSegment:
+    ) -> draft.TextSegment:
         """
         转换文本段配置到 TextSegment
         
@@ -326,7 +326,7 @@ class DraftInterfaceConverter:
             # 处理scale特殊情况（文本通常使用统一缩放）
             scale = get_value_or_default("scale", 1.0)
             
-            clip_settings = ClipSettings(
+            clip_settings = draft.ClipSettings(
                 alpha=get_value_or_default("opacity", 1.0),
                 rotation=get_value_or_default("rotation", 0.0),
                 scale_x=scale,
@@ -359,7 +359,7 @@ class DraftInterfaceConverter:
             else:
                 font_size = font_size_input
             
-            text_style = TextStyle(
+            text_style = draft.TextStyle(
                 size=font_size,
                 color=color_rgb  # 使用转换后的RGB元组
             )
@@ -375,7 +375,7 @@ class DraftInterfaceConverter:
         if clip_settings is not None:
             kwargs["clip_settings"] = clip_settings
         
-        text_segment = TextSegment(**kwargs)
+        text_segment = draft.TextSegment(**kwargs)
         
         # 先切片，再放入 f-string，避免解析问题
         text_preview = text_content[:20] if len(text_content) > 20 else text_content
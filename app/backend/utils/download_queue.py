@@ -0,0 +1,251 @@
+"""
+后台素材下载队列
+创建带 material_url 的片段后立即在后台下载素材，不再等到保存草稿时才下载
+（火山引擎 TTS 等签名 URL 可能在保存前过期，下载耗时也不再集中在保存请求上）。
+
+下载过程中更新片段的 download_status（pending -> downloading -> completed / failed）和 local_path，
+GET /api/segment/{type}/{id} 和草稿状态中可以看到实际进度。同一 URL 只下载一次（多个片段共用）。
+
+启用全局素材缓存时，下载的素材只保存在缓存中（不在其他目录保留硬链接，缓存按大小淘汰时能释放空间），
+保存草稿时 DraftSaver 等待仍在下载的素材，把缓存文件硬链接（无法硬链接时复制）到草稿的素材目录。
+未启用缓存时素材下载到 {assets_dir}/prefetched。同一 URL 的片段共用一个文件：片段保存到草稿后
+local_path 改为草稿素材目录中的文件，没有片段再引用该文件时删除（SegmentManager.release_prefetched）；
+进程崩溃等原因留下的无引用文件由状态清理任务删除。
+"""
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from app.backend.config import get_config
+from app.backend.utils.logger import get_logger
+from app.backend.utils.lru_cache import LRUCache
+from app.backend.utils.material_store import get_material_store
+
+# 片段下载状态回调 (download_status, local_path)
+StatusCallback = Callable[[str, Optional[str]], Any]
+
+# 记录已下载路径的 URL 数上限（超出时遗忘最久未使用的，之后再次使用时重新查找或下载）
+MAX_RESULTS = 4096
+
+# 未启用全局素材缓存时的下载目录（{assets_dir} 下）
+PREFETCHED_DIR_NAME = "prefetched"
+
+
+class MaterialDownloadQueue:
+    """
+    后台素材下载队列
+
+    使用示例:
+    ```python
+    queue = get_download_queue()
+    queue.submit(url, lambda status, path: segment_manager.update_download_status(segment_id, status, path))
+    ...
+    local_path = queue.wait(url)    # 保存草稿时：等待下载完成，未加入队列或下载失败时返回 None
+    queue.release(url, local_path)  # 没有片段引用时：删除 download_dir 中的文件
+    ```
+    """
+
+    def __init__(self, download_dir: str, workers: int = 4):
+        """
+        初始化下载队列
+
+        Args:
+            download_dir: 素材下载目录
+            workers: 同时下载的素材数
+        """
+        self.logger = get_logger(__name__)
+        self.download_dir = download_dir
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="material-download")
+        self._lock = threading.Lock()
+        # URL -> 正在进行的下载任务（结果为本地路径）；下载结束后移除
+        self._futures: Dict[str, Future] = {}
+        # URL -> 等待该素材下载完成的片段回调；下载结束后移除
+        self._waiting: Dict[str, List[StatusCallback]] = {}
+        # URL -> 已下载的本地路径
+        self._results: LRUCache[str, str] = LRUCache(max_entries=MAX_RESULTS)
+        self._saver = None
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, url: str, on_status: StatusCallback) -> None:
+        """
+        在后台下载素材
+
+        Args:
+            url: 素材URL
+            on_status: 下载状态变化时调用 on_status(download_status, local_path)；
+                素材已经下载过时立即以 completed 调用
+        """
+        with self._lock:
+            path = self._results.get(url)
+            if path is not None and not os.path.isfile(path):
+                # 已下载的文件被删除或被缓存淘汰，重新下载
+                self._results.pop(url)
+                path = None
+            if path is None:
+                waiting = self._waiting.get(url)
+                if waiting is not None:
+                    # 正在下载，完成后一起通知
+                    waiting.append(on_status)
+                    return
+                self._waiting[url] = [on_status]
+                self._futures[url] = self._executor.submit(self._download, url)
+                return
+        self._notify([on_status], "completed", path)
+
+    def wait(self, url: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        等待素材下载完成
+
+        Returns:
+            已下载的本地路径；素材未加入队列、下载失败或文件已被删除时返回 None
+        """
+        with self._lock:
+            future = self._futures.get(url)
+            path = self._results.get(url) if future is None else None
+        if future is not None:
+            try:
+                path = future.result(timeout=timeout)
+            except Exception:
+                return None
+        return path if path is not None and os.path.isfile(path) else None
+
+    def is_prefetched(self, path: str) -> bool:
+        """文件是否在 download_dir 中（全局素材缓存中的文件由缓存按大小淘汰）"""
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.download_dir)
+
+    def release(self, url: str, path: Optional[str] = None) -> bool:
+        """
+        删除 download_dir 中下载的文件（调用方确认已没有片段引用该文件）
+
+        Args:
+            url: 素材URL
+            path: 片段记录的本地路径（服务重启后队列中没有记录时使用）
+
+        Returns:
+            是否删除了文件
+        """
+        with self._lock:
+            if url in self._futures:
+                # 正在重新下载
+                return False
+            path = path or self._results.get(url)
+            if path is None or not self.is_prefetched(path):
+                return False
+            if self._results.get(url) == path:
+                self._results.pop(url)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            self.logger.warning(f"删除后台下载的素材失败 {path}: {e}")
+            return False
+        return True
+
+    def _download(self, url: str) -> str:
+        """下载一个素材（在线程池中执行）"""
+        with self._lock:
+            callbacks = list(self._waiting.get(url, []))
+        self._notify(callbacks, "downloading", None)
+
+        try:
+            path = self._get_saver().download_material(url, self.download_dir)
+            store = get_material_store()
+            cached = store.get(url) if store is not None else None
+            if cached is not None:
+                # 直接使用缓存中的文件，download_dir 中的硬链接会让缓存淘汰素材时无法释放空间
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    self.logger.warning(f"删除后台下载的素材失败 {path}: {e}")
+                path = str(cached)
+        except Exception as e:
+            self.logger.warning(f"后台下载素材失败 {url}: {e}")
+            with self._lock:
+                callbacks = self._waiting.pop(url, [])
+                self._futures.pop(url, None)
+                self.failed += 1
+            self._notify(callbacks, "failed", None)
+            raise
+
+        with self._lock:
+            callbacks = self._waiting.pop(url, [])
+            self._results[url] = path
+            self._futures.pop(url, None)
+            self.completed += 1
+        self._notify(callbacks, "completed", path)
+        return path
+
+    def _get_saver(self):
+        """下载使用的 DraftSaver（流式下载、断点续传、全局素材缓存）"""
+        if self._saver is None:
+            # draft_saver 导入了本模块，在第一次下载时再导入
+            from app.backend.utils.draft_saver import DraftSaver
+            self._saver = DraftSaver(output_dir=self.download_dir)
+        return self._saver
+
+    def _notify(self, callbacks: List[StatusCallback], status: str, path: Optional[str]) -> None:
+        """调用片段状态回调（回调出错不影响下载）"""
+        for callback in callbacks:
+            try:
+                callback(status, path)
+            except Exception as e:
+                self.logger.warning(f"更新片段下载状态失败: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """队列统计（下载中、已完成、失败的素材数）"""
+        with self._lock:
+            return {
+                "downloading": len(self._waiting),
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def shutdown(self) -> None:
+        """停止队列：取消尚未开始的下载，不等待正在进行的下载"""
+        with self._lock:
+            futures = list(self._futures.values())
+        # Python 3.8 的 shutdown 没有 cancel_futures 参数，逐个取消（已开始的下载不受影响）
+        for future in futures:
+            future.cancel()
+        self._executor.shutdown(wait=False)
+
+
+# 全局单例实例
+_download_queue: Optional[MaterialDownloadQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_download_queue() -> Optional[MaterialDownloadQueue]:
+    """
+    获取全局后台下载队列（单例模式）
+
+    Returns:
+        MaterialDownloadQueue 实例，background_download_workers 为 0 时返回 None（保存草稿时再下载）
+    """
+    global _download_queue
+
+    config = get_config()
+    if config.background_download_workers <= 0:
+        return None
+    if _download_queue is None:
+        with _queue_lock:
+            if _download_queue is None:
+                _download_queue = MaterialDownloadQueue(
+                    os.path.join(config.assets_dir, PREFETCHED_DIR_NAME),
+                    workers=config.background_download_workers,
+                )
+
+    return _download_queue
+
+
+def shutdown_download_queue() -> None:
+    """关闭服务时停止后台下载队列"""
+    global _download_queue
+
+    with _queue_lock:
+        if _download_queue is not None:
+            _download_queue.shutdown()
+            _download_queue = None
@@ -3,28 +3,38 @@
 从Coze输出完整转换到剪映草稿
 结合 coze_parser + converter + material_manager + pyJianYingDraft
 """
+from __future__ import annotations
+
 from pathlib import Path
 from typing import Optional, Dict, List, Any
 import os
+from app.backend.config import get_config
 from app.backend.utils.logger import get_logger
 from app.backend.utils.coze_parser import CozeOutputParser
 from app.backend.utils.converter import DraftInterfaceConverter
 from app.backend.utils.material_manager import MaterialManager, create_material_manager
 from app.backend.utils.settings_manager import get_settings_manager
-import pyJianYingDraft as draft
-from pyJianYingDraft import ScriptFile  
+from app.backend.utils.lazy import lazy_import
+
+# GUI 启动时不导入 pyJianYingDraft，第一次生成草稿时才导入
+draft = lazy_import("pyJianYingDraft")
 
 
 class DraftGenerator:
     """剪映草稿生成器 - 从Coze输出到剪映草稿的完整转换"""
     
-    def __init__(self, output_base_dir: Optional[str] = None):
+    # 可以添加到轨道中的片段类型（其余类型的轨道被跳过，不下载素材）
+    SUPPORTED_TRACK_TYPES = ('audio', 'image', 'text', 'video')
+    
+    def __init__(self, output_base_dir: Optional[str] = None, prefetch_concurrency: Optional[int] = None):
         """
         初始化草稿生成器
         
         Args:
             output_base_dir: 输出根目录(存放所有草稿项目)。
                            如果为None，则使用全局设置管理器的配置
+            prefetch_concurrency: 并发预取素材的最大下载数。
+                           如果为None，则使用配置 JIANYING_MATERIAL_PREFETCH_CONCURRENCY（默认 4）
         """
         self.logger = get_logger(__name__)
         self.logger.info("初始化草稿生成器")
@@ -40,6 +50,9 @@ class DraftGenerator:
         
         self.parser = CozeOutputParser()
         self.material_managers: Dict[str, MaterialManager] = {}
+        if prefetch_concurrency is None:
+            prefetch_concurrency = get_config().material_prefetch_concurrency
+        self.prefetch_concurrency = max(1, prefetch_concurrency)
         
         # 确保输出目录存在
         os.makedirs(self.output_base_dir, exist_ok=True)
@@ -206,7 +219,7 @@ class DraftGenerator:
         # 参考 pyJianYingDraft 的 demo.py，使用人类可读的名称不会被剪映重命名
         self.logger.info("创建草稿...")
         draft_folder_obj = draft.DraftFolder(self.output_base_dir)
-        script: ScriptFile = draft_folder_obj.create_draft(
+        script: draft.ScriptFile = draft_folder_obj.create_draft(
             draft_name=draft_folder_name,  # 使用"扣子2剪映：" + UUID 作为文件夹名
             width=width,
             height=height,
@@ -230,8 +243,11 @@ class DraftGenerator:
         # 4. 初始化Converter
         converter = DraftInterfaceConverter()
         
-        # 5. 处理所有轨道
+        # 5. 并发预取所有片段的素材，之后添加片段时直接使用下载结果
         tracks = draft_data.get('tracks', [])
+        prefetched = self._prefetch_materials(tracks, material_manager)
+        
+        # 6. 处理所有轨道
         self.logger.info(f"处理 {len(tracks)} 条轨道...")
         
         for track_idx, track in enumerate(tracks, 1):
@@ -239,7 +255,7 @@ class DraftGenerator:
             segments = track.get('segments', [])
             self.logger.info(f"  轨道 {track_idx}: {track_type} ({len(segments)} 个片段)")
             
-            # 6. 根据轨道类型创建对应的轨道
+            # 7. 根据轨道类型创建对应的轨道
             track_name = f"{track_type}_track_{track_idx}"
             if not self._create_track_by_type(script, track_type, track_name):
                 continue
@@ -254,23 +270,52 @@ class DraftGenerator:
                         converter=converter,
                         material_manager=material_manager,
                         script=script,
-                        seg_idx=seg_idx
+                        seg_idx=seg_idx,
+                        prefetched=prefetched
                     )
                 except Exception as e:
                     self.logger.error(f"    ❌ 片段 {seg_idx} 处理失败: {e}")
         
-        # 7. 保存草稿
+        # 8. 保存草稿
         self.logger.info("保存草稿...")
         script.save()
         
-        # 8. 打印素材统计
+        # 9. 打印素材统计
         downloaded_materials = material_manager.list_downloaded_materials()
         self.logger.info(f"下载素材数量: {len(downloaded_materials)}")
         self.logger.info(f"素材文件夹大小: {material_manager.get_assets_folder_size():.2f} MB")
         
         return draft_folder
     
-    def _create_track_by_type(self, script: ScriptFile, track_type: str, track_name: str) -> bool:
+    def _prefetch_materials(
+        self,
+        tracks: List[Dict[str, Any]],
+        material_manager: MaterialManager
+    ) -> Dict[str, Any]:
+        """
+        收集所有片段的 material_url 并并发下载
+        
+        Args:
+            tracks: 草稿的轨道列表
+            material_manager: 素材管理器实例
+            
+        Returns:
+            {url: material} 映射字典，下载失败的URL对应异常对象
+        """
+        urls = [
+            segment['material_url']
+            for track in tracks
+            if track.get('track_type', 'unknown') in self.SUPPORTED_TRACK_TYPES
+            for segment in track.get('segments', [])
+            if segment.get('material_url')
+        ]
+        if not urls:
+            return {}
+        
+        self.logger.info(f"预取 {len(urls)} 个片段的素材...")
+        return material_manager.prefetch_materials(urls, max_workers=self.prefetch_concurrency)
+    
+    def _create_track_by_type(self, script: draft.ScriptFile, track_type: str, track_name: str) -> bool:
         """
         根据轨道类型创建对应的轨道
         
@@ -314,8 +359,9 @@ class DraftGenerator:
         track_name: str,
         converter: DraftInterfaceConverter,
         material_manager: MaterialManager,
-        script: ScriptFile,
-        seg_idx: int
+        script: draft.ScriptFile,
+        seg_idx: int,
+        prefetched: Optional[Dict[str, Any]] = None
     ):
         """
         处理单个片段
@@ -328,6 +374,7 @@ class DraftGenerator:
             material_manager: 素材管理器实例
             script: Script对象
             seg_idx: 片段索引(用于日志)
+            prefetched: 预取结果 {url: material 或异常}（可选）
         """
         segment_type = segment.get('type', track_type)
         
@@ -338,7 +385,12 @@ class DraftGenerator:
         if material_url:
             try:
                 self.logger.info(f"    下载素材 {seg_idx}...")
-                material = material_manager.create_material(material_url)
+                material = (prefetched or {}).get(material_url)
+                if isinstance(material, Exception):
+                    # 预取时已下载失败，不再重复下载
+                    raise material
+                if material is None:
+                    material = material_manager.create_material(material_url)
                 segment['_material_object'] = material
                 
                 # 对于图片类型，额外保存本地文件路径到 material_path
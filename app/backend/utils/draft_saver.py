@@ -3,36 +3,51 @@
 将 DraftStateManager 和 SegmentManager 的数据转换为 pyJianYingDraft 调用并保存
 """
 
+import hashlib
 import os
+import re
 import tempfile
+import time
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
 
-import pyJianYingDraft as draft
 import requests
-from pyJianYingDraft import (
-    ClipSettings,
-    CropSettings,
-    FilterType,
-    IntroType,
-    OutroType,
-    GroupAnimationType,
-    TextIntro,
-    TextOutro,
-    TextLoopAnim,
-    TransitionType,
-    VideoSceneEffectType,
-    tim,
-    trange,
-    VideoSegment,
-    TextSegment
-)
 
 from app.backend.config import get_config
 from app.backend.utils.settings_manager import get_settings_manager
 from app.backend.utils.draft_state_manager import get_draft_state_manager
+from app.backend.utils.download_queue import get_download_queue
+from app.backend.utils.http_client import get_http_client
+from app.backend.utils.lazy import lazy_import
 from app.backend.utils.logger import get_logger
+from app.backend.utils.material_store import file_sha256, get_material_store, link_or_copy
+from app.backend.utils.metrics import get_metrics
+from app.backend.utils.resumable_download import PARTIAL_SUFFIX, PartialDownload
 from app.backend.utils.segment_manager import get_segment_manager
+from app.backend.utils.segmented_download import RangeNotSupported, download_segmented, should_split
+
+# pyJianYingDraft 导入较慢（加载全部特效 / 动画枚举），第一次保存草稿时才导入
+draft = lazy_import("pyJianYingDraft")
+
+# 文件名中不允许出现的字符（Windows）
+_UNSAFE_FILENAME_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+def material_filename(url: str) -> str:
+    """
+    素材URL对应的本地文件名: {URL路径中的文件名}_{URL哈希}{扩展名}
+
+    不含查询参数和不允许的字符；哈希包含完整URL（含查询参数），
+    文件名相同而路径或签名不同的URL不会互相覆盖
+    """
+    basename = _UNSAFE_FILENAME_CHARS.sub("_", unquote(os.path.basename(urlparse(url).path)))
+    stem, ext = os.path.splitext(basename)
+    stem = stem.strip(" .")[:80] or "material"
+    if not re.fullmatch(r"\.[A-Za-z0-9]{1,8}", ext):
+        ext = ""
+    url_hash = hashlib.md5(url.encode("utf-8")).hexdigest()[:8]
+    return f"{stem}_{url_hash}{ext}"
 
 
 class DraftSaver:
@@ -58,48 +73,176 @@ class DraftSaver:
         self.draft_manager = get_draft_state_manager()
         self.segment_manager = get_segment_manager()
 
-    def download_material(self, url: str, save_dir: str) -> str:
+    def _report(self, progress: Optional[Callable[..., None]], event: str, **data: Any) -> None:
+        """
+        向保存进度回调报告事件（回调出错不影响保存）
+
+        回调随每次保存调用传递，不保存在实例上：全局 DraftSaver 会同时执行多个保存任务
+        """
+        if progress is None:
+            return
+        try:
+            progress(event, **data)
+        except Exception as e:
+            self.logger.warning(f"保存进度回调失败: {e}")
+
+    def download_material(
+        self,
+        url: str,
+        save_dir: str,
+        prefetched: Optional[str] = None,
+        progress: Optional[Callable[..., None]] = None,
+    ) -> str:
         """
         下载素材文件
 
+        流式写入临时文件（内存占用与文件大小无关），下载完成后原子地改名为 material_filename(url)。
+
         Args:
             url: 素材URL
             save_dir: 保存目录
+            prefetched: 已在后台下载好的文件（存在时链接到保存目录，不再下载）
+            progress: 保存进度回调，下载完成时报告 material_downloaded
 
         Returns:
             本地文件路径
         """
-        filename = url.split("/")[-1]
+        filename = material_filename(url)
         save_path = os.path.join(save_dir, filename)
 
         if os.path.exists(save_path):
             self.logger.info(f"素材已存在: {filename}")
+            get_metrics().observe_download("draft_saver", "cached")
+            self._report(progress, "material_downloaded", url=url, bytes=0, cached=True)
+            return save_path
+
+        # 创建片段时已在后台下载的素材，链接到素材目录
+        if prefetched and os.path.isfile(prefetched):
+            link_or_copy(prefetched, save_path)
+            self.logger.info(f"使用后台下载的素材: {filename}")
+            get_metrics().observe_download("draft_saver", "cached")
+            self._report(progress, "material_downloaded", url=url, bytes=0, cached=True)
+            return save_path
+
+        # 全局素材缓存命中时链接到素材目录，不再下载
+        store = get_material_store()
+        cached_path = store.get(url) if store is not None else None
+        if cached_path is not None and store.link(cached_path, save_path):
+            get_metrics().observe_download("draft_saver", "cached")
+            self._report(progress, "material_downloaded", url=url, bytes=0, cached=True)
             return save_path
 
         self.logger.info(f"下载素材: {filename}")
+        started = time.perf_counter()
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-
-            with open(save_path, "wb") as f:
-                f.write(response.content)
+            size, digest = self._download_with_retries(url, save_path)
+            if store is not None:
+                store.add(url, save_path, digest=digest)
 
             self.logger.info(f"素材下载完成: {save_path}")
+            get_metrics().observe_download(
+                "draft_saver", "success", size=size, seconds=time.perf_counter() - started
+            )
+            self._report(progress, "material_downloaded", url=url, bytes=size, cached=False)
             return save_path
         except Exception as e:
             self.logger.error(f"下载素材失败 {url}: {e}")
+            get_metrics().observe_download("draft_saver", "failed", seconds=time.perf_counter() - started)
             raise
 
-    def save_draft(self, draft_id: str) -> str:
+    def _download_with_retries(self, url: str, save_path: str, max_retries: int = 3) -> Tuple[int, str]:
+        """
+        带重试地下载素材，连接中断时从断点续传（续传状态保存在磁盘，重新保存草稿时同样续传），
+        从头下载的大文件在服务器支持 Range 时分段并发下载
+
+        Returns:
+            (文件大小, 内容sha256)
+        """
+        config = get_config()
+        threshold = int(config.segmented_download_mb * 1024 * 1024)
+        partial = PartialDownload(url, save_path + PARTIAL_SUFFIX)
+        for attempt in range(max_retries):
+            try:
+                partial.load()
+                with get_http_client().get(
+                    url, stream=True, timeout=30, strategy=attempt, headers=partial.request_headers()
+                ) as response:
+                    offset = partial.begin(response)
+                    try:
+                        if not offset and should_split(response, threshold):
+                            size, digest = self._download_segmented(
+                                url, response, partial, attempt, config.segmented_download_parts
+                            )
+                        else:
+                            size, digest = self._stream_response(response, partial)
+                    except requests.RequestException:
+                        partial.interrupted()
+                        raise
+                partial.complete(save_path)
+                return size, digest
+            except requests.RequestException as e:
+                if attempt == max_retries - 1:
+                    raise
+                self.logger.warning(f"第{attempt + 1}次下载失败，{(attempt + 1) * 2}秒后重试: {e}")
+                time.sleep((attempt + 1) * 2)
+            except Exception:
+                partial.discard()
+                raise
+        raise RuntimeError("下载失败：所有重试尝试均已用尽")
+
+    def _stream_response(self, response: requests.Response, partial: PartialDownload) -> Tuple[int, str]:
+        """把响应写入临时文件（续传时追加），返回 (文件大小, 内容sha256)"""
+        digest = partial.read_existing()[0] if partial.offset else hashlib.sha256()
+        size = partial.offset
+        with partial.open() as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+        return size, digest.hexdigest()
+
+    def _download_segmented(
+        self, url: str, response: requests.Response, partial: PartialDownload, strategy: int, parts: int
+    ) -> Tuple[int, str]:
+        """分段并发下载，服务器没有按 Range 返回时改为单连接从头下载"""
+        try:
+            size = download_segmented(url, response, partial.temp_path, parts=parts, strategy=strategy, timeout=30)
+        except RangeNotSupported as e:
+            self.logger.warning(f"{e}，改为单连接下载: {url}")
+            partial.discard()
+            with get_http_client().get(url, stream=True, timeout=30, strategy=strategy) as single:
+                partial.begin(single)
+                return self._stream_response(single, partial)
+        except requests.RequestException:
+            # 各段之间有空洞，无法续传
+            partial.discard()
+            raise
+        return size, file_sha256(partial.temp_path)
+
+    def save_draft(self, draft_id: str, progress: Optional[Callable[..., None]] = None) -> str:
         """
         保存草稿为 pyJianYingDraft 格式
 
         Args:
             draft_id: 草稿UUID
+            progress: 可选的进度回调 progress(event, **data)，事件包括
+                started(total_segments)、material_downloaded(url, bytes, cached)、
+                segment_built(segment_id, segment_type)、written(draft_path, bytes_written)
 
         Returns:
             草稿文件夹路径
         """
+        started = time.perf_counter()
+        try:
+            draft_path = self._save_draft(draft_id, progress)
+        except Exception:
+            get_metrics().observe_save(time.perf_counter() - started, success=False)
+            raise
+        get_metrics().observe_save(time.perf_counter() - started, success=True)
+        return draft_path
+
+    def _save_draft(self, draft_id: str, progress: Optional[Callable[..., None]]) -> str:
+        """保存草稿（save_draft 的实现，不含耗时统计）"""
         self.logger.info(f"开始保存草稿: {draft_id}")
 
         # 获取草稿配置
@@ -146,6 +289,12 @@ class DraftSaver:
                 # effect 和 filter 轨道通过不同方式添加
                 self.logger.info(f"跳过轨道添加（将在片段添加时处理）: {track_type}")
 
+        total_segments = sum(len(track.get("segments", [])) for track in tracks)
+        self._report(progress, "started", total_segments=total_segments)
+
+        # 使用了后台下载素材的片段 (segment_id, url, 本地路径)，草稿保存后释放
+        prefetched_materials = []
+
         # 处理所有片段
         for track in tracks:
             track_type = track.get("track_type")
@@ -162,25 +311,66 @@ class DraftSaver:
                 operations = segment.get("operations", [])
 
                 # 创建片段
-                seg = self._create_segment(segment_type, config_data, temp_assets_dir)
+                prefetched = self._prefetched_path(segment)
+                if prefetched is not None:
+                    prefetched_materials.append((segment_id, config_data["material_url"], prefetched))
+                seg = self._create_segment(segment_type, config_data, temp_assets_dir, prefetched, progress)
                 if seg:
                     # 应用操作
                     self._apply_operations(seg, operations)
                     # 添加到脚本
                     script.add_segment(seg)
                     self.logger.info(f"添加片段: {segment_type} ({segment_id})")
+                self._report(progress, "segment_built", segment_id=segment_id, segment_type=segment_type)
 
         # 保存草稿
         script.save()
         draft_path = os.path.join(self.output_dir, draft_name)
 
+        self._release_prefetched(prefetched_materials, temp_assets_dir)
+
         self.logger.info(f"草稿保存成功: {draft_path}")
+        if progress is not None:
+            bytes_written = sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _, files in os.walk(draft_path)
+                for name in files
+            )
+            self._report(progress, "written", draft_path=draft_path, bytes_written=bytes_written)
         return draft_path
 
+    def _release_prefetched(self, materials: List[Tuple[str, str, str]], assets_dir: str) -> None:
+        """
+        草稿保存后，片段的 local_path 改为草稿素材目录中的文件；
+        不再有片段使用的后台下载文件由 SegmentManager.release_prefetched 删除
+        """
+        for segment_id, url, _ in materials:
+            draft_copy = os.path.join(assets_dir, material_filename(url))
+            if os.path.isfile(draft_copy):
+                self.segment_manager.update_download_status(segment_id, "completed", draft_copy)
+        self.segment_manager.release_prefetched([(url, path) for _, url, path in materials])
+
+    def _prefetched_path(self, segment: Dict[str, Any]) -> Optional[str]:
+        """片段素材在后台下载的文件：仍在下载时等待完成，没有时返回 None（保存时下载）"""
+        url = segment.get("config", {}).get("material_url")
+        if not url:
+            return None
+        queue = get_download_queue()
+        path = queue.wait(url) if queue is not None else None
+        if path is None and segment.get("download_status") == "completed":
+            # 服务重启后队列为空，使用片段记录的路径
+            path = segment.get("local_path")
+        return path
+
     def _create_segment(
-        self, segment_type: str, config: Dict[str, Any], assets_dir: str
+        self,
+        segment_type: str,
+        config: Dict[str, Any],
+        assets_dir: str,
+        prefetched: Optional[str] = None,
+        progress: Optional[Callable[..., None]] = None,
     ):
-        """创建片段对象"""
+        """创建片段对象（prefetched: 后台已下载的素材文件，progress: 保存进度回调）"""
         try:
             material_url = config.get("material_url")
             target_timerange = config.get("target_timerange", {})
@@ -193,18 +383,18 @@ class DraftSaver:
 
             if segment_type == "audio":
                 # 下载音频
-                local_path = self.download_material(material_url, assets_dir)
+                local_path = self.download_material(material_url, assets_dir, prefetched, progress)
                 volume = config.get("volume", 1.0)
                 seg = draft.AudioSegment(
                     local_path,
-                    trange(f"{start_sec}s", f"{duration_sec}s"),
+                    draft.trange(f"{start_sec}s", f"{duration_sec}s"),
                     volume=volume,
                 )
                 return seg
 
             elif segment_type == "video" or segment_type == "image":
                 # 下载视频/图片
-                local_path = self.download_material(material_url, assets_dir)
+                local_path = self.download_material(material_url, assets_dir, prefetched, progress)
                 
                 # 获取 ClipSettings
                 clip_config = config.get("clip_settings")
@@ -239,13 +429,13 @@ class DraftSaver:
                     material = draft.VideoMaterial(local_path, crop_settings=crop_settings)
                     seg = draft.VideoSegment(
                         material, 
-                        trange(f"{start_sec}s", f"{duration_sec}s"),
+                        draft.trange(f"{start_sec}s", f"{duration_sec}s"),
                         clip_settings=clip_settings
                     )
                 else:
                     seg = draft.VideoSegment(
                         local_path, 
-                        trange(f"{start_sec}s", f"{duration_sec}s"),
+                        draft.trange(f"{start_sec}s", f"{duration_sec}s"),
                         clip_settings=clip_settings
                     )
                 return seg
@@ -264,7 +454,7 @@ class DraftSaver:
                 b = int(hex_color[4:6], 16) / 255.0
 
                 # 创建文本片段
-                text_timerange = trange(f"{start_sec}s", f"{duration_sec}s")
+                text_timerange = draft.trange(f"{start_sec}s", f"{duration_sec}s")
 
                 # 获取字体类型
                 try:
@@ -304,7 +494,7 @@ class DraftSaver:
 
                 seg = draft.StickerSegment(
                     resource_id,
-                    trange(f"{start_sec}s", f"{duration_sec}s"),
+                    draft.trange(f"{start_sec}s", f"{duration_sec}s"),
                     clip_settings=draft.ClipSettings(
                         transform_x=position_x,
                         transform_y=position_y,
@@ -327,7 +517,7 @@ class DraftSaver:
 
                 # 尝试从 VideoSceneEffectType 获取特效
                 try:
-                    effect = getattr(VideoSceneEffectType, effect_type, None)
+                    effect = getattr(draft.VideoSceneEffectType, effect_type, None)
                     if not effect:
                         self.logger.warning(f"未知的特效类型: {effect_type}")
                         return None
@@ -338,7 +528,7 @@ class DraftSaver:
 
                     # 创建特效片段
                     seg = draft.EffectSegment(
-                        effect, trange(f"{start_sec}s", f"{duration_sec}s")
+                        effect, draft.trange(f"{start_sec}s", f"{duration_sec}s")
                     )
                     return seg
                 except Exception as e:
@@ -354,7 +544,7 @@ class DraftSaver:
 
                 # 尝试从 FilterType 获取滤镜
                 try:
-                    filter_enum = getattr(FilterType, filter_type, None)
+                    filter_enum = getattr(draft.FilterType, filter_type, None)
                     if not filter_enum:
                         self.logger.warning(f"未知的滤镜类型: {filter_type}")
                         return None
@@ -365,7 +555,7 @@ class DraftSaver:
                     # 创建滤镜片段 - FilterSegment(FilterType, timerange, intensity)
                     seg = draft.FilterSegment(
                         filter_enum,
-                        trange(f"{start_sec}s", f"{duration_sec}s"),
+                        draft.trange(f"{start_sec}s", f"{duration_sec}s"),
                         intensity=intensity,
                     )
                     return seg
@@ -413,44 +603,44 @@ class DraftSaver:
                             type_name, anim_name = animation_type.split(".", 1)
                             # 视频动画类型
                             if type_name == "IntroType":
-                                anim = getattr(IntroType, anim_name, None)
+                                anim = getattr(draft.IntroType, anim_name, None)
                             elif type_name == "OutroType":
-                                anim = getattr(OutroType, anim_name, None)
+                                anim = getattr(draft.OutroType, anim_name, None)
                             elif type_name == "GroupAnimationType":
-                                anim = getattr(GroupAnimationType, anim_name, None)
+                                anim = getattr(draft.GroupAnimationType, anim_name, None)
                             # 文本动画类型
                             elif type_name == "TextIntro":
-                                anim = getattr(TextIntro, anim_name, None)
+                                anim = getattr(draft.TextIntro, anim_name, None)
                             elif type_name == "TextOutro":
-                                anim = getattr(TextOutro, anim_name, None)
+                                anim = getattr(draft.TextOutro, anim_name, None)
                             elif type_name == "TextLoopAnim":
-                                anim = getattr(TextLoopAnim, anim_name, None)
+                                anim = getattr(draft.TextLoopAnim, anim_name, None)
                         
                         # 2. 如果没有前缀或解析失败，且没有找到anim，则进行模糊查找
                         if not anim:
                             # 如果输入包含点但没匹配到（可能是错误的前缀），尝试只用后半部分
                             clean_anim_name = animation_type.split(".")[-1] if "." in animation_type else animation_type
                             
-                            if isinstance(seg, VideoSegment):
+                            if isinstance(seg, draft.VideoSegment):
                                 # 视频动画: 依次查找 IntroType, OutroType, GroupAnimationType
                                 # 注意：这里存在优先级，如果有重名且未指定前缀，IntroType 优先
-                                anim = getattr(IntroType, clean_anim_name, None)
+                                anim = getattr(draft.IntroType, clean_anim_name, None)
                                 if not anim:
-                                    anim = getattr(OutroType, clean_anim_name, None)
+                                    anim = getattr(draft.OutroType, clean_anim_name, None)
                                 if not anim:
-                                    anim = getattr(GroupAnimationType, clean_anim_name, None)
+                                    anim = getattr(draft.GroupAnimationType, clean_anim_name, None)
                             
-                            elif isinstance(seg, TextSegment):
+                            elif isinstance(seg, draft.TextSegment):
                                 # 文本动画: 依次查找 TextIntro, TextOutro, TextLoopAnim
-                                anim = getattr(TextIntro, clean_anim_name, None)
+                                anim = getattr(draft.TextIntro, clean_anim_name, None)
                                 if not anim:
-                                    anim = getattr(TextOutro, clean_anim_name, None)
+                                    anim = getattr(draft.TextOutro, clean_anim_name, None)
                                 if not anim:
-                                    anim = getattr(TextLoopAnim, clean_anim_name, None)
+                                    anim = getattr(draft.TextLoopAnim, clean_anim_name, None)
 
                         if anim:
                             if duration:
-                                seg.add_animation(anim, duration=tim(duration))
+                                seg.add_animation(anim, duration=draft.tim(duration))
                             else:
                                 seg.add_animation(anim)
                             self.logger.info(f"应用动画: {animation_type}")
@@ -469,7 +659,7 @@ class DraftSaver:
                         transition_type = transition_type.replace("TransitionType.", "")
                     
                     try:
-                        trans = getattr(TransitionType, transition_type, None)
+                        trans = getattr(draft.TransitionType, transition_type, None)
                         if trans and hasattr(seg, "add_transition"):
                             seg.add_transition(trans)
                             self.logger.info(f"应用转场: {transition_type}")
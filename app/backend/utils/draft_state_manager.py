@@ -3,14 +3,20 @@
 管理基于 UUID 的草稿配置、状态和素材下载
 """
 import os
-import json
+import copy
+import asyncio
 import uuid
 import time
+import atexit
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
 from app.backend.utils.logger import get_logger
 from app.backend.config import get_config
+from app.backend.database.state_store import StateStore, create_state_store, get_state_store
 
 
 class DraftStateManager:
@@ -19,29 +25,203 @@ class DraftStateManager:
     
     功能:
     1. 创建和管理基于 UUID 的草稿配置
-    2. 存储草稿状态到文件系统（/tmp 或指定目录）
+    2. 通过可插拔的状态存储后端（文件 / SQLite）持久化草稿状态
     3. 支持草稿的增删改查操作
     4. 追踪素材下载状态
+    5. 内存缓存草稿配置（按存储修改标记失效），支持合并写回（write-behind）
+    6. 每个草稿一把 asyncio 锁 + 配置中的 version 字段（比较并交换），防止并发更新丢失
     """
+
+    # modify_draft 遇到版本冲突时的最大重试次数
+    MAX_CONFLICT_RETRIES = 5
     
-    def __init__(self, base_dir: Optional[str] = None):
+    def __init__(self, base_dir: Optional[str] = None, store: Optional[StateStore] = None):
         """
         初始化草稿状态管理器
         
         Args:
             base_dir: 草稿存储的基础目录，如果为 None 则使用配置系统的 cache 目录
+            store: 状态存储后端，如果为 None 则根据 base_dir 和配置自动选择
         """
         self.logger = get_logger(__name__)
         
         # 如果没有指定 base_dir，使用配置系统的 cache 目录
         # draft_config.json 是内部状态管理文件，应该存储在 cache 中
+        if store is None:
+            store = get_state_store() if base_dir is None else create_state_store(base_dir=base_dir)
         if base_dir is None:
             config = get_config()
             base_dir = config.cache_dir
         
+        self.store = store
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(parents=True, exist_ok=True)
-        self.logger.info(f"草稿状态管理器已初始化: {self.base_dir}")
+
+        # 草稿配置缓存: draft_id -> 配置，按最近使用顺序排列
+        app_config = get_config()
+        self.flush_mode = app_config.draft_flush_mode
+        if app_config.api_workers > 1 and self.flush_mode == "write_behind":
+            # write_behind 只保证进程内一致，多 worker 进程时每次更新必须立即写入共享存储
+            self.logger.warning("多 worker 模式下不支持 write_behind，改用 immediate")
+            self.flush_mode = "immediate"
+        self.flush_interval = app_config.draft_flush_interval
+        self.flush_max_dirty = max(1, app_config.draft_flush_max_dirty)
+        self.cache_size = max(1, app_config.draft_cache_size)
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._stamps: Dict[str, Any] = {}
+        self._dirty: set = set()
+        self._pending_writes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._flush_timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+
+        # 进程内每个草稿一把 asyncio 锁，不同草稿之间互不阻塞
+        # draft_id -> [asyncio.Lock, 持有和等待的请求数]，没有请求使用时移除
+        self._draft_locks: Dict[str, List[Any]] = {}
+
+        self.logger.info(
+            f"草稿状态管理器已初始化: {self.base_dir} "
+            f"(后端: {self.store.backend_name}, 写回模式: {self.flush_mode})"
+        )
+
+    # ---------- 缓存与写回 ----------
+
+    def _remember(self, draft_id: str, config: Dict[str, Any]) -> None:
+        """放入缓存，超出容量时淘汰最久未使用且已落盘的草稿"""
+        self._cache[draft_id] = config
+        self._cache.move_to_end(draft_id)
+        while len(self._cache) > self.cache_size:
+            victim = next((k for k in self._cache if k not in self._dirty), None)
+            if victim is None or victim == draft_id:
+                break
+            self._cache.pop(victim)
+            self._stamps.pop(victim, None)
+
+    def _forget(self, draft_id: str) -> None:
+        self._cache.pop(draft_id, None)
+        self._stamps.pop(draft_id, None)
+        self._dirty.discard(draft_id)
+
+    def _write_through(self, draft_id: str) -> None:
+        self.store.save_draft(draft_id, self._cache[draft_id])
+        self._stamps[draft_id] = self.store.draft_stamp(draft_id)
+        self._dirty.discard(draft_id)
+
+    def _schedule_flush(self) -> None:
+        if self._flush_timer is not None:
+            return
+        self._flush_timer = threading.Timer(self.flush_interval, self._on_flush_timer)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _on_flush_timer(self) -> None:
+        with self._lock:
+            self._flush_timer = None
+        self.flush()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        在一个存储事务中修改草稿（以及同一存储中的片段），sqlite 后端原子提交，异常时整体回滚
+
+        先取本管理器的锁再开启存储事务，与 update_draft_config 的加锁顺序一致
+        """
+        with self._lock, self.store.transaction():
+            yield
+
+    def flush(self, draft_id: Optional[str] = None) -> int:
+        """
+        将缓存中的脏草稿写入存储
+
+        Args:
+            draft_id: 只刷新指定草稿，为 None 时刷新全部
+
+        Returns:
+            写入的草稿数量
+        """
+        with self._lock:
+            if draft_id is None:
+                targets = list(self._dirty)
+            else:
+                targets = [draft_id] if draft_id in self._dirty else []
+
+            flushed = 0
+            for target in targets:
+                try:
+                    self._write_through(target)
+                    flushed += 1
+                except Exception as e:
+                    self.logger.error(f"刷新草稿配置失败: {target}, {str(e)}")
+
+            if not self._dirty:
+                self._pending_writes = 0
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+
+        if flushed:
+            self.logger.debug(f"已刷新 {flushed} 个草稿配置")
+        return flushed
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        获取草稿配置缓存统计
+        
+        Returns:
+            包含 size, max_entries, dirty, hits, misses, hit_rate 的字典
+        """
+        with self._lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "size": len(self._cache),
+                "max_entries": self.cache_size,
+                "dirty": len(self._dirty),
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+            }
+
+    @asynccontextmanager
+    async def draft_lock(self, draft_id: str) -> AsyncIterator[None]:
+        """
+        持有草稿的 asyncio 锁，用于在进程内串行化同一草稿的读-改-写
+
+        锁在最后一个持有或等待的请求退出时移除，不会随草稿数量无限增长
+
+        使用示例:
+        ```python
+        async with draft_manager.draft_lock(draft_id):
+            draft_manager.modify_draft(draft_id, mutate)
+        ```
+        """
+        with self._lock:
+            entry = self._draft_locks.get(draft_id)
+            if entry is None:
+                entry = self._draft_locks[draft_id] = [asyncio.Lock(), 0]
+            entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._draft_locks.pop(draft_id, None)
+
+    def is_draft_locked(self, draft_id: str) -> bool:
+        """草稿当前是否有请求正在修改（不会为草稿创建新锁）"""
+        with self._lock:
+            entry = self._draft_locks.get(draft_id)
+            return entry is not None and entry[0].locked()
+
+    def close(self) -> None:
+        """刷新所有脏草稿并停止后台写回定时器（关闭服务时调用）"""
+        self.flush()
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
     
     def create_draft(self, draft_name: str, width: int, height: int, fps: int) -> Dict[str, Any]:
         """
@@ -60,10 +240,6 @@ class DraftStateManager:
             # 生成 UUID
             draft_id = str(uuid.uuid4())
             
-            # 创建草稿文件夹
-            draft_folder = self.base_dir / draft_id
-            draft_folder.mkdir(parents=True, exist_ok=True)
-            
             # 创建初始配置
             timestamp = datetime.now().timestamp()
             config = {
@@ -78,13 +254,14 @@ class DraftStateManager:
                 "tracks": [],
                 "created_timestamp": timestamp,
                 "last_modified": timestamp,
-                "status": "created"
+                "status": "created",
+                "version": 1
             }
             
-            # 保存配置文件
-            config_path = draft_folder / "draft_config.json"
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
+            # 保存配置（新建草稿总是立即写入，保证其他进程可见）
+            with self._lock:
+                self._remember(draft_id, config)
+                self._write_through(draft_id)
             
             self.logger.info(f"草稿创建成功: {draft_id}")
             
@@ -102,6 +279,42 @@ class DraftStateManager:
                 "message": f"创建草稿失败: {str(e)}"
             }
     
+    def _load_cached(self, draft_id: str) -> Optional[Dict[str, Any]]:
+        """
+        读取草稿配置（不复制），调用方需持有 _lock 且不得修改返回值
+
+        Args:
+            draft_id: 草稿 UUID
+
+        Returns:
+            缓存中的草稿配置，如果不存在则返回 None
+        """
+        cached = self._cache.get(draft_id)
+        if cached is not None:
+            # 脏数据以内存为准；否则存储修改标记未变时直接命中
+            if draft_id in self._dirty:
+                self._cache.move_to_end(draft_id)
+                self.cache_hits += 1
+                return cached
+            stamp = self.store.draft_stamp(draft_id)
+            if stamp is not None and stamp == self._stamps.get(draft_id):
+                self._cache.move_to_end(draft_id)
+                self.cache_hits += 1
+                return cached
+
+        self.cache_misses += 1
+        stamp = self.store.draft_stamp(draft_id)
+        config = self.store.load_draft(draft_id)
+        
+        if config is None:
+            self._forget(draft_id)
+            self.logger.warning(f"草稿配置不存在: {draft_id}")
+            return None
+        
+        self._remember(draft_id, config)
+        self._stamps[draft_id] = stamp
+        return config
+    
     def get_draft_config(self, draft_id: str) -> Optional[Dict[str, Any]]:
         """
         获取草稿配置
@@ -113,40 +326,84 @@ class DraftStateManager:
             草稿配置字典，如果不存在则返回 None
         """
         try:
-            config_path = self.base_dir / draft_id / "draft_config.json"
-            
-            if not config_path.exists():
-                self.logger.warning(f"草稿配置不存在: {draft_id}")
-                return None
+            with self._lock:
+                config = self._load_cached(draft_id)
+                return None if config is None else copy.deepcopy(config)
             
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
+        except Exception as e:
+            self.logger.error(f"读取草稿配置失败: {str(e)}")
+            return None
+    
+    def get_draft_revision(self, draft_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取草稿的版本信息，不复制整个配置（用于条件请求判断草稿是否变化）
+        
+        Args:
+            draft_id: 草稿 UUID
             
-            return config
+        Returns:
+            包含 version, last_modified, segment_ids 的字典，如果不存在则返回 None
+        """
+        try:
+            with self._lock:
+                config = self._load_cached(draft_id)
+                if config is None:
+                    return None
+                return {
+                    "version": config.get("version", 0),
+                    "last_modified": config.get("last_modified") or 0,
+                    "segment_ids": list(dict.fromkeys(
+                        segment_id
+                        for track in config.get("tracks", [])
+                        for segment_id in track.get("segments", [])
+                    )),
+                }
             
         except Exception as e:
-            self.logger.error(f"读取草稿配置失败: {str(e)}")
+            self.logger.error(f"读取草稿版本失败: {str(e)}")
             return None
     
-    def update_draft_config(self, draft_id: str, config: Dict[str, Any]) -> bool:
+    def update_draft_config(
+        self,
+        draft_id: str,
+        config: Dict[str, Any],
+        expected_version: Optional[int] = None
+    ) -> bool:
         """
         更新草稿配置
         
         Args:
             draft_id: 草稿 UUID
             config: 新的配置字典
+            expected_version: 如果指定，仅当当前版本等于该值时才写入（比较并交换）
             
         Returns:
-            是否成功更新
+            是否成功更新，版本冲突时返回 False
         """
         try:
-            config_path = self.base_dir / draft_id / "draft_config.json"
-            
-            # 更新最后修改时间
+            # 更新最后修改时间和版本号
             config["last_modified"] = datetime.now().timestamp()
-            
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
+            base_version = config.get("version", 0) if expected_version is None else expected_version
+            config["version"] = base_version + 1
+            
+            with self._lock:
+                if expected_version is not None and not self._check_version(draft_id, config, expected_version):
+                    self.logger.warning(f"草稿版本冲突: {draft_id} (期望版本 {expected_version})")
+                    return False
+                self._remember(draft_id, copy.deepcopy(config))
+                if expected_version is not None and self.flush_mode != "write_behind":
+                    # 已经由 _check_version 写入存储
+                    self._stamps[draft_id] = self.store.draft_stamp(draft_id)
+                    self._dirty.discard(draft_id)
+                elif self.flush_mode != "write_behind":
+                    self._write_through(draft_id)
+                else:
+                    self._dirty.add(draft_id)
+                    self._pending_writes += 1
+                    if self._pending_writes >= self.flush_max_dirty:
+                        self.flush()
+                    else:
+                        self._schedule_flush()
             
             self.logger.info(f"草稿配置已更新: {draft_id}")
             return True
@@ -155,6 +412,59 @@ class DraftStateManager:
             self.logger.error(f"更新草稿配置失败: {str(e)}")
             return False
     
+    def _check_version(self, draft_id: str, config: Dict[str, Any], expected_version: int) -> bool:
+        """
+        比较版本，立即写入模式下同时完成写入
+
+        write_behind 模式下内存缓存是唯一的事实来源，只在进程内比较；
+        immediate 模式下交给存储后端原子地比较并写入，多 worker 进程之间同样有效
+        """
+        if self.flush_mode == "write_behind" and draft_id in self._dirty:
+            return self._cache[draft_id].get("version", 0) == expected_version
+        if self.flush_mode == "write_behind":
+            current = self.store.load_draft(draft_id)
+            return current is not None and current.get("version", 0) == expected_version
+        return self.store.save_draft_if_version(draft_id, config, expected_version)
+
+    def modify_draft(
+        self,
+        draft_id: str,
+        mutate: Callable[[Dict[str, Any]], Any],
+        max_retries: Optional[int] = None
+    ) -> Tuple[bool, Any]:
+        """
+        以比较并交换的方式读-改-写草稿配置，版本冲突时重新读取并重试
+
+        Args:
+            draft_id: 草稿 UUID
+            mutate: 就地修改配置的函数，其返回值原样返回给调用方；
+                    抛出的异常会直接向上传播，不会写入
+            max_retries: 最大重试次数，默认 MAX_CONFLICT_RETRIES
+
+        Returns:
+            (是否成功写入, mutate 的返回值)，草稿不存在时返回 (False, None)
+        """
+        retries = self.MAX_CONFLICT_RETRIES if max_retries is None else max_retries
+        result = None
+        for attempt in range(retries + 1):
+            config = self.get_draft_config(draft_id)
+            if config is None:
+                return False, None
+
+            expected_version = config.get("version", 0)
+            result = mutate(config)
+            if self.update_draft_config(draft_id, config, expected_version=expected_version):
+                return True, result
+
+            # 其他进程已修改，丢弃缓存后重试
+            with self._lock:
+                if draft_id not in self._dirty:
+                    self._forget(draft_id)
+            self.logger.info(f"草稿 {draft_id} 版本冲突，重试第 {attempt + 1} 次")
+
+        self.logger.error(f"草稿 {draft_id} 多次版本冲突，放弃更新")
+        return False, result
+
     def add_track(self, draft_id: str, track_type: str, segments: List[Dict[str, Any]]) -> bool:
         """
         向草稿添加轨道
@@ -280,16 +590,7 @@ class DraftStateManager:
             草稿 UUID 列表
         """
         try:
-            draft_ids = []
-            
-            if not self.base_dir.exists():
-                return draft_ids
-            
-            for item in self.base_dir.iterdir():
-                if item.is_dir():
-                    config_path = item / "draft_config.json"
-                    if config_path.exists():
-                        draft_ids.append(item.name)
+            draft_ids = self.store.list_drafts()
             
             self.logger.info(f"找到 {len(draft_ids)} 个草稿")
             return draft_ids
@@ -298,6 +599,39 @@ class DraftStateManager:
             self.logger.error(f"列出草稿失败: {str(e)}")
             return []
     
+    def list_recent_drafts(self, limit: Optional[int] = None) -> List[str]:
+        """
+        按最后修改时间倒序列出草稿
+        
+        Args:
+            limit: 最多返回的数量，None 表示全部
+            
+        Returns:
+            草稿 UUID 列表
+        """
+        try:
+            return self.store.drafts_by_last_modified(limit=limit)
+        except Exception as e:
+            self.logger.error(f"列出草稿失败: {str(e)}")
+            return []
+    
+    def get_draft_segments(self, draft_id: str, segment_type: Optional[str] = None) -> List[str]:
+        """
+        按轨道顺序列出草稿引用的片段
+        
+        Args:
+            draft_id: 草稿 UUID
+            segment_type: 可选的片段类型过滤
+            
+        Returns:
+            片段 UUID 列表
+        """
+        with self._lock:
+            if draft_id in self._dirty:
+                # 写回尚未落盘，索引中的引用关系可能过期，先刷新该草稿
+                self.flush(draft_id)
+        return self.store.draft_segments(draft_id, segment_type)
+    
     def delete_draft(self, draft_id: str) -> bool:
         """
         删除草稿
@@ -309,15 +643,12 @@ class DraftStateManager:
             是否成功删除
         """
         try:
-            draft_folder = self.base_dir / draft_id
-            
-            if not draft_folder.exists():
+            with self._lock:
+                self._forget(draft_id)
+            if not self.store.delete_draft(draft_id):
                 self.logger.warning(f"草稿不存在: {draft_id}")
                 return False
             
-            import shutil
-            shutil.rmtree(draft_folder)
-            
             self.logger.info(f"草稿已删除: {draft_id}")
             return True
             
@@ -389,5 +720,7 @@ def get_draft_state_manager(base_dir: Optional[str] = None) -> DraftStateManager
     
     if _draft_state_manager is None:
         _draft_state_manager = DraftStateManager(base_dir)
+        # 进程退出前写回尚未落盘的草稿
+        atexit.register(_draft_state_manager.close)
     
     return _draft_state_manager
@@ -0,0 +1,316 @@
+"""
+共享 HTTP 客户端
+所有素材下载（MaterialManager / DraftSaver）共用一个 requests.Session：
+- keep-alive 连接池，下载同一 CDN 的多个素材时复用连接，不再重复 DNS + TCP + TLS 握手
+- 每个主机的连接数可配置（JIANYING_HTTP_POOL_SIZE / JIANYING_HTTP_HOST_POOL_SIZES）
+- 安装了 h2 时通过 httpx 使用 HTTP/2（JIANYING_HTTP2=auto/on/off）
+- 统一的请求头策略：浏览器请求头 + CDN 的 Referer/Origin 规则，下载失败重试时依次换用备选请求头
+"""
+import importlib.util
+import threading
+from typing import Any, Dict, Iterator, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from app.backend.config import get_config
+from app.backend.utils.lazy import lazy_import
+from app.backend.utils.logger import get_logger
+
+# httpx 只在启用 HTTP/2 时使用，延迟导入以免拖慢启动；HTTP/2 还需要安装 h2
+HTTPX_AVAILABLE = importlib.util.find_spec("httpx") is not None
+HTTP2_AVAILABLE = HTTPX_AVAILABLE and importlib.util.find_spec("h2") is not None
+httpx = lazy_import("httpx") if HTTPX_AVAILABLE else None
+
+# 请求头策略：第一次请求使用第 0 个，下载失败重试时依次换用后面的（部分 CDN 会拒绝特定 UA）
+HEADER_STRATEGIES = (
+    {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'image/*,video/*,audio/*,*/*;q=0.8',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'Accept-Encoding': 'identity',
+        'Connection': 'keep-alive',
+    },
+    {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': '*/*',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Accept-Encoding': 'identity',
+    },
+    {
+        'User-Agent': 'curl/7.68.0',
+        'Accept': '*/*',
+    },
+)
+
+# Coze 素材所在的 CDN（需要 coze.cn 的 Referer/Origin）
+COZE_CDN_DOMAINS = ('oceancloudapi.com', 'volccdn.com', 'bytedance.com')
+# 其他需要 Referer 的 CDN
+CDN_REFERERS = {
+    'amazonaws.com': 'https://aws.amazon.com/',
+    'cloudfront.net': 'https://aws.amazon.com/',
+    'googleapis.com': 'https://cloud.google.com/',
+    'gstatic.com': 'https://cloud.google.com/',
+}
+
+
+def _host_matches(host: str, domain: str) -> bool:
+    return host == domain or host.endswith('.' + domain)
+
+
+def is_volcano_tts_url(url: str) -> bool:
+    """是否为火山引擎 TTS 生成的音频（签名 URL，需要额外的请求头）"""
+    return 'VolcanoUserVoice' in url or 'speech_' in url
+
+
+def build_headers(url: str, strategy: int = 0) -> Dict[str, str]:
+    """
+    生成下载素材的请求头
+
+    Args:
+        url: 素材URL
+        strategy: 请求头策略序号（超出范围时使用最后一个）
+
+    Returns:
+        请求头字典
+    """
+    headers = dict(HEADER_STRATEGIES[min(max(strategy, 0), len(HEADER_STRATEGIES) - 1)])
+    host = (urlparse(url).hostname or '').lower()
+
+    if any(_host_matches(host, domain) for domain in COZE_CDN_DOMAINS):
+        headers['Referer'] = 'https://www.coze.cn/'
+        headers['Origin'] = 'https://www.coze.cn'
+        if is_volcano_tts_url(url):
+            headers['Accept'] = 'audio/mpeg,audio/*,*/*;q=0.9'
+            headers['Accept-Language'] = 'zh-CN,zh;q=0.9,en;q=0.8'
+            headers['Cache-Control'] = 'no-cache'
+            headers['Pragma'] = 'no-cache'
+    else:
+        for domain, referer in CDN_REFERERS.items():
+            if _host_matches(host, domain):
+                headers['Referer'] = referer
+                break
+
+    return headers
+
+
+class _HttpxRaw:
+    """把 httpx 流式响应包装成 requests.Response.raw（iter_content / content 使用）"""
+
+    def __init__(self, response: "httpx.Response", request: requests.PreparedRequest):
+        self._response = response
+        self._request = request
+        self._chunks: Optional[Iterator[bytes]] = None
+        self._buffer = b""
+
+    def stream(self, chunk_size: Optional[int] = None, decode_content: bool = True) -> Iterator[bytes]:
+        iterator = self._response.iter_bytes(chunk_size) if decode_content else self._response.iter_raw(chunk_size)
+        try:
+            yield from iterator
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ConnectionError(e, request=self._request)
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ChunkedEncodingError(e, request=self._request)
+        finally:
+            self._response.close()
+
+    def read(self, amt: Optional[int] = None, decode_content: bool = True) -> bytes:
+        if self._chunks is None:
+            self._chunks = self.stream(decode_content=decode_content)
+        while amt is None or len(self._buffer) < amt:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if amt is None:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def close(self) -> None:
+        self._response.close()
+
+    def release_conn(self) -> None:
+        self._response.close()
+
+
+class HttpxAdapter(BaseAdapter):
+    """
+    通过 httpx 发送请求的 requests 适配器（用于 HTTP/2）
+
+    httpx 在同一主机的一个 HTTP/2 连接上并发多个请求，因此不区分主机连接数，
+    只限制总连接数。调用方仍然使用 requests 的接口（重定向、raise_for_status、iter_content）。
+    """
+
+    def __init__(self, http2: bool = True, pool_size: int = 16):
+        super().__init__()
+        self._client = httpx.Client(
+            http2=http2,
+            follow_redirects=False,  # 由 requests.Session 处理重定向
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_size),
+        )
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            httpx_timeout = httpx.Timeout(read, connect=connect)
+        else:
+            httpx_timeout = httpx.Timeout(timeout)
+        httpx_request = self._client.build_request(
+            request.method, request.url, headers=dict(request.headers), content=request.body,
+            timeout=httpx_timeout
+        )
+        try:
+            httpx_response = self._client.send(httpx_request, stream=True)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(e, request=request)
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+        response = requests.Response()
+        response.status_code = httpx_response.status_code
+        response.headers = CaseInsensitiveDict(httpx_response.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.reason = httpx_response.reason_phrase
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.raw = _HttpxRaw(httpx_response, request)
+        if not stream:
+            response.content
+        return response
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class HttpClient:
+    """
+    共享的 HTTP 客户端
+
+    使用示例:
+    ```python
+    response = get_http_client().get(url, stream=True, timeout=60)
+    response.raise_for_status()
+    ```
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 16,
+        host_pool_sizes: Optional[Dict[str, int]] = None,
+        http2: str = "auto"
+    ):
+        """
+        初始化 HTTP 客户端
+
+        Args:
+            pool_size: 每个主机保持的连接数
+            host_pool_sizes: 指定主机的连接数 {主机名: 连接数}
+            http2: auto（安装了 h2 时使用 HTTP/2）/ on / off
+        """
+        self.logger = get_logger(__name__)
+        self.session = requests.Session()
+        self.http2 = http2 != "off" and HTTP2_AVAILABLE
+        if http2 == "on" and not HTTP2_AVAILABLE:
+            self.logger.warning("未安装 httpx[http2]，使用 HTTP/1.1")
+
+        if self.http2:
+            adapter: BaseAdapter = HttpxAdapter(http2=True, pool_size=pool_size)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+        else:
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_size)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+            for host, size in (host_pool_sizes or {}).items():
+                host_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+                self.session.mount(f"http://{host}", host_adapter)
+                self.session.mount(f"https://{host}", host_adapter)
+
+        self.logger.info(f"HTTP 客户端已初始化: {'HTTP/2' if self.http2 else 'HTTP/1.1'}，每个主机 {pool_size} 个连接")
+
+    @property
+    def header_strategies(self) -> int:
+        """可用的请求头策略数量"""
+        return len(HEADER_STRATEGIES)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        strategy: int = 0,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs: Any
+    ) -> requests.Response:
+        """
+        发送请求（自动添加统一的请求头）
+
+        Args:
+            method: 请求方法
+            url: 请求URL
+            strategy: 请求头策略序号
+            headers: 额外的请求头（覆盖默认值）
+            **kwargs: 传给 requests.Session.request 的其他参数
+
+        Returns:
+            requests.Response
+        """
+        request_headers = build_headers(url, strategy)
+        if headers:
+            request_headers.update(headers)
+        return self.session.request(method, url, headers=request_headers, **kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        """发送 GET 请求"""
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url: str, **kwargs: Any) -> requests.Response:
+        """发送 HEAD 请求（默认跟随重定向）"""
+        kwargs.setdefault("allow_redirects", True)
+        return self.request("HEAD", url, **kwargs)
+
+    def close(self) -> None:
+        """关闭所有连接"""
+        self.session.close()
+
+
+def _parse_host_pool_sizes(value: str) -> Dict[str, int]:
+    """解析 host=size,host=size 格式的主机连接数配置"""
+    sizes = {}
+    for item in value.split(","):
+        host, _, size = item.partition("=")
+        if host.strip() and size.strip().isdigit():
+            sizes[host.strip().lower()] = max(1, int(size))
+    return sizes
+
+
+# 全局单例实例
+_http_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """
+    获取全局 HTTP 客户端（单例模式）
+
+    Returns:
+        HttpClient 实例
+    """
+    global _http_client
+
+    if _http_client is None:
+        with _client_lock:
+            if _http_client is None:
+                config = get_config()
+                _http_client = HttpClient(
+                    pool_size=config.http_pool_size,
+                    host_pool_sizes=_parse_host_pool_sizes(config.http_host_pool_sizes),
+                    http2=config.http2,
+                )
+
+    return _http_client
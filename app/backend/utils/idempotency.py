@@ -0,0 +1,406 @@
+"""
+幂等键（Idempotency-Key）
+Coze 在工具调用超时后会重试，重试的创建草稿 / 创建片段 / 保存草稿请求会重复创建 UUID
+或重复执行完整的保存（包括所有素材下载）。
+
+客户端通过 Idempotency-Key 请求头、idempotency_key 查询参数或请求体中的 idempotency_key
+字段提供幂等键后：
+- 第一次请求正常执行，成功的响应按 (方法, 路径, 幂等键) 保存 idempotency_ttl 秒
+- 重复请求直接返回保存的响应，不再执行；第一次请求仍在执行时等待其完成
+- 同一幂等键用于不同的请求内容时返回 IDEMPOTENCY_CONFLICT
+- 执行失败（非 SUCCESS 的 error_code 或异常）不保存，重试会重新执行
+
+记录保存在 {cache_dir}/idempotency/ 中，多 worker 进程共享。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from app.backend.config import get_config
+from app.backend.database.serializer import fast_json_dumps, fast_json_loads
+from app.backend.utils.api_response_manager import ErrorCode, get_response_manager
+from app.backend.utils.blocking_io import run_blocking
+from app.backend.utils.logger import get_logger
+
+# begin() 的结果
+CLAIMED = "claimed"
+REPLAY = "replay"
+CONFLICT = "conflict"
+IN_PROGRESS = "in_progress"
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+IDEMPOTENCY_FIELD = "idempotency_key"
+
+
+def process_alive(pid: int) -> Optional[bool]:
+    """
+    进程是否仍在运行
+
+    Returns:
+        True / False，无法判断时返回 None
+    """
+    if os.name == "nt":
+        # Windows 上 os.kill(pid, 0) 会发送 CTRL_C_EVENT，不能用来探测进程
+        import ctypes
+
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        ERROR_INVALID_PARAMETER = 87
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            # 进程不存在时 OpenProcess 返回 ERROR_INVALID_PARAMETER；拒绝访问说明进程存在
+            return ctypes.get_last_error() != ERROR_INVALID_PARAMETER
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return None
+            return exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return None
+    return True
+
+
+class IdempotencyStore:
+    """
+    幂等键记录（跨进程共享的文件存储）
+
+    每个幂等键一个文件：处理中时为 pending 标记（以 O_EXCL 创建，保证只有一个请求执行），
+    完成后替换为保存的响应
+    """
+
+    # 扫描目录清除过期记录的最小间隔（秒）
+    PURGE_SCAN_INTERVAL = 60.0
+    # pending 标记超过该时间仍未完成，视为执行它的进程已退出（秒）
+    PENDING_TIMEOUT = 3600.0
+
+    def __init__(self, ttl: Optional[float] = None, keys_dir: Optional[str] = None):
+        """
+        初始化幂等键记录
+
+        Args:
+            ttl: 响应保留时间（秒），None 时使用配置 idempotency_ttl
+            keys_dir: 记录目录，None 时使用 {cache_dir}/idempotency
+        """
+        self.logger = get_logger(__name__)
+        self.ttl = get_config().idempotency_ttl if ttl is None else ttl
+        self.keys_dir = Path(keys_dir or os.path.join(get_config().cache_dir, "idempotency"))
+        self.keys_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._last_purge_scan = 0.0
+
+    def _path(self, scope: str, key: str) -> Path:
+        digest = hashlib.sha256(f"{scope}\n{key}".encode("utf-8")).hexdigest()
+        return self.keys_dir / f"{digest}.json"
+
+    def _load(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            return fast_json_loads(path.read_bytes())
+        except (OSError, ValueError):
+            return None
+
+    def _is_stale(self, record: Dict[str, Any], now: float) -> bool:
+        """完成的记录已过期，或 pending 标记的进程已退出"""
+        if record.get("status") == "completed":
+            return now - record.get("completed_at", 0) > self.ttl
+        if now - record.get("created_at", 0) > self.PENDING_TIMEOUT:
+            return True
+        pid = record.get("pid")
+        if not pid or pid == os.getpid():
+            return False
+        return process_alive(pid) is False
+
+    def begin(self, scope: str, key: str, fingerprint: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        开始处理带幂等键的请求
+
+        Args:
+            scope: 请求范围（方法和路径）
+            key: 幂等键
+            fingerprint: 请求内容指纹
+
+        Returns:
+            (结果, 记录)：CLAIMED 表示由本请求执行；REPLAY 时记录中包含保存的响应；
+            CONFLICT 表示幂等键已用于不同的请求；IN_PROGRESS 表示相同请求正在执行
+        """
+        self.purge_expired()
+        path = self._path(scope, key)
+        for _ in range(3):
+            pending = {
+                "status": "pending",
+                "fingerprint": fingerprint,
+                "created_at": time.time(),
+                "pid": os.getpid(),
+            }
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                record = self._load(path)
+                if record is None or self._is_stale(record, time.time()):
+                    path.unlink(missing_ok=True)
+                    continue
+                if record.get("fingerprint") != fingerprint:
+                    return CONFLICT, record
+                if record.get("status") == "completed":
+                    return REPLAY, record
+                return IN_PROGRESS, record
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(fast_json_dumps(pending))
+            return CLAIMED, pending
+        return IN_PROGRESS, None
+
+    def complete(self, scope: str, key: str, fingerprint: str, response: Dict[str, Any]) -> None:
+        """
+        保存执行成功的响应
+
+        Args:
+            scope: 请求范围
+            key: 幂等键
+            fingerprint: 请求内容指纹
+            response: 包含 status, headers, body 的响应
+        """
+        path = self._path(scope, key)
+        record = {
+            "status": "completed",
+            "fingerprint": fingerprint,
+            "completed_at": time.time(),
+            "response": response,
+        }
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            temp_path.write_text(fast_json_dumps(record), encoding="utf-8")
+            os.replace(temp_path, path)
+        except OSError as e:
+            self.logger.warning(f"保存幂等键记录失败: {key}: {e}")
+            path.unlink(missing_ok=True)
+
+    def release(self, scope: str, key: str) -> None:
+        """执行失败时释放幂等键，使重试重新执行"""
+        self._path(scope, key).unlink(missing_ok=True)
+
+    async def wait(self, scope: str, key: str, fingerprint: str, timeout: float) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        等待正在执行的相同请求完成
+
+        Returns:
+            与 begin 相同；超时仍未完成时返回 IN_PROGRESS
+        """
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+            outcome = await run_blocking(self.begin, scope, key, fingerprint)
+            if outcome[0] != IN_PROGRESS:
+                return outcome
+        return IN_PROGRESS, None
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """清除过期的响应和失效的 pending 标记，返回清除数量"""
+        scan = now is not None
+        now = time.time() if now is None else now
+        with self._lock:
+            if not scan and time.monotonic() - self._last_purge_scan < self.PURGE_SCAN_INTERVAL:
+                return 0
+            self._last_purge_scan = time.monotonic()
+        purged = 0
+        for path in self.keys_dir.glob("*.json"):
+            record = self._load(path)
+            if record is not None and self._is_stale(record, now):
+                path.unlink(missing_ok=True)
+                purged += 1
+        return purged
+
+
+def _request_key(scope: Dict[str, Any], body: bytes) -> Optional[str]:
+    """从请求头、查询参数或 JSON 请求体中读取幂等键"""
+    for name, value in scope.get("headers", []):
+        if name == IDEMPOTENCY_HEADER and value.strip():
+            return value.decode("latin-1").strip()
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    if query.get(IDEMPOTENCY_FIELD):
+        return query[IDEMPOTENCY_FIELD][0]
+    # 只有请求体中出现字段名时才解析 JSON
+    if IDEMPOTENCY_FIELD.encode() in body:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return None
+        if isinstance(payload, dict) and isinstance(payload.get(IDEMPOTENCY_FIELD), str):
+            return payload[IDEMPOTENCY_FIELD] or None
+    return None
+
+
+class IdempotencyMiddleware:
+    """
+    幂等键中间件（纯 ASGI 实现）
+
+    只处理 /api/ 下的 POST/PUT 请求；没有提供幂等键的请求原样转发
+    """
+
+    # 相同请求正在执行时，重复请求等待其完成的最长时间（秒）
+    WAIT_TIMEOUT = 120.0
+    METHODS = ("POST", "PUT")
+
+    def __init__(self, app, store: Optional[IdempotencyStore] = None):
+        self.app = app
+        self._store = store
+
+    @property
+    def store(self) -> IdempotencyStore:
+        if self._store is None:
+            self._store = get_idempotency_store()
+        return self._store
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.METHODS
+            or not scope["path"].startswith("/api/")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        # 读取完整请求体，之后重放给应用
+        chunks: List[bytes] = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                await self.app(scope, receive, send)
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        key = _request_key(scope, body)
+        if key is None:
+            await self.app(scope, replay_receive, send)
+            return
+
+        request_scope = f"{scope['method']} {scope['path']}"
+        fingerprint = hashlib.sha256(body).hexdigest()
+        store = self.store
+        # begin 会读写记录文件并定期扫描目录，放到线程池中执行
+        outcome, record = await run_blocking(store.begin, request_scope, key, fingerprint)
+        if outcome == IN_PROGRESS:
+            outcome, record = await store.wait(request_scope, key, fingerprint, self.WAIT_TIMEOUT)
+
+        if outcome == REPLAY:
+            await self._replay(record["response"], send)
+            return
+        if outcome in (CONFLICT, IN_PROGRESS):
+            reason = "已用于内容不同的请求" if outcome == CONFLICT else "对应的请求仍在处理中，请稍后重试"
+            await self._send_json(send, get_response_manager().error(
+                error_code=ErrorCode.IDEMPOTENCY_CONFLICT,
+                details={"idempotency_key": key, "reason": reason}
+            ))
+            return
+
+        # 由本请求执行：记录响应，成功时保存
+        response: Dict[str, Any] = {"status": 500, "headers": [], "body": []}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            store.release(request_scope, key)
+            raise
+
+        content = b"".join(response["body"])
+        if self._succeeded(response, content):
+            await run_blocking(store.complete, request_scope, key, fingerprint, {
+                "status": response["status"],
+                "headers": response["headers"],
+                "body": content.decode("utf-8"),
+            })
+        else:
+            store.release(request_scope, key)
+
+    @staticmethod
+    def _succeeded(response: Dict[str, Any], content: bytes) -> bool:
+        """2xx 的 JSON 响应且 error_code 为 SUCCESS（或没有 error_code）"""
+        if not 200 <= response["status"] < 300:
+            return False
+        content_type = next((value for name, value in response["headers"] if name.lower() == "content-type"), "")
+        if not content_type.startswith("application/json"):
+            return False
+        try:
+            payload = json.loads(content)
+        except ValueError:
+            return False
+        return not isinstance(payload, dict) or payload.get("error_code") in (None, ErrorCode.SUCCESS.value)
+
+    @staticmethod
+    async def _replay(response: Dict[str, Any], send) -> None:
+        body = response["body"].encode("utf-8")
+        headers = [
+            (name.encode("latin-1"), value.encode("latin-1"))
+            for name, value in response["headers"]
+            if name.lower() != "content-length"
+        ]
+        headers.append((b"content-length", str(len(body)).encode()))
+        headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": response["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _send_json(send, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# 全局单例实例
+_idempotency_store: Optional[IdempotencyStore] = None
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """
+    获取全局幂等键记录实例（单例模式）
+
+    Returns:
+        IdempotencyStore 实例
+    """
+    global _idempotency_store
+
+    if _idempotency_store is None:
+        _idempotency_store = IdempotencyStore()
+
+    return _idempotency_store
@@ -0,0 +1,94 @@
+"""
+延迟加载工具
+用于缩短 API 服务和 GUI 的启动时间：体积较大的模块（pyJianYingDraft 及其枚举表）
+和需要读取状态存储的全局管理器在第一次使用时才加载 / 创建。
+"""
+import importlib.util
+import sys
+import threading
+from types import ModuleType
+from typing import Any, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    延迟导入模块：返回的模块对象在第一次访问属性时才真正执行导入
+
+    使用示例:
+    ```python
+    draft = lazy_import("pyJianYingDraft")
+    ...
+    script = draft.ScriptFile(1920, 1080)  # 此时才导入 pyJianYingDraft
+    ```
+
+    Args:
+        name: 模块名
+
+    Returns:
+        模块对象（已导入时直接返回 sys.modules 中的模块）
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"找不到模块: {name}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class LazyObject(Generic[T]):
+    """
+    延迟创建的对象代理：第一次访问属性时调用 factory 创建对象，之后的属性读写都转发给该对象
+
+    用于路由模块中的全局管理器，导入路由模块时不创建管理器（不打开状态存储）。
+
+    使用示例:
+    ```python
+    segment_manager = LazyObject(get_segment_manager)
+    segment_manager.get_segment(segment_id)  # 此时才调用 get_segment_manager()
+    ```
+    """
+
+    __slots__ = ("_factory", "_instance", "_lock")
+
+    def __init__(self, factory: Callable[[], T]):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _resolve(self) -> T:
+        """返回被代理的对象（必要时创建）"""
+        instance = object.__getattribute__(self, "_instance")
+        if instance is None:
+            with object.__getattribute__(self, "_lock"):
+                instance = object.__getattribute__(self, "_instance")
+                if instance is None:
+                    instance = object.__getattribute__(self, "_factory")()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    @property
+    def is_loaded(self) -> bool:
+        """对象是否已创建"""
+        return object.__getattribute__(self, "_instance") is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._resolve(), name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(self._resolve(), name)
+
+    def __repr__(self) -> str:
+        if not self.is_loaded:
+            return f"<LazyObject {getattr(object.__getattribute__(self, '_factory'), '__name__', '?')} (未创建)>"
+        return repr(self._resolve())
@@ -0,0 +1,141 @@
+"""
+有界 LRU/TTL 缓存
+用于替代长期运行服务中无限增长的内存字典
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Iterator, Optional, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    线程安全的 LRU 缓存，可选 TTL 过期
+
+    功能:
+    1. 条目数超过 max_entries 时淘汰最久未使用的条目
+    2. 条目写入后超过 ttl 秒未被写入/读取即视为过期（ttl <= 0 表示不过期）
+    3. 统计命中、未命中、淘汰和过期次数，便于调整容量
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 0):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最大条目数
+            ttl: 条目存活时间（秒），<= 0 表示不过期
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        # 键 -> (值, 写入时间)
+        self._data: "OrderedDict[K, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expired(self, touched_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - touched_at > self.ttl
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """读取条目，命中时刷新其使用顺序和存活时间"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, touched_at = item
+            if self._expired(touched_at, now):
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data[key] = (value, now)
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: K, value: V) -> None:
+        """写入条目，必要时淘汰最久未使用的条目"""
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (value, now)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """移除并返回条目"""
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[0]
+
+    def purge_expired(self) -> int:
+        """清理所有过期条目，返回清理数量"""
+        if self.ttl <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (_, t) in self._data.items() if self._expired(t, now)]
+            for key in expired:
+                del self._data[key]
+            self.expirations += len(expired)
+            return len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: object) -> bool:
+        """是否包含未过期的条目（不影响统计和使用顺序）"""
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and not self._expired(item[1], time.monotonic())
+
+    def __getitem__(self, key: K) -> V:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: K, value: V) -> None:
+        self.put(key, value)
+
+    def __delitem__(self, key: K) -> None:
+        with self._lock:
+            del self._data[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def __iter__(self) -> Iterator[K]:
+        with self._lock:
+            return iter(list(self._data.keys()))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计
+
+        Returns:
+            包含 size, max_entries, ttl, hits, misses, evictions, expirations, hit_rate 的字典
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
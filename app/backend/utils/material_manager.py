@@ -2,14 +2,65 @@
 素材管理器
 负责下载网络素材到草稿的Assets文件夹，并创建对应的Material对象
 """
+from __future__ import annotations
+
 import os
+import threading
+import time
 import requests
 import hashlib
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Union, Optional, Dict, Any
+from typing import Union, Optional, Dict, Any, Tuple
 from urllib.parse import urlparse, unquote
-import pyJianYingDraft as draft
+from app.backend.config import get_config
+from app.backend.utils.http_client import get_http_client
+from app.backend.utils.lazy import lazy_import
 from app.backend.utils.logger import get_logger
+from app.backend.utils.material_store import MaterialStore, file_sha256, get_material_store
+from app.backend.utils.metrics import get_metrics
+from app.backend.utils.resumable_download import PARTIAL_SUFFIX, PartialDownload, is_partial_file
+from app.backend.utils.segmented_download import RangeNotSupported, download_segmented, should_split
+
+# 第一次创建素材时才导入 pyJianYingDraft
+draft = lazy_import("pyJianYingDraft")
+
+# 下载时从响应开头读取的字节数，用于识别文件类型和错误页面
+SNIFF_BYTES = 512
+# 小于该字节数的下载结果视为错误内容
+MIN_MATERIAL_SIZE = 100
+
+# 文件头签名: (判断函数, 素材类型, 扩展名, 名称)
+MAGIC_SIGNATURES = (
+    (lambda h: h.startswith(b'\xFF\xD8\xFF'), 'image', '.jpg', 'JPEG图片'),
+    (lambda h: h.startswith(b'\x89PNG\r\n\x1a\n'), 'image', '.png', 'PNG图片'),
+    (lambda h: h.startswith(b'GIF8'), 'image', '.gif', 'GIF图片'),
+    (lambda h: h.startswith(b'RIFF') and b'WEBP' in h[:16], 'image', '.webp', 'WEBP图片'),
+    (lambda h: h.startswith((b'\x00\x00\x00\x14ftypmp4', b'\x00\x00\x00\x18ftypmp4', b'\x00\x00\x00\x20ftypmp4')),
+     'video', '.mp4', 'MP4视频'),
+    (lambda h: h.startswith(b'ID3') or h.startswith(b'\xFF\xFB'), 'audio', '.mp3', 'MP3音频'),
+    (lambda h: h.startswith(b'RIFF') and b'WAVE' in h[:16], 'audio', '.wav', 'WAV音频'),
+)
+
+
+def sniff_media(header: bytes) -> Optional[Tuple[str, str, str]]:
+    """
+    根据文件头（魔术数字）识别素材
+    
+    Returns:
+        (素材类型, 扩展名, 名称)，无法识别时返回 None
+    """
+    for matches, material_type, ext, name in MAGIC_SIGNATURES:
+        if matches(header):
+            return material_type, ext, name
+    return None
+
+
+def looks_like_html(header: bytes) -> bool:
+    """文件开头是否为 HTML 页面（CDN 返回的错误页面）"""
+    content_start = header.decode('utf-8', errors='ignore')[:200].lower()
+    return '<html' in content_start or '<!doctype html' in content_start
 
 
 class MaterialManager:
@@ -20,7 +71,7 @@ class MaterialManager:
     1. 从URL下载素材到草稿的Assets文件夹
     2. 自动识别素材类型(视频/音频/图片)
     3. 创建对应的Material对象
-    4. 支持素材缓存(避免重复下载)
+    4. 支持素材缓存(避免重复下载)，下载过的素材存入全局素材缓存，所有草稿共用
     """
     
     def __init__(self, draft_folder_path: str, draft_name: str, project_id: Optional[str] = None):
@@ -57,6 +108,15 @@ class MaterialManager:
         
         # 素材缓存 {url: material_object}
         self.material_cache: Dict[str, Union[draft.VideoMaterial, draft.AudioMaterial]] = {}
+        # 目标文件锁 {文件名: Lock}：并发预取时不同 URL 得到相同文件名，按顺序下载 / 复用
+        self._file_locks: Dict[str, threading.Lock] = {}
+        self._file_locks_guard = threading.Lock()
+        # 下载时根据文件头识别的素材类型 {本地路径: 类型}，无法识别时为 None；创建素材时不再读取文件
+        self._sniffed_types: Dict[str, Optional[str]] = {}
+        # 分段并发下载（不小于该字节数且服务器支持 Range 的素材），0 表示不启用
+        config = get_config()
+        self.segmented_threshold = int(config.segmented_download_mb * 1024 * 1024)
+        self.segmented_parts = config.segmented_download_parts
         
         # 确保Assets文件夹存在
         self._ensure_assets_folder()
@@ -134,19 +194,24 @@ class MaterialManager:
         # 如果没有扩展名，使用Content-Type或生成唯一文件名
         if not filename or '.' not in filename:
             # 使用URL的MD5作为文件名
-            url_hash = hashlib.md5(url.encode()).hexdigest()[:12]
+            stem = self._get_default_stem(url)
             
             # 尝试从Content-Type获取扩展名
             if content_type:
                 ext = self._get_extension_from_content_type(content_type)
-                filename = f"material_{url_hash}{ext}"
+                filename = f"{stem}{ext}"
                 self.logger.info(f"根据Content-Type ({content_type}) 生成文件名: {filename}")
             else:
-                filename = f"material_{url_hash}.mp4"  # 默认为mp4
+                filename = f"{stem}.mp4"  # 默认为mp4
                 self.logger.warning(f"无法从URL提取文件名，使用默认mp4: {filename}")
         
         return filename
     
+    def _get_default_stem(self, url: str) -> str:
+        """URL没有文件名时使用的文件名（不含扩展名）"""
+        url_hash = hashlib.md5(url.encode()).hexdigest()[:12]
+        return f"material_{url_hash}"
+    
     def _detect_material_type(self, file_path: Path) -> str:
         """
         根据文件扩展名和文件头检测素材类型
@@ -175,99 +240,43 @@ class MaterialManager:
         if ext in image_exts:
             return 'image'
         
-        # 如果扩展名不明确，尝试检查文件头（魔术数字）
-        try:
-            with open(file_path, 'rb') as f:
-                header = f.read(16)  # 读取前16字节
-            
-            # 检查常见的文件头签名
-            if header.startswith(b'\xFF\xD8\xFF'):  # JPEG
-                self.logger.info(f"通过文件头检测到JPEG图片: {file_path.name}")
-                return 'image'
-            elif header.startswith(b'\x89PNG\r\n\x1a\n'):  # PNG
-                self.logger.info(f"通过文件头检测到PNG图片: {file_path.name}")
-                return 'image'
-            elif header.startswith(b'GIF8'):  # GIF
-                self.logger.info(f"通过文件头检测到GIF图片: {file_path.name}")
-                return 'image'
-            elif header.startswith(b'RIFF') and b'WEBP' in header:  # WEBP
-                self.logger.info(f"通过文件头检测到WEBP图片: {file_path.name}")
-                return 'image'
-            elif header.startswith((b'\x00\x00\x00\x14ftypmp4', b'\x00\x00\x00\x18ftypmp4', b'\x00\x00\x00\x20ftypmp4')):  # MP4
-                self.logger.info(f"通过文件头检测到MP4视频: {file_path.name}")
-                return 'video'
-            elif header.startswith(b'ID3') or header.startswith(b'\xFF\xFB'):  # MP3
-                self.logger.info(f"通过文件头检测到MP3音频: {file_path.name}")
-                return 'audio'
-            elif header.startswith(b'RIFF') and b'WAVE' in header:  # WAV
-                self.logger.info(f"通过文件头检测到WAV音频: {file_path.name}")
-                return 'audio'
-                
-        except Exception as e:
-            self.logger.warning(f"无法读取文件头进行类型检测: {e}")
-        
-        # 如果都不匹配，检查文件是否可能是HTML错误页面
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content_start = f.read(200).lower()
-                if '<html' in content_start or '<!doctype html' in content_start:
-                    self.logger.error(f"检测到HTML内容，可能下载了错误页面: {file_path.name}")
-                    raise ValueError(f"下载的文件是HTML页面而不是媒体文件: {file_path.name}")
-        except UnicodeDecodeError:
-            # 二进制文件，这是好的
-            pass
-        except ValueError as ve:
-            # 重新抛出HTML错误
-            if "HTML页面" in str(ve):
-                raise
-            # 其他ValueError继续处理
-            self.logger.debug(f"HTML内容检查出现ValueError: {ve}")
-        except Exception as e:
-            self.logger.debug(f"HTML内容检查出现异常（可能是正常的二进制文件）: {e}")
+        # 如果扩展名不明确，使用下载时识别的类型（HTML 错误页面在下载时已被拒绝），否则检查文件头
+        if str(file_path) in self._sniffed_types:
+            material_type = self._sniffed_types[str(file_path)]
+        else:
+            material_type = self._sniff_file(file_path)
+        if material_type:
+            return material_type
         
         # 默认当作视频，但给出警告
         self.logger.warning(f"未识别的文件格式 {ext}，默认作为视频处理")
         return 'video'
     
-    def _fix_filename_by_content(self, file_path: Path, original_filename: str) -> str:
+    def _sniff_file(self, file_path: Path) -> Optional[str]:
         """
-        根据文件实际内容修正文件名扩展名
+        读取文件头识别素材类型（用于不是由本管理器下载的文件）
         
-        Args:
-            file_path: 文件路径
-            original_filename: 原始文件名
-            
         Returns:
-            修正后的文件名
+            'video', 'audio', 'image'，无法识别时返回 None
+            
+        Raises:
+            ValueError: 文件是HTML页面
         """
         try:
             with open(file_path, 'rb') as f:
-                header = f.read(16)
-            
-            # 提取原始文件名（不含扩展名）
-            name_without_ext = Path(original_filename).stem
-            
-            # 根据文件头确定正确的扩展名
-            if header.startswith(b'\xFF\xD8\xFF'):  # JPEG
-                return f"{name_without_ext}.jpg"
-            elif header.startswith(b'\x89PNG\r\n\x1a\n'):  # PNG
-                return f"{name_without_ext}.png"
-            elif header.startswith(b'GIF8'):  # GIF
-                return f"{name_without_ext}.gif"
-            elif header.startswith(b'RIFF') and b'WEBP' in header:  # WEBP
-                return f"{name_without_ext}.webp"
-            elif header.startswith((b'\x00\x00\x00\x14ftypmp4', b'\x00\x00\x00\x18ftypmp4', b'\x00\x00\x00\x20ftypmp4')):  # MP4
-                return f"{name_without_ext}.mp4"
-            elif header.startswith(b'ID3') or header.startswith(b'\xFF\xFB'):  # MP3
-                return f"{name_without_ext}.mp3"
-            elif header.startswith(b'RIFF') and b'WAVE' in header:  # WAV
-                return f"{name_without_ext}.wav"
-            
+                header = f.read(SNIFF_BYTES)
         except Exception as e:
-            self.logger.warning(f"无法检查文件内容来修正扩展名: {e}")
+            self.logger.warning(f"无法读取文件头进行类型检测: {e}")
+            return None
         
-        # 如果无法确定，返回原始文件名
-        return original_filename
+        media = sniff_media(header)
+        if media is not None:
+            self.logger.info(f"通过文件头检测到{media[2]}: {file_path.name}")
+            return media[0]
+        if looks_like_html(header):
+            self.logger.error(f"检测到HTML内容，可能下载了错误页面: {file_path.name}")
+            raise ValueError(f"下载的文件是HTML页面而不是媒体文件: {file_path.name}")
+        return None
     
     def download_material(
         self, 
@@ -288,110 +297,172 @@ class MaterialManager:
             
         Raises:
             requests.RequestException: 下载失败
+            ValueError: 下载的内容不是媒体文件（过小或HTML页面）
         """
-        # 如果没有指定文件名,先发送HEAD请求获取Content-Type
-        content_type = None
+        # 全局素材缓存命中时直接链接到Assets文件夹，不再发送任何请求
+        store = get_material_store()
+        if store is not None and not force_download:
+            cached_path = store.get(url)
+            if cached_path is not None:
+                local_path = self._link_cached_material(store, cached_path, url, filename)
+                if local_path is not None:
+                    return local_path
+        
+        # 不发送HEAD请求：URL没有扩展名时，下载时根据响应的Content-Type和文件内容确定扩展名
         if filename is None:
-            try:
-                # 增加更长的超时时间和更好的请求头
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                }
-                head_response = requests.head(url, timeout=30, allow_redirects=True, headers=headers)
-                content_type = head_response.headers.get('Content-Type', None)
-                self.logger.debug(f"检测到Content-Type: {content_type}")
-            except Exception as e:
-                self.logger.warning(f"HEAD请求失败,将使用默认扩展名: {e}")
+            url_filename = os.path.basename(unquote(urlparse(url).path))
+            if url_filename and '.' in url_filename:
+                filename = url_filename
+        
+        with self._file_lock(filename or self._get_default_stem(url)):
+            # 检查文件是否已存在
+            existing_path = None if force_download else self._find_downloaded(url, filename)
+            if existing_path is not None:
+                self.logger.info(f"素材已存在，跳过下载: {existing_path.name}")
+                get_metrics().observe_download("material_manager", "cached")
+                return str(existing_path)
+            
+            local_path, digest = self._download_and_record(url, filename)
+            if store is not None:
+                store.add(url, local_path, digest=digest)
+            return local_path
+    
+    def _find_downloaded(self, url: str, filename: Optional[str]) -> Optional[Path]:
+        """查找已下载到Assets文件夹的素材（文件名未确定时按URL生成的文件名匹配任意扩展名）"""
+        if filename is not None:
+            target_path = self.assets_path / filename
+            return target_path if target_path.exists() else None
+        for path in self.assets_path.glob(f"{self._get_default_stem(url)}.*"):
+            if not is_partial_file(path):
+                return path
+        return None
+    
+    def _link_cached_material(
+        self,
+        store: MaterialStore,
+        cached_path: Path,
+        url: str,
+        filename: Optional[str]
+    ) -> Optional[str]:
+        """
+        把全局缓存中的素材链接到Assets文件夹
         
-        # 确定文件名
+        文件名按下载时的规则生成，扩展名以缓存的素材为准（与下载后根据内容修正的扩展名一致）
+        
+        Returns:
+            本地文件路径，缓存素材已被淘汰时返回 None
+        """
         if filename is None:
+            content_type = mimetypes.guess_type(f"material{cached_path.suffix}")[0]
             filename = self._get_filename_from_url(url, content_type)
+        target_path = self.assets_path / Path(filename).with_suffix(cached_path.suffix).name
         
-        # 目标路径
-        target_path = self.assets_path / filename
-        
-        # 检查文件是否已存在
-        if target_path.exists() and not force_download:
-            self.logger.info(f"素材已存在，跳过下载: {filename}")
-            return str(target_path)
-        
+        with self._file_lock(target_path.name):
+            if not target_path.exists() and not store.link(cached_path, target_path):
+                return None
+        get_metrics().observe_download("material_manager", "cached")
+        return str(target_path)
+    
+    def _file_lock(self, filename: str) -> threading.Lock:
+        """获取目标文件对应的锁"""
+        with self._file_locks_guard:
+            lock = self._file_locks.get(filename)
+            if lock is None:
+                lock = self._file_locks[filename] = threading.Lock()
+            return lock
+    
+    def _download_and_record(self, url: str, filename: Optional[str]) -> Tuple[str, str]:
+        """下载素材并记录下载指标，返回 (本地文件路径, 内容sha256)"""
         # 下载文件 - 添加重试机制
         self.logger.info(f"开始下载素材: {url}")
+        started = time.perf_counter()
+        try:
+            final_path, size, digest = self._download_with_retries(url, filename)
+        except Exception:
+            get_metrics().observe_download("material_manager", "failed", seconds=time.perf_counter() - started)
+            raise
+        get_metrics().observe_download(
+            "material_manager", "success", size=size, seconds=time.perf_counter() - started
+        )
+        return final_path, digest
+    
+    def _download_with_retries(self, url: str, filename: Optional[str]) -> Tuple[str, int, str]:
+        """
+        带重试地下载素材（根据文件内容可能修正扩展名）
+        
+        中断的下载保留临时文件，重试时（包括之后重新下载同一素材、服务重启后）用 Range 请求续传。
+        从头下载的大文件在服务器支持 Range 时分段并发下载（segmented_download_mb）。
+        
+        Args:
+            url: 素材URL
+            filename: 文件名，为 None 时根据响应的Content-Type生成
+        
+        Returns:
+            (下载后的本地文件路径, 文件大小, 内容sha256)
+        """
+        # 临时文件名在请求前确定（URL没有扩展名时不含扩展名），以便找到上次中断的下载
+        partial = PartialDownload(
+            url, self.assets_path / f"{filename or self._get_default_stem(url)}{PARTIAL_SUFFIX}"
+        )
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                # 更好的请求头和更长的超时时间
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                    'Accept': 'image/*,video/*,audio/*,*/*',
-                    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1'
-                }
-                
-                response = requests.get(
+                partial.load()
+                # 共享连接池；重试时依次换用备选请求头（部分 CDN 会拒绝特定 UA）
+                with get_http_client().get(
                     url, 
                     stream=True, 
                     timeout=60,  # 增加到60秒超时
-                    headers=headers,
-                    allow_redirects=True
-                )
-                response.raise_for_status()
-                
-                # 检查响应的Content-Type是否合理
-                actual_content_type = response.headers.get('Content-Type', '')
-                self.logger.debug(f"实际Content-Type: {actual_content_type}")
-                
-                # 创建临时文件先写入
-                temp_path = target_path.with_suffix(target_path.suffix + '.tmp')
-                
-                # 写入文件，增加进度监控
-                total_size = int(response.headers.get('Content-Length', 0))
-                downloaded_size = 0
-                
-                with open(temp_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded_size += len(chunk)
-                            
-                            # 每下载1MB打印一次进度（避免日志过多）
-                            if downloaded_size % (1024 * 1024) == 0:
-                                if total_size > 0:
-                                    progress = (downloaded_size / total_size) * 100
-                                    self.logger.debug(f"下载进度: {progress:.1f}% ({downloaded_size / 1024 / 1024:.1f}MB)")
+                    strategy=attempt,
+                    headers=partial.request_headers()
+                ) as response:
+                    offset = partial.begin(response)
+                    
+                    # 检查响应的Content-Type是否合理
+                    actual_content_type = response.headers.get('Content-Type', '')
+                    self.logger.debug(f"实际Content-Type: {actual_content_type}")
+                    name = filename or self._get_filename_from_url(url, actual_content_type)
+                    
+                    # 先写入临时文件；连接中断时保留已下载的部分用于续传
+                    try:
+                        if not offset and should_split(response, self.segmented_threshold):
+                            size, digest, media = self._download_segmented(url, response, partial, name, attempt)
+                        else:
+                            size, digest, media = self._stream_to_file(response, partial, name)
+                    except requests.RequestException:
+                        partial.interrupted()
+                        raise
+                    except BaseException:
+                        partial.discard()
+                        raise
                 
                 # 检查下载的文件大小是否合理
-                if temp_path.stat().st_size < 100:  # 小于100字节可能是错误页面
-                    self.logger.warning(f"下载的文件过小({temp_path.stat().st_size}字节)，可能是错误内容")
-                    temp_path.unlink()  # 删除临时文件
+                if size < MIN_MATERIAL_SIZE:  # 小于100字节可能是错误页面
+                    self.logger.warning(f"下载的文件过小({size}字节)，可能是错误内容")
+                    partial.discard()  # 删除临时文件
                     if attempt < max_retries - 1:
                         self.logger.info(f"第{attempt + 1}次尝试失败，等待2秒后重试...")
-                        import time
                         time.sleep(2)
                         continue
                     else:
                         raise ValueError("下载的文件过小，可能是错误内容")
                 
-                # 检查实际文件内容并修正扩展名（如果需要）
-                correct_filename = self._fix_filename_by_content(temp_path, filename)
-                if correct_filename != filename:
-                    self.logger.info(f"根据文件内容修正扩展名: {filename} -> {correct_filename}")
-                    final_path = self.assets_path / correct_filename
-                    temp_path.rename(final_path)
-                else:
-                    final_path = target_path
-                    temp_path.rename(final_path)
+                # 根据文件内容修正扩展名（如果需要）
+                if media is not None and f"{Path(name).stem}{media[1]}" != name:
+                    correct_filename = f"{Path(name).stem}{media[1]}"
+                    self.logger.info(f"根据文件内容修正扩展名: {name} -> {correct_filename}")
+                    name = correct_filename
+                final_path = self.assets_path / name
+                partial.complete(final_path)
+                self._sniffed_types[str(final_path)] = media[0] if media is not None else None
                 
-                self.logger.info(f"✅ 素材下载完成: {final_path.name} ({final_path.stat().st_size / 1024 / 1024:.2f} MB)")
-                return str(final_path)
+                self.logger.info(f"✅ 素材下载完成: {final_path.name} ({size / 1024 / 1024:.2f} MB)")
+                return str(final_path), size, digest
                 
             except requests.RequestException as e:
                 self.logger.warning(f"第{attempt + 1}次下载尝试失败: {e}")
                 if attempt < max_retries - 1:
                     self.logger.info(f"等待{(attempt + 1) * 2}秒后重试...")
-                    import time
                     time.sleep((attempt + 1) * 2)  # 递增等待时间
                 else:
                     self.logger.error(f"❌ 所有下载尝试均失败: {url}")
@@ -400,7 +471,6 @@ class MaterialManager:
                 self.logger.error(f"下载过程中发生未知错误: {e}")
                 if attempt < max_retries - 1:
                     self.logger.info(f"等待{(attempt + 1) * 2}秒后重试...")
-                    import time
                     time.sleep((attempt + 1) * 2)
                 else:
                     raise
@@ -408,6 +478,115 @@ class MaterialManager:
         # 如果所有重试都失败，这里不应该到达，但为了类型安全添加
         raise RuntimeError("下载失败：所有重试尝试均已用尽")
     
+    def _stream_to_file(
+        self,
+        response: requests.Response,
+        partial: PartialDownload,
+        name: str
+    ) -> Tuple[int, str, Optional[Tuple[str, str, str]]]:
+        """
+        把响应流式写入临时文件，同时在开头的数据上识别文件类型和HTML错误页面，并计算sha256
+        
+        识别到HTML页面时立即停止下载，不再读取剩余内容。续传时先读取已下载的部分
+        （计算sha256、取得文件开头），再追加写入剩余内容。
+        
+        Returns:
+            (文件大小, 内容sha256, 文件头识别结果 sniff_media)
+            
+        Raises:
+            ValueError: 下载的内容是HTML页面
+        """
+        downloaded_size = partial.offset
+        total_size = int(response.headers.get('Content-Length', 0)) + downloaded_size
+        if downloaded_size:
+            digest, header = partial.read_existing(SNIFF_BYTES)
+        else:
+            digest, header = hashlib.sha256(), b''
+        media = None
+        sniffed = False
+        
+        def check_header() -> None:
+            nonlocal media, sniffed
+            sniffed = True
+            media = self._inspect_header(header, name)
+        
+        if len(header) >= SNIFF_BYTES:
+            check_header()
+        with partial.open() as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                if not chunk:
+                    continue
+                if not sniffed:
+                    header += chunk[:SNIFF_BYTES - len(header)]
+                    if len(header) >= SNIFF_BYTES:
+                        check_header()
+                f.write(chunk)
+                digest.update(chunk)
+                downloaded_size += len(chunk)
+                
+                # 每下载1MB打印一次进度（避免日志过多）
+                if downloaded_size % (1024 * 1024) == 0:
+                    if total_size > 0:
+                        progress = (downloaded_size / total_size) * 100
+                        self.logger.debug(f"下载进度: {progress:.1f}% ({downloaded_size / 1024 / 1024:.1f}MB)")
+        
+        if not sniffed and header:
+            check_header()
+        return downloaded_size, digest.hexdigest(), media
+    
+    def _download_segmented(
+        self,
+        url: str,
+        response: requests.Response,
+        partial: PartialDownload,
+        name: str,
+        strategy: int
+    ) -> Tuple[int, str, Optional[Tuple[str, str, str]]]:
+        """
+        分段并发下载大文件（返回值同 _stream_to_file）
+        
+        服务器没有按 Range 返回时，在同一次尝试中改为单连接从头下载。
+        分段下载中断时不续传（临时文件中各段之间有空洞），下一次尝试从头下载。
+        """
+        media = None
+        
+        def inspect(header: bytes) -> None:
+            nonlocal media
+            media = self._inspect_header(header, name)
+        
+        try:
+            size = download_segmented(
+                url, response, partial.temp_path,
+                parts=self.segmented_parts, strategy=strategy,
+                inspect=inspect, inspect_size=SNIFF_BYTES
+            )
+        except RangeNotSupported as e:
+            self.logger.warning(f"{e}，改为单连接下载: {name}")
+            partial.discard()
+            with get_http_client().get(url, stream=True, timeout=60, strategy=strategy) as single:
+                partial.begin(single)
+                return self._stream_to_file(single, partial, name)
+        except requests.RequestException:
+            partial.discard()
+            raise
+        return size, file_sha256(partial.temp_path), media
+    
+    def _inspect_header(self, header: bytes, name: str) -> Optional[Tuple[str, str, str]]:
+        """
+        根据下载内容的开头识别文件类型
+        
+        Returns:
+            sniff_media 的识别结果
+            
+        Raises:
+            ValueError: 内容是HTML页面
+        """
+        media = sniff_media(header)
+        if media is None and looks_like_html(header):
+            self.logger.error(f"检测到HTML内容，可能下载了错误页面: {name}")
+            raise ValueError(f"下载的文件是HTML页面而不是媒体文件: {name}")
+        return media
+    
     def create_material(
         self,
         url: str,
@@ -555,6 +734,75 @@ class MaterialManager:
         self.logger.info(f"✅ 批量下载完成: {len(results)}/{len(urls)} 成功")
         return results
     
+    def prefetch_materials(
+        self,
+        urls: list[str],
+        max_workers: int = 4
+    ) -> Dict[str, Union[draft.VideoMaterial, draft.AudioMaterial, Exception]]:
+        """
+        并发下载素材并创建Material对象（结果写入 material_cache）
+        
+        下载在线程池中并发执行；解析素材信息（pymediainfo）不是线程安全的，
+        下载完成后按 URL 顺序逐个创建 Material 对象。之后按 URL 调用 create_material
+        直接从缓存返回，不再下载。
+        
+        Args:
+            urls: URL列表（重复的URL只下载一次）
+            max_workers: 同时下载的最大数量
+            
+        Returns:
+            {url: material} 映射字典，下载或创建失败的URL对应异常对象
+        """
+        results: Dict[str, Any] = {url: self.material_cache[url] for url in urls if url in self.material_cache}
+        pending = [url for url in dict.fromkeys(urls) if url not in results]
+        if not pending:
+            return results
+        
+        # URL 文件名相同的素材会下载到同一个文件（后下载的直接复用），按原顺序放在同一组依次下载，
+        # 保证结果与逐个下载一致
+        groups: Dict[str, list] = {}
+        for url in pending:
+            basename = os.path.basename(unquote(urlparse(url).path))
+            groups.setdefault(basename if '.' in basename else url, []).append(url)
+        
+        workers = max(1, min(max_workers, len(groups)))
+        self.logger.info(f"开始预取 {len(pending)} 个素材（并发数: {workers}）")
+        
+        def download_group(group: list) -> Dict[str, Any]:
+            downloaded = {}
+            for url in group:
+                try:
+                    downloaded[url] = self.download_material(url)
+                except Exception as e:
+                    self.logger.error(f"预取素材失败: {url} - {e}")
+                    downloaded[url] = e
+            return downloaded
+        
+        local_paths: Dict[str, Any] = {}
+        if workers == 1:
+            for group in groups.values():
+                local_paths.update(download_group(group))
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="material_prefetch") as executor:
+                for downloaded in executor.map(download_group, groups.values()):
+                    local_paths.update(downloaded)
+        
+        failed = 0
+        for url in pending:
+            local_path = local_paths[url]
+            if not isinstance(local_path, Exception):
+                try:
+                    results[url] = self.create_material_from_local_path(local_path, source_url=url)
+                    continue
+                except Exception as e:
+                    self.logger.error(f"创建素材失败: {url} - {e}")
+                    local_path = e
+            results[url] = local_path
+            failed += 1
+        
+        self.logger.info(f"✅ 素材预取完成: {len(pending) - failed}/{len(pending)} 成功")
+        return results
+    
     def get_material_info(self, url: str) -> Optional[Dict[str, Any]]:
         """
         获取已下载素材的信息
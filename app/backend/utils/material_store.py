@@ -0,0 +1,281 @@
+"""
+全局素材缓存
+按 URL + 内容哈希保存下载过的素材，所有草稿共用：同一个 BGM / Logo 被 500 个草稿使用时
+只下载、存储一次，各草稿的素材目录通过硬链接引用（无法创建硬链接时复制）
+
+目录结构（{material_store_dir}，默认 {cache_dir}/materials）:
+- objects/{哈希前两位}/{sha256}{扩展名}: 素材内容，文件名即内容哈希，相同内容只保存一份
+- urls/{哈希前两位}/{sha256(url)}: 记录 URL 对应的内容文件名
+
+缓存总大小超过 material_store_max_mb 时，按最后使用时间（内容文件的修改时间，命中时刷新）
+从旧到新删除。已链接到草稿目录的素材不受影响（硬链接或副本仍然保留）。
+所有状态都在文件系统中，多个 worker 进程可以共用同一个缓存目录。
+"""
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from app.backend.config import get_config
+from app.backend.utils.logger import get_logger
+
+PathLike = Union[str, Path]
+
+
+def file_sha256(path: PathLike, chunk_size: int = 1024 * 1024) -> str:
+    """计算文件内容的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(source: PathLike, target: PathLike) -> bool:
+    """
+    把 source 原子地放到 target（先写临时文件再改名）
+
+    Returns:
+        True 表示创建了硬链接，False 表示复制了文件（跨磁盘、文件系统不支持等）
+    """
+    target = Path(target)
+    temp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        os.link(source, temp_path)
+        linked = True
+    except OSError:
+        shutil.copyfile(source, temp_path)
+        linked = False
+    try:
+        os.replace(temp_path, target)
+    except OSError:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return linked
+
+
+class MaterialStore:
+    """
+    按内容寻址的全局素材缓存
+
+    使用示例:
+    ```python
+    store = get_material_store()
+    cached = store.get(url)
+    if cached is not None and store.link(cached, target_path):
+        return target_path          # 命中，不再下载
+    download(url, target_path)
+    store.add(url, target_path)
+    ```
+    """
+
+    def __init__(self, root: PathLike, max_bytes: int = 0):
+        """
+        初始化素材缓存
+
+        Args:
+            root: 缓存目录
+            max_bytes: 缓存总大小上限（字节），<= 0 表示不限制
+        """
+        self.logger = get_logger(__name__)
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.urls_dir = self.root / "urls"
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 缓存占用的字节数，第一次需要时扫描目录得到
+        self._total_bytes: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self.copies = 0
+
+    # ---------- 路径 ----------
+
+    def _url_ref_path(self, url: str) -> Path:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.urls_dir / key[:2] / key
+
+    def _object_path(self, digest: str, suffix: str) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}{suffix.lower()}"
+
+    def _ensure_scanned(self) -> int:
+        """返回缓存占用的字节数（调用方持有 _lock）"""
+        if self._total_bytes is None:
+            total = 0
+            if self.objects_dir.exists():
+                for path in self.objects_dir.glob("*/*"):
+                    try:
+                        total += path.stat().st_size
+                    except OSError:
+                        pass
+            self._total_bytes = total
+        return self._total_bytes
+
+    # ---------- 读写 ----------
+
+    def get(self, url: str) -> Optional[Path]:
+        """
+        查找 URL 对应的缓存素材（命中时刷新最后使用时间）
+
+        Returns:
+            缓存中的素材路径，未缓存时返回 None
+        """
+        ref_path = self._url_ref_path(url)
+        try:
+            object_name = ref_path.read_text(encoding="utf-8").strip()
+            object_path = self.objects_dir / object_name[:2] / object_name
+            os.utime(object_path)
+        except (OSError, ValueError):
+            # 未缓存，或内容文件已被淘汰
+            if ref_path.exists():
+                ref_path.unlink(missing_ok=True)
+            with self._lock:
+                self.misses += 1
+            return None
+        return object_path
+
+    def link(self, object_path: Path, target: PathLike) -> bool:
+        """
+        把缓存素材放到草稿素材目录（硬链接，失败时复制），计入命中
+
+        Returns:
+            是否成功（内容文件在查找后被淘汰时返回 False，调用方应重新下载）
+        """
+        try:
+            size = object_path.stat().st_size
+            linked = link_or_copy(object_path, target)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += size
+            if not linked:
+                self.copies += 1
+        self.logger.info(f"素材缓存命中: {Path(target).name}（{'硬链接' if linked else '复制'}）")
+        return True
+
+    def add(self, url: str, file_path: PathLike, digest: Optional[str] = None) -> Optional[Path]:
+        """
+        把下载完成的素材加入缓存（相同内容只保存一份）
+
+        Args:
+            url: 素材URL
+            file_path: 已下载的本地文件
+            digest: 文件内容的 sha256（下载时已计算的话传入，避免重新读取文件）
+
+        Returns:
+            缓存中的素材路径，失败时返回 None（不影响已下载的文件）
+        """
+        file_path = Path(file_path)
+        try:
+            digest = digest or file_sha256(file_path)
+            object_path = self._object_path(digest, file_path.suffix)
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            added = 0
+            if object_path.exists():
+                os.utime(object_path)
+            else:
+                link_or_copy(file_path, object_path)
+                added = object_path.stat().st_size
+
+            ref_path = self._url_ref_path(url)
+            ref_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_ref = ref_path.with_name(f".{ref_path.name}.{uuid.uuid4().hex[:8]}.tmp")
+            temp_ref.write_text(object_path.name, encoding="utf-8")
+            os.replace(temp_ref, ref_path)
+        except OSError as e:
+            self.logger.warning(f"加入素材缓存失败 {url}: {e}")
+            return None
+
+        with self._lock:
+            # 尚未扫描时，之后扫描会包含新加入的文件
+            if self._total_bytes is not None:
+                self._total_bytes += added
+        self.evict()
+        return object_path
+
+    def evict(self) -> int:
+        """
+        缓存超过大小上限时按最后使用时间从旧到新删除素材
+
+        Returns:
+            释放的字节数
+        """
+        if self.max_bytes <= 0:
+            return 0
+        with self._lock:
+            if self._ensure_scanned() <= self.max_bytes:
+                return 0
+            # 以磁盘上的文件为准（其他进程可能也在写入同一缓存）
+            entries = []
+            for path in self.objects_dir.glob("*/*"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            reclaimed = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                reclaimed += size
+                self.evictions += 1
+            self._total_bytes = total
+        if reclaimed:
+            self.logger.info(f"素材缓存淘汰 {reclaimed / 1024 / 1024:.1f} MB，当前 {total / 1024 / 1024:.1f} MB")
+        return reclaimed
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计（命中率、节省的下载字节数、占用空间）"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(list(self.objects_dir.glob("*/*"))) if self.objects_dir.exists() else 0,
+                "bytes": self._ensure_scanned(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "evictions": self.evictions,
+                "copies": self.copies,
+            }
+
+
+# 全局单例实例
+_material_store: Optional[MaterialStore] = None
+_store_lock = threading.Lock()
+
+
+def get_material_store() -> Optional[MaterialStore]:
+    """
+    获取全局素材缓存（单例模式）
+
+    Returns:
+        MaterialStore 实例，material_store_max_mb 为 0 时返回 None（不使用缓存）
+    """
+    global _material_store
+
+    config = get_config()
+    if config.material_store_max_mb <= 0:
+        return None
+    if _material_store is None:
+        with _store_lock:
+            if _material_store is None:
+                _material_store = MaterialStore(
+                    config.material_store_dir,
+                    max_bytes=int(config.material_store_max_mb * 1024 * 1024),
+                )
+
+    return _material_store
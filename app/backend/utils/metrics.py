@@ -0,0 +1,352 @@
+"""
+服务运行指标（Prometheus 文本格式）
+
+不依赖外部服务或 prometheus_client，在进程内记录：
+- 每个路由的请求数（按状态码和 ErrorCode 分类）、延迟直方图和进行中的请求数
+- 素材下载字节数和耗时
+- 草稿保存耗时
+- 各缓存的命中率（抓取时从注册的统计函数读取）
+
+由 /metrics 端点以 Prometheus 文本格式输出。多 worker 模式下每个进程各自统计。
+"""
+import contextvars
+import math
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 延迟直方图的默认桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 素材下载与草稿保存耗时的桶（秒）
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# 当前请求的状态，由中间件设置；APIResponseManager 生成错误响应时记录错误代码
+_request_state: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "jianying_request_state", default=None
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """带标签的指标基类"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0)]
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """分桶直方图，输出 _bucket / _sum / _count"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # 标签值 -> [各桶计数（非累计）, 总和, 总数]
+        self._values: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[2] if entry else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(entry[0]), entry[1], entry[2])) for key, entry in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    服务指标注册表
+
+    预先定义 HTTP 请求、素材下载、草稿保存指标；缓存命中率在抓取时
+    通过 register_cache 注册的统计函数读取
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._caches: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+        # HTTP 请求
+        self.http_requests = self.add(Counter(
+            "jianying_http_requests_total", "按路由、状态码和错误代码统计的请求数",
+            ("method", "route", "status", "error_code")
+        ))
+        self.http_latency = self.add(Histogram(
+            "jianying_http_request_duration_seconds", "按路由统计的请求耗时（秒）",
+            ("method", "route")
+        ))
+        self.http_in_flight = self.add(Gauge(
+            "jianying_http_requests_in_flight", "正在处理的请求数"
+        ))
+
+        # 素材下载
+        self.downloads = self.add(Counter(
+            "jianying_material_downloads_total", "素材下载次数（result: success/failed/cached）",
+            ("source", "result")
+        ))
+        self.download_bytes = self.add(Counter(
+            "jianying_material_download_bytes_total", "下载的素材字节数", ("source",)
+        ))
+        self.download_latency = self.add(Histogram(
+            "jianying_material_download_duration_seconds", "单个素材下载耗时（秒）",
+            ("source",), buckets=SLOW_BUCKETS
+        ))
+
+        # 草稿保存
+        self.saves = self.add(Counter(
+            "jianying_draft_saves_total", "草稿保存次数（result: success/failed）", ("result",)
+        ))
+        self.save_latency = self.add(Histogram(
+            "jianying_draft_save_duration_seconds", "草稿保存耗时（秒）", buckets=SLOW_BUCKETS
+        ))
+
+    def add(self, metric: _Metric) -> Any:
+        """注册自定义指标"""
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_cache(self, name: str, stats: Callable[[], Dict[str, Any]]) -> None:
+        """
+        注册缓存统计函数
+
+        Args:
+            name: 缓存名称（指标的 cache 标签）
+            stats: 返回包含 size, hits, misses 的字典（如 LRUCache.stats），
+                可选 bytes, bytes_saved
+        """
+        with self._lock:
+            self._caches[name] = stats
+
+    def observe_request(self, method: str, route: str, status: int, error_code: str, seconds: float) -> None:
+        """记录一次 HTTP 请求"""
+        self.http_requests.inc(method=method, route=route, status=status, error_code=error_code)
+        self.http_latency.observe(seconds, method=method, route=route)
+
+    def observe_download(self, source: str, result: str, size: int = 0, seconds: Optional[float] = None) -> None:
+        """
+        记录一次素材下载
+
+        Args:
+            source: 下载来源（material_manager / draft_saver）
+            result: success / failed / cached
+            size: 下载的字节数
+            seconds: 下载耗时，cached 时为 None
+        """
+        self.downloads.inc(source=source, result=result)
+        if size:
+            self.download_bytes.inc(size, source=source)
+        if seconds is not None:
+            self.download_latency.observe(seconds, source=source)
+
+    def observe_save(self, seconds: float, success: bool) -> None:
+        """记录一次草稿保存"""
+        self.saves.inc(result="success" if success else "failed")
+        self.save_latency.observe(seconds)
+
+    def _cache_samples(self) -> Iterable[str]:
+        with self._lock:
+            caches = sorted(self._caches.items())
+        rows = []
+        for name, stats in caches:
+            try:
+                rows.append((name, stats()))
+            except Exception:
+                continue
+        families = (
+            ("jianying_cache_hits_total", "counter", "缓存命中次数", lambda s: s.get("hits", 0)),
+            ("jianying_cache_misses_total", "counter", "缓存未命中次数", lambda s: s.get("misses", 0)),
+            ("jianying_cache_hit_ratio", "gauge", "缓存命中率", lambda s: s.get("hit_rate", 0.0)),
+            ("jianying_cache_entries", "gauge", "缓存条目数", lambda s: s.get("size", 0)),
+        )
+        for name, kind, documentation, value in families:
+            yield f"# HELP {name} {documentation}"
+            yield f"# TYPE {name} {kind}"
+            for cache, stats in rows:
+                yield f"{name}{_format_labels(('cache',), (cache,))} {_format_value(value(stats))}"
+        # 只有部分缓存（如全局素材缓存）统计占用字节数和节省的下载字节数
+        byte_families = (
+            ("jianying_cache_bytes", "gauge", "缓存占用的字节数", "bytes"),
+            ("jianying_cache_saved_bytes_total", "counter", "缓存命中节省的下载字节数", "bytes_saved"),
+        )
+        for name, kind, documentation, key in byte_families:
+            byte_rows = [(cache, stats[key]) for cache, stats in rows if key in stats]
+            if not byte_rows:
+                continue
+            yield f"# HELP {name} {documentation}"
+            yield f"# TYPE {name} {kind}"
+            for cache, value in byte_rows:
+                yield f"{name}{_format_labels(('cache',), (cache,))} {_format_value(value)}"
+
+    def render(self) -> str:
+        """以 Prometheus 文本格式输出所有指标"""
+        with self._lock:
+            metrics = list(self._metrics)
+        parts = [metric.render() for metric in metrics]
+        parts.append("\n".join(self._cache_samples()))
+        return "\n".join(parts) + "\n"
+
+
+def begin_request() -> Tuple[Dict[str, Any], contextvars.Token]:
+    """开始记录请求状态（中间件调用），返回状态字典和用于恢复的 token"""
+    state: Dict[str, Any] = {"error_code": None}
+    return state, _request_state.set(state)
+
+
+def end_request(token: contextvars.Token) -> None:
+    """结束记录请求状态"""
+    _request_state.reset(token)
+
+
+def record_error_code(error_code: Any) -> None:
+    """记录当前请求返回的错误代码（不在请求中时忽略）"""
+    state = _request_state.get()
+    if state is not None:
+        state["error_code"] = getattr(error_code, "value", error_code)
+
+
+# 全局单例实例
+_metrics_registry: Optional[MetricsRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    获取全局指标注册表（单例模式）
+
+    Returns:
+        MetricsRegistry 实例
+    """
+    global _metrics_registry
+
+    if _metrics_registry is None:
+        with _registry_lock:
+            if _metrics_registry is None:
+                _metrics_registry = MetricsRegistry()
+
+    return _metrics_registry
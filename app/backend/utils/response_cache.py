@@ -0,0 +1,188 @@
+"""
+查询端点的条件请求与响应缓存
+
+轮询类查询端点（草稿状态、片段详情）根据草稿/片段的版本生成 ETag 和 Last-Modified：
+- 客户端带 If-None-Match / If-Modified-Since 且状态未变化时返回 304，不构建响应
+- 状态未变化时直接返回缓存的序列化响应体，不重新构建和序列化响应模型
+- 状态变化后 ETag 随之变化，旧的缓存条目不再命中，并在下一次请求时被覆盖
+"""
+import hashlib
+import json
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.backend.config import get_config
+from app.backend.utils.logger import get_logger
+from app.backend.utils.lru_cache import LRUCache
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    根据版本信息生成强 ETag
+
+    Args:
+        *parts: 能唯一确定响应内容的版本信息（可 JSON 序列化）
+
+    Returns:
+        带引号的 ETag 字符串
+    """
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+def http_date(timestamp: float) -> str:
+    """把时间戳格式化为 HTTP 日期（用于 Last-Modified）"""
+    return formatdate(timestamp, usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[float]) -> bool:
+    """
+    判断条件请求是否可以返回 304
+
+    If-None-Match 优先；没有 If-None-Match 时才比较 If-Modified-Since。
+    HTTP 日期精度为秒，同一秒内的多次修改只能通过 ETag 区分
+
+    Args:
+        request: 请求对象
+        etag: 当前 ETag
+        last_modified: 当前最后修改时间戳
+
+    Returns:
+        客户端缓存仍然有效时返回 True
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # 弱比较：忽略 W/ 前缀
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        candidates = {tag[2:] if tag.startswith("W/") else tag for tag in tags}
+        return etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+class ResponseCache:
+    """
+    序列化响应缓存
+
+    以 key（如 ("draft_status", draft_id)）缓存 (etag, 序列化响应体)，
+    只有请求时计算出的 ETag 与缓存条目一致才命中
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        """
+        初始化响应缓存
+
+        Args:
+            max_entries: 最大缓存条目数，默认读取配置 response_cache_size
+        """
+        self.logger = get_logger(__name__)
+        if max_entries is None:
+            max_entries = get_config().response_cache_size
+        self._cache: LRUCache[Tuple[str, str], Tuple[str, bytes]] = LRUCache(max_entries=max_entries)
+        self.not_modified = 0
+
+    @staticmethod
+    def _headers(etag: str, last_modified: Optional[float]) -> Dict[str, str]:
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if last_modified:
+            headers["Last-Modified"] = http_date(last_modified)
+        return headers
+
+    def lookup(
+        self,
+        request: Request,
+        key: Tuple[str, str],
+        etag: str,
+        last_modified: Optional[float] = None
+    ) -> Optional[Response]:
+        """
+        尝试不构建响应直接应答
+
+        Args:
+            request: 请求对象
+            key: 缓存键
+            etag: 根据当前状态计算的 ETag
+            last_modified: 当前最后修改时间戳
+
+        Returns:
+            304 响应或缓存的响应；都不适用时返回 None，调用方需构建响应后调用 store
+        """
+        headers = self._headers(etag, last_modified)
+        if is_not_modified(request, etag, last_modified):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == etag:
+            return Response(content=cached[1], media_type="application/json", headers=headers)
+        return None
+
+    def store(
+        self,
+        key: Tuple[str, str],
+        etag: str,
+        last_modified: Optional[float],
+        payload: Any
+    ) -> Response:
+        """
+        序列化响应并写入缓存
+
+        Args:
+            key: 缓存键
+            etag: 与 payload 对应的 ETag
+            last_modified: 最后修改时间戳
+            payload: 响应模型实例
+
+        Returns:
+            带 ETag / Last-Modified 的 JSON 响应
+        """
+        body = JSONResponse(content=jsonable_encoder(payload)).body
+        self._cache.put(key, (etag, body))
+        return Response(content=body, media_type="application/json", headers=self._headers(etag, last_modified))
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计
+
+        Returns:
+            LRU 缓存统计，以及返回 304 的次数 not_modified
+        """
+        stats = self._cache.stats()
+        stats["not_modified"] = self.not_modified
+        return stats
+
+
+# 全局单例实例
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    获取全局响应缓存实例（单例模式）
+
+    Returns:
+        ResponseCache 实例
+    """
+    global _response_cache
+
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+
+    return _response_cache
@@ -0,0 +1,199 @@
+"""
+断点续传
+下载中断时保留临时文件（{目标文件}.tmp）和续传状态（{目标文件}.tmp.json），
+之后的重试、重新保存草稿或服务重启后用 Range 请求从断点继续下载。
+
+If-Range 携带第一次响应的 ETag（没有强 ETag 时用 Last-Modified）：服务器上的文件
+已经变化时服务器返回完整内容，从头下载。两者都没有的响应无法安全续传，中断后从头下载。
+"""
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import IO, Any, Dict, Optional, Tuple, Union
+
+import requests
+
+from app.backend.utils.logger import get_logger
+
+# 下载中的临时文件和续传状态文件的后缀
+PARTIAL_SUFFIX = ".tmp"
+STATE_SUFFIX = ".tmp.json"
+
+_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+def is_partial_file(path: Union[str, Path]) -> bool:
+    """是否为下载中的临时文件或续传状态文件"""
+    return str(path).endswith((PARTIAL_SUFFIX, STATE_SUFFIX))
+
+
+def range_validator(headers: Any) -> Optional[str]:
+    """If-Range 使用的校验值：强 ETag 优先，其次 Last-Modified"""
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def content_range_start(headers: Any) -> Optional[int]:
+    """206 响应的 Content-Range 起始位置"""
+    match = _CONTENT_RANGE.match(headers.get("Content-Range", ""))
+    return int(match.group(1)) if match else None
+
+
+class PartialDownload:
+    """
+    一个下载目标的断点续传状态
+
+    使用示例:
+    ```python
+    partial = PartialDownload(url, target_path + PARTIAL_SUFFIX)
+    partial.load()
+    with session.get(url, stream=True, headers=partial.request_headers()) as response:
+        offset = partial.begin(response)        # 0 表示从头写入
+        with partial.open() as f:
+            for chunk in response.iter_content(64 * 1024):
+                f.write(chunk)
+    partial.complete(target_path)
+    ```
+    中断（requests.RequestException）时不调用 complete，临时文件和状态保留到下一次下载。
+    """
+
+    def __init__(self, url: str, temp_path: Union[str, Path]):
+        """
+        初始化续传状态
+
+        Args:
+            url: 素材URL（状态文件中的 URL 不同时不续传）
+            temp_path: 下载中的临时文件路径（以 PARTIAL_SUFFIX 结尾）
+        """
+        self.logger = get_logger(__name__)
+        self.url = url
+        self.temp_path = Path(temp_path)
+        self.state_path = Path(f"{temp_path}.json")
+        self.state: Dict[str, Any] = {}
+        self.offset = 0
+
+    @property
+    def resumable(self) -> bool:
+        """中断后能否续传（第一次响应带有 ETag / Last-Modified）"""
+        return bool(self.state)
+
+    def load(self) -> int:
+        """
+        读取磁盘上的续传状态
+
+        Returns:
+            可以续传的字节数，0 表示从头下载
+        """
+        self.state, self.offset = {}, 0
+        try:
+            state = json.loads(self.state_path.read_text(encoding="utf-8"))
+            size = self.temp_path.stat().st_size
+        except (OSError, ValueError):
+            return 0
+        total = state.get("total")
+        if state.get("url") != self.url or not state.get("validator") or size == 0 or (total and size >= total):
+            self.discard()
+            return 0
+        self.state, self.offset = state, size
+        return size
+
+    def request_headers(self) -> Dict[str, str]:
+        """续传时请求剩余部分的请求头"""
+        if not self.offset:
+            return {}
+        return {"Range": f"bytes={self.offset}-", "If-Range": self.state["validator"]}
+
+    def begin(self, response: requests.Response) -> int:
+        """
+        检查响应并确定写入位置（代替 response.raise_for_status）
+
+        Returns:
+            从哪个字节开始写入：服务器按断点返回 206 时为断点位置，否则为 0（从头下载）
+
+        Raises:
+            requests.HTTPError: 响应状态码表示错误
+        """
+        if response.status_code == 416:
+            # 断点超出文件大小（服务器上的文件变小了），下次从头下载
+            self.discard()
+        response.raise_for_status()
+
+        if self.offset and response.status_code == 206 and content_range_start(response.headers) == self.offset:
+            self.logger.info(f"从 {self.offset / 1024 / 1024:.2f} MB 处继续下载: {self.temp_path.name}")
+            return self.offset
+        if self.offset:
+            self.logger.info(f"服务器上的文件已变化或不支持续传，从头下载: {self.temp_path.name}")
+
+        self.offset = 0
+        validator = range_validator(response.headers)
+        if validator:
+            self.state = {
+                "url": self.url,
+                "validator": validator,
+                "total": int(response.headers.get("Content-Length", 0)) or None,
+            }
+            temp_state = self.state_path.with_name(self.state_path.name + ".new")
+            temp_state.write_text(json.dumps(self.state), encoding="utf-8")
+            os.replace(temp_state, self.state_path)
+        else:
+            self.state = {}
+            self.state_path.unlink(missing_ok=True)
+        return 0
+
+    def open(self) -> IO[bytes]:
+        """打开临时文件：续传时定位到断点（丢弃断点之后的内容），否则清空"""
+        if not self.offset:
+            return open(self.temp_path, "wb")
+        f = open(self.temp_path, "r+b")
+        f.seek(self.offset)
+        f.truncate()
+        return f
+
+    def read_existing(self, prefix_size: int = 0) -> Tuple["hashlib._Hash", bytes]:
+        """
+        读取已下载的部分（续传时使用）
+
+        Returns:
+            (已下载部分的 sha256 对象, 文件开头 prefix_size 字节)
+        """
+        digest = hashlib.sha256()
+        prefix = b""
+        remaining = self.offset
+        with open(self.temp_path, "rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                if len(prefix) < prefix_size:
+                    prefix += chunk[:prefix_size - len(prefix)]
+                digest.update(chunk)
+                remaining -= len(chunk)
+        return digest, prefix
+
+    def interrupted(self) -> bool:
+        """
+        下载中断时调用：能续传时保留临时文件，否则删除
+
+        Returns:
+            是否保留了临时文件
+        """
+        if self.resumable:
+            return True
+        self.discard()
+        return False
+
+    def complete(self, target: Union[str, Path]) -> None:
+        """下载完成：临时文件改名为目标文件，删除续传状态"""
+        os.replace(self.temp_path, target)
+        self.state_path.unlink(missing_ok=True)
+        self.state, self.offset = {}, 0
+
+    def discard(self) -> None:
+        """删除临时文件和续传状态"""
+        self.temp_path.unlink(missing_ok=True)
+        self.state_path.unlink(missing_ok=True)
+        self.state, self.offset = {}, 0
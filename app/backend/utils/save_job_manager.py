@@ -0,0 +1,340 @@
+"""
+异步保存任务管理器
+保存请求立即返回任务 ID，草稿在保存线程池中生成；客户端通过任务状态接口或
+SSE 进度流查看下载的素材数、已构建的片段数和写出的字节数。
+结束的任务保留 save_job_retention 秒后清除。
+
+任务快照同时写入 {cache_dir}/save_jobs/{job_id}.json，多 worker 进程部署时，
+查询请求落到没有执行该任务的进程也能读取到任务状态。快照记录执行任务的进程 ID，
+该进程退出（崩溃或重启）时未结束的任务视为失败；未结束超过 save_job_stale_timeout 秒的任务同样清除。
+"""
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.backend.config import get_config
+from app.backend.database.serializer import fast_json_dumps, fast_json_loads
+from app.backend.utils.blocking_io import get_save_executor
+from app.backend.utils.draft_saver import get_draft_saver
+from app.backend.utils.draft_state_manager import get_draft_state_manager
+from app.backend.utils.idempotency import process_alive
+from app.backend.utils.logger import get_logger
+from app.backend.utils.settings_manager import get_settings_manager
+
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED)
+
+# 本进程的标识：进程 ID 可能被重启后的进程复用（如容器中的 1 号进程），同时记录该标识加以区分
+PROCESS_TOKEN = uuid.uuid4().hex
+
+
+class SaveJobManager:
+    """
+    异步保存任务管理器
+
+    使用示例:
+    ```python
+    manager = get_save_job_manager()
+    job = manager.submit(draft_id)
+    snapshot = manager.get_job(job["job_id"])
+    ```
+    """
+
+    # 进度变化写入共享目录的最小间隔（秒），状态变化总是立即写入
+    PERSIST_INTERVAL = 0.2
+    # 扫描共享目录清除过期任务的最小间隔（秒）
+    PURGE_SCAN_INTERVAL = 60.0
+
+    def __init__(
+        self,
+        retention: Optional[float] = None,
+        jobs_dir: Optional[str] = None,
+        stale_timeout: Optional[float] = None,
+    ):
+        """
+        初始化任务管理器
+
+        Args:
+            retention: 结束的任务保留时间（秒），None 时使用配置
+            jobs_dir: 任务快照目录，None 时使用 {cache_dir}/save_jobs
+            stale_timeout: 未结束的任务的最长保留时间（秒），None 时使用配置
+        """
+        self.logger = get_logger(__name__)
+        self.retention = get_config().save_job_retention if retention is None else retention
+        self.stale_timeout = get_config().save_job_stale_timeout if stale_timeout is None else stale_timeout
+        self.jobs_dir = Path(jobs_dir or os.path.join(get_config().cache_dir, "save_jobs"))
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._persisted_at: Dict[str, float] = {}
+        self._last_purge_scan = 0.0
+
+    # ---------- 任务状态 ----------
+
+    @staticmethod
+    def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+        snapshot = dict(job)
+        snapshot["progress"] = dict(job["progress"])
+        return snapshot
+
+    def _job_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _persist(self, job: Dict[str, Any], force: bool = True) -> None:
+        """将任务快照写入共享目录（调用方持有 _lock）"""
+        now = time.time()
+        if not force and now - self._persisted_at.get(job["job_id"], 0.0) < self.PERSIST_INTERVAL:
+            return
+        path = self._job_path(job["job_id"])
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            temp_path.write_text(fast_json_dumps(job), encoding="utf-8")
+            os.replace(temp_path, path)
+            self._persisted_at[job["job_id"]] = now
+        except OSError as e:
+            self.logger.warning(f"写入保存任务快照失败: {job['job_id']}: {e}")
+
+    def _load_persisted(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            return fast_json_loads(path.read_bytes())
+        except (OSError, ValueError):
+            return None
+
+    def _is_expired(self, job: Dict[str, Any], now: float) -> bool:
+        if job.get("finished_at") is None:
+            return now - job["created_at"] > self.stale_timeout
+        return now - job["finished_at"] > self.retention
+
+    def _check_owner(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        其他进程的未结束任务：执行任务的进程已退出时标记为失败并写回共享目录（调用方持有 _lock）
+
+        进程 ID 与本进程相同但标识不同时，是重启前使用了相同进程 ID 的进程留下的
+        """
+        if job["status"] in FINISHED_STATES:
+            return job
+        pid = job.get("pid")
+        if pid == os.getpid():
+            exited = job.get("process_token") != PROCESS_TOKEN
+        else:
+            exited = pid is not None and process_alive(pid) is False
+        if exited:
+            job["status"] = JOB_FAILED
+            job["progress"]["stage"] = "failed"
+            job["error"] = "执行保存任务的进程已退出"
+            job["finished_at"] = time.time()
+            job["revision"] += 1
+            self._persist(job)
+        return job
+
+    def _update(self, job_id: str, progress: Optional[Dict[str, Any]] = None, **fields: Any) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            if progress:
+                job["progress"].update(progress)
+            job["revision"] += 1
+            self._persist(job)
+
+    def _on_progress(self, job_id: str, event: str, **data: Any) -> None:
+        """DraftSaver 进度回调"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            progress = job["progress"]
+            if event == "started":
+                progress["total_segments"] = data.get("total_segments", 0)
+                progress["stage"] = "building"
+            elif event == "material_downloaded":
+                progress["materials_downloaded"] += 1
+                progress["bytes_downloaded"] += data.get("bytes", 0)
+            elif event == "segment_built":
+                progress["segments_built"] += 1
+            elif event == "written":
+                progress["bytes_written"] = data.get("bytes_written", 0)
+                progress["stage"] = "written"
+            job["revision"] += 1
+            self._persist(job, force=False)
+
+    # ---------- 提交与执行 ----------
+
+    def submit(self, draft_id: str) -> Dict[str, Any]:
+        """
+        提交保存任务（同一草稿已有未结束的任务时直接返回该任务）
+
+        Args:
+            draft_id: 草稿 UUID
+
+        Returns:
+            任务快照
+        """
+        self.purge_expired()
+        with self._lock:
+            for job in self._jobs.values():
+                if job["draft_id"] == draft_id and job["status"] not in FINISHED_STATES:
+                    return self._snapshot(job)
+            # 其他 worker 进程中未结束的同一草稿的任务
+            now = time.time()
+            for job in self._persisted_jobs():
+                if (
+                    job["draft_id"] == draft_id
+                    and job["status"] not in FINISHED_STATES
+                    and not self._is_expired(job, now)
+                ):
+                    return job
+
+            job_id = str(uuid.uuid4())
+            job = {
+                "job_id": job_id,
+                "draft_id": draft_id,
+                "status": JOB_QUEUED,
+                "progress": {
+                    "stage": "queued",
+                    "total_segments": 0,
+                    "segments_built": 0,
+                    "materials_downloaded": 0,
+                    "bytes_downloaded": 0,
+                    "bytes_written": 0,
+                },
+                "draft_path": "",
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "revision": 0,
+                "pid": os.getpid(),
+                "process_token": PROCESS_TOKEN,
+            }
+            self._jobs[job_id] = job
+            self._persist(job)
+            snapshot = self._snapshot(job)
+
+        get_save_executor().submit(self._run, job_id)
+        self.logger.info(f"已提交保存任务: {job_id} (草稿: {draft_id})")
+        return snapshot
+
+    def _run(self, job_id: str) -> None:
+        """在保存线程池中执行保存任务"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            draft_id = job["draft_id"]
+        self._update(job_id, {"stage": "preparing"}, status=JOB_RUNNING, started_at=time.time())
+
+        try:
+            draft_manager = get_draft_state_manager()
+            # 写回缓存中尚未落盘的草稿配置，并重新加载路径设置
+            draft_manager.flush(draft_id)
+            get_settings_manager().reload()
+
+            draft_path = get_draft_saver().save_draft(
+                draft_id,
+                progress=lambda event, **data: self._on_progress(job_id, event, **data)
+            )
+
+            # 版本冲突时 modify_draft 会自动重试，不需要持有路由中的草稿锁
+            draft_manager.modify_draft(draft_id, lambda latest: latest.update(status="saved"))
+            draft_manager.flush(draft_id)
+
+            self._update(
+                job_id, {"stage": "done"},
+                status=JOB_COMPLETED, draft_path=draft_path, finished_at=time.time()
+            )
+            self.logger.info(f"保存任务完成: {job_id} -> {draft_path}")
+        except Exception as e:
+            self.logger.error(f"保存任务失败: {job_id}: {e}", exc_info=True)
+            self._update(
+                job_id, {"stage": "failed"},
+                status=JOB_FAILED, error=str(e), finished_at=time.time()
+            )
+
+    # ---------- 查询 ----------
+
+    def _persisted_jobs(self) -> List[Dict[str, Any]]:
+        """读取共享目录中不属于本进程的任务快照（调用方持有 _lock）"""
+        jobs = []
+        for path in self.jobs_dir.glob("*.json"):
+            if path.stem in self._jobs:
+                continue
+            job = self._load_persisted(path)
+            if job is not None:
+                jobs.append(self._check_owner(job))
+        return jobs
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务快照，任务不存在或已过期时返回 None"""
+        self.purge_expired()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._snapshot(job)
+
+        # 由其他 worker 进程执行的任务
+        job = self._load_persisted(self._job_path(job_id))
+        if job is None:
+            return None
+        with self._lock:
+            job = self._check_owner(job)
+        return None if self._is_expired(job, time.time()) else job
+
+    def list_jobs(self, draft_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """列出任务（按创建时间倒序）"""
+        self.purge_expired()
+        now = time.time()
+        with self._lock:
+            jobs = [self._snapshot(job) for job in self._jobs.values()]
+            jobs.extend(job for job in self._persisted_jobs() if not self._is_expired(job, now))
+        jobs = [job for job in jobs if draft_id is None or job["draft_id"] == draft_id]
+        jobs.sort(key=lambda job: job["created_at"], reverse=True)
+        return jobs
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """清除结束超过保留时间、或未结束超过 stale_timeout 的任务，返回清除数量"""
+        scan_shared = now is not None
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if self._is_expired(job, now)]
+            for job_id in expired:
+                del self._jobs[job_id]
+                self._persisted_at.pop(job_id, None)
+                self._job_path(job_id).unlink(missing_ok=True)
+
+            # 其他进程的过期快照（定期扫描）
+            if scan_shared or time.monotonic() - self._last_purge_scan >= self.PURGE_SCAN_INTERVAL:
+                self._last_purge_scan = time.monotonic()
+                for job in self._persisted_jobs():
+                    if self._is_expired(job, now):
+                        self._job_path(job["job_id"]).unlink(missing_ok=True)
+                        expired.append(job["job_id"])
+        return len(expired)
+
+
+# 全局单例实例
+_save_job_manager: Optional[SaveJobManager] = None
+
+
+def get_save_job_manager() -> SaveJobManager:
+    """
+    获取全局保存任务管理器实例（单例模式）
+
+    Returns:
+        SaveJobManager 实例
+    """
+    global _save_job_manager
+
+    if _save_job_manager is None:
+        _save_job_manager = SaveJobManager()
+
+    return _save_job_manager
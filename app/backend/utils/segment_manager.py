@@ -3,13 +3,15 @@
 管理基于 UUID 的片段配置、状态和操作
 """
 import os
-import json
+import threading
 import uuid
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 from app.backend.utils.logger import get_logger
+from app.backend.utils.lru_cache import LRUCache
 from app.backend.config import get_config
+from app.backend.database.state_store import StateStore, create_state_store, get_state_store
 
 
 class SegmentManager:
@@ -18,40 +20,77 @@ class SegmentManager:
     
     功能:
     1. 创建和管理基于 UUID 的片段配置
-    2. 存储片段状态到文件系统
+    2. 通过可插拔的状态存储后端（文件 / SQLite）持久化片段状态
     3. 支持片段的增删改查操作
     4. 追踪片段的下载和处理状态
+    5. 内存中只保留有界的 LRU/TTL 缓存，淘汰的片段按需从存储后端重新加载
+    6. 缓存命中时比较存储的修改标记，修改在 segment_lock 中重新读取后写入，
+       多个 worker 进程共享同一存储时各自的视图保持一致
     """
     
-    def __init__(self, base_dir: Optional[str] = None):
+    def __init__(self, base_dir: Optional[str] = None, store: Optional[StateStore] = None):
         """
         初始化片段状态管理器
         
         Args:
             base_dir: 片段存储的基础目录，如果为 None 则使用配置系统的默认路径
+            store: 状态存储后端，如果为 None 则根据 base_dir 和配置自动选择
         """
         self.logger = get_logger(__name__)
         
         # 如果没有指定 base_dir，使用配置系统的默认路径
+        if store is None:
+            store = get_state_store() if base_dir is None else create_state_store(base_dir=base_dir)
+        config = get_config()
         if base_dir is None:
-            config = get_config()
             base_dir = config.segments_dir
         
+        self.store = store
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(parents=True, exist_ok=True)
         
-        # 内存中的片段状态存储
-        self.segments: Dict[str, Dict[str, Any]] = {}
+        # 内存中的片段缓存（有界）
+        self.segments: LRUCache[str, Dict[str, Any]] = LRUCache(
+            max_entries=config.segment_cache_size,
+            ttl=config.segment_cache_ttl
+        )
+        # 缓存片段时存储的修改标记
+        self._stamps: LRUCache[str, Any] = LRUCache(
+            max_entries=config.segment_cache_size,
+            ttl=config.segment_cache_ttl
+        )
         
-        self.logger.info(f"片段状态管理器已初始化: {self.base_dir}")
+        # 路由在线程池中调用管理器，修改同一片段的缓存对象时需要加锁
+        self._write_lock = threading.RLock()
+        
+        self.logger.info(f"片段状态管理器已初始化: {self.base_dir} (后端: {self.store.backend_name})")
+    
+    @staticmethod
+    def _new_operation(
+        operation_type: str, operation_data: Dict[str, Any], operation_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """构造一条操作记录"""
+        return {
+            "operation_id": operation_id or str(uuid.uuid4()),
+            "operation_type": operation_type,
+            "data": operation_data,
+            "timestamp": datetime.now().timestamp()
+        }
     
-    def create_segment(self, segment_type: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    def create_segment(
+        self,
+        segment_type: str,
+        config: Dict[str, Any],
+        operations: Optional[List[Tuple[str, Dict[str, Any]]]] = None
+    ) -> Dict[str, Any]:
         """
         创建新的片段
         
         Args:
             segment_type: 片段类型 (audio/video/text/sticker/effect/filter)
             config: 片段配置
+            operations: 可选的初始操作列表 [(operation_type, operation_data), ...]，
+                与创建后逐个调用 add_operation 的结果相同，但只写入一次
             
         Returns:
             包含 segment_id 和成功状态的字典
@@ -71,19 +110,24 @@ class SegmentManager:
                 "local_path": None,
                 "created_timestamp": timestamp,
                 "last_modified": timestamp,
-                "operations": []  # 记录对片段的操作
+                "operations": [  # 记录对片段的操作
+                    self._new_operation(operation_type, operation_data)
+                    for operation_type, operation_data in (operations or [])
+                ]
             }
             
+            # 持久化
+            self.store.save_segment(segment_id, segment_data)
+            
             # 保存到内存
             self.segments[segment_id] = segment_data
-            
-            # 保存配置文件
-            segment_file = self.base_dir / f"{segment_id}.json"
-            with open(segment_file, 'w', encoding='utf-8') as f:
-                json.dump(segment_data, f, ensure_ascii=False, indent=2)
+            self._stamps[segment_id] = self.store.segment_stamp(segment_id)
             
             self.logger.info(f"片段创建成功: {segment_id} (类型: {segment_type})")
             
+            if segment_data["download_status"] == "pending":
+                self._schedule_download(segment_id, config["material_url"])
+            
             return {
                 "segment_id": segment_id,
                 "success": True,
@@ -98,6 +142,55 @@ class SegmentManager:
                 "message": f"创建片段失败: {str(e)}"
             }
     
+    def _schedule_download(self, segment_id: str, url: str) -> None:
+        """在后台下载片段素材，下载过程中更新 download_status / local_path（未启用时保存草稿时再下载）"""
+        # download_queue 通过 DraftSaver 下载，而 DraftSaver 导入了本模块
+        from app.backend.utils.download_queue import get_download_queue
+        
+        queue = get_download_queue()
+        if queue is not None:
+            queue.submit(url, lambda status, local_path: self.update_download_status(segment_id, status, local_path))
+    
+    def _prefetched_owners(self) -> Dict[str, List[str]]:
+        """已下载片段的 local_path -> 片段 ID 列表"""
+        owners: Dict[str, List[str]] = {}
+        summaries = self.store.segment_summaries(self.store.segments_by_download_status("completed"))
+        for segment_id, summary in summaries.items():
+            if summary.get("local_path"):
+                owners.setdefault(summary["local_path"], []).append(segment_id)
+        return owners
+    
+    def release_prefetched(self, materials: List[Tuple[Optional[str], Optional[str]]]) -> None:
+        """
+        释放后台下载的素材文件（按引用计数）
+        
+        片段保存到草稿后 local_path 改为草稿素材目录中的文件，片段删除后不再引用；
+        后台下载目录中的文件不再被任何片段的 local_path 引用时删除。删除时恰好又有片段
+        引用该文件（刚完成的同一 URL 的片段），则把这些片段重置为 pending 并重新下载。
+        
+        Args:
+            materials: (素材 URL, 本地路径) 列表，不在后台下载目录中的文件忽略
+        """
+        # download_queue 通过 DraftSaver 下载，而 DraftSaver 导入了本模块
+        from app.backend.utils.download_queue import get_download_queue
+        
+        queue = get_download_queue()
+        if queue is None:
+            return
+        materials = [(url, path) for url, path in materials if url and path and queue.is_prefetched(path)]
+        if not materials:
+            return
+        try:
+            owners = self._prefetched_owners()
+            for url, path in materials:
+                if owners.get(path) or not queue.release(url, path):
+                    continue
+                for segment_id in self._prefetched_owners().get(path, []):
+                    self.update_download_status(segment_id, "pending")
+                    self._schedule_download(segment_id, url)
+        except Exception as e:
+            self.logger.error(f"释放后台下载的素材失败: {str(e)}")
+    
     def get_segment(self, segment_id: str) -> Optional[Dict[str, Any]]:
         """
         获取片段配置
@@ -108,24 +201,35 @@ class SegmentManager:
         Returns:
             片段配置字典，如果不存在返回 None
         """
-        if segment_id in self.segments:
-            return self.segments[segment_id]
+        segment_data = self.segments.get(segment_id)
+        if segment_data is not None:
+            # 存储的修改标记未变时直接命中，否则说明其他进程修改过，重新加载
+            if self.store.segment_stamp(segment_id) == self._stamps.get(segment_id):
+                return segment_data
         
-        # 尝试从文件加载
-        segment_file = self.base_dir / f"{segment_id}.json"
-        if segment_file.exists():
-            try:
-                with open(segment_file, 'r', encoding='utf-8') as f:
-                    segment_data = json.load(f)
-                    self.segments[segment_id] = segment_data
-                    return segment_data
-            except Exception as e:
-                self.logger.error(f"加载片段配置失败: {str(e)}")
-                return None
+        # 缓存未命中，从存储后端加载
+        try:
+            stamp = self.store.segment_stamp(segment_id)
+            segment_data = self.store.load_segment(segment_id)
+        except Exception as e:
+            self.logger.error(f"加载片段配置失败: {str(e)}")
+            return None
         
-        return None
+        if segment_data is not None:
+            self.segments[segment_id] = segment_data
+            self._stamps[segment_id] = stamp
+        else:
+            self.segments.pop(segment_id, None)
+            self._stamps.pop(segment_id, None)
+        return segment_data
     
-    def add_operation(self, segment_id: str, operation_type: str, operation_data: Dict[str, Any]) -> bool:
+    def add_operation(
+        self,
+        segment_id: str,
+        operation_type: str,
+        operation_data: Dict[str, Any],
+        operation_id: Optional[str] = None
+    ) -> bool:
         """
         添加片段操作记录
         
@@ -133,34 +237,29 @@ class SegmentManager:
             segment_id: 片段 UUID
             operation_type: 操作类型 (add_effect/add_fade/add_keyframe等)
             operation_data: 操作数据
+            operation_id: 操作记录 ID，默认生成新的 UUID（批量操作预先生成，失败时据此撤销）
             
         Returns:
             是否成功
         """
-        segment = self.get_segment(segment_id)
-        if not segment:
-            self.logger.error(f"片段不存在: {segment_id}")
-            return False
-        
         try:
-            # 生成操作 ID
-            operation_id = str(uuid.uuid4())
-            
-            # 添加操作记录
-            operation = {
-                "operation_id": operation_id,
-                "operation_type": operation_type,
-                "data": operation_data,
-                "timestamp": datetime.now().timestamp()
-            }
+            # 生成操作记录
+            operation = self._new_operation(operation_type, operation_data, operation_id)
             
-            segment["operations"].append(operation)
-            segment["last_modified"] = datetime.now().timestamp()
-            
-            # 保存到文件
-            segment_file = self.base_dir / f"{segment_id}.json"
-            with open(segment_file, 'w', encoding='utf-8') as f:
-                json.dump(segment, f, ensure_ascii=False, indent=2)
+            # 先取存储锁再取缓存锁（与 store.transaction() 中创建片段的顺序一致）
+            with self.store.segment_lock(segment_id), self._write_lock:
+                # 锁内重新读取，包含其他进程刚写入的操作
+                segment = self.get_segment(segment_id)
+                if not segment:
+                    self.logger.error(f"片段不存在: {segment_id}")
+                    return False
+                
+                segment["operations"].append(operation)
+                segment["last_modified"] = datetime.now().timestamp()
+                
+                # 持久化（只追加新的操作记录）
+                self.store.append_operation(segment_id, segment, operation)
+                self._stamps[segment_id] = self.store.segment_stamp(segment_id)
             
             self.logger.info(f"为片段 {segment_id} 添加操作: {operation_type}")
             return True
@@ -169,6 +268,43 @@ class SegmentManager:
             self.logger.error(f"添加操作失败: {str(e)}")
             return False
     
+    def remove_operations(self, segment_id: str, operation_ids: List[str]) -> bool:
+        """
+        删除片段的指定操作记录（批量操作失败时撤销已添加的操作）
+        
+        Args:
+            segment_id: 片段 UUID
+            operation_ids: 要删除的操作记录 ID
+            
+        Returns:
+            是否成功
+        """
+        try:
+            removed = set(operation_ids)
+            with self.store.segment_lock(segment_id), self._write_lock:
+                segment = self.get_segment(segment_id)
+                if not segment:
+                    self.logger.error(f"片段不存在: {segment_id}")
+                    return False
+                
+                operations = [op for op in segment["operations"] if op.get("operation_id") not in removed]
+                if len(operations) == len(segment["operations"]):
+                    # 已随存储事务回滚，或从未写入
+                    return True
+                segment["operations"] = operations
+                segment["last_modified"] = datetime.now().timestamp()
+                
+                # 重写快照（同时丢弃操作日志）
+                self.store.save_segment(segment_id, segment)
+                self._stamps[segment_id] = self.store.segment_stamp(segment_id)
+            
+            self.logger.info(f"撤销片段 {segment_id} 的 {len(removed)} 个操作")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"撤销操作失败: {str(e)}")
+            return False
+    
     def update_download_status(self, segment_id: str, status: str, local_path: Optional[str] = None) -> bool:
         """
         更新片段的下载状态
@@ -176,26 +312,26 @@ class SegmentManager:
         Args:
             segment_id: 片段 UUID
             status: 下载状态 (pending/downloading/completed/failed)
-            local_path: 本地文件路径
+            local_path: 本地文件路径（status 为 pending 时清除原路径，表示需要重新下载）
             
         Returns:
             是否成功
         """
-        segment = self.get_segment(segment_id)
-        if not segment:
-            self.logger.error(f"片段不存在: {segment_id}")
-            return False
-        
         try:
-            segment["download_status"] = status
-            if local_path:
-                segment["local_path"] = local_path
-            segment["last_modified"] = datetime.now().timestamp()
-            
-            # 保存到文件
-            segment_file = self.base_dir / f"{segment_id}.json"
-            with open(segment_file, 'w', encoding='utf-8') as f:
-                json.dump(segment, f, ensure_ascii=False, indent=2)
+            with self.store.segment_lock(segment_id), self._write_lock:
+                segment = self.get_segment(segment_id)
+                if not segment:
+                    self.logger.error(f"片段不存在: {segment_id}")
+                    return False
+                
+                segment["download_status"] = status
+                if local_path or status == "pending":
+                    segment["local_path"] = local_path
+                segment["last_modified"] = datetime.now().timestamp()
+                
+                # 持久化
+                self.store.save_segment(segment_id, segment)
+                self._stamps[segment_id] = self.store.segment_stamp(segment_id)
             
             self.logger.info(f"更新片段 {segment_id} 下载状态: {status}")
             return True
@@ -214,21 +350,63 @@ class SegmentManager:
         Returns:
             片段列表
         """
+        # 使用存储后端的片段摘要索引，无需加载完整片段
+        summaries = self.store.segment_summaries(self.store.list_segment_ids())
         segments = []
-        for segment_id, segment_data in self.segments.items():
-            if segment_type is None or segment_data["segment_type"] == segment_type:
+        for segment_id, summary in summaries.items():
+            if segment_type is None or summary["segment_type"] == segment_type:
                 segments.append({
                     "segment_id": segment_id,
-                    "segment_type": segment_data["segment_type"],
-                    "status": segment_data["status"],
-                    "download_status": segment_data["download_status"],
-                    "created_timestamp": segment_data["created_timestamp"]
+                    "segment_type": summary["segment_type"],
+                    "status": summary["status"],
+                    "download_status": summary["download_status"],
+                    "created_timestamp": summary["created_timestamp"]
                 })
         
         # 按创建时间倒序排序
         segments.sort(key=lambda x: x["created_timestamp"], reverse=True)
         return segments
     
+    def get_segment_summaries(self, segment_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量获取片段摘要（类型、状态、下载状态、素材 URL 等），不加载 config 和 operations
+        
+        Args:
+            segment_ids: 片段 UUID 列表
+            
+        Returns:
+            segment_id -> 摘要字典，不存在的片段不出现在结果中
+        """
+        try:
+            return self.store.segment_summaries(segment_ids)
+        except Exception as e:
+            self.logger.error(f"获取片段摘要失败: {str(e)}")
+            return {}
+    
+    def list_segments_by_download_status(self, status: str) -> List[str]:
+        """
+        列出处于指定下载状态的片段 ID
+        
+        Args:
+            status: 下载状态 (pending/downloading/completed/failed/none)
+            
+        Returns:
+            片段 UUID 列表
+        """
+        return self.store.segments_by_download_status(status)
+    
+    def get_referencing_drafts(self, segment_id: str) -> List[str]:
+        """
+        列出引用了指定片段的草稿
+        
+        Args:
+            segment_id: 片段 UUID
+            
+        Returns:
+            草稿 UUID 列表
+        """
+        return self.store.segment_drafts(segment_id)
+    
     def delete_segment(self, segment_id: str) -> bool:
         """
         删除片段
@@ -240,14 +418,17 @@ class SegmentManager:
             是否成功
         """
         try:
+            segment = self.get_segment(segment_id)
+            
             # 从内存中删除
-            if segment_id in self.segments:
-                del self.segments[segment_id]
+            self.segments.pop(segment_id)
+            self._stamps.pop(segment_id, None)
             
-            # 删除文件
-            segment_file = self.base_dir / f"{segment_id}.json"
-            if segment_file.exists():
-                segment_file.unlink()
+            # 从存储后端删除
+            self.store.delete_segment(segment_id)
+            if segment is not None:
+                url = segment.get("config", {}).get("material_url")
+                self.release_prefetched([(url, segment.get("local_path"))])
             
             self.logger.info(f"片段删除成功: {segment_id}")
             return True
@@ -255,6 +436,15 @@ class SegmentManager:
         except Exception as e:
             self.logger.error(f"删除片段失败: {str(e)}")
             return False
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        获取片段缓存统计
+        
+        Returns:
+            包含 size, hits, misses, evictions, expirations, hit_rate 等字段的字典
+        """
+        return self.segments.stats()
 
 
 # 全局片段管理器实例
@@ -0,0 +1,153 @@
+"""
+分段并发下载
+CDN 对单个连接限速时，把大文件按字节范围分成多段，用多个连接同时下载，
+各段写入预先分配好大小的临时文件的对应位置。
+
+只对声明了 Accept-Ranges: bytes、Content-Length 不小于阈值的 200 响应启用（见 should_split）。
+第一段直接读取已经打开的响应，其余各段用 Range 请求（If-Range 携带 ETag / Last-Modified）；
+任一段没有按 Range 返回时抛出 RangeNotSupported，由调用方改为单连接下载。
+"""
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, Union
+
+import requests
+
+from app.backend.utils.http_client import get_http_client
+from app.backend.utils.logger import get_logger
+from app.backend.utils.resumable_download import content_range_start, range_validator
+
+logger = get_logger(__name__)
+
+# 每段至少这么大，避免小文件分出过多的段
+MIN_SEGMENT_SIZE = 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+
+
+class RangeNotSupported(Exception):
+    """服务器没有按 Range 请求返回指定范围"""
+
+
+class _Cancelled(Exception):
+    """其他段失败，停止下载"""
+
+
+def should_split(response: requests.Response, threshold: int) -> bool:
+    """
+    响应是否适合分段下载
+
+    Args:
+        response: 从头开始的 GET 响应（尚未读取内容）
+        threshold: 启用分段下载的最小字节数，<= 0 表示不启用
+    """
+    if threshold <= 0 or response.status_code != 200:
+        return False
+    if response.headers.get("Accept-Ranges", "").lower() != "bytes":
+        return False
+    if "Content-Encoding" in response.headers and response.headers["Content-Encoding"] != "identity":
+        return False
+    return int(response.headers.get("Content-Length", 0) or 0) >= threshold
+
+
+def split_ranges(total: int, parts: int) -> List[Tuple[int, int]]:
+    """把 [0, total) 分成最多 parts 段，返回 [(起始, 结束（不含）)]"""
+    parts = max(1, min(parts, total // MIN_SEGMENT_SIZE or 1))
+    size = -(-total // parts)
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+def download_segmented(
+    url: str,
+    response: requests.Response,
+    temp_path: Union[str, Path],
+    parts: int = 4,
+    strategy: int = 0,
+    inspect: Optional[Callable[[bytes], None]] = None,
+    inspect_size: int = 512,
+    timeout: float = 60,
+) -> int:
+    """
+    分段并发下载到临时文件
+
+    Args:
+        url: 素材URL
+        response: 已打开的完整内容响应（should_split 为 True），用于下载第一段
+        temp_path: 临时文件路径（预先分配为完整大小）
+        parts: 最多同时下载的段数
+        strategy: 请求头策略序号
+        inspect: 收到文件开头 inspect_size 字节时调用（识别文件类型、拒绝错误页面，抛出异常即停止下载）
+        inspect_size: inspect 需要的字节数
+        timeout: 每个请求的超时（秒）
+
+    Returns:
+        文件大小
+
+    Raises:
+        RangeNotSupported: 服务器没有按 Range 返回（临时文件内容不完整，调用方应从头单连接下载）
+        requests.RequestException: 某一段下载失败
+    """
+    total = int(response.headers["Content-Length"])
+    ranges = split_ranges(total, parts)
+    validator = range_validator(response.headers)
+    cancelled = threading.Event()
+    logger.info(f"分段下载 {total / 1024 / 1024:.1f} MB，{len(ranges)} 段: {Path(temp_path).name}")
+
+    with open(temp_path, "wb") as f:
+        f.truncate(total)
+
+    def write_range(source: requests.Response, start: int, end: int, first: bool) -> None:
+        position = start
+        header = b""
+        with open(temp_path, "r+b") as f:
+            f.seek(start)
+            for chunk in source.iter_content(chunk_size=CHUNK_SIZE):
+                if cancelled.is_set():
+                    raise _Cancelled()
+                chunk = chunk[:end - position]
+                if first and inspect is not None and len(header) < inspect_size:
+                    header += chunk[:inspect_size - len(header)]
+                    if len(header) >= min(inspect_size, end):
+                        inspect(header)
+                f.write(chunk)
+                position += len(chunk)
+                if position >= end:
+                    break
+        if position < end:
+            raise requests.exceptions.ChunkedEncodingError(f"分段下载不完整: {position - start}/{end - start} 字节")
+
+    def fetch(start: int, end: int) -> None:
+        headers = {"Range": f"bytes={start}-{end - 1}"}
+        if validator:
+            headers["If-Range"] = validator
+        try:
+            with get_http_client().get(url, stream=True, timeout=timeout, strategy=strategy, headers=headers) as part:
+                part.raise_for_status()
+                if part.status_code != 206 or content_range_start(part.headers) != start:
+                    raise RangeNotSupported(f"服务器未按 Range 返回（状态码 {part.status_code}）")
+                write_range(part, start, end, first=False)
+        except BaseException:
+            # 任一段失败时立即停止其他段
+            cancelled.set()
+            raise
+
+    with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="segmented_download") as executor:
+        futures = [executor.submit(fetch, start, end) for start, end in ranges[1:]]
+        try:
+            # 第一段直接读取已经打开的响应（读完后关闭，剩余内容由其他段下载）
+            try:
+                write_range(response, *ranges[0], first=True)
+            finally:
+                response.close()
+            wait(futures, return_when=FIRST_EXCEPTION)
+        except _Cancelled:
+            pass
+        except BaseException:
+            cancelled.set()
+            raise
+
+    for future in futures:
+        error = future.exception()
+        if error is not None and not isinstance(error, _Cancelled):
+            raise error
+    return total
@@ -0,0 +1,304 @@
+"""
+状态清理器
+定期清理长期无人使用的草稿、片段和素材目录，回收磁盘空间
+
+清理规则（均可通过环境变量配置，见 AppConfig）:
+1. 草稿: 从未保存（status != "saved"）且超过 gc_draft_ttl 未修改
+2. 片段: 没有任何草稿引用（通过 segment_drafts 索引判断）且超过 gc_segment_ttl 未修改
+3. 素材目录 assets/{draft_id}: 对应草稿已不存在且超过 gc_assets_ttl 未修改；
+   如果素材目录总大小超过 gc_assets_quota_mb，再按最后修改时间从旧到新删除，
+   跳过最近仍在编辑的草稿
+4. 后台下载目录 assets/prefetched 不属于任何草稿，不按草稿素材目录清理；
+   只删除其中没有片段引用（local_path）且超过 gc_assets_ttl 未修改的文件
+
+多 worker 部署时只有持有 {cache_dir}/state_sweeper.lock 的进程执行定时清理。
+"""
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.backend.config import get_config
+from app.backend.database.state_store import FileStateStore
+from app.backend.utils.download_queue import PREFETCHED_DIR_NAME
+from app.backend.utils.draft_state_manager import DraftStateManager, get_draft_state_manager
+from app.backend.utils.logger import get_logger
+from app.backend.utils.segment_manager import SegmentManager, get_segment_manager
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+def _path_size(path: Path) -> int:
+    """文件或目录的总字节数"""
+    if not path.exists():
+        return 0
+    if path.is_file():
+        return path.stat().st_size
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class StateSweeper:
+    """
+    状态清理器
+
+    使用示例:
+    ```python
+    report = get_state_sweeper().sweep()
+    print(report["reclaimed_bytes"])
+    ```
+    """
+
+    def __init__(
+        self,
+        draft_manager: Optional[DraftStateManager] = None,
+        segment_manager: Optional[SegmentManager] = None,
+        assets_dir: Optional[str] = None
+    ):
+        """
+        初始化清理器
+
+        Args:
+            draft_manager: 草稿状态管理器，默认使用全局实例
+            segment_manager: 片段管理器，默认使用全局实例
+            assets_dir: 本地素材根目录，默认使用配置系统的 assets 目录
+        """
+        self.logger = get_logger(__name__)
+        config = get_config()
+        self.draft_manager = draft_manager or get_draft_state_manager()
+        self.segment_manager = segment_manager or get_segment_manager()
+        self.assets_dir = Path(assets_dir or config.assets_dir)
+        self.lock_path = Path(config.cache_dir) / "state_sweeper.lock"
+
+        self.interval = config.gc_interval
+        self.draft_ttl = config.gc_draft_ttl
+        self.segment_ttl = config.gc_segment_ttl
+        self.assets_ttl = config.gc_assets_ttl
+        self.assets_quota_bytes = int(config.gc_assets_quota_mb * 1024 * 1024)
+
+        self._lock = threading.Lock()
+        self.last_report: Optional[Dict[str, Any]] = None
+        self.total_reclaimed_bytes = 0
+        self._lock_file = None
+
+    def acquire_leader_lock(self) -> bool:
+        """
+        多 worker 部署时只让一个进程执行定时清理
+
+        对 lock_path 加非阻塞排他锁，成功后一直持有到进程退出；持有锁的进程退出后，
+        其他进程下次调用时接手
+
+        Returns:
+            本进程是否持有锁
+        """
+        if self._lock_file is not None:
+            return True
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.lock_path, 'a+b')
+        try:
+            if sys.platform == "win32":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        return True
+
+    # ---------- 单项清理 ----------
+
+    def _state_size(self, kind: str, item_id: str) -> int:
+        """file 后端的状态文件大小（sqlite 后端的空间由数据库自行复用，计为 0）"""
+        store = self.draft_manager.store if kind == "draft" else self.segment_manager.store
+        if not isinstance(store, FileStateStore):
+            return 0
+        if kind == "draft":
+            return _path_size(store.drafts_dir / item_id)
+        return _path_size(store._segment_path(item_id)) + _path_size(store._journal_path(item_id))
+
+    def sweep_drafts(self, now: float) -> Tuple[List[str], int]:
+        """清理从未保存且过期的草稿"""
+        deleted, reclaimed = [], 0
+        if self.draft_ttl <= 0:
+            return deleted, reclaimed
+
+        # drafts_by_last_modified 升序，遇到未过期的草稿即可停止
+        for draft_id in self.draft_manager.store.drafts_by_last_modified(descending=False):
+            config = self.draft_manager.get_draft_config(draft_id)
+            if config is None:
+                continue
+            if now - (config.get("last_modified") or 0) <= self.draft_ttl:
+                break
+            if config.get("status") == "saved" or self.draft_manager.is_draft_locked(draft_id):
+                continue
+            size = self._state_size("draft", draft_id)
+            if self.draft_manager.delete_draft(draft_id):
+                deleted.append(draft_id)
+                reclaimed += size
+        return deleted, reclaimed
+
+    def sweep_segments(self, now: float) -> Tuple[List[str], int]:
+        """清理没有被任何草稿引用且过期的片段"""
+        deleted, reclaimed = [], 0
+        if self.segment_ttl <= 0:
+            return deleted, reclaimed
+
+        store = self.segment_manager.store
+        summaries = store.segment_summaries(store.list_segment_ids())
+        for segment_id, summary in summaries.items():
+            touched = summary.get("last_modified") or summary.get("created_timestamp") or 0
+            if now - touched <= self.segment_ttl:
+                continue
+            if store.segment_drafts(segment_id):
+                continue
+            size = self._state_size("segment", segment_id)
+            if self.segment_manager.delete_segment(segment_id):
+                deleted.append(segment_id)
+                reclaimed += size
+        return deleted, reclaimed
+
+    def sweep_assets(self, now: float) -> Tuple[List[str], int]:
+        """清理失去草稿的素材目录，并把素材目录总大小控制在配额以内"""
+        deleted, reclaimed = [], 0
+        if not self.assets_dir.exists():
+            return deleted, reclaimed
+
+        folders = []
+        for entry in os.scandir(self.assets_dir):
+            if entry.name == PREFETCHED_DIR_NAME:
+                reclaimed += self._sweep_prefetched(Path(entry.path), now)
+            elif entry.is_dir():
+                folders.append((entry.stat().st_mtime, Path(entry.path)))
+        folders.sort()
+
+        live = set(self.draft_manager.list_all_drafts())
+        remaining = []
+        for mtime, folder in folders:
+            if self.assets_ttl > 0 and folder.name not in live and now - mtime > self.assets_ttl:
+                size = _path_size(folder)
+                shutil.rmtree(folder, ignore_errors=True)
+                deleted.append(folder.name)
+                reclaimed += size
+            else:
+                remaining.append((mtime, folder))
+
+        if self.assets_quota_bytes > 0:
+            sizes = {folder: _path_size(folder) for _, folder in remaining}
+            total = sum(sizes.values())
+            recent_window = self.assets_ttl if self.assets_ttl > 0 else 3600
+            for mtime, folder in remaining:
+                if total <= self.assets_quota_bytes:
+                    break
+                if folder.name in live and now - mtime <= recent_window:
+                    continue
+                shutil.rmtree(folder, ignore_errors=True)
+                deleted.append(folder.name)
+                reclaimed += sizes[folder]
+                total -= sizes[folder]
+            if total > self.assets_quota_bytes:
+                self.logger.warning(
+                    f"素材目录仍超出配额: {total / 1024 / 1024:.1f} MB > "
+                    f"{self.assets_quota_bytes / 1024 / 1024:.1f} MB（剩余的都是最近编辑中的草稿）"
+                )
+        return deleted, reclaimed
+
+    def _sweep_prefetched(self, folder: Path, now: float) -> int:
+        """删除后台下载目录中没有片段引用且过期的文件（进程崩溃等原因留下的），返回释放的字节数"""
+        reclaimed = 0
+        if self.assets_ttl <= 0 or not folder.is_dir():
+            return reclaimed
+        store = self.segment_manager.store
+        referenced = {
+            os.path.abspath(summary["local_path"])
+            for summary in store.segment_summaries(store.list_segment_ids()).values()
+            if summary.get("local_path")
+        }
+        for entry in os.scandir(folder):
+            if not entry.is_file() or os.path.abspath(entry.path) in referenced:
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime > self.assets_ttl:
+                os.remove(entry.path)
+                reclaimed += stat.st_size
+        if reclaimed:
+            self.logger.info(f"清理后台下载目录中无引用的素材 {reclaimed / 1024 / 1024:.2f} MB")
+        return reclaimed
+
+    # ---------- 整体清理 ----------
+
+    def sweep(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        执行一次清理（先草稿、再片段、最后素材目录）
+
+        Args:
+            now: 当前时间戳，默认 time.time()（测试时可指定）
+
+        Returns:
+            清理报告，包含删除数量和回收字节数
+        """
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        with self._lock:
+            report: Dict[str, Any] = {
+                "drafts_deleted": 0,
+                "segments_deleted": 0,
+                "asset_dirs_deleted": 0,
+                "reclaimed_bytes": 0,
+            }
+            for key, step in (
+                ("drafts_deleted", self.sweep_drafts),
+                ("segments_deleted", self.sweep_segments),
+                ("asset_dirs_deleted", self.sweep_assets),
+            ):
+                try:
+                    deleted, reclaimed = step(now)
+                except Exception as e:
+                    self.logger.error(f"清理 {key} 时发生错误: {e}", exc_info=True)
+                    continue
+                report[key] = len(deleted)
+                report["reclaimed_bytes"] += reclaimed
+
+            report["duration"] = time.perf_counter() - started
+            report["timestamp"] = now
+            self.total_reclaimed_bytes += report["reclaimed_bytes"]
+            report["total_reclaimed_bytes"] = self.total_reclaimed_bytes
+            self.last_report = report
+
+        self.logger.info(
+            f"状态清理完成: 草稿 {report['drafts_deleted']}，片段 {report['segments_deleted']}，"
+            f"素材目录 {report['asset_dirs_deleted']}，回收 {report['reclaimed_bytes'] / 1024 / 1024:.2f} MB"
+        )
+        return report
+
+
+# 全局单例实例
+_state_sweeper: Optional[StateSweeper] = None
+
+
+def get_state_sweeper() -> StateSweeper:
+    """
+    获取全局状态清理器实例（单例模式）
+
+    Returns:
+        StateSweeper 实例
+    """
+    global _state_sweeper
+
+    if _state_sweeper is None:
+        _state_sweeper = StateSweeper()
+
+    return _state_sweeper
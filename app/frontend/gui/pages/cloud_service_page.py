@@ -8,7 +8,6 @@ import sys
 import queue
 import atexit
 from pathlib import Path
-import uvicorn
 import customtkinter as ctk
 
 from app.frontend.gui.base_page import BasePage
@@ -299,6 +298,8 @@ class CloudServicePage(BasePage):
             messagebox.showerror("错误", f"启动服务失败: {e}")
 
     def _start_embedded_service(self, port):
+        # 启动服务时才导入 uvicorn 和 API 应用，缩短 GUI 启动时间
+        import uvicorn
         from app.backend.api_main import app
         def run_server():
             config = uvicorn.Config(app=app, host="127.0.0.1", port=port, log_level="info")
@@ -0,0 +1,268 @@
+"""
+batch_draft 工具处理器
+
+自动从 API 端点生成: /{draft_id}/batch
+源文件: /home/runner/work/Coze2JianYing/Coze2JianYing/app/backend/api/draft_routes.py
+"""
+
+import os
+import uuid
+import time
+from typing import NamedTuple, Dict, Any, Optional, List
+from runtime import Args
+
+
+# ========== 自定义类型定义 ==========
+# 以下类型定义从 segment_schemas.py 复制而来
+# Coze 平台不支持跨文件 import，因此需要在每个工具中重复定义
+
+class BatchCommand(NamedTuple):
+    """BatchCommand"""
+    action: str  # 命令类型: create_segment（创建片段）/ add_operation（片段操作）/ add_segment（添加到草稿）
+    ref: Optional[str]  # 临时 ID，create_segment 时定义，同一批次后续命令通过 segment_ref 引用
+    segment_type: Optional[str]  # create_segment 的片段类型: audio/video/text/sticker/effect/filter
+    segment_id: Optional[str]  # 已存在的片段 UUID（与 segment_ref 二选一）
+    segment_ref: Optional[str]  # 本批次中创建的片段的临时 ID
+    operation: Optional[str]  # add_operation 的操作名，如 add_fade、add_keyframe、add_animation
+    track_index: Optional[int]  # add_segment 的目标轨道索引，None 则自动选择
+    params: Dict  # 命令参数，与对应单个端点的请求体相同
+
+
+# Input 类型定义
+class Input(NamedTuple):
+    """batch_draft 工具的输入参数"""
+    draft_id: str  # 草稿ID
+    commands: List[BatchCommand]  # 按顺序执行的命令列表
+
+
+# Output 类型定义
+class Output(NamedTuple):
+    """batch_draft 工具的输出参数"""
+    success: bool = False  # 是否成功
+    ids: Optional[Dict] = None  # 临时 ID -> 生成的片段 UUID
+    results: List[Dict] = []  # 每条命令的执行结果
+    version: int = 0  # 执行后的草稿配置版本号
+    message: str = ""  # 响应消息
+    error_code: Optional[str] = None  # 错误代码
+    category: Optional[str] = None  # 错误类别
+    level: Optional[str] = None  # 响应级别
+    details: Optional[Dict] = None  # 详细信息
+
+
+def ensure_coze2jianying_file() -> str:
+    """
+    确保 /tmp 目录下存在 coze2jianying.py 文件
+
+    Returns:
+        coze2jianying.py 文件的完整路径
+    """
+    file_path = "/tmp/coze2jianying.py"
+
+    if not os.path.exists(file_path):
+        # 创建初始文件内容
+        initial_content = """# Coze2JianYing API 调用记录
+# 此文件由 Coze 工具自动生成和更新
+# 记录所有通过 Coze 工具调用的 API 操作
+
+import asyncio
+from app.backend.schemas.segment_schemas import *
+
+# API 调用记录将追加在下方
+"""
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(initial_content)
+
+    return file_path
+
+
+def append_api_call_to_file(file_path: str, api_call_code: str):
+    """
+    将 API 调用代码追加到 coze2jianying.py 文件
+
+    Args:
+        file_path: coze2jianying.py 文件路径
+        api_call_code: 要追加的 API 调用代码
+    """
+    with open(file_path, 'a', encoding='utf-8') as f:
+        f.write("\n" + api_call_code + "\n")
+
+
+def _is_meaningful_object(obj) -> bool:
+    """
+    检查对象是否包含有意义的数据
+
+    用于区分空的 CustomNamespace() 对象和包含有效数据的对象
+    避免将空对象视为有效值，导致 Pydantic 验证失败
+
+    Args:
+        obj: 任意对象
+
+    Returns:
+        True 如果对象包含有意义的数据，False 如果对象为 None 或为空
+    """
+    # None 值不是有意义的对象
+    if obj is None:
+        return False
+
+    # 检查是否有 __dict__ 属性（CustomNamespace, SimpleNamespace 等）
+    if hasattr(obj, '__dict__'):
+        obj_dict = obj.__dict__
+        # 空字典意味着空对象
+        if not obj_dict:
+            return False
+        # 检查是否所有值都是 None（也视为空对象）
+        if all(v is None for v in obj_dict.values()):
+            return False
+        # 至少有一个非 None 值，视为有意义的对象
+        return True
+
+    # 对于基本类型（字符串、数字、布尔值等），非 None 即为有意义
+    return True
+
+
+def _to_type_constructor(obj, type_name: Optional[str]) -> str:
+    """
+    将 CustomNamespace/SimpleNamespace 对象转换为类型构造表达式字符串
+
+    用于处理 Coze 的 CustomNamespace/SimpleNamespace 对象
+    这些对象在 Coze 云端使用，在应用端执行时需要转换为对应类型的构造调用
+
+    例如：
+        CustomNamespace(start=0, duration=5000000)
+        -> "TimeRange(start=0, duration=5000000)"
+        [CustomNamespace(action="add_segment", segment_id="xxx")]
+        -> "[BatchCommand(action="add_segment", segment_id=segment_xxx)]"
+
+    Args:
+        obj: CustomNamespace/SimpleNamespace 对象、字典或它们的列表
+        type_name: 目标类型名，如 "TimeRange", "ClipSettings", "CropSettings", "TextStyle"；
+            为 None 时生成字典字面量
+
+    Returns:
+        类型构造表达式字符串，如 "TimeRange(start=0, duration=5000000)"
+    """
+    if obj is None:
+        return 'None'
+
+    # 列表：逐个元素转换（如 List[BatchCommand]）
+    if isinstance(obj, (list, tuple)):
+        return '[' + ', '.join(_to_type_constructor(item, type_name) for item in obj) + ']'
+
+    # 检查是否有 __dict__ 属性（CustomNamespace, SimpleNamespace 等）
+    if hasattr(obj, '__dict__') or isinstance(obj, dict):
+        obj_dict = obj if isinstance(obj, dict) else obj.__dict__
+        # 构造类型构造调用的参数列表
+        params = []
+        for key, value in obj_dict.items():
+            if key in ('draft_id', 'segment_id') and isinstance(value, str) and value:
+                # 嵌套的对象 ID：引用之前创建的对象变量，如 segment_{uuid}
+                value_repr = key[:-len('_id')] + '_' + value
+            # 递归处理嵌套对象
+            elif hasattr(value, '__dict__') or isinstance(value, (dict, list, tuple)):
+                # 嵌套对象：没有对应类型时生成字典字面量，由 Pydantic 转换
+                nested_type_name = None
+                # 如果 key 本身就是类型相关的，使用更智能的命名
+                # 根据最新 schema 重构：ClipSettings, CropSettings, TextStyle, TimeRange
+                if isinstance(value, (list, tuple)) and not any(
+                    hasattr(item, '__dict__') or isinstance(item, dict) for item in value
+                ):
+                    # 基本类型的列表（如颜色 [1.0, 1.0, 1.0]）保持原样
+                    nested_type_name = None
+                elif 'clip_settings' in key.lower() or key.lower() == 'clipsettings':
+                    nested_type_name = 'ClipSettings'
+                elif 'crop_settings' in key.lower() or key.lower() == 'cropsettings':
+                    nested_type_name = 'CropSettings'
+                elif 'timerange' in key.lower():
+                    nested_type_name = 'TimeRange'
+                elif 'text_style' in key.lower() or key.lower() == 'textstyle':
+                    nested_type_name = 'TextStyle'
+                # Note: Position class was removed in schema refactoring
+                value_repr = _to_type_constructor(value, nested_type_name)
+            elif isinstance(value, str):
+                # 字符串值：加引号
+                value_repr = f'"{value}"'
+            else:
+                # 其他类型：直接使用 repr
+                value_repr = repr(value)
+            params.append(f'{key}={value_repr}')
+
+        if type_name is None:
+            return '{' + ', '.join(
+                f'"{key}": ' + param.split('=', 1)[1]
+                for key, param in zip(obj_dict.keys(), params)
+            ) + '}'
+
+        # 构造类型构造表达式：TypeName(param1=value1, param2=value2)
+        return f'{type_name}(' + ', '.join(params) + ')'
+
+    # 如果不是复杂对象，返回其 repr
+    if isinstance(obj, str):
+        return f'"{obj}"'
+    else:
+        return repr(obj)
+
+
+def handler(args: Args[Input]) -> Dict[str, Any]:
+    """
+    batch_draft 的主处理函数
+
+    Args:
+        args: Input arguments
+
+    Returns:
+        Dict containing response data (converted from Output NamedTuple for Coze compatibility)
+    """
+    logger = getattr(args, 'logger', None)
+
+    if logger:
+        logger.info(f"调用 batch_draft，参数: {args.input}")
+
+    try:
+        # 生成唯一 UUID
+        generated_uuid = str(uuid.uuid4()).replace("-", "_")
+
+        if logger:
+            logger.info(f"生成 UUID: {generated_uuid}")
+
+        # 为批量命令中的临时 ID 生成 UUID，后续工具通过 segment_{uuid} 引用这些片段
+        batch_ids = {}
+        batch_id_bindings = ""
+        for command in getattr(args.input, "commands", None) or []:
+            ref = command.get("ref") if isinstance(command, dict) else getattr(command, "ref", None)
+            if ref:
+                batch_ids[ref] = str(uuid.uuid4()).replace("-", "_")
+                batch_id_bindings += f"segment_{batch_ids[ref]} = resp_{generated_uuid}.ids['{ref}']\n"
+
+        # 生成 API 调用代码
+        api_call = f"""
+# API 调用: batch_draft
+# 时间: {time.strftime('%Y-%m-%d %H:%M:%S')}
+
+# 构造 request 对象
+req_params_{generated_uuid} = {{}}
+req_params_{generated_uuid}['commands'] = {_to_type_constructor(args.input.commands, 'BatchCommand')}
+req_{generated_uuid} = BatchDraftRequest(**req_params_{generated_uuid})
+
+resp_{generated_uuid} = await batch_draft(draft_{args.input.draft_id}, req_{generated_uuid})
+
+{batch_id_bindings}"""
+
+        # 写入 API 调用到文件
+        coze_file = ensure_coze2jianying_file()
+        append_api_call_to_file(coze_file, api_call)
+
+
+        if logger:
+            logger.info(f"batch_draft 调用成功")
+
+        return Output(success=True, ids=batch_ids, results=[], version=0, message="操作成功", error_code=None, category=None, level=None, details=None)._asdict()
+
+    except Exception as e:
+        error_msg = f"调用 batch_draft 时发生错误: {str(e)}"
+        if logger:
+            logger.error(error_msg)
+            import traceback
+            logger.error(f"Traceback: {traceback.format_exc()}")
+
+        return Output(success=False, message=error_msg)._asdict()
+
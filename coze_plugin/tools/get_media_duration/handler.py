@@ -21,6 +21,40 @@ except ImportError:
 from runtime import Args
 
 
+# Shared session: keep-alive connection pooling across all links of one call
+_session = requests.Session()
+_session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=8))
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=8))
+
+# Header strategies, tried in order when a download is rejected
+HEADER_STRATEGIES = [
+    # Strategy 1: Comprehensive modern browser headers
+    {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'audio/*,video/*,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7',
+        'Accept-Encoding': 'identity',
+        'Connection': 'keep-alive',
+        'Sec-Fetch-Dest': 'audio',
+        'Sec-Fetch-Mode': 'cors',
+        'Sec-Fetch-Site': 'cross-site',
+        'sec-ch-ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
+        'sec-ch-ua-mobile': '?0',
+        'sec-ch-ua-platform': '"Windows"'
+    },
+    {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': '*/*',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Accept-Encoding': 'identity'
+    },
+    {
+        'User-Agent': 'curl/7.68.0',
+        'Accept': '*/*'
+    }
+]
+
+
 # Input/Output 类型定义（每个 Coze 工具都需要）
 class Input(NamedTuple):
     """输入参数 for get_media_duration tool"""
@@ -48,6 +82,41 @@ def is_volcano_tts_url(url: str) -> bool:
             ('VolcanoUserVoice' in url or 'speech_' in url))
 
 
+def build_request_headers(url: str, strategy: int = 0) -> Dict[str, str]:
+    """
+    Build request headers for a media URL: a base strategy plus CDN-specific Referer/Origin rules
+    
+    Args:
+        url: 媒体文件 URL
+        strategy: Index into HEADER_STRATEGIES
+        
+    Returns:
+        Headers dict
+    """
+    headers = HEADER_STRATEGIES[min(strategy, len(HEADER_STRATEGIES) - 1)].copy()
+    
+    # Add CDN-specific headers based on URL
+    if 'oceancloudapi.com' in url or 'volccdn.com' in url or 'bytedance.com' in url:
+        headers['Referer'] = 'https://www.coze.cn/'
+        headers['Origin'] = 'https://www.coze.cn'
+        
+        # Special handling for Volcano TTS URLs
+        if 'VolcanoUserVoice' in url or 'speech_' in url:
+            headers['Accept'] = 'audio/mpeg,audio/*,*/*;q=0.9'
+            headers['Accept-Language'] = 'zh-CN,zh;q=0.9,en;q=0.8'
+            headers['Cache-Control'] = 'no-cache'
+            headers['Pragma'] = 'no-cache'
+            # Preserve all query parameters exactly as provided
+            headers['Connection'] = 'keep-alive'
+            
+    elif 'amazonaws.com' in url or 'cloudfront.net' in url:
+        headers['Referer'] = 'https://aws.amazon.com/'
+    elif 'googleapis.com' in url or 'gstatic.com' in url:
+        headers['Referer'] = 'https://cloud.google.com/'
+    
+    return headers
+
+
 def handle_volcano_tts_url(url: str, logger=None) -> dict:
     """
     Special handling for Volcano Engine TTS URLs
@@ -109,24 +178,7 @@ def check_media_url_accessibility(url: str, timeout: int = 10) -> dict:
         Dict with accessibility info and content details
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': '*/*'
-        }
-        
-        # Add CDN-specific headers
-        if 'oceancloudapi.com' in url or 'volccdn.com' in url or 'bytedance.com' in url:
-            headers['Referer'] = 'https://www.coze.cn/'
-            headers['Origin'] = 'https://www.coze.cn'
-            
-            # Special handling for Volcano TTS URLs
-            if 'VolcanoUserVoice' in url or 'speech_' in url:
-                headers['Accept'] = 'audio/mpeg,audio/*,*/*;q=0.9'
-                headers['Accept-Language'] = 'zh-CN,zh;q=0.9,en;q=0.8'
-                headers['Cache-Control'] = 'no-cache'
-                headers['Pragma'] = 'no-cache'
-        
-        response = requests.head(url, headers=headers, timeout=timeout)
+        response = _session.head(url, headers=build_request_headers(url), timeout=timeout)
         
         return {
             'accessible': response.status_code == 200,
@@ -170,57 +222,10 @@ def download_media_file(url: str, timeout: int = 30) -> str:
         success = False
         last_error = None
         
-        # Strategy 1: Comprehensive modern browser headers
-        headers_strategies = [
-            {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'audio/*,video/*,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7',
-                'Accept-Encoding': 'identity',
-                'Connection': 'keep-alive',
-                'Sec-Fetch-Dest': 'audio',
-                'Sec-Fetch-Mode': 'cors',
-                'Sec-Fetch-Site': 'cross-site',
-                'sec-ch-ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
-                'sec-ch-ua-mobile': '?0',
-                'sec-ch-ua-platform': '"Windows"'
-            },
-            {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': '*/*',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept-Encoding': 'identity'
-            },
-            {
-                'User-Agent': 'curl/7.68.0',
-                'Accept': '*/*'
-            }
-        ]
-        
-        for i, base_headers in enumerate(headers_strategies):
+        for i in range(len(HEADER_STRATEGIES)):
             try:
-                headers = base_headers.copy()
-                
-                # Add CDN-specific headers based on URL
-                if 'oceancloudapi.com' in url or 'volccdn.com' in url or 'bytedance.com' in url:
-                    headers['Referer'] = 'https://www.coze.cn/'
-                    headers['Origin'] = 'https://www.coze.cn'
-                    
-                    # Special handling for Volcano TTS URLs
-                    if 'VolcanoUserVoice' in url or 'speech_' in url:
-                        headers['Accept'] = 'audio/mpeg,audio/*,*/*;q=0.9'
-                        headers['Accept-Language'] = 'zh-CN,zh;q=0.9,en;q=0.8'
-                        headers['Cache-Control'] = 'no-cache'
-                        headers['Pragma'] = 'no-cache'
-                        # Preserve all query parameters exactly as provided
-                        headers['Connection'] = 'keep-alive'
-                        
-                elif 'amazonaws.com' in url or 'cloudfront.net' in url:
-                    headers['Referer'] = 'https://aws.amazon.com/'
-                elif 'googleapis.com' in url or 'gstatic.com' in url:
-                    headers['Referer'] = 'https://cloud.google.com/'
-                
-                response = requests.get(url, headers=headers, timeout=timeout, stream=True)
+                headers = build_request_headers(url, strategy=i)
+                response = _session.get(url, headers=headers, timeout=timeout, stream=True)
                 response.raise_for_status()
                 
                 # If we get here, download was successful
@@ -229,7 +234,7 @@ def download_media_file(url: str, timeout: int = 30) -> str:
                 
             except requests.exceptions.RequestException as e:
                 last_error = e
-                if i < len(headers_strategies) - 1:
+                if i < len(HEADER_STRATEGIES) - 1:
                     continue  # Try next strategy
                 else:
                     break  # All strategies failed
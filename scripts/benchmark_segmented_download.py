@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+分段并发下载基准测试
+
+启动一个本地素材服务（支持 Range，对每个连接限速，模拟 CDN 的单连接限速），
+用 MaterialManager 分别以单连接和分段并发方式下载同一个大文件，
+比较耗时并校验内容一致。加速比低于目标值时以非零状态码退出，可以在 CI 中使用。
+
+使用方法:
+    python scripts/benchmark_segmented_download.py
+    python scripts/benchmark_segmented_download.py --size-mb 64 --parts 8 --rate-mb 4
+    python scripts/benchmark_segmented_download.py --target-speedup 3
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+# 基准测试不使用全局素材缓存，数据目录放在临时目录中
+os.environ["JIANYING_MATERIAL_STORE_MB"] = "0"
+os.environ.setdefault("JIANYING_DATA_ROOT", tempfile.mkdtemp(prefix="segmented_bench_"))
+
+from app.backend.utils.material_manager import MaterialManager  # noqa: E402
+
+# 限速时每次发送的字节数
+SEND_CHUNK = 64 * 1024
+
+
+def make_handler(data: bytes, rate: float):
+    """创建支持 Range、对每个连接限速为 rate 字节/秒的请求处理类"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            start, end = 0, len(data)
+            byte_range = self.headers.get("Range")
+            if byte_range:
+                first, _, last = byte_range[len("bytes="):].partition("-")
+                start, end = int(first), int(last) + 1 if last else len(data)
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(data)}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(end - start))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", '"bench"')
+            self.end_headers()
+
+            started = time.perf_counter()
+            sent = 0
+            try:
+                for offset in range(start, end, SEND_CHUNK):
+                    chunk = data[offset:min(offset + SEND_CHUNK, end)]
+                    self.wfile.write(chunk)
+                    sent += len(chunk)
+                    delay = sent / rate - (time.perf_counter() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+            except (BrokenPipeError, ConnectionResetError):
+                # 分段下载的第一段读够后关闭连接
+                self.close_connection = True
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def run(url: str, work_dir: Path, threshold: int, parts: int) -> tuple:
+    """下载一次，返回 (耗时 s, 内容 sha256)"""
+    manager = MaterialManager(str(work_dir), "benchmark", project_id=f"parts_{parts}")
+    manager.segmented_threshold = threshold
+    manager.segmented_parts = parts
+    started = time.perf_counter()
+    path, digest = manager._download_and_record(url, None)
+    elapsed = time.perf_counter() - started
+    Path(path).unlink()
+    return elapsed, digest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分段并发下载基准测试")
+    parser.add_argument("--size-mb", type=float, default=32, help="测试文件大小 (默认: 32 MB)")
+    parser.add_argument("--parts", type=int, default=4, help="分段数 (默认: 4)")
+    parser.add_argument("--rate-mb", type=float, default=8, help="每个连接的限速 MB/s (默认: 8)")
+    parser.add_argument("--target-speedup", type=float, default=2.0, help="加速比目标 (默认: 2.0)")
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    header = b"\x00\x00\x00\x18ftypmp42"
+    data = header + os.urandom(size - len(header))
+    expected = hashlib.sha256(data).hexdigest()
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(data, args.rate_mb * 1024 * 1024))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}/large.mp4"
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="segmented_bench_") as work_dir:
+            single, single_digest = run(url, Path(work_dir), 0, 1)
+            segmented, segmented_digest = run(url, Path(work_dir), 1, args.parts)
+    finally:
+        httpd.shutdown()
+
+    speedup = single / segmented
+    ok = speedup >= args.target_speedup and single_digest == segmented_digest == expected
+    print(f"文件大小: {args.size_mb:.0f} MB，每个连接限速 {args.rate_mb:.1f} MB/s")
+    print(f"  单连接:         {single:.2f} s ({args.size_mb / single:.1f} MB/s)")
+    print(f"  分段 ({args.parts} 段):    {segmented:.2f} s ({args.size_mb / segmented:.1f} MB/s)")
+    print(f"  加速比: {speedup:.2f}x (目标 {args.target_speedup:.1f}x) {'✅' if ok else '❌'}")
+    if single_digest != expected or segmented_digest != expected:
+        print("  下载内容与原文件不一致")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
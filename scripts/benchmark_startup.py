@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+冷启动基准测试
+
+在新的 Python 进程中用 `python -X importtime` 导入 API 服务和 GUI 的入口模块，
+统计导入总耗时（取多次运行的中位数）和耗时最多的模块，并与目标值比较。
+任一入口超过目标值时以非零状态码退出，可以在 CI 中使用。
+
+未安装 GUI 依赖（customtkinter 等）时跳过 GUI 入口。
+
+使用方法:
+    python scripts/benchmark_startup.py
+    python scripts/benchmark_startup.py --rounds 7 --top 15
+    python scripts/benchmark_startup.py --api-target-ms 600 --gui-target-ms 900
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+# 入口名称 -> (导入的模块, 默认目标值 ms)
+ENTRY_POINTS = {
+    "api": ("app.backend.api_main", 500.0),
+    "gui": ("app.frontend.gui.main_window", 800.0),
+}
+
+# 导入后不应出现在 sys.modules 中的模块（首次使用时才加载）
+DEFERRED_MODULES = ("pyJianYingDraft.segment", "uvicorn")
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)$")
+
+
+def run_import(module: str, data_root: str) -> Tuple[float, List[Tuple[str, int, int]], List[str]]:
+    """
+    在子进程中导入模块
+
+    Returns:
+        (导入总耗时 ms, [(模块名, 自身耗时 us, 累计耗时 us)], 已加载的延迟模块)
+    """
+    code = (
+        f"import sys; import {module}; "
+        f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    )
+    env = dict(os.environ, JIANYING_DATA_ROOT=data_root, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=str(project_root), env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "导入失败")
+
+    modules = []
+    total_us = None
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        modules.append((name, int(self_us), int(cumulative_us)))
+        if name == module and len(indent) == 1:
+            total_us = int(cumulative_us)
+    if total_us is None:
+        raise RuntimeError(f"未找到 {module} 的导入耗时")
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return total_us / 1000, modules, loaded
+
+
+def benchmark(name: str, module: str, rounds: int, top: int) -> Optional[Dict]:
+    """多次导入入口模块，返回中位数耗时和耗时最多的模块；依赖缺失时返回 None"""
+    timings = []
+    slowest: List[Tuple[str, int, int]] = []
+    loaded: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="startup_bench_") as data_root:
+        for _ in range(rounds):
+            try:
+                total_ms, modules, loaded = run_import(module, data_root)
+            except RuntimeError as e:
+                print(f"[{name}] 跳过: {e}")
+                return None
+            timings.append(total_ms)
+            slowest = sorted(modules, key=lambda item: item[1], reverse=True)[:top]
+        # 导入入口模块时不应创建数据目录
+        created_dirs = os.listdir(data_root)
+    return {
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "slowest": slowest,
+        "loaded": loaded,
+        "created_dirs": created_dirs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API 服务和 GUI 冷启动基准测试")
+    parser.add_argument("--rounds", type=int, default=5, help="每个入口的导入次数 (默认: 5)")
+    parser.add_argument("--top", type=int, default=10, help="显示自身耗时最多的模块数 (默认: 10)")
+    for name, (_, target) in ENTRY_POINTS.items():
+        parser.add_argument(
+            f"--{name}-target-ms", type=float, default=target,
+            help=f"{name} 入口的导入耗时目标 (默认: {target:.0f} ms)"
+        )
+    args = parser.parse_args()
+
+    failed = False
+    for name, (module, _) in ENTRY_POINTS.items():
+        target = getattr(args, f"{name}_target_ms")
+        result = benchmark(name, module, args.rounds, args.top)
+        if result is None:
+            continue
+
+        ok = result["median_ms"] <= target and not result["loaded"] and not result["created_dirs"]
+        failed = failed or not ok
+        print(f"[{name}] {module}")
+        print(f"  导入耗时: 中位数 {result['median_ms']:.0f} ms, 最小 {result['min_ms']:.0f} ms "
+              f"(目标 {target:.0f} ms) {'✅' if ok else '❌'}")
+        if result["loaded"]:
+            print(f"  提前加载的模块: {', '.join(result['loaded'])}")
+        if result["created_dirs"]:
+            print(f"  导入时创建的数据目录: {', '.join(result['created_dirs'])}")
+        print(f"  {'模块':<56}{'自身 (ms)':>12}{'累计 (ms)':>12}")
+        for mod_name, self_us, cumulative_us in result["slowest"]:
+            print(f"  {mod_name:<56}{self_us / 1000:>12.1f}{cumulative_us / 1000:>12.1f}")
+        print()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+状态序列化格式基准测试
+
+生成一个字幕很多的草稿配置，对比各序列化格式 / 压缩方式的写入耗时、读取耗时和体积。
+未安装的可选依赖（orjson / msgpack / zstandard）对应的组合会被跳过。
+
+使用方法:
+    python scripts/benchmark_state_serializer.py
+    python scripts/benchmark_state_serializer.py --captions 20000 --rounds 5
+"""
+import argparse
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.backend.database import serializer as serializer_module
+from app.backend.database.serializer import StateSerializer
+
+
+def build_draft_config(caption_count: int) -> dict:
+    """构造一个包含大量字幕片段的草稿配置"""
+    captions = []
+    for i in range(caption_count):
+        captions.append({
+            "segment_id": str(uuid.uuid4()),
+            "text": f"第 {i} 句字幕：这是一段用于测试序列化性能的中文字幕内容",
+            "start": i * 2_000_000,
+            "end": (i + 1) * 2_000_000,
+            "style": {"font": "文轩体", "size": 8.0, "color": [1.0, 1.0, 1.0], "bold": i % 2 == 0},
+            "keyframes": [{"time_offset": t * 100_000, "alpha": t / 10} for t in range(5)],
+        })
+    return {
+        "draft_id": str(uuid.uuid4()),
+        "project": {"name": "序列化基准", "width": 1920, "height": 1080, "fps": 30},
+        "media_resources": [],
+        "tracks": [{"track_type": "text", "track_index": 0, "segments": captions}],
+        "status": "created",
+        "version": 1,
+    }
+
+
+def available_combinations():
+    formats = ["json", "orjson"]
+    if serializer_module.MSGPACK_AVAILABLE:
+        formats.append("msgpack")
+    compressions = ["none", "gzip"]
+    if serializer_module.ZSTD_AVAILABLE:
+        compressions.append("zstd")
+    return [(fmt, comp) for fmt in formats for comp in compressions]
+
+
+def benchmark(config: dict, fmt: str, compression: str, rounds: int) -> dict:
+    serializer = StateSerializer(fmt, compression)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        data = serializer.dumps(config)
+    store_ms = (time.perf_counter() - start) / rounds * 1000
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        loaded = serializer.loads(data)
+    load_ms = (time.perf_counter() - start) / rounds * 1000
+
+    assert loaded == config, f"{serializer.name} 往返结果不一致"
+    return {"name": serializer.name, "size": len(data), "store_ms": store_ms, "load_ms": load_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="状态序列化格式基准测试")
+    parser.add_argument("--captions", type=int, default=5000, help="字幕片段数量 (默认: 5000)")
+    parser.add_argument("--rounds", type=int, default=3, help="每种格式重复次数 (默认: 3)")
+    args = parser.parse_args()
+
+    config = build_draft_config(args.captions)
+    print(f"字幕数量: {args.captions}, 每种格式重复 {args.rounds} 次")
+    print(f"orjson: {serializer_module.ORJSON_AVAILABLE}, "
+          f"msgpack: {serializer_module.MSGPACK_AVAILABLE}, "
+          f"zstandard: {serializer_module.ZSTD_AVAILABLE}")
+    print()
+    print(f"{'格式':<16}{'体积 (KB)':>12}{'写入 (ms)':>12}{'读取 (ms)':>12}")
+    print("-" * 52)
+
+    results = [benchmark(config, fmt, comp, args.rounds) for fmt, comp in available_combinations()]
+    for result in results:
+        print(f"{result['name']:<16}{result['size'] / 1024:>12.1f}"
+              f"{result['store_ms']:>12.1f}{result['load_ms']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
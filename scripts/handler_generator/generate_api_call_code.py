@@ -315,6 +315,11 @@ class APICallCodeGenerator:
             api_call_code += "\n"
             api_call_code += "segment_{generated_uuid} = resp_{generated_uuid}.segment_id\n"
 
+        if any(f["name"] == "ids" for f in output_fields):
+            # 批量端点：把命令中的临时 ID 绑定到 segment_{uuid} 变量
+            api_call_code += "\n"
+            api_call_code += "{batch_id_bindings}"
+
         api_call_code += '"""\n'
         api_call_code += "\n"
         api_call_code += "        # 写入 API 调用到文件\n"
@@ -26,6 +26,9 @@ class HandlerFunctionGenerator:
         elif endpoint.has_segment_id:
             target_id_type = "segment_id"
 
+        # 批量端点（Output 包含 ids 字段）需要为命令中的临时 ID 生成变量名
+        has_batch_ids = any(field["name"] == "ids" for field in output_fields)
+
         # 生成返回值
         return_values = []
         for field in output_fields:
@@ -47,6 +50,9 @@ class HandlerFunctionGenerator:
             elif field_name == "api_call":
                 # 对于 api_call 字段，返回生成的 API 调用代码字符串
                 return_values.append(f'        "{field_name}": api_call')
+            elif field_name == "ids" and has_batch_ids:
+                # 对于 ids 字段，返回 临时 ID -> 纯 UUID，后续调用通过 segment_{uuid} 引用
+                return_values.append(f'        "{field_name}": batch_ids')
             else:
                 # 其他字段使用默认值
                 default = field.get("default", "None")
@@ -125,7 +131,7 @@ class HandlerFunctionGenerator:
     return True
 
 
-def _to_type_constructor(obj, type_name: str) -> str:
+def _to_type_constructor(obj, type_name: Optional[str]) -> str:
     """
     将 CustomNamespace/SimpleNamespace 对象转换为类型构造表达式字符串
 
@@ -135,10 +141,13 @@ def _to_type_constructor(obj, type_name: str) -> str:
     例如：
         CustomNamespace(start=0, duration=5000000)
         -> "TimeRange(start=0, duration=5000000)"
+        [CustomNamespace(action="add_segment", segment_id="xxx")]
+        -> "[BatchCommand(action="add_segment", segment_id=segment_xxx)]"
 
     Args:
-        obj: CustomNamespace/SimpleNamespace 对象
-        type_name: 目标类型名，如 "TimeRange", "ClipSettings", "CropSettings", "TextStyle"
+        obj: CustomNamespace/SimpleNamespace 对象、字典或它们的列表
+        type_name: 目标类型名，如 "TimeRange", "ClipSettings", "CropSettings", "TextStyle"；
+            为 None 时生成字典字面量
 
     Returns:
         类型构造表达式字符串，如 "TimeRange(start=0, duration=5000000)"
@@ -146,19 +155,31 @@ def _to_type_constructor(obj, type_name: str) -> str:
     if obj is None:
         return 'None'
 
+    # 列表：逐个元素转换（如 List[BatchCommand]）
+    if isinstance(obj, (list, tuple)):
+        return '[' + ', '.join(_to_type_constructor(item, type_name) for item in obj) + ']'
+
     # 检查是否有 __dict__ 属性（CustomNamespace, SimpleNamespace 等）
-    if hasattr(obj, '__dict__'):
-        obj_dict = obj.__dict__
+    if hasattr(obj, '__dict__') or isinstance(obj, dict):
+        obj_dict = obj if isinstance(obj, dict) else obj.__dict__
         # 构造类型构造调用的参数列表
         params = []
         for key, value in obj_dict.items():
+            if key in ('draft_id', 'segment_id') and isinstance(value, str) and value:
+                # 嵌套的对象 ID：引用之前创建的对象变量，如 segment_{uuid}
+                value_repr = key[:-len('_id')] + '_' + value
             # 递归处理嵌套对象
-            if hasattr(value, '__dict__'):
-                # 嵌套对象：尝试推断其类型名（使用首字母大写的 key）
-                nested_type_name = key.capitalize() if key else 'Object'
+            elif hasattr(value, '__dict__') or isinstance(value, (dict, list, tuple)):
+                # 嵌套对象：没有对应类型时生成字典字面量，由 Pydantic 转换
+                nested_type_name = None
                 # 如果 key 本身就是类型相关的，使用更智能的命名
                 # 根据最新 schema 重构：ClipSettings, CropSettings, TextStyle, TimeRange
-                if 'clip_settings' in key.lower() or key.lower() == 'clipsettings':
+                if isinstance(value, (list, tuple)) and not any(
+                    hasattr(item, '__dict__') or isinstance(item, dict) for item in value
+                ):
+                    # 基本类型的列表（如颜色 [1.0, 1.0, 1.0]）保持原样
+                    nested_type_name = None
+                elif 'clip_settings' in key.lower() or key.lower() == 'clipsettings':
                     nested_type_name = 'ClipSettings'
                 elif 'crop_settings' in key.lower() or key.lower() == 'cropsettings':
                     nested_type_name = 'CropSettings'
@@ -176,6 +197,12 @@ def _to_type_constructor(obj, type_name: str) -> str:
                 value_repr = repr(value)
             params.append(f'{key}={value_repr}')
 
+        if type_name is None:
+            return '{' + ', '.join(
+                f'"{key}": ' + param.split('=', 1)[1]
+                for key, param in zip(obj_dict.keys(), params)
+            ) + '}'
+
         # 构造类型构造表达式：TypeName(param1=value1, param2=value2)
         return f'{type_name}(' + ', '.join(params) + ')'
 
@@ -186,6 +213,19 @@ def _to_type_constructor(obj, type_name: str) -> str:
         return repr(obj)
 
 
+'''
+
+        batch_id_code = ""
+        if has_batch_ids:
+            batch_id_code = '''
+        # 为批量命令中的临时 ID 生成 UUID，后续工具通过 segment_{uuid} 引用这些片段
+        batch_ids = {}
+        batch_id_bindings = ""
+        for command in getattr(args.input, "commands", None) or []:
+            ref = command.get("ref") if isinstance(command, dict) else getattr(command, "ref", None)
+            if ref:
+                batch_ids[ref] = str(uuid.uuid4()).replace("-", "_")
+                batch_id_bindings += f"segment_{batch_ids[ref]} = resp_{generated_uuid}.ids['{ref}']\\n"
 '''
 
         handler_function = (
@@ -211,7 +251,7 @@ def _to_type_constructor(obj, type_name: str) -> str:
 
         if logger:
             logger.info(f"生成 UUID: {{generated_uuid}}")
-
+{batch_id_code}
 {api_call_code}
 
         if logger:
@@ -0,0 +1,9 @@
+"""
+测试公共配置
+
+测试中创建的片段使用 example.com 等无法访问的素材 URL，不在后台下载素材
+（后台下载会异步修改片段的 download_status）。需要后台下载的测试自行创建下载队列。
+"""
+import os
+
+os.environ.setdefault("JIANYING_BACKGROUND_DOWNLOAD_WORKERS", "0")
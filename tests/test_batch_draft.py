@@ -0,0 +1,215 @@
+"""
+批量操作测试
+
+验证一个请求中创建片段、添加操作并添加到草稿，临时 ID 引用，以及无效命令不写入任何状态
+"""
+import asyncio
+import importlib.util
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Generic, TypeVar
+from unittest.mock import MagicMock
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import httpx
+
+from app.backend.api import draft_routes
+from app.backend.api_main import app
+
+# 模拟 Coze 运行时的 Args 类（使用泛型）
+T = TypeVar('T')
+
+
+class Args(Generic[T]):
+    def __init__(self, input_tuple):
+        self.input = input_tuple
+        self.logger = None
+
+
+def _commands():
+    return [
+        {
+            "action": "create_segment",
+            "ref": "caption",
+            "segment_type": "text",
+            "params": {"text_content": "第一句字幕", "target_timerange": {"start": 0, "duration": 2000000}},
+        },
+        {
+            "action": "create_segment",
+            "ref": "clip",
+            "segment_type": "video",
+            "params": {"material_url": "https://example.com/video.mp4", "target_timerange": {"start": 0, "duration": 5000000}},
+        },
+        {
+            "action": "add_operation",
+            "segment_ref": "caption",
+            "operation": "add_animation",
+            "params": {"animation_type": "TextAnimationType.TYPEWRITER", "duration": "1s"},
+        },
+        {
+            "action": "add_operation",
+            "segment_ref": "clip",
+            "operation": "add_fade",
+            "params": {"in_duration": "1s", "out_duration": "0s"},
+        },
+        {"action": "add_segment", "segment_ref": "clip"},
+        {"action": "add_segment", "segment_ref": "caption"},
+    ]
+
+
+async def _post(path, payload):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return (await client.post(path, json=payload)).json()
+
+
+def test_batch_creates_operates_and_attaches():
+    """测试一次批量请求创建、操作并添加片段"""
+    print("测试批量操作...")
+    draft_manager = draft_routes.draft_manager
+    segment_manager = draft_routes.segment_manager
+    draft_id = draft_manager.create_draft("批量操作", 1920, 1080, 30)["draft_id"]
+    version_before = draft_manager.get_draft_config(draft_id)["version"]
+
+    data = asyncio.run(_post(f"/api/draft/{draft_id}/batch", {"commands": _commands()}))
+
+    assert data["success"] is True
+    assert data["error_code"] == "SUCCESS"
+    assert set(data["ids"]) == {"caption", "clip"}
+    assert len(data["results"]) == 6
+    assert data["results"][2]["segment_id"] == data["ids"]["caption"]
+
+    caption = segment_manager.get_segment(data["ids"]["caption"])
+    clip = segment_manager.get_segment(data["ids"]["clip"])
+    assert [op["operation_type"] for op in caption["operations"]] == ["add_animation"]
+    assert [op["operation_type"] for op in clip["operations"]] == ["add_fade"]
+
+    # 两个片段添加到草稿只修改一次草稿配置
+    config = draft_manager.get_draft_config(draft_id)
+    assert config["version"] == version_before + 1 == data["version"]
+    segments_by_type = {track["track_type"]: track["segments"] for track in config["tracks"]}
+    assert segments_by_type["video"] == [data["ids"]["clip"]]
+    assert segments_by_type["text"] == [data["ids"]["caption"]]
+
+    for segment_id in data["ids"].values():
+        segment_manager.delete_segment(segment_id)
+    draft_manager.delete_draft(draft_id)
+    print("✅ 批量操作测试通过\n")
+
+
+def test_invalid_command_writes_nothing():
+    """测试任意一条命令无效时不创建片段，并返回出错的命令序号"""
+    print("测试无效批量命令...")
+    draft_manager = draft_routes.draft_manager
+    segment_manager = draft_routes.segment_manager
+    draft_id = draft_manager.create_draft("批量校验", 1920, 1080, 30)["draft_id"]
+    segments_before = set(segment_manager.store.list_segment_ids())
+    version_before = draft_manager.get_draft_config(draft_id)["version"]
+
+    invalid_cases = [
+        # 文本片段不支持 add_fade
+        (3, {"action": "add_operation", "segment_ref": "caption", "operation": "add_fade", "params": {}}),
+        # 引用未定义的临时 ID
+        (4, {"action": "add_segment", "segment_ref": "missing"}),
+        # 参数校验失败
+        (4, {"action": "add_operation", "segment_ref": "clip", "operation": "add_fade", "params": {"in_duration": 1}}),
+    ]
+    for expected_index, bad_command in invalid_cases:
+        commands = _commands()[:expected_index] + [bad_command] + _commands()[expected_index:]
+        data = asyncio.run(_post(f"/api/draft/{draft_id}/batch", {"commands": commands}))
+        assert data["success"] is True
+        assert data["error_code"] != "SUCCESS"
+        assert data["details"]["index"] == expected_index
+
+    # 轨道索引指向不同类型的轨道
+    commands = _commands()[:4] + [
+        {"action": "add_segment", "segment_ref": "clip"},
+        {"action": "add_segment", "segment_ref": "caption", "track_index": 0},
+    ]
+    data = asyncio.run(_post(f"/api/draft/{draft_id}/batch", {"commands": commands}))
+    assert data["error_code"] != "SUCCESS"
+    assert data["details"]["index"] == 5
+
+    assert set(segment_manager.store.list_segment_ids()) == segments_before
+    assert draft_manager.get_draft_config(draft_id)["version"] == version_before
+
+    draft_manager.delete_draft(draft_id)
+    print("✅ 无效批量命令测试通过\n")
+
+
+def test_generated_handler_binds_batch_ids(monkeypatch):
+    """测试生成的 batch_draft 工具：一次 API 调用，并把临时 ID 绑定到 segment_{uuid} 变量"""
+    print("测试 batch_draft 工具...")
+
+    # 模拟 runtime 模块（仅在 Coze 环境中可用）
+    runtime_module = MagicMock()
+    runtime_module.Args = Args
+    monkeypatch.setitem(sys.modules, "runtime", runtime_module)
+
+    handler_path = project_root / "coze_plugin" / "raw_tools" / "batch_draft" / "handler.py"
+    spec = importlib.util.spec_from_file_location("batch_draft_handler", handler_path)
+    handler_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(handler_module)
+
+    api_calls = []
+    monkeypatch.setattr(handler_module, "ensure_coze2jianying_file", lambda: "/dev/null")
+    monkeypatch.setattr(handler_module, "append_api_call_to_file", lambda path, code: api_calls.append(code))
+
+    commands = [
+        SimpleNamespace(action="create_segment", ref="caption", segment_type="text",
+                        params=SimpleNamespace(text_content="字幕", target_timerange=SimpleNamespace(start=0, duration=1000000))),
+        SimpleNamespace(action="add_operation", segment_id="abc_123", operation="add_fade",
+                        params=SimpleNamespace(in_duration="1s")),
+        SimpleNamespace(action="add_segment", segment_ref="caption"),
+    ]
+    args = Args(SimpleNamespace(draft_id="draft_uuid", commands=commands))
+    result = handler_module.handler(args)
+    print(api_calls[0])
+
+    assert result["success"] is True
+    assert set(result["ids"]) == {"caption"}
+    assert len(api_calls) == 1
+    code = api_calls[0]
+    assert code.count("await batch_draft(draft_draft_uuid") == 1
+    assert code.count("BatchCommand(") == 3
+    assert 'params={"text_content": "字幕", "target_timerange": TimeRange(start=0, duration=1000000)}' in code
+    assert "segment_id=segment_abc_123" in code
+    assert f"segment_{result['ids']['caption']} = resp_" in code
+    assert ".ids['caption']" in code
+    print("✅ batch_draft 工具测试通过\n")
+
+
+def test_failed_attach_rolls_back_operations(monkeypatch):
+    """测试添加到草稿失败时删除新建片段，并撤销已存在片段上添加的操作"""
+    print("测试批量操作回滚...")
+    draft_manager = draft_routes.draft_manager
+    segment_manager = draft_routes.segment_manager
+    draft_id = draft_manager.create_draft("批量回滚", 1920, 1080, 30)["draft_id"]
+    created = asyncio.run(_post(f"/api/draft/{draft_id}/batch", {"commands": _commands()[:2]}))["ids"]
+    existing = created["clip"]
+    operations_before = list(segment_manager.get_segment(existing)["operations"])
+    segments_before = set(segment_manager.store.list_segment_ids())
+    version_before = draft_manager.get_draft_config(draft_id)["version"]
+
+    monkeypatch.setattr(draft_manager, "modify_draft", lambda *args, **kwargs: (False, None))
+    commands = [
+        {"action": "add_operation", "segment_id": existing, "operation": "add_fade", "params": {"in_duration": "1s", "out_duration": "0s"}},
+        {"action": "create_segment", "ref": "caption", "segment_type": "text", "params": {"text_content": "字幕", "target_timerange": {"start": 0, "duration": 1000000}}},
+        {"action": "add_segment", "segment_ref": "caption"},
+    ]
+    data = asyncio.run(_post(f"/api/draft/{draft_id}/batch", {"commands": commands}))
+    assert data["error_code"] != "SUCCESS"
+
+    assert set(segment_manager.store.list_segment_ids()) == segments_before
+    assert segment_manager.get_segment(existing)["operations"] == operations_before
+    assert draft_manager.get_draft_config(draft_id)["version"] == version_before
+
+    monkeypatch.undo()
+    for segment_id in created.values():
+        segment_manager.delete_segment(segment_id)
+    draft_manager.delete_draft(draft_id)
+    print("✅ 批量操作回滚测试通过\n")
@@ -0,0 +1,88 @@
+"""
+阻塞操作卸载测试
+
+验证草稿保存在线程池中执行时，事件循环上的其它请求（如查询草稿状态）不会被阻塞
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import httpx
+
+from app.backend.api import draft_routes
+from app.backend.api_main import app
+from app.backend.utils.draft_saver import DraftSaver
+from app.backend.utils.blocking_io import run_blocking
+
+SAVE_SECONDS = 1.5
+
+
+def test_run_blocking_returns_result():
+    """测试 run_blocking 返回同步函数的结果并传递异常"""
+    print("测试 run_blocking...")
+
+    async def run():
+        assert await run_blocking(sum, [1, 2, 3]) == 6
+        try:
+            await run_blocking(int, "abc")
+        except ValueError:
+            return True
+        return False
+
+    assert asyncio.run(run())
+    print("✅ run_blocking 测试通过\n")
+
+
+def test_status_responsive_during_save(monkeypatch):
+    """测试大草稿保存期间状态查询仍然及时响应"""
+    print("测试保存期间的状态查询...")
+
+    def slow_save(self, draft_id, progress=None):
+        # 模拟下载素材和写出草稿文件的同步耗时
+        time.sleep(SAVE_SECONDS)
+        return f"/tmp/{draft_id}"
+
+    monkeypatch.setattr(DraftSaver, "save_draft", slow_save)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            created = await client.post(
+                "/api/draft/create",
+                json={"draft_name": "保存期间查询", "width": 1920, "height": 1080, "fps": 30},
+            )
+            draft_id = created.json()["draft_id"]
+
+            started = time.perf_counter()
+            save_task = asyncio.create_task(client.post(f"/api/draft/{draft_id}/save"))
+            await asyncio.sleep(0.1)
+
+            latencies = []
+            for _ in range(10):
+                request_started = time.perf_counter()
+                response = await client.get(f"/api/draft/{draft_id}/status")
+                latencies.append(time.perf_counter() - request_started)
+                assert response.status_code == 200
+            status_done = time.perf_counter() - started
+
+            save_response = await save_task
+            save_done = time.perf_counter() - started
+            return draft_id, latencies, status_done, save_done, save_response.json()
+
+    draft_id, latencies, status_done, save_done, save_data = asyncio.run(run())
+    print(f"状态查询最大耗时: {max(latencies) * 1000:.1f} ms，保存耗时: {save_done:.2f} s")
+
+    assert save_data["success"] is True
+    assert save_data["draft_path"] == f"/tmp/{draft_id}"
+    # 所有状态查询都在保存完成之前返回
+    assert status_done < SAVE_SECONDS
+    assert max(latencies) < SAVE_SECONDS / 3
+    assert save_done >= SAVE_SECONDS
+
+    draft_routes.draft_manager.delete_draft(draft_id)
+    print("✅ 保存期间状态查询测试通过\n")
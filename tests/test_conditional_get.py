@@ -0,0 +1,119 @@
+"""
+条件请求测试
+
+验证草稿状态和片段详情返回 ETag，未变化时返回 304 或缓存的响应，修改后返回新内容
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import httpx
+
+from app.backend.api import draft_routes, segment_routes
+from app.backend.api_main import app
+from app.backend.schemas.segment_schemas import DraftStatusResponse
+
+
+def test_draft_status_conditional_get(monkeypatch):
+    """测试草稿状态的 ETag、304 和缓存响应"""
+    print("测试草稿状态条件请求...")
+    draft_manager = draft_routes.draft_manager
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            draft_id = (await client.post(
+                "/api/draft/create",
+                json={"draft_name": "条件请求", "width": 1920, "height": 1080, "fps": 30},
+            )).json()["draft_id"]
+            path = f"/api/draft/{draft_id}/status"
+
+            first = await client.get(path)
+            etag = first.headers["etag"]
+            not_modified = await client.get(path, headers={"If-None-Match": etag})
+            since = await client.get(path, headers={"If-Modified-Since": first.headers["last-modified"]})
+
+            # 状态未变化时不再读取完整草稿配置
+            loads = []
+            original = draft_manager.get_draft_config
+            monkeypatch.setattr(draft_manager, "get_draft_config", lambda *a: loads.append(a) or original(*a))
+            cached = await client.get(path)
+            monkeypatch.undo()
+
+            segment_id = (await client.post(
+                "/api/segment/video/create",
+                json={"material_url": "https://example.com/video.mp4",
+                      "target_timerange": {"start": 0, "duration": 1000000}},
+            )).json()["segment_id"]
+            await client.post(f"/api/draft/{draft_id}/add_segment", json={"segment_id": segment_id})
+            changed = await client.get(path, headers={"If-None-Match": etag})
+            return draft_id, segment_id, first, not_modified, since, loads, cached, changed
+
+    draft_id, segment_id, first, not_modified, since, loads, cached, changed = asyncio.run(run())
+
+    assert first.status_code == 200
+    assert first.json()["draft_id"] == draft_id
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == first.headers["etag"]
+    assert since.status_code == 304
+    assert cached.status_code == 200
+    assert cached.content == first.content
+    assert loads == []
+
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != first.headers["etag"]
+    assert [segment["segment_id"] for segment in changed.json()["segments"]] == [segment_id]
+
+    # 直接调用（脚本执行器）仍返回响应模型
+    assert isinstance(asyncio.run(draft_routes.get_draft_status(draft_id)), DraftStatusResponse)
+
+    draft_routes.segment_manager.delete_segment(segment_id)
+    draft_manager.delete_draft(draft_id)
+    print("✅ 草稿状态条件请求测试通过\n")
+
+
+def test_segment_detail_conditional_get():
+    """测试片段详情的 ETag，添加操作和更新下载状态后返回新内容"""
+    print("测试片段详情条件请求...")
+    segment_manager = draft_routes.segment_manager
+    segment_id = segment_manager.create_segment(
+        "video", {"material_url": "https://example.com/video.mp4"}
+    )["segment_id"]
+    path = f"/api/segment/video/{segment_id}"
+
+    async def get(headers=None):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+
+    first = asyncio.run(get())
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+    assert first.json()["success"] is True
+    # 缓存的响应体会被重复返回，不包含固定的时间戳
+    assert first.json()["timestamp"] is None
+    assert asyncio.run(get()).content == first.content
+    assert asyncio.run(get({"If-None-Match": etag})).status_code == 304
+    assert asyncio.run(get({"If-None-Match": f'"other", W/{etag}'})).status_code == 304
+
+    segment_manager.add_operation(segment_id, "add_fade", {"in_duration": "1s", "out_duration": "0s"})
+    after_operation = asyncio.run(get({"If-None-Match": etag}))
+    assert after_operation.status_code == 200
+    assert len(after_operation.json()["properties"]["operations"]) == 1
+
+    segment_manager.update_download_status(segment_id, "completed", "/tmp/video.mp4")
+    after_download = asyncio.run(get({"If-None-Match": after_operation.headers["etag"]}))
+    assert after_download.status_code == 200
+    assert after_download.json()["download_status"] == "completed"
+
+    # 直接调用仍返回字典
+    detail = asyncio.run(segment_routes.get_segment_detail("video", segment_id))
+    assert detail["local_path"] == "/tmp/video.mp4"
+
+    segment_manager.delete_segment(segment_id)
+    print("✅ 片段详情条件请求测试通过\n")
@@ -0,0 +1,261 @@
+"""
+后台素材下载队列测试
+
+验证创建带 material_url 的片段后立即在后台下载素材，download_status / local_path 随下载更新，
+同一 URL 只下载一次；保存草稿时 DraftSaver 直接使用已下载的文件（包括服务重启后），
+启用全局素材缓存时不在下载目录保留文件，未启用时草稿保存或片段删除后删除下载的文件
+"""
+import os
+import sys
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+
+from app.backend.database.state_store import create_state_store
+from app.backend.utils import download_queue as download_queue_module
+from app.backend.utils import draft_saver as draft_saver_module
+from app.backend.utils.download_queue import MaterialDownloadQueue
+from app.backend.utils.draft_saver import DraftSaver
+from app.backend.utils.material_store import MaterialStore
+from app.backend.utils.segment_manager import SegmentManager
+
+AUDIO = b"ID3\x03" + b"\x01" * 20000
+
+
+class _GatedHandler(SimpleHTTPRequestHandler):
+    """release 之前不返回响应，记录收到的请求路径"""
+
+    requests = None
+    release = None
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        self.release.wait(10)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    media = tmp_path / "media"
+    media.mkdir()
+    (media / "voice.mp3").write_bytes(AUDIO)
+    state = {"requests": [], "release": threading.Event()}
+    handler = type("Handler", (_GatedHandler,), state)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=str(media)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", state
+    state["release"].set()
+    httpd.shutdown()
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(draft_saver_module, "get_material_store", lambda: None)
+    monkeypatch.setattr(download_queue_module, "get_material_store", lambda: None)
+    monkeypatch.setattr(draft_saver_module.time, "sleep", lambda seconds: None)
+    queue = MaterialDownloadQueue(str(tmp_path / "prefetched"), workers=2)
+    monkeypatch.setattr(download_queue_module, "get_download_queue", lambda: queue)
+    monkeypatch.setattr(draft_saver_module, "get_download_queue", lambda: queue)
+    yield queue
+    queue.shutdown()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_segment_creation_starts_download(server, queue, tmp_path):
+    """测试创建片段即开始下载，状态依次为 downloading、completed，相同 URL 的片段共用一次下载"""
+    print("测试创建片段时后台下载...")
+    base_url, state = server
+    url = f"{base_url}/voice.mp3?sig=abc"
+    manager = SegmentManager(str(tmp_path / "segments"), store=create_state_store("file", str(tmp_path / "segments")))
+
+    first = manager.create_segment("audio", {"material_url": url})["segment_id"]
+    assert _wait_for(lambda: manager.get_segment(first)["download_status"] == "downloading")
+    second = manager.create_segment("audio", {"material_url": url})["segment_id"]
+    text = manager.create_segment("text", {"text": "字幕"})["segment_id"]
+    assert manager.get_segment(second)["download_status"] == "pending"
+
+    state["release"].set()
+    path = queue.wait(url, timeout=10)
+    assert Path(path).read_bytes() == AUDIO
+    assert Path(path).parent == tmp_path / "prefetched"
+    for segment_id in (first, second):
+        assert _wait_for(lambda: manager.get_segment(segment_id)["download_status"] == "completed")
+        assert manager.get_segment(segment_id)["local_path"] == path
+    assert manager.get_segment(text)["download_status"] == "none"
+    assert state["requests"] == ["/voice.mp3?sig=abc"]
+
+    # 已下载过的素材立即标记为完成
+    third = manager.create_segment("audio", {"material_url": url})["segment_id"]
+    assert manager.get_segment(third)["download_status"] == "completed"
+    assert len(state["requests"]) == 1
+    assert queue.stats() == {"downloading": 0, "completed": 1, "failed": 0}
+    # 下载结束后不再保留下载任务
+    assert queue._futures == {}
+    print("✅ 创建片段时后台下载测试通过\n")
+
+
+def test_draft_saver_reuses_background_download(server, queue, tmp_path, monkeypatch):
+    """测试保存草稿时等待仍在下载的素材并直接使用，服务重启后使用片段记录的路径"""
+    print("测试保存草稿复用后台下载...")
+    base_url, state = server
+    url = f"{base_url}/voice.mp3"
+    manager = SegmentManager(str(tmp_path / "segments"), store=create_state_store("file", str(tmp_path / "segments")))
+    segment_id = manager.create_segment("audio", {"material_url": url})["segment_id"]
+
+    saver = DraftSaver(output_dir=str(tmp_path / "output"))
+    threading.Timer(0.2, state["release"].set).start()
+    # 仍在下载时等待下载完成
+    prefetched = saver._prefetched_path(manager.get_segment(segment_id))
+    assert prefetched is not None and Path(prefetched).read_bytes() == AUDIO
+    draft_assets = tmp_path / "draft_assets"
+    draft_assets.mkdir()
+    local_path = saver.download_material(url, str(draft_assets), prefetched)
+    assert Path(local_path).parent == draft_assets
+    assert os.path.samefile(local_path, prefetched)
+    assert state["requests"] == ["/voice.mp3"]
+
+    # 服务重启后队列为空，使用片段记录的 local_path
+    assert _wait_for(lambda: manager.get_segment(segment_id)["download_status"] == "completed")
+    restarted = MaterialDownloadQueue(str(tmp_path / "prefetched"))
+    monkeypatch.setattr(draft_saver_module, "get_download_queue", lambda: restarted)
+    assert saver._prefetched_path(manager.get_segment(segment_id)) == prefetched
+    restarted.shutdown()
+    print("✅ 保存草稿复用后台下载测试通过\n")
+
+
+def test_failed_background_download(server, queue, tmp_path):
+    """测试后台下载失败时片段标记为 failed，保存草稿时重新下载"""
+    print("测试后台下载失败...")
+    base_url, state = server
+    state["release"].set()
+    url = f"{base_url}/missing.mp3"
+    manager = SegmentManager(str(tmp_path / "segments"), store=create_state_store("file", str(tmp_path / "segments")))
+    segment_id = manager.create_segment("audio", {"material_url": url})["segment_id"]
+
+    assert queue.wait(url, timeout=10) is None
+    assert _wait_for(lambda: manager.get_segment(segment_id)["download_status"] == "failed")
+    saver = DraftSaver(output_dir=str(tmp_path / "output"))
+    assert saver._prefetched_path(manager.get_segment(segment_id)) is None
+    assert queue.stats()["failed"] == 1
+    print("✅ 后台下载失败测试通过\n")
+
+
+def test_background_download_kept_in_material_store(server, queue, tmp_path, monkeypatch):
+    """测试启用全局素材缓存时下载的素材只保存在缓存中，保存草稿时从缓存链接"""
+    print("测试后台下载使用全局素材缓存...")
+    base_url, state = server
+    state["release"].set()
+    store = MaterialStore(tmp_path / "store")
+    monkeypatch.setattr(draft_saver_module, "get_material_store", lambda: store)
+    monkeypatch.setattr(download_queue_module, "get_material_store", lambda: store)
+    url = f"{base_url}/voice.mp3"
+    manager = SegmentManager(str(tmp_path / "segments"), store=create_state_store("file", str(tmp_path / "segments")))
+    segment_id = manager.create_segment("audio", {"material_url": url})["segment_id"]
+
+    path = queue.wait(url, timeout=10)
+    assert Path(path) == store.get(url)
+    assert list((tmp_path / "prefetched").iterdir()) == []
+    assert _wait_for(lambda: manager.get_segment(segment_id)["local_path"] == path)
+
+    saver = DraftSaver(output_dir=str(tmp_path / "output"))
+    draft_assets = tmp_path / "draft_assets"
+    draft_assets.mkdir()
+    local_path = saver.download_material(url, str(draft_assets), saver._prefetched_path(manager.get_segment(segment_id)))
+    assert os.path.samefile(local_path, path)
+    # 缓存中的文件由缓存按大小淘汰，草稿保存后不删除
+    queue.release(url, path)
+    assert Path(path).is_file()
+    assert state["requests"] == ["/voice.mp3"]
+    print("✅ 后台下载使用全局素材缓存测试通过\n")
+
+
+def test_release_background_download(server, queue, tmp_path, monkeypatch):
+    """测试未启用全局素材缓存时按片段引用计数删除下载目录中的文件"""
+    print("测试释放后台下载的素材...")
+    base_url, state = server
+    state["release"].set()
+    url = f"{base_url}/voice.mp3"
+    manager = SegmentManager(str(tmp_path / "segments"), store=create_state_store("file", str(tmp_path / "segments")))
+    monkeypatch.setattr(draft_saver_module, "get_segment_manager", lambda: manager)
+    first = manager.create_segment("audio", {"material_url": url})["segment_id"]
+    second = manager.create_segment("audio", {"material_url": url})["segment_id"]
+    path = queue.wait(url, timeout=10)
+    for segment_id in (first, second):
+        assert _wait_for(lambda: manager.get_segment(segment_id)["download_status"] == "completed")
+
+    # 保存第一个片段所在的草稿：片段改为引用草稿中的文件，第二个片段仍在使用下载的文件
+    saver = DraftSaver(output_dir=str(tmp_path / "output"))
+    draft_assets = tmp_path / "draft_assets"
+    draft_assets.mkdir()
+    local_path = saver.download_material(url, str(draft_assets), path)
+    saver._release_prefetched([(first, url, path)], str(draft_assets))
+    assert manager.get_segment(first)["local_path"] == local_path
+    assert manager.get_segment(first)["download_status"] == "completed"
+    assert Path(path).read_bytes() == AUDIO
+    assert queue.wait(url) == path
+
+    # 最后一个引用的片段被删除后删除文件，草稿中的文件不受影响
+    assert manager.delete_segment(second)
+    assert not Path(path).exists()
+    assert Path(local_path).read_bytes() == AUDIO
+    assert queue.wait(url) is None
+
+    # 删除时恰好又有片段引用该文件：重置为 pending 并重新下载
+    third = manager.create_segment("audio", {"material_url": url})["segment_id"]
+    assert _wait_for(lambda: manager.get_segment(third)["download_status"] == "completed")
+    assert len(state["requests"]) == 2
+    owners = manager._prefetched_owners
+    checks = []
+
+    def owners_appear_after_check():
+        # 检查时还没有片段引用，删除文件后再查询时出现
+        checks.append(1)
+        return {} if len(checks) == 1 else owners()
+
+    monkeypatch.setattr(manager, "_prefetched_owners", owners_appear_after_check)
+    manager.release_prefetched([(url, path)])
+    assert _wait_for(lambda: len(state["requests"]) == 3)
+    assert _wait_for(lambda: manager.get_segment(third)["download_status"] == "completed")
+    assert Path(manager.get_segment(third)["local_path"]).read_bytes() == AUDIO
+    print("✅ 释放后台下载的素材测试通过\n")
+
+
+def test_shutdown_cancels_pending_downloads(server, tmp_path, monkeypatch):
+    """测试停止队列时取消尚未开始的下载"""
+    print("测试停止下载队列...")
+    base_url, state = server
+    monkeypatch.setattr(draft_saver_module, "get_material_store", lambda: None)
+    monkeypatch.setattr(download_queue_module, "get_material_store", lambda: None)
+    queue = MaterialDownloadQueue(str(tmp_path / "prefetched"), workers=1)
+    statuses = []
+    queue.submit(f"{base_url}/voice.mp3?n=1", lambda status, path: statuses.append(status))
+    assert _wait_for(lambda: len(state["requests"]) == 1)
+    pending = f"{base_url}/voice.mp3?n=2"
+    queue.submit(pending, lambda status, path: statuses.append(status))
+    future = queue._futures[pending]
+
+    queue.shutdown()
+    assert future.cancelled()
+    state["release"].set()
+    assert _wait_for(lambda: statuses == ["downloading", "completed"])
+    assert state["requests"] == ["/voice.mp3?n=1"]
+    print("✅ 停止下载队列测试通过\n")
@@ -0,0 +1,99 @@
+"""
+草稿并发控制测试
+
+验证同一草稿的并行请求不会丢失更新，以及版本号的比较并交换语义
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.backend.api import draft_routes
+from app.backend.database.state_store import FileStateStore
+from app.backend.database.sqlite_store import SQLiteStateStore
+from app.backend.schemas.segment_schemas import AddTrackRequest, CreateDraftRequest
+from app.backend.utils.draft_state_manager import DraftStateManager
+
+
+def test_parallel_add_track_keeps_all_updates():
+    """测试并行添加轨道时没有更新丢失"""
+    print("测试并行添加轨道...")
+
+    async def run():
+        created = await draft_routes.create_draft(
+            CreateDraftRequest(draft_name="并发测试", width=1920, height=1080, fps=30)
+        )
+        draft_id = created.draft_id
+        responses = await asyncio.gather(*[
+            draft_routes.add_track(draft_id, AddTrackRequest(track_type="video"))
+            for _ in range(20)
+        ])
+        return draft_id, responses
+
+    draft_id, responses = asyncio.run(run())
+
+    assert all(r.error_code == "SUCCESS" for r in responses)
+    assert sorted(r.track_index for r in responses) == list(range(20))
+    config = draft_routes.draft_manager.get_draft_config(draft_id)
+    assert len(config["tracks"]) == 20
+    assert config["version"] == 21
+    # 请求结束后草稿锁被移除
+    assert draft_id not in draft_routes.draft_manager._draft_locks
+
+    draft_routes.draft_manager.delete_draft(draft_id)
+    print("✅ 并行添加轨道测试通过\n")
+
+
+def test_version_compare_and_swap(tmp_path):
+    """测试两个管理器（模拟两个 worker 进程）之间的版本冲突"""
+    print("测试版本比较并交换...")
+
+    for store in (FileStateStore(str(tmp_path / "file")), SQLiteStateStore(str(tmp_path / "state.db"))):
+        worker_a = DraftStateManager(str(tmp_path), store=store)
+        worker_b = DraftStateManager(str(tmp_path), store=store)
+
+        draft_id = worker_a.create_draft("版本测试", 1280, 720, 30)["draft_id"]
+        config_a = worker_a.get_draft_config(draft_id)
+        config_b = worker_b.get_draft_config(draft_id)
+        assert config_a["version"] == config_b["version"] == 1
+
+        config_a["tracks"].append({"track_type": "video", "segments": []})
+        assert worker_a.update_draft_config(draft_id, config_a, expected_version=1)
+
+        # worker_b 基于旧版本写入会被拒绝
+        config_b["tracks"].append({"track_type": "audio", "segments": []})
+        assert not worker_b.update_draft_config(draft_id, config_b, expected_version=1)
+
+        # modify_draft 自动重新读取并重试
+        success, count = worker_b.modify_draft(
+            draft_id,
+            lambda config: config["tracks"].append({"track_type": "audio", "segments": []}) or len(config["tracks"])
+        )
+        assert success and count == 2
+
+        final = worker_a.get_draft_config(draft_id)
+        assert [t["track_type"] for t in final["tracks"]] == ["video", "audio"]
+        assert final["version"] == 3
+        store.close()
+
+    print("✅ 版本比较并交换测试通过\n")
+
+
+def test_compare_and_swap_after_delete(tmp_path):
+    """测试草稿删除后比较并交换失败，且不会重新创建草稿目录"""
+    print("测试删除后的比较并交换...")
+
+    store = FileStateStore(str(tmp_path))
+    manager = DraftStateManager(str(tmp_path), store=store)
+    draft_id = manager.create_draft("删除测试", 1280, 720, 30)["draft_id"]
+    config = manager.get_draft_config(draft_id)
+
+    assert store.delete_draft(draft_id) is True
+    config["version"] = 2
+    assert store.save_draft_if_version(draft_id, config, expected_version=1) is False
+    assert not (store.drafts_dir / draft_id).exists()
+    assert store.delete_draft(draft_id) is False
+    print("✅ 删除后的比较并交换测试通过\n")
@@ -0,0 +1,143 @@
+"""
+共享 HTTP 客户端测试
+
+验证素材下载复用 keep-alive 连接、按主机配置连接数、统一的 CDN 请求头规则，
+以及 HTTP/2 使用的 httpx 适配器
+"""
+import sys
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+import requests
+
+from app.backend.utils import http_client as http_client_module
+from app.backend.utils import material_manager as material_manager_module
+from app.backend.utils.http_client import HttpClient, HttpxAdapter, build_headers
+from app.backend.utils.material_manager import MaterialManager
+
+
+class _KeepAliveHandler(SimpleHTTPRequestHandler):
+    """HTTP/1.1 keep-alive 服务，记录连接数和请求头；/redirect/<name> 重定向到 /<name>"""
+
+    protocol_version = "HTTP/1.1"
+    stats = None
+
+    def setup(self):
+        super().setup()
+        with self.stats["lock"]:
+            self.stats["connections"] += 1
+
+    def _redirect(self):
+        if not self.path.startswith("/redirect/"):
+            return False
+        self.send_response(302)
+        self.send_header("Location", self.path[len("/redirect"):])
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return True
+
+    def do_GET(self):
+        self.stats["headers"].append(dict(self.headers))
+        if not self._redirect():
+            super().do_GET()
+
+    def do_HEAD(self):
+        if not self._redirect():
+            super().do_HEAD()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    media = tmp_path / "media"
+    media.mkdir()
+    for i in range(5):
+        (media / f"clip{i}.mp4").write_bytes(bytes([i]) * 4096)
+    stats = {"lock": threading.Lock(), "connections": 0, "headers": []}
+    handler = type("Handler", (_KeepAliveHandler,), {"stats": stats})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=str(media)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", stats
+    httpd.shutdown()
+
+
+def test_material_downloads_reuse_connection(server, tmp_path, monkeypatch):
+    """测试多个素材的下载请求复用同一个连接"""
+    print("测试连接复用...")
+    base_url, stats = server
+    client = HttpClient(pool_size=4, http2="off")
+    monkeypatch.setattr(http_client_module, "_http_client", client)
+    # 不使用全局素材缓存，每次测试都实际下载
+    monkeypatch.setattr(material_manager_module, "get_material_store", lambda: None)
+
+    manager = MaterialManager(str(tmp_path / "drafts"), "连接复用", project_id="pool")
+    paths = [manager.download_material(f"{base_url}/clip{i}.mp4") for i in range(5)]
+
+    assert [Path(path).read_bytes()[:1] for path in paths] == [bytes([i]) for i in range(5)]
+    # 5 个请求只建立一个连接
+    assert stats["connections"] == 1
+    assert stats["headers"][0]["Accept-Encoding"] == "identity"
+    client.close()
+    print("✅ 连接复用测试通过\n")
+
+
+def test_host_pool_sizes_and_headers():
+    """测试按主机配置连接数，以及 CDN 的 Referer/Origin 规则"""
+    print("测试主机连接数与请求头...")
+    client = HttpClient(pool_size=2, host_pool_sizes={"cdn.example.com": 8}, http2="off")
+    pool_size = lambda url: client.session.get_adapter(url)._pool_maxsize
+    assert pool_size("https://cdn.example.com/a.mp4") == 8
+    assert pool_size("https://other.example.com/a.mp4") == 2
+    client.close()
+
+    assert http_client_module._parse_host_pool_sizes("a.com=4, b.com = 2,bad") == {"a.com": 4, "b.com": 2}
+
+    coze = build_headers("https://lf3-appstore-sign.oceancloudapi.com/ocean-cloud-tos/a.png")
+    assert coze["Referer"] == "https://www.coze.cn/" and coze["Origin"] == "https://www.coze.cn"
+    tts = build_headers("https://lf9.oceancloudapi.com/VolcanoUserVoice/speech_1.mp3?x-signature=1")
+    assert tts["Accept"].startswith("audio/mpeg") and tts["Cache-Control"] == "no-cache"
+    assert build_headers("https://bucket.s3.amazonaws.com/a.mp4")["Referer"] == "https://aws.amazon.com/"
+    # 只按主机匹配，查询参数中出现 CDN 域名不影响
+    assert "Referer" not in build_headers("https://example.com/a.mp4?from=bytedance.com")
+    # 重试时换用备选请求头
+    assert build_headers("https://example.com/a.mp4", strategy=2)["User-Agent"].startswith("curl/")
+    assert build_headers("https://example.com/a.mp4", strategy=9) == build_headers("https://example.com/a.mp4", strategy=2)
+    print("✅ 主机连接数与请求头测试通过\n")
+
+
+@pytest.mark.skipif(not http_client_module.HTTPX_AVAILABLE, reason="未安装 httpx")
+def test_httpx_adapter(server):
+    """测试 httpx 适配器（HTTP/2 模式使用）的重定向、流式读取和错误状态"""
+    print("测试 httpx 适配器...")
+    base_url, stats = server
+    client = HttpClient(pool_size=4, http2="off")
+    adapter = HttpxAdapter(http2=False, pool_size=4)
+    client.session.mount("http://", adapter)
+
+    response = client.get(f"{base_url}/redirect/clip3.mp4", stream=True, timeout=10)
+    response.raise_for_status()
+    assert response.url == f"{base_url}/clip3.mp4"
+    assert len(response.history) == 1
+    assert b"".join(response.iter_content(chunk_size=1000)) == bytes([3]) * 4096
+
+    assert client.head(f"{base_url}/clip1.mp4", timeout=10).headers["Content-Length"] == "4096"
+    assert client.get(f"{base_url}/clip2.mp4", timeout=(5, 10)).content == bytes([2]) * 4096
+
+    missing = client.get(f"{base_url}/missing.mp4", timeout=10)
+    with pytest.raises(requests.HTTPError):
+        missing.raise_for_status()
+    with pytest.raises(requests.ConnectionError):
+        client.get("http://127.0.0.1:1/clip.mp4", timeout=2)
+
+    assert stats["connections"] == 1
+    client.close()
+    print("✅ httpx 适配器测试通过\n")
@@ -0,0 +1,196 @@
+"""
+幂等键测试
+
+验证重试的创建草稿、创建片段和保存草稿请求返回第一次的结果而不重复执行，
+幂等键用于不同请求时报告冲突，以及记录的保留时间
+"""
+import asyncio
+import ctypes
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import httpx
+
+from app.backend.api import draft_routes
+from app.backend.api_main import app
+from app.backend.utils.draft_saver import DraftSaver
+from app.backend.utils import idempotency as idempotency_module
+from app.backend.utils.idempotency import CLAIMED, CONFLICT, IN_PROGRESS, REPLAY, IdempotencyStore
+
+
+def _client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_retried_create_returns_original_result():
+    """测试重试的创建草稿和创建片段请求返回同一个 ID"""
+    print("测试重试创建请求...")
+    draft_manager = draft_routes.draft_manager
+    segment_manager = draft_routes.segment_manager
+    key = str(uuid.uuid4())
+    draft_payload = {"draft_name": "幂等草稿", "width": 1920, "height": 1080, "fps": 30}
+    segment_payload = {
+        "material_url": "https://example.com/video.mp4",
+        "target_timerange": {"start": 0, "duration": 1000000},
+        "idempotency_key": key,
+    }
+
+    async def run():
+        async with _client() as client:
+            drafts = [
+                await client.post("/api/draft/create", json=draft_payload, headers={"Idempotency-Key": key})
+                for _ in range(3)
+            ]
+            segments = [await client.post("/api/segment/video/create", json=segment_payload) for _ in range(2)]
+            conflict = await client.post(
+                "/api/draft/create", json={**draft_payload, "draft_name": "另一个草稿"},
+                headers={"Idempotency-Key": key}
+            )
+            return drafts, segments, conflict
+
+    drafts_before = set(draft_manager.list_all_drafts())
+    drafts, segments, conflict = asyncio.run(run())
+
+    draft_ids = {response.json()["draft_id"] for response in drafts}
+    assert len(draft_ids) == 1
+    assert "idempotent-replayed" not in drafts[0].headers
+    assert drafts[1].headers["idempotent-replayed"] == "true"
+    assert set(draft_manager.list_all_drafts()) - drafts_before == draft_ids
+
+    segment_ids = {response.json()["segment_id"] for response in segments}
+    assert len(segment_ids) == 1
+    # 幂等键字段不写入片段配置
+    assert "idempotency_key" not in segment_manager.get_segment(segment_ids.pop())["config"]
+
+    data = conflict.json()
+    assert data["success"] is True
+    assert data["error_code"] == "IDEMPOTENCY_CONFLICT"
+
+    segment_manager.delete_segment(segments[0].json()["segment_id"])
+    draft_manager.delete_draft(draft_ids.pop())
+    print("✅ 重试创建请求测试通过\n")
+
+
+def test_concurrent_retried_save_runs_once(monkeypatch):
+    """测试第一次保存仍在执行时重试，只执行一次保存；失败的保存不保存结果"""
+    print("测试重试保存请求...")
+    calls = []
+
+    def slow_save(self, draft_id, progress=None):
+        calls.append(draft_id)
+        time.sleep(0.5)
+        return f"/tmp/{draft_id}"
+
+    monkeypatch.setattr(DraftSaver, "save_draft", slow_save)
+    draft_id = draft_routes.draft_manager.create_draft("幂等保存", 1920, 1080, 30)["draft_id"]
+    key = str(uuid.uuid4())
+
+    async def run():
+        async with _client() as client:
+            first = asyncio.create_task(client.post(f"/api/draft/{draft_id}/save?idempotency_key={key}"))
+            await asyncio.sleep(0.1)
+            # Coze 超时后重试
+            retry = await client.post(f"/api/draft/{draft_id}/save", headers={"Idempotency-Key": key})
+            return await first, retry
+
+    first, retry = asyncio.run(run())
+    assert calls == [draft_id]
+    assert first.json()["draft_path"] == f"/tmp/{draft_id}"
+    assert retry.json() == first.json()
+
+    def failing_save(self, draft_id, progress=None):
+        calls.append(draft_id)
+        raise RuntimeError("素材下载失败")
+
+    monkeypatch.setattr(DraftSaver, "save_draft", failing_save)
+    failed_key = str(uuid.uuid4())
+
+    async def run_failed():
+        async with _client() as client:
+            return [
+                (await client.post(f"/api/draft/{draft_id}/save", headers={"Idempotency-Key": failed_key})).json()
+                for _ in range(2)
+            ]
+
+    failed = asyncio.run(run_failed())
+    assert all(data["error_code"] != "SUCCESS" for data in failed)
+    assert len(calls) == 3
+
+    draft_routes.draft_manager.delete_draft(draft_id)
+    print("✅ 重试保存请求测试通过\n")
+
+
+def test_records_shared_and_expire(tmp_path):
+    """测试记录在进程间共享，并在保留时间后清除"""
+    print("测试幂等键记录保留时间...")
+    worker_a = IdempotencyStore(ttl=60, keys_dir=str(tmp_path))
+    worker_b = IdempotencyStore(ttl=60, keys_dir=str(tmp_path))
+    scope = "POST /api/draft/create"
+
+    assert worker_a.begin(scope, "key", "fingerprint")[0] == CLAIMED
+    worker_a.complete(scope, "key", "fingerprint", {"status": 200, "headers": [], "body": "{}"})
+
+    outcome, record = worker_b.begin(scope, "key", "fingerprint")
+    assert outcome == REPLAY
+    assert record["response"]["body"] == "{}"
+    assert worker_b.begin(scope, "key", "other")[0] == CONFLICT
+    # 不同路径的同名幂等键互不影响
+    assert worker_b.begin("POST /api/draft/other", "key", "other")[0] == CLAIMED
+
+    assert worker_b.purge_expired(now=time.time() + 120) == 1
+    assert worker_a.begin(scope, "key", "other")[0] == CLAIMED
+    print("✅ 幂等键记录保留时间测试通过\n")
+
+
+def test_pending_marker_of_dead_process_reclaimed(tmp_path, monkeypatch):
+    """测试执行请求的进程退出后，pending 标记立即失效；Windows 上不使用 os.kill 探测进程"""
+    print("测试失效的 pending 标记...")
+    store = IdempotencyStore(ttl=60, keys_dir=str(tmp_path))
+    scope = "POST /api/draft/create"
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    store._path(scope, "dead").write_text(json.dumps(
+        {"status": "pending", "fingerprint": "fingerprint", "created_at": time.time(), "pid": child.pid}
+    ))
+    assert store.begin(scope, "dead", "fingerprint")[0] == CLAIMED
+
+    # 模拟 Windows：通过 OpenProcess 判断，os.kill 不会被调用
+    def no_kill(pid, sig):
+        raise AssertionError("Windows 上不应调用 os.kill")
+
+    class FakeKernel32:
+        alive = set()
+
+        def OpenProcess(self, access, inherit, pid):
+            return pid if pid in self.alive else 0
+
+        def GetExitCodeProcess(self, handle, exit_code):
+            ctypes.cast(exit_code, ctypes.POINTER(ctypes.c_ulong)).contents.value = 259
+            return 1
+
+        def CloseHandle(self, handle):
+            return 1
+
+    kernel32 = FakeKernel32()
+    monkeypatch.setattr(idempotency_module.os, "name", "nt")
+    monkeypatch.setattr(idempotency_module.os, "kill", no_kill)
+    monkeypatch.setattr(ctypes, "WinDLL", lambda name, use_last_error=False: kernel32, raising=False)
+    monkeypatch.setattr(ctypes, "get_last_error", lambda: 87, raising=False)
+
+    kernel32.alive.add(os.getppid())
+    store._path(scope, "live").write_text(json.dumps(
+        {"status": "pending", "fingerprint": "fingerprint", "created_at": time.time(), "pid": os.getppid()}
+    ))
+    assert store.begin(scope, "live", "fingerprint")[0] == IN_PROGRESS
+    kernel32.alive.clear()
+    assert store.begin(scope, "live", "fingerprint")[0] == CLAIMED
+    print("✅ 失效的 pending 标记测试通过\n")
@@ -0,0 +1,417 @@
+"""
+素材下载测试
+
+验证素材只通过一次 GET 下载：不发送 HEAD 请求，在下载的数据上识别文件类型、
+拒绝 HTML 错误页面、计算 sha256，创建素材时不再读取文件；
+连接中断后用 Range 请求续传（包括服务重启、重新保存草稿后）；
+大文件分段并发下载（服务器不支持 Range 时改为单连接）；
+以及 DraftSaver 下载大文件时内存占用不随文件大小增长
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+
+from app.backend.utils import draft_saver as draft_saver_module
+from app.backend.utils import material_manager as material_manager_module
+from app.backend.utils import segmented_download as segmented_download_module
+from app.backend.config import get_config
+from app.backend.utils.draft_saver import DraftSaver, material_filename
+from app.backend.utils.material_manager import MaterialManager, looks_like_html, sniff_media
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x05" * 3000
+ERROR_PAGE = b"<!DOCTYPE html><html><body>403 Forbidden</body></html>" + b" " * (16 * 1024 * 1024)
+
+
+class _RecordingHandler(SimpleHTTPRequestHandler):
+    """记录请求方法和路径，以及每个请求实际发送的字节数"""
+
+    stats = None
+
+    def do_GET(self):
+        self.stats["requests"].append(("GET", self.path))
+        super().do_GET()
+
+    def do_HEAD(self):
+        self.stats["requests"].append(("HEAD", self.path))
+        super().do_HEAD()
+
+    def copyfile(self, source, outputfile):
+        try:
+            while True:
+                chunk = source.read(16 * 1024)
+                if not chunk:
+                    break
+                outputfile.write(chunk)
+                self.stats["sent"] += len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    media = tmp_path / "media"
+    media.mkdir()
+    (media / "cover").write_bytes(PNG)
+    (media / "clip.mp4").write_bytes(b"\x00\x00\x00\x18ftypmp42" + b"\x06" * 5000)
+    (media / "blocked.mp4").write_bytes(ERROR_PAGE)
+    (media / "data.bin").write_bytes(b"\x07" * 1000)
+    stats = {"requests": [], "sent": 0}
+    handler = type("Handler", (_RecordingHandler,), {"stats": stats})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=str(media)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", stats
+    httpd.shutdown()
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(material_manager_module, "get_material_store", lambda: None)
+    monkeypatch.setattr(material_manager_module.time, "sleep", lambda seconds: None)
+    return MaterialManager(str(tmp_path / "drafts"), "下载", project_id="download")
+
+
+def test_single_get_with_inline_sniffing(server, manager, monkeypatch):
+    """测试只发送 GET，扩展名和素材类型在下载时确定，创建素材不再读取文件"""
+    print("测试单次下载...")
+    base_url, stats = server
+
+    path, digest = manager._download_and_record(f"{base_url}/cover", None)
+    assert digest == hashlib.sha256(PNG).hexdigest()
+    # 无扩展名的 URL：Content-Type 未知时先用 .mp4，根据文件头修正为 .png
+    assert Path(path).suffix == ".png" and Path(path).read_bytes() == PNG
+    assert not list(manager.assets_path.glob("*.tmp"))
+
+    # 已下载的素材按 URL 找到，不再请求
+    assert manager.download_material(f"{base_url}/cover") == path
+    assert manager.download_material(f"{base_url}/clip.mp4").endswith("clip.mp4")
+    assert stats["requests"] == [("GET", "/cover"), ("GET", "/clip.mp4")]
+
+    # 扩展名和文件头都无法识别的素材，使用下载时的识别结果，不再读取文件
+    unknown = manager.download_material(f"{base_url}/data.bin")
+
+    def no_reread(file_path):
+        raise AssertionError(f"不应重新读取文件: {file_path}")
+
+    monkeypatch.setattr(manager, "_sniff_file", no_reread)
+    assert manager._sniffed_types[path] == "image" and manager._sniffed_types[unknown] is None
+    assert manager._detect_material_type(Path(unknown)) == "video"
+    print("✅ 单次下载测试通过\n")
+
+
+def test_html_error_page_rejected_early(server, manager):
+    """测试 CDN 返回 HTML 错误页面时读取开头即停止，重试后报错且不留下文件"""
+    print("测试 HTML 错误页面...")
+    base_url, stats = server
+
+    with pytest.raises(ValueError, match="HTML页面"):
+        manager.download_material(f"{base_url}/blocked.mp4")
+
+    assert stats["requests"] == [("GET", "/blocked.mp4")] * 3
+    # 每次只读取了开头的数据（远小于完整的错误页面）
+    assert stats["sent"] < len(ERROR_PAGE)
+    assert not any(manager.assets_path.iterdir())
+    print("✅ HTML 错误页面测试通过\n")
+
+
+def test_sniff_helpers():
+    """测试文件头识别与 HTML 检测"""
+    print("测试文件头识别...")
+    assert sniff_media(PNG[:16]) == ("image", ".png", "PNG图片")
+    assert sniff_media(b"ID3\x03") == ("audio", ".mp3", "MP3音频")
+    assert sniff_media(b"RIFF\x00\x00\x00\x00WAVEfmt ")[1] == ".wav"
+    assert sniff_media(b"plain bytes") is None
+    assert looks_like_html(b"\n  <HTML><head>")
+    assert not looks_like_html(PNG)
+    print("✅ 文件头识别测试通过\n")
+
+
+VIDEO = b"\x00\x00\x00\x18ftypmp42" + bytes(range(256)) * 4096
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """
+    支持 Range / If-Range 的素材服务
+
+    files: {路径: [内容, ETag]}；cuts: 依次对每个 GET 请求在发送多少字节后断开连接；
+    ignore_range: 声明 Accept-Ranges 但忽略 Range 请求头（总是返回完整内容）
+    """
+
+    protocol_version = "HTTP/1.1"
+    files = None
+    cuts = None
+    requests = None
+    ignore_range = False
+
+    def do_GET(self):
+        data, etag = self.files[self.path]
+        self.requests.append({"path": self.path, "range": self.headers.get("Range"),
+                              "if_range": self.headers.get("If-Range")})
+        start, end = 0, len(data)
+        byte_range = self.headers.get("Range")
+        if byte_range and not self.ignore_range and self.headers.get("If-Range") in (None, etag):
+            first, _, last = byte_range[len("bytes="):].partition("-")
+            start, end = int(first), int(last) + 1 if last else len(data)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        body = data[start:end]
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.end_headers()
+        cut = self.cuts.pop(0) if self.cuts else None
+        try:
+            if cut is None:
+                self.wfile.write(body)
+            else:
+                self.wfile.write(body[:cut])
+                self.wfile.flush()
+                self.close_connection = True
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端只读取了需要的部分（分段下载的第一段、HTML 错误页面）
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def range_server():
+    state = {"files": {"/video.mp4": [VIDEO, '"v1"'], "/blocked.mp4": [ERROR_PAGE, '"e1"']},
+             "cuts": [], "requests": []}
+    handler = type("Handler", (_RangeHandler,), state)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", state
+    httpd.shutdown()
+
+
+def test_resume_after_interruption(range_server, manager):
+    """测试连接中断后重试用 Range + If-Range 从断点续传，结果与完整下载一致"""
+    print("测试断点续传...")
+    base_url, state = range_server
+    state["cuts"].extend([300000, 200000])
+
+    path, digest = manager._download_and_record(f"{base_url}/video.mp4", None)
+
+    assert Path(path).read_bytes() == VIDEO
+    assert digest == hashlib.sha256(VIDEO).hexdigest()
+    # 每次从上次写入文件的位置继续（中断时未凑满一个读取块的数据会丢弃）
+    assert [r["if_range"] for r in state["requests"]] == [None, '"v1"', '"v1"']
+    offsets = [int(r["range"][len("bytes="):-1]) for r in state["requests"][1:]]
+    assert 0 < offsets[0] <= 300000 < offsets[1] <= 500000
+    assert sorted(p.name for p in manager.assets_path.iterdir()) == ["video.mp4"]
+    print("✅ 断点续传测试通过\n")
+
+
+def test_resume_persists_across_restart(range_server, tmp_path, monkeypatch):
+    """测试重试全部失败后保留续传状态，新的管理器（服务重启）继续下载；文件变化时从头下载"""
+    print("测试重启后续传...")
+    base_url, state = range_server
+    monkeypatch.setattr(material_manager_module, "get_material_store", lambda: None)
+    monkeypatch.setattr(material_manager_module.time, "sleep", lambda seconds: None)
+    state["cuts"].extend([100000, 100000, 100000])
+
+    manager = MaterialManager(str(tmp_path / "drafts"), "续传", project_id="resume")
+    with pytest.raises(Exception):
+        manager.download_material(f"{base_url}/video.mp4")
+    saved = json.loads((manager.assets_path / "video.mp4.tmp.json").read_text(encoding="utf-8"))
+    assert saved["validator"] == '"v1"' and saved["total"] == len(VIDEO)
+    partial_size = (manager.assets_path / "video.mp4.tmp").stat().st_size
+    assert 0 < partial_size <= 300000
+
+    restarted = MaterialManager(str(tmp_path / "drafts"), "续传", project_id="resume")
+    assert Path(restarted.download_material(f"{base_url}/video.mp4")).read_bytes() == VIDEO
+    assert state["requests"][-1]["range"] == f"bytes={partial_size}-"
+
+    # 服务器上的文件变化后 If-Range 不匹配，返回完整内容
+    changed = VIDEO[::-1]
+    state["files"]["/video.mp4"] = [changed, '"v2"']
+    state["cuts"].extend([100000, 100000, 100000])
+    with pytest.raises(Exception):
+        restarted.download_material(f"{base_url}/video.mp4", force_download=True)
+    partial_size = (restarted.assets_path / "video.mp4.tmp").stat().st_size
+    state["files"]["/video.mp4"] = [VIDEO, '"v3"']
+    assert Path(restarted.download_material(f"{base_url}/video.mp4", force_download=True)).read_bytes() == VIDEO
+    assert state["requests"][-1]["if_range"] == '"v2"' and state["requests"][-1]["range"] == f"bytes={partial_size}-"
+    print("✅ 重启后续传测试通过\n")
+
+
+def test_draft_saver_retries_and_resumes(range_server, tmp_path, monkeypatch):
+    """测试 DraftSaver 下载中断后重试并续传"""
+    print("测试 DraftSaver 续传...")
+    base_url, state = range_server
+    monkeypatch.setattr(draft_saver_module, "get_material_store", lambda: None)
+    monkeypatch.setattr(draft_saver_module.time, "sleep", lambda seconds: None)
+    state["cuts"].extend([400000])
+
+    saver = DraftSaver(output_dir=str(tmp_path / "output"))
+    path = saver.download_material(f"{base_url}/video.mp4", str(tmp_path))
+
+    assert Path(path).read_bytes() == VIDEO
+    assert state["requests"][0]["range"] is None
+    assert 0 < int(state["requests"][1]["range"][len("bytes="):-1]) <= 400000
+    assert not list(tmp_path.glob("*.tmp*"))
+    print("✅ DraftSaver 续传测试通过\n")
+
+
+def _ranges(state):
+    """分段请求的字节范围 [(起始, 结束（含）)]"""
+    return sorted(tuple(int(n) for n in r["range"][len("bytes="):].split("-"))
+                  for r in state["requests"] if r["range"])
+
+
+def test_segmented_download(range_server, manager, monkeypatch):
+    """测试大文件分段并发下载：其余各段用 Range + If-Range 请求，拼接结果与完整下载一致"""
+    print("测试分段下载...")
+    base_url, state = range_server
+    monkeypatch.setattr(segmented_download_module, "MIN_SEGMENT_SIZE", 64 * 1024)
+    manager.segmented_threshold = 512 * 1024
+    manager.segmented_parts = 4
+
+    path, digest = manager._download_and_record(f"{base_url}/video.mp4", None)
+
+    assert Path(path).read_bytes() == VIDEO
+    assert digest == hashlib.sha256(VIDEO).hexdigest()
+    assert manager._sniffed_types[path] == "video"
+    # 第一段读取完整内容的响应，其余 3 段按范围请求，覆盖到文件末尾
+    assert state["requests"][0]["range"] is None
+    ranges = _ranges(state)
+    assert len(ranges) == 3 and ranges[-1][1] == len(VIDEO) - 1
+    assert all(a[1] + 1 == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert all(r["if_range"] == '"v1"' for r in state["requests"][1:])
+    assert sorted(p.name for p in manager.assets_path.iterdir()) == ["video.mp4"]
+    print("✅ 分段下载测试通过\n")
+
+
+def test_segmented_download_falls_back_without_ranges(range_server, tmp_path, monkeypatch):
+    """测试服务器忽略 Range 时 DraftSaver 改为单连接下载（同一次尝试中完成）"""
+    print("测试不支持 Range 时单连接下载...")
+    base_url, state = range_server
+    monkeypatch.setattr(draft_saver_module, "get_material_store", lambda: None)
+    monkeypatch.setattr(segmented_download_module, "MIN_SEGMENT_SIZE", 64 * 1024)
+    monkeypatch.setattr(get_config(), "segmented_download_mb", 0.5)
+    monkeypatch.setattr(_RangeHandler, "ignore_range", True)
+
+    saver = DraftSaver(output_dir=str(tmp_path / "output"))
+    path = saver.download_material(f"{base_url}/video.mp4", str(tmp_path))
+
+    assert Path(path).read_bytes() == VIDEO
+    # 分段请求得到完整内容后放弃分段，重新请求一次完整内容
+    full = [r for r in state["requests"] if r["range"] is None]
+    assert len(full) == 2 and state["requests"][-1]["range"] is None
+    assert not list(tmp_path.glob("*.tmp*"))
+    print("✅ 不支持 Range 时单连接下载测试通过\n")
+
+
+def test_segmented_download_rejects_html(range_server, manager, monkeypatch):
+    """测试分段下载时第一段开头是 HTML 错误页面即停止所有段，不留下文件"""
+    print("测试分段下载 HTML 错误页面...")
+    base_url, state = range_server
+    monkeypatch.setattr(segmented_download_module, "MIN_SEGMENT_SIZE", 64 * 1024)
+    manager.segmented_threshold = 512 * 1024
+
+    with pytest.raises(ValueError, match="HTML页面"):
+        manager.download_material(f"{base_url}/blocked.mp4")
+
+    assert [r["range"] for r in state["requests"]].count(None) == 3
+    assert not any(manager.assets_path.iterdir())
+    print("✅ 分段下载 HTML 错误页面测试通过\n")
+
+
+# 默认 200 MB（远大于内存增长上限，足以验证流式写入），
+# 设置 JIANYING_TEST_LARGE_DOWNLOAD_MB=2048 可以验证数 GB 的文件
+LARGE_SIZE = int(os.getenv("JIANYING_TEST_LARGE_DOWNLOAD_MB", "200")) * 1024 * 1024
+
+
+class _LargeHandler(BaseHTTPRequestHandler):
+    """边生成边发送 LARGE_SIZE 字节的视频（服务端不占用对应的内存）"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        block = b"\x00\x00\x00\x18ftypmp42".ljust(1024 * 1024, b"\x08")
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(LARGE_SIZE))
+        self.end_headers()
+        for _ in range(LARGE_SIZE // len(block)):
+            self.wfile.write(block)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _rss_bytes():
+    """当前进程的常驻内存（Linux）"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def test_material_filename():
+    """测试素材文件名不含查询参数和非法字符，同名不同 URL 不冲突"""
+    print("测试素材文件名...")
+    signed = material_filename("https://cdn.example.com/tts/audio.mp3?sig=a/b:c&expires=1")
+    assert signed.startswith("audio_") and signed.endswith(".mp3")
+    assert not set('<>:"/\\|?*') & set(signed)
+    assert signed != material_filename("https://cdn.example.com/tts/audio.mp3?sig=d&expires=2")
+    assert material_filename("https://a.com/v1/logo.png") != material_filename("https://a.com/v2/logo.png")
+    assert material_filename("https://a.com/x/%E9%9F%B3%E4%B9%90.mp3").startswith("音乐_")
+    assert material_filename("https://a.com/api/get?id=1").startswith("get_")
+    assert material_filename("https://a.com/").startswith("material_")
+    print("✅ 素材文件名测试通过\n")
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="需要 /proc 读取内存占用")
+def test_draft_saver_large_download_bounded_memory(tmp_path, monkeypatch):
+    """测试 DraftSaver 下载大文件时内存占用保持在常数范围内，完成后原子地改名"""
+    print("测试大文件下载内存占用...")
+    monkeypatch.setattr(draft_saver_module, "get_material_store", lambda: None)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _LargeHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}/large.mp4?token=abc"
+
+    baseline = _rss_bytes()
+    peak = baseline
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, _rss_bytes())
+            time.sleep(0.01)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        saver = DraftSaver(output_dir=str(tmp_path / "output"))
+        path = saver.download_material(url, str(tmp_path))
+    finally:
+        done.set()
+        sampler.join()
+        httpd.shutdown()
+
+    assert Path(path).name == material_filename(url)
+    assert os.path.getsize(path) == LARGE_SIZE
+    assert not list(tmp_path.glob("*.tmp*"))
+    # 服务端和客户端的内存增长都远小于文件大小
+    assert peak - baseline < 64 * 1024 * 1024, f"内存增长 {(peak - baseline) / 1024 / 1024:.0f} MB"
+    os.remove(path)
+    print("✅ 大文件下载内存占用测试通过\n")
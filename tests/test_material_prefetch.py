@@ -0,0 +1,157 @@
+"""
+素材并发预取测试
+
+从本地 HTTP 服务下载素材生成草稿，验证素材并发下载、失败的素材不重复下载，
+以及生成的草稿与逐个下载时一致
+"""
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.backend.utils import draft_generator as draft_generator_module
+from app.backend.utils import material_manager as material_manager_module
+from app.backend.utils.draft_generator import DraftGenerator
+
+DELAY = 0.3
+
+
+class _SlowHandler(SimpleHTTPRequestHandler):
+    """每个请求延迟 DELAY 秒，并记录同时处理的 GET 请求数"""
+
+    stats = None
+
+    def do_GET(self):
+        with self.stats["lock"]:
+            self.stats["requests"].append(self.path)
+            self.stats["active"] += 1
+            self.stats["peak"] = max(self.stats["peak"], self.stats["active"])
+        try:
+            threading.Event().wait(DELAY)
+            super().do_GET()
+        finally:
+            with self.stats["lock"]:
+                self.stats["active"] -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(directory):
+    stats = {"lock": threading.Lock(), "requests": [], "active": 0, "peak": 0}
+    handler = type("Handler", (_SlowHandler,), {"stats": stats})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=str(directory)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+def _draft_data(base_url):
+    def segment(segment_type, name, index):
+        return {
+            "type": segment_type,
+            "material_url": f"{base_url}/{name}",
+            "time_range": {"start": index * 1000000, "end": (index + 1) * 1000000},
+        }
+
+    return {
+        "draft_id": str(uuid.uuid4()),
+        "project": {"name": "预取", "width": 1920, "height": 1080, "fps": 30},
+        "tracks": [
+            {"track_type": "video", "segments": [segment("video", f"clip{i}.mp4", i) for i in range(3)]},
+            {"track_type": "audio", "segments": [segment("audio", "bgm.mp3", 0), segment("audio", "missing.mp3", 1)]},
+            {"track_type": "image", "segments": [segment("image", f"pic{i}.png", i) for i in range(2)]},
+        ],
+    }
+
+
+class _RecordingScript:
+    """记录添加的轨道和片段（轨道名、片段类型、素材文件名、时间范围）"""
+
+    def __init__(self):
+        self.timeline = []
+
+    def add_track(self, track_type, track_name):
+        self.timeline.append((track_name, []))
+
+    def add_segment(self, segment, track_name):
+        track = dict(self.timeline)[track_name]
+        material = os.path.basename(segment.material_instance.path)
+        track.append((type(segment).__name__, material, str(segment.target_timerange)))
+
+    def save(self):
+        pass
+
+
+class _RecordingFolder:
+    scripts = []
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+
+    def create_draft(self, draft_name, width, height, fps, allow_replace=False):
+        script = _RecordingScript()
+        self.scripts.append(script)
+        return script
+
+
+def test_prefetch_matches_serial_output(tmp_path, monkeypatch):
+    """测试并发预取素材生成的草稿与逐个下载一致"""
+    print("测试素材并发预取...")
+    media = tmp_path / "media"
+    media.mkdir()
+    for i in range(3):
+        shutil.copy(project_root / "assets" / "video.mp4", media / f"clip{i}.mp4")
+    shutil.copy(project_root / "assets" / "audio.mp3", media / "bgm.mp3")
+    for i, icon in enumerate(["draft.png", "cloud.png"]):
+        shutil.copy(project_root / "app" / "frontend" / "gui" / "assets" / "icons" / icon, media / f"pic{i}.png")
+
+    monkeypatch.setattr(draft_generator_module.draft, "DraftFolder", _RecordingFolder)
+    # 下载失败后的重试不等待
+    monkeypatch.setattr(material_manager_module.time, "sleep", lambda seconds: None)
+    # 不使用全局素材缓存，两次生成都实际下载
+    monkeypatch.setattr(material_manager_module, "get_material_store", lambda: None)
+    server, stats = _serve(media)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        draft_data = _draft_data(base_url)
+        results = {}
+        for concurrency in (1, 4):
+            stats["requests"].clear()
+            stats["peak"] = 0
+            generator = DraftGenerator(output_base_dir=str(tmp_path / f"drafts_{concurrency}"),
+                                       prefetch_concurrency=concurrency)
+            started = time.perf_counter()
+            generator._convert_single_draft(json.loads(json.dumps(draft_data)))
+            results[concurrency] = {
+                "seconds": time.perf_counter() - started,
+                "timeline": _RecordingFolder.scripts[-1].timeline,
+                "peak": stats["peak"],
+                "requests": list(stats["requests"]),
+            }
+    finally:
+        server.shutdown()
+
+    serial, concurrent = results[1], results[4]
+    assert serial["peak"] == 1
+    assert concurrent["peak"] > 1
+    assert concurrent["seconds"] < serial["seconds"]
+    # 生成的草稿一致
+    assert concurrent["timeline"] == serial["timeline"]
+    assert [len(segments) for _, segments in serial["timeline"]] == [3, 1, 2]
+    assert serial["timeline"][2][1][0] == ("VideoSegment", "pic0.png", "[start=0, end=1000000]")
+    # 每个素材只下载一次，下载失败的素材在添加片段时不再重试
+    for result in (serial, concurrent):
+        downloads = [path for path in result["requests"] if path != "/missing.mp3"]
+        assert sorted(downloads) == sorted(set(downloads))
+        assert result["requests"].count("/missing.mp3") == 3
+    print("✅ 素材并发预取测试通过\n")
@@ -0,0 +1,179 @@
+"""
+全局素材缓存测试
+
+验证同一素材在多个草稿间只下载一次（硬链接到各草稿的素材目录），
+无法硬链接时复制，按最后使用时间淘汰，以及命中率和节省字节数的统计
+"""
+import os
+import sys
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+
+from app.backend.utils import draft_saver as draft_saver_module
+from app.backend.utils import material_manager as material_manager_module
+from app.backend.utils import material_store as material_store_module
+from app.backend.utils.draft_saver import DraftSaver
+from app.backend.utils.material_manager import MaterialManager
+from app.backend.utils.material_store import MaterialStore
+from app.backend.utils.metrics import MetricsRegistry
+
+
+class _FakeResponse:
+    """DraftSaver 流式下载使用的响应"""
+
+    status_code = 200
+    headers = {}
+
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        yield self.content
+
+
+class _CountingHandler(SimpleHTTPRequestHandler):
+    """记录收到的请求（方法 + 路径）"""
+
+    requests = None
+
+    def do_GET(self):
+        self.requests.append(("GET", self.path))
+        super().do_GET()
+
+    def do_HEAD(self):
+        self.requests.append(("HEAD", self.path))
+        super().do_HEAD()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    media = tmp_path / "media"
+    media.mkdir()
+    (media / "bgm.mp3").write_bytes(b"ID3" + b"\x01" * 8192)
+    (media / "logo").write_bytes(b"\x89PNG\r\n\x1a\n" + b"\x02" * 4096)
+    requests = []
+    handler = type("Handler", (_CountingHandler,), {"requests": requests})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=str(media)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", requests
+    httpd.shutdown()
+
+
+def test_material_shared_across_drafts(server, tmp_path, monkeypatch):
+    """测试多个草稿使用同一素材时只下载一次，草稿素材目录中是硬链接"""
+    print("测试素材跨草稿共享...")
+    base_url, requests = server
+    store = MaterialStore(tmp_path / "store", max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(material_manager_module, "get_material_store", lambda: store)
+
+    paths = []
+    for i in range(3):
+        manager = MaterialManager(str(tmp_path / "drafts"), f"草稿{i}", project_id=f"draft{i}")
+        paths.append((manager.download_material(f"{base_url}/bgm.mp3"),
+                      manager.download_material(f"{base_url}/logo")))
+
+    # 只有第一个草稿发送了请求
+    assert sorted(requests) == [("GET", "/bgm.mp3"), ("GET", "/logo")]
+    for bgm, logo in paths:
+        assert Path(bgm).name == "bgm.mp3"
+        # 无扩展名的 URL 使用下载时根据内容修正的扩展名
+        assert Path(logo).suffix == ".png"
+        assert os.path.samefile(bgm, paths[0][0]) and os.path.samefile(logo, paths[0][1])
+    assert len({Path(bgm).parent for bgm, _ in paths}) == 3
+
+    stats = store.stats()
+    assert stats["hits"] == 4 and stats["misses"] == 2
+    assert stats["hit_rate"] == pytest.approx(4 / 6)
+    assert stats["bytes_saved"] == 2 * (8195 + 4104)
+    assert stats["size"] == 2 and stats["bytes"] == 8195 + 4104
+
+    # 指标中报告命中率和节省的字节数
+    registry = MetricsRegistry()
+    registry.register_cache("material_store", store.stats)
+    text = registry.render()
+    assert 'jianying_cache_hit_ratio{cache="material_store"} 0.666' in text
+    assert f'jianying_cache_saved_bytes_total{{cache="material_store"}} {2 * (8195 + 4104)}' in text
+    print("✅ 素材跨草稿共享测试通过\n")
+
+
+def test_draft_saver_uses_store_and_copies_without_links(tmp_path, monkeypatch):
+    """测试 DraftSaver 共用缓存，无法创建硬链接时复制文件，相同内容只保存一份"""
+    print("测试无法硬链接时复制...")
+    content = b"\x03" * 2048
+    downloads = []
+
+    def get(url, **kwargs):
+        downloads.append(url)
+        return _FakeResponse(content)
+
+    store = MaterialStore(tmp_path / "store")
+    monkeypatch.setattr(draft_saver_module, "get_http_client", lambda: SimpleNamespace(get=get))
+    monkeypatch.setattr(draft_saver_module, "get_material_store", lambda: store)
+
+    def no_link(source, target):
+        raise OSError("跨磁盘")
+
+    monkeypatch.setattr(material_store_module.os, "link", no_link)
+    saver = DraftSaver(output_dir=str(tmp_path / "output"))
+    dirs = [tmp_path / name for name in ("a", "b", "c")]
+    for directory in dirs:
+        directory.mkdir()
+
+    first = saver.download_material("https://cdn.example.com/v1/logo.png", str(dirs[0]))
+    # 不同 URL、相同内容共用同一个缓存文件
+    saver.download_material("https://cdn.example.com/v2/logo.png", str(dirs[1]))
+    third = saver.download_material("https://cdn.example.com/v1/logo.png", str(dirs[2]))
+
+    assert downloads == ["https://cdn.example.com/v1/logo.png", "https://cdn.example.com/v2/logo.png"]
+    assert Path(third).read_bytes() == content
+    assert not os.path.samefile(first, third)
+    stats = store.stats()
+    assert stats["size"] == 1 and stats["copies"] == 1 and stats["bytes_saved"] == 2048
+    print("✅ 无法硬链接时复制测试通过\n")
+
+
+def test_lru_eviction(tmp_path):
+    """测试缓存超过上限时淘汰最久未使用的素材，草稿中已链接的文件保留"""
+    print("测试缓存淘汰...")
+    store = MaterialStore(tmp_path / "store", max_bytes=3000)
+    drafts = tmp_path / "draft"
+    drafts.mkdir()
+    for i, name in enumerate(["a", "b", "c"]):
+        path = drafts / f"{name}.mp4"
+        path.write_bytes(bytes([i]) * 1000)
+        store.add(f"https://example.com/{name}.mp4", path)
+        os.utime(store.get(f"https://example.com/{name}.mp4"), ns=(i * 10**9, i * 10**9))
+
+    # 使用 a 之后加入 d，最久未使用的 b 被淘汰
+    assert store.get("https://example.com/a.mp4") is not None
+    (drafts / "d.mp4").write_bytes(b"\x09" * 1000)
+    store.add("https://example.com/d.mp4", drafts / "d.mp4")
+
+    assert store.get("https://example.com/b.mp4") is None
+    for name in ["a", "c", "d"]:
+        assert store.get(f"https://example.com/{name}.mp4") is not None
+    assert (drafts / "b.mp4").read_bytes() == b"\x01" * 1000
+    stats = store.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] == 3000 and stats["size"] == 3
+    print("✅ 缓存淘汰测试通过\n")
@@ -0,0 +1,171 @@
+"""
+服务指标测试
+
+在本地抓取 /metrics，验证请求数、错误代码、延迟直方图、进行中的请求数、
+素材下载、草稿保存和缓存命中率指标
+"""
+import asyncio
+import re
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import httpx
+
+from app.backend.api import draft_routes
+from app.backend.api_main import app
+from app.backend.utils import draft_saver as draft_saver_module
+from app.backend.utils.draft_saver import DraftSaver
+
+SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})? (-?[0-9.e+-]+|\+Inf|NaN)$')
+
+
+class _FakeResponse:
+    """DraftSaver 流式下载使用的响应"""
+
+    status_code = 200
+    headers = {}
+
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        yield self.content
+
+
+def _parse(text):
+    """解析 Prometheus 文本格式，返回 {(name, labels): value}"""
+    samples = {}
+    for line in text.strip().split("\n"):
+        if line.startswith("#"):
+            assert line.startswith("# HELP ") or line.startswith("# TYPE ")
+            continue
+        match = SAMPLE_LINE.match(line)
+        assert match, f"无效的指标行: {line}"
+        name, labels, value = match.groups()
+        labels = tuple(sorted(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', labels or "")))
+        samples[(name, labels)] = float(value)
+    return samples
+
+
+async def _scrape(client):
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    return _parse(response.text)
+
+
+def _value(samples, name, **labels):
+    return samples.get((name, tuple(sorted((k, str(v)) for k, v in labels.items()))), 0)
+
+
+def test_request_metrics():
+    """测试按路由模板统计请求数、错误代码和延迟"""
+    print("测试请求指标...")
+    route = "/api/draft/{draft_id}/status"
+    job_route = "/api/draft/save_jobs/{job_id}"
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            before = await _scrape(client)
+            draft_id = (await client.post(
+                "/api/draft/create",
+                json={"draft_name": "指标", "width": 1920, "height": 1080, "fps": 30},
+            )).json()["draft_id"]
+            for _ in range(3):
+                await client.get(f"/api/draft/{draft_id}/status")
+            await client.get("/api/draft/not-a-draft/status")
+            await client.get("/api/draft/save_jobs/not-a-job")
+            after = await _scrape(client)
+            return draft_id, before, after
+
+    draft_id, before, after = asyncio.run(run())
+
+    def delta(name, **labels):
+        return _value(after, name, **labels) - _value(before, name, **labels)
+
+    # 标签使用路由模板，不包含草稿 ID
+    assert delta("jianying_http_requests_total", method="GET", route=route, status=200, error_code="SUCCESS") == 3
+    assert delta("jianying_http_requests_total", method="GET", route=route, status=404, error_code="HTTP_404") == 1
+    assert delta("jianying_http_requests_total", method="GET", route=job_route,
+                 status=200, error_code="SAVE_JOB_NOT_FOUND") == 1
+    assert not any(draft_id in str(key) for key in after)
+
+    assert delta("jianying_http_request_duration_seconds_count", method="GET", route=route) == 4
+    assert delta("jianying_http_request_duration_seconds_bucket", method="GET", route=route, le="+Inf") == 4
+    assert _value(after, "jianying_http_request_duration_seconds_sum", method="GET", route=route) > 0
+
+    # 抓取请求本身正在处理
+    assert _value(after, "jianying_http_requests_in_flight") == 1
+
+    # 缓存命中率
+    assert _value(after, "jianying_cache_hits_total", cache="draft_config") > 0
+    assert 0 < _value(after, "jianying_cache_hit_ratio", cache="draft_config") <= 1
+    assert ("jianying_cache_entries", (("cache", "segment"),)) in after
+    assert ("jianying_cache_entries", (("cache", "response"),)) in after
+
+    draft_routes.draft_manager.delete_draft(draft_id)
+    print("✅ 请求指标测试通过\n")
+
+
+def test_download_and_save_metrics(monkeypatch, tmp_path):
+    """测试素材下载字节数、耗时和草稿保存耗时"""
+    print("测试下载与保存指标...")
+    content = b"x" * 4096
+    monkeypatch.setattr(
+        draft_saver_module, "get_http_client",
+        lambda: SimpleNamespace(get=lambda url, **kwargs: _FakeResponse(content))
+    )
+    # 不使用全局素材缓存，每次测试都实际下载
+    monkeypatch.setattr(draft_saver_module, "get_material_store", lambda: None)
+
+    def fake_save(self, draft_id, progress):
+        self.download_material("https://example.com/a.mp4", str(tmp_path))
+        # 第二次下载同一素材命中本地文件
+        self.download_material("https://example.com/a.mp4", str(tmp_path))
+        return f"/tmp/{draft_id}"
+
+    def failing_save(self, draft_id, progress):
+        raise ValueError(f"草稿不存在: {draft_id}")
+
+    async def scrape():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await _scrape(client)
+
+    saver = DraftSaver(output_dir=str(tmp_path / "drafts"))
+    before = asyncio.run(scrape())
+    monkeypatch.setattr(DraftSaver, "_save_draft", fake_save)
+    assert saver.save_draft("draft") == "/tmp/draft"
+    monkeypatch.setattr(DraftSaver, "_save_draft", failing_save)
+    try:
+        saver.save_draft("missing")
+    except ValueError:
+        pass
+    after = asyncio.run(scrape())
+
+    def delta(name, **labels):
+        return _value(after, name, **labels) - _value(before, name, **labels)
+
+    assert delta("jianying_material_download_bytes_total", source="draft_saver") == len(content)
+    assert delta("jianying_material_downloads_total", source="draft_saver", result="success") == 1
+    assert delta("jianying_material_downloads_total", source="draft_saver", result="cached") == 1
+    assert delta("jianying_material_download_duration_seconds_count", source="draft_saver") == 1
+    assert delta("jianying_draft_saves_total", result="success") == 1
+    assert delta("jianying_draft_saves_total", result="failed") == 1
+    assert delta("jianying_draft_save_duration_seconds_count") == 2
+    print("✅ 下载与保存指标测试通过\n")
@@ -0,0 +1,97 @@
+"""
+多 worker 进程状态一致性测试
+
+多个进程共享同一状态存储时，同时为同一片段添加操作不会丢失，
+各进程缓存的片段在其他进程修改后能读取到最新数据，索引查询能看到其他进程对文件的改写
+"""
+import multiprocessing
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pytest
+
+from app.backend.database.state_store import FileStateStore, create_state_store
+from app.backend.utils.segment_manager import SegmentManager
+
+OPERATIONS_PER_WORKER = 40
+WORKERS = 3
+
+
+def _add_operations(backend, base_dir, segment_id, worker, start_event):
+    """worker 进程：先缓存片段，再与其他进程同时追加操作"""
+    manager = SegmentManager(base_dir=base_dir, store=create_state_store(backend, base_dir))
+    assert manager.get_segment(segment_id) is not None
+    start_event.wait()
+    for index in range(OPERATIONS_PER_WORKER):
+        assert manager.add_operation(segment_id, "add_keyframe", {"worker": worker, "index": index})
+    manager.update_download_status(segment_id, "completed", f"/tmp/{worker}.mp4")
+
+
+@pytest.mark.parametrize("backend", ["file", "sqlite"])
+def test_concurrent_workers_do_not_lose_operations(backend, tmp_path):
+    """测试多个进程同时为同一片段添加操作"""
+    print(f"测试多进程追加片段操作 ({backend})...")
+    base_dir = str(tmp_path)
+    manager = SegmentManager(base_dir=base_dir, store=create_state_store(backend, base_dir))
+    segment_id = manager.create_segment("video", {"material_url": "https://example.com/video.mp4"})["segment_id"]
+
+    context = multiprocessing.get_context("spawn")
+    start_event = context.Event()
+    processes = [
+        context.Process(target=_add_operations, args=(backend, base_dir, segment_id, worker, start_event))
+        for worker in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    start_event.set()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    # 本进程缓存的是创建时的片段，读取时应发现其他进程的修改
+    segment = manager.get_segment(segment_id)
+    operations = [op["data"] for op in segment["operations"]]
+    print(f"操作数: {len(operations)}")
+
+    assert len(operations) == WORKERS * OPERATIONS_PER_WORKER
+    assert len({op["operation_id"] for op in segment["operations"]}) == len(operations)
+    for worker in range(WORKERS):
+        # 同一进程的操作保持追加顺序
+        assert [op["index"] for op in operations if op["worker"] == worker] == list(range(OPERATIONS_PER_WORKER))
+    assert segment["download_status"] == "completed"
+
+    # 重新打开存储读取到的数据相同
+    reopened = SegmentManager(base_dir=base_dir, store=create_state_store(backend, base_dir))
+    assert len(reopened.get_segment(segment_id)["operations"]) == len(operations)
+    print("✅ 多进程追加片段操作测试通过\n")
+
+
+def test_file_index_sees_other_worker_writes(tmp_path):
+    """测试另一个 worker 在目录内改写草稿、追加片段日志后，segment_drafts / segment_summaries 返回最新结果"""
+    print("测试跨进程索引查询...")
+    worker_a = FileStateStore(str(tmp_path))
+    worker_b = FileStateStore(str(tmp_path))
+    segment = {"segment_id": "s1", "segment_type": "video", "operations": [], "last_modified": 1.0}
+    worker_a.save_segment("s1", segment)
+    worker_a.save_draft("d1", {"draft_id": "d1", "tracks": [], "last_modified": 1.0})
+    assert worker_b.segment_drafts("s1") == []
+    assert worker_b.segment_summaries(["s1"])["s1"]["last_modified"] == 1.0
+
+    # 改写草稿文件、追加日志都不改变目录 mtime
+    worker_a.save_draft("d1", {"draft_id": "d1", "tracks": [{"segments": ["s1"]}], "last_modified": 2.0})
+    segment["last_modified"] = 2.0
+    worker_a.append_operation("s1", segment, {"operation_id": "op1", "operation_type": "add_fade"})
+    # worker_b 随后的写入会记下新的目录 mtime
+    worker_b.save_segment("s2", {"segment_id": "s2", "segment_type": "audio", "operations": []})
+
+    assert worker_b.segment_drafts("s1") == ["d1"]
+    assert worker_b.segment_summaries(["s1"])["s1"]["last_modified"] == 2.0
+
+    # 其他进程删除片段
+    worker_a.delete_segment("s1")
+    assert worker_b.segment_summaries(["s1", "s2"]).keys() == {"s2"}
+    print("✅ 跨进程索引查询测试通过\n")
@@ -0,0 +1,325 @@
+"""
+异步保存任务测试
+
+验证保存请求立即返回任务 ID、任务状态和 SSE 进度流，以及结束任务的保留时间
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import httpx
+
+from app.backend.api import draft_routes
+from app.backend.api_main import app
+from app.backend.utils import draft_saver as draft_saver_module
+from app.backend.utils.draft_saver import DraftSaver
+from app.backend.utils.save_job_manager import SaveJobManager
+
+
+class _FakeResponse:
+    """DraftSaver 流式下载使用的响应"""
+
+    status_code = 200
+    headers = {}
+
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        yield self.content
+
+
+def fake_save(self, draft_id, progress=None):
+    """模拟下载 2 个素材、构建 3 个片段并写出草稿"""
+    progress("started", total_segments=3)
+    for index in range(3):
+        time.sleep(0.1)
+        if index < 2:
+            progress("material_downloaded", url=f"https://example.com/{index}.mp4", bytes=1000, cached=False)
+        progress("segment_built", segment_id=f"segment-{index}", segment_type="video")
+    progress("written", draft_path=f"/tmp/{draft_id}", bytes_written=4096)
+    return f"/tmp/{draft_id}"
+
+
+def failing_save(self, draft_id, progress=None):
+    raise RuntimeError("素材下载失败")
+
+
+def _parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+async def _create_draft(client, name):
+    created = await client.post(
+        "/api/draft/create",
+        json={"draft_name": name, "width": 1920, "height": 1080, "fps": 30},
+    )
+    return created.json()["draft_id"]
+
+
+def test_save_job_status_and_events(monkeypatch):
+    """测试异步保存立即返回，并通过 SSE 报告进度"""
+    print("测试异步保存任务...")
+    monkeypatch.setattr(DraftSaver, "save_draft", fake_save)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            draft_id = await _create_draft(client, "异步保存")
+
+            started = time.perf_counter()
+            submitted = (await client.post(f"/api/draft/{draft_id}/save_async")).json()
+            submit_seconds = time.perf_counter() - started
+
+            # 任务未结束时重复提交返回同一个任务
+            again = (await client.post(f"/api/draft/{draft_id}/save_async")).json()
+
+            events = await client.get(f"/api/draft/save_jobs/{submitted['job_id']}/events")
+            status = (await client.get(f"/api/draft/save_jobs/{submitted['job_id']}")).json()
+            return draft_id, submitted, again, submit_seconds, events, status
+
+    draft_id, submitted, again, submit_seconds, events, status = asyncio.run(run())
+
+    assert submitted["success"] is True
+    assert submitted["status"] in ("queued", "running")
+    assert submit_seconds < 0.3
+    assert again["job_id"] == submitted["job_id"]
+
+    assert events.headers["content-type"].startswith("text/event-stream")
+    parsed = _parse_sse(events.text)
+    assert parsed[-1][0] == "completed"
+    assert all(name == "progress" for name, _ in parsed[:-1])
+
+    assert status["status"] == "completed"
+    assert status["draft_path"] == f"/tmp/{draft_id}"
+    assert status["progress"]["segments_built"] == 3
+    assert status["progress"]["materials_downloaded"] == 2
+    assert status["progress"]["bytes_downloaded"] == 2000
+    assert status["progress"]["bytes_written"] == 4096
+    assert draft_routes.draft_manager.get_draft_config(draft_id)["status"] == "saved"
+
+    draft_routes.draft_manager.delete_draft(draft_id)
+    print("✅ 异步保存任务测试通过\n")
+
+
+def test_save_job_failure_and_not_found(monkeypatch):
+    """测试保存失败的任务和不存在的任务"""
+    print("测试保存任务失败...")
+    monkeypatch.setattr(DraftSaver, "save_draft", failing_save)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            draft_id = await _create_draft(client, "保存失败")
+            job_id = (await client.post(f"/api/draft/{draft_id}/save_async")).json()["job_id"]
+            events = await client.get(f"/api/draft/save_jobs/{job_id}/events")
+            status = (await client.get(f"/api/draft/save_jobs/{job_id}")).json()
+            missing = (await client.get("/api/draft/save_jobs/not-a-job")).json()
+            missing_events = await client.get("/api/draft/save_jobs/not-a-job/events")
+            return draft_id, events, status, missing, missing_events
+
+    draft_id, events, status, missing, missing_events = asyncio.run(run())
+
+    assert _parse_sse(events.text)[-1][0] == "failed"
+    assert status["success"] is True
+    assert status["status"] == "failed"
+    assert status["error_code"] == "DRAFT_SAVE_FAILED"
+    assert "素材下载失败" in status["error"]
+    assert missing["error_code"] == "SAVE_JOB_NOT_FOUND"
+    assert missing_events.status_code == 404
+
+    draft_routes.draft_manager.delete_draft(draft_id)
+    print("✅ 保存任务失败测试通过\n")
+
+
+def test_finished_jobs_expire(monkeypatch, tmp_path):
+    """测试结束的任务超过保留时间后被清除"""
+    print("测试保存任务保留时间...")
+    monkeypatch.setattr(DraftSaver, "save_draft", fake_save)
+
+    manager = SaveJobManager(retention=60, jobs_dir=str(tmp_path))
+    draft_id = draft_routes.draft_manager.create_draft("保留时间", 1280, 720, 30)["draft_id"]
+    job_id = manager.submit(draft_id)["job_id"]
+
+    deadline = time.time() + 5
+    while manager.get_job(job_id)["status"] != "completed" and time.time() < deadline:
+        time.sleep(0.05)
+
+    assert manager.purge_expired() == 0
+    assert manager.get_job(job_id) is not None
+    assert manager.purge_expired(now=time.time() + 120) == 1
+    assert manager.get_job(job_id) is None
+
+    draft_routes.draft_manager.delete_draft(draft_id)
+    print("✅ 保存任务保留时间测试通过\n")
+
+
+def test_jobs_visible_across_workers(monkeypatch, tmp_path):
+    """测试另一个 worker 进程（共享任务目录的另一个管理器）能查询到任务"""
+    print("测试跨进程查询保存任务...")
+    monkeypatch.setattr(DraftSaver, "save_draft", fake_save)
+
+    worker_a = SaveJobManager(retention=60, jobs_dir=str(tmp_path))
+    worker_b = SaveJobManager(retention=60, jobs_dir=str(tmp_path))
+    draft_id = draft_routes.draft_manager.create_draft("跨进程", 1280, 720, 30)["draft_id"]
+    job_id = worker_a.submit(draft_id)["job_id"]
+
+    # 任务未结束时另一个 worker 提交同一草稿返回同一个任务
+    assert worker_b.submit(draft_id)["job_id"] == job_id
+
+    deadline = time.time() + 5
+    while worker_b.get_job(job_id)["status"] != "completed" and time.time() < deadline:
+        time.sleep(0.05)
+
+    status = worker_b.get_job(job_id)
+    assert status["status"] == "completed"
+    assert status["progress"]["segments_built"] == 3
+    assert [job["job_id"] for job in worker_b.list_jobs(draft_id)] == [job_id]
+
+    assert worker_b.purge_expired(now=time.time() + 120) == 1
+    assert worker_b.get_job(job_id) is None
+
+    draft_routes.draft_manager.delete_draft(draft_id)
+    print("✅ 跨进程查询保存任务测试通过\n")
+
+
+def test_jobs_of_exited_worker_fail(monkeypatch, tmp_path):
+    """测试执行任务的进程退出后，未结束的任务标记为失败，同一草稿可以重新提交；未结束过久的任务被清除"""
+    print("测试进程退出后的保存任务...")
+    monkeypatch.setattr(DraftSaver, "save_draft", fake_save)
+
+    manager = SaveJobManager(retention=60, jobs_dir=str(tmp_path), stale_timeout=600)
+    draft_id = draft_routes.draft_manager.create_draft("进程退出", 1280, 720, 30)["draft_id"]
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+
+    def write_job(job_id, pid, created_at):
+        (tmp_path / f"{job_id}.json").write_text(json.dumps({
+            "job_id": job_id, "draft_id": draft_id, "status": "running",
+            "progress": {"stage": "building"}, "draft_path": "", "error": None,
+            "created_at": created_at, "started_at": created_at, "finished_at": None,
+            "revision": 3, "pid": pid,
+        }))
+
+    # 已退出的进程，以及重启前使用了相同进程 ID 的进程留下的任务
+    write_job("dead", child.pid, time.time())
+    write_job("restarted", os.getpid(), time.time())
+    for job_id in ("dead", "restarted"):
+        job = manager.get_job(job_id)
+        assert job["status"] == "failed" and job["progress"]["stage"] == "failed"
+        assert json.loads((tmp_path / f"{job_id}.json").read_text())["status"] == "failed"
+
+    write_job("orphan", child.pid, time.time())
+    job_id = manager.submit(draft_id)["job_id"]
+    assert job_id not in ("dead", "restarted", "orphan")
+    deadline = time.time() + 5
+    while manager.get_job(job_id)["status"] != "completed" and time.time() < deadline:
+        time.sleep(0.05)
+
+    # 无法判断进程状态（其他主机）的未结束任务超过 stale_timeout 后清除
+    write_job("stale", None, time.time() - 3600)
+    assert manager.get_job("stale") is None
+    assert manager.purge_expired(now=time.time()) == 1
+    assert not (tmp_path / "stale.json").exists()
+
+    draft_routes.draft_manager.delete_draft(draft_id)
+    print("✅ 进程退出后的保存任务测试通过\n")
+
+
+def test_concurrent_saves_report_own_progress(monkeypatch, tmp_path):
+    """测试同一个 DraftSaver 同时执行两个保存时，各自的进度回调只收到自己的事件"""
+    print("测试并发保存的进度回调...")
+
+    class FakeScript:
+        def add_track(self, track_type):
+            pass
+
+        def add_segment(self, segment):
+            pass
+
+        def save(self):
+            pass
+
+    # 不依赖 pyJianYingDraft 的草稿对象；素材下载走 DraftSaver.download_material
+    fake_draft = SimpleNamespace(
+        DraftFolder=lambda folder: SimpleNamespace(create_draft=lambda *args, **kwargs: FakeScript()),
+        TrackType=SimpleNamespace(audio="audio", video="video", text="text", sticker="sticker"),
+    )
+    monkeypatch.setattr(draft_saver_module, "draft", fake_draft)
+    monkeypatch.setattr(draft_saver_module, "get_material_store", lambda: None)
+    monkeypatch.setattr(
+        draft_saver_module, "get_http_client",
+        lambda: SimpleNamespace(get=lambda url, **kwargs: _FakeResponse(url.encode() * 100))
+    )
+
+    def create_segment(self, segment_type, config, assets_dir, prefetched=None, progress=None):
+        self.download_material(config["material_url"], assets_dir, prefetched, progress)
+        return None
+
+    monkeypatch.setattr(DraftSaver, "_create_segment", create_segment)
+
+    saver = DraftSaver(output_dir=str(tmp_path))
+    drafts = {
+        f"draft-{i}": {
+            "project": {"name": f"并发保存{i}"},
+            "tracks": [{"track_type": "video", "segments": [f"video-{i}-{j}" for j in range(3)]}],
+        }
+        for i in range(2)
+    }
+    monkeypatch.setattr(saver.draft_manager, "get_draft_config", lambda draft_id: drafts.get(draft_id))
+    monkeypatch.setattr(saver.segment_manager, "get_segment", lambda segment_id: {
+        "segment_type": "video",
+        "config": {"material_url": f"https://example.com/{tmp_path.name}/{segment_id}.mp4"},
+        "operations": [],
+    })
+
+    # 两个保存都开始后才继续，之后的事件交错发生
+    barrier = threading.Barrier(2, timeout=10)
+    events = {draft_id: [] for draft_id in drafts}
+
+    def progress_for(draft_id):
+        def progress(event, **data):
+            events[draft_id].append((event, data.get("segment_id") or data.get("url", "").rsplit("/", 1)[-1]))
+            if event == "started":
+                barrier.wait()
+        return progress
+
+    threads = [
+        threading.Thread(target=saver.save_draft, args=(draft_id, progress_for(draft_id)))
+        for draft_id in drafts
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    for i, draft_id in enumerate(drafts):
+        expected = [("started", "")]
+        for j in range(3):
+            expected += [("material_downloaded", f"video-{i}-{j}.mp4"), ("segment_built", f"video-{i}-{j}")]
+        assert events[draft_id] == expected + [("written", "")]
+    print("✅ 并发保存的进度回调测试通过\n")
@@ -0,0 +1,99 @@
+"""
+启动延迟加载测试
+
+验证导入 API 应用时不导入 pyJianYingDraft / uvicorn、不创建全局管理器、不创建数据目录，
+以及延迟加载的模块和管理器在第一次使用时正常工作
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.backend.config import AppConfig
+from app.backend.utils.lazy import LazyObject
+
+PROBE = """
+import json, os, sys
+import app.backend.api_main
+from app.backend.api import draft_routes, segment_routes
+from app.backend.utils import draft_state_manager, segment_manager
+
+state = {
+    "pyjianyingdraft": "pyJianYingDraft.segment" in sys.modules,
+    "uvicorn": "uvicorn" in sys.modules,
+    "managers": [draft_state_manager._draft_state_manager is not None,
+                 segment_manager._segment_manager is not None],
+    "data_root": os.path.exists(os.environ["JIANYING_DATA_ROOT"]),
+}
+
+# 第一次使用时才加载
+from app.backend.utils.draft_saver import draft
+state["trange"] = str(draft.trange("0s", "1s"))
+state["draft_id"] = draft_routes.draft_manager.create_draft("启动", 1920, 1080, 30)["draft_id"]
+state["same_manager"] = segment_routes.segment_manager._resolve() is segment_manager.get_segment_manager()
+state["loaded"] = ["pyJianYingDraft.segment" in sys.modules, draft_routes.draft_manager.is_loaded]
+state["data_root_after"] = os.path.exists(os.environ["JIANYING_DATA_ROOT"])
+print(json.dumps(state))
+"""
+
+
+def test_api_import_is_lazy(tmp_path):
+    """测试导入 API 应用时延迟加载 pyJianYingDraft、管理器和数据目录"""
+    print("测试 API 应用延迟加载...")
+    data_root = tmp_path / "data"
+    env = dict(os.environ, JIANYING_DATA_ROOT=str(data_root))
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=str(project_root), env=env,
+        capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    state = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert state["pyjianyingdraft"] is False
+    assert state["uvicorn"] is False
+    assert state["managers"] == [False, False]
+    assert state["data_root"] is False
+
+    assert state["trange"] == "[start=0, end=1000000]"
+    assert state["draft_id"]
+    assert state["same_manager"] is True
+    assert state["loaded"] == [True, True]
+    assert state["data_root_after"] is True
+    print("✅ API 应用延迟加载测试通过\n")
+
+
+def test_lazy_object_and_deferred_directories(tmp_path, monkeypatch):
+    """测试延迟对象转发属性读写，配置在第一次访问路径时创建目录"""
+    print("测试延迟对象与数据目录...")
+    created = []
+
+    class Manager:
+        value = 1
+
+    def factory():
+        created.append(True)
+        return Manager()
+
+    proxy = LazyObject(factory)
+    assert not proxy.is_loaded
+    assert proxy.value == 1
+    proxy.value = 2
+    assert proxy._resolve().value == 2
+    assert created == [True]
+
+    data_root = tmp_path / "data"
+    monkeypatch.setenv("JIANYING_DATA_ROOT", str(data_root))
+    config = AppConfig()
+    assert not data_root.exists()
+    # 显式赋值的路径不会被覆盖
+    config.assets_dir = str(tmp_path / "custom_assets")
+    assert config.cache_dir == str(data_root / "cache")
+    assert (data_root / "cache").is_dir() and (data_root / "logs").is_dir()
+    assert config.materials_cache_dir == config.assets_dir == str(tmp_path / "custom_assets")
+    assert config.state_db_path == str(data_root / "cache" / "state.db")
+    print("✅ 延迟对象与数据目录测试通过\n")
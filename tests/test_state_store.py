@@ -0,0 +1,403 @@
+"""
+状态存储后端测试
+
+验证 FileStateStore 与 SQLiteStateStore 行为一致，
+并且 DraftStateManager / SegmentManager 可以在两种后端上工作
+"""
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.backend.database.serializer import StateSerializer
+from app.backend.database.state_store import FileStateStore, create_state_store
+from app.backend.database.sqlite_store import SQLiteStateStore
+from app.backend.utils.draft_state_manager import DraftStateManager
+from app.backend.utils.lru_cache import LRUCache
+from app.backend.utils.segment_manager import SegmentManager
+
+
+@pytest.fixture(params=["file", "sqlite"])
+def store(request, tmp_path):
+    """分别创建两种后端"""
+    store = create_state_store(backend=request.param, base_dir=str(tmp_path))
+    yield store
+    store.close()
+
+
+def test_create_state_store_backend(tmp_path):
+    """测试后端选择"""
+    file_store = create_state_store(backend="file", base_dir=str(tmp_path))
+    sqlite_store = create_state_store(backend="sqlite", base_dir=str(tmp_path))
+    assert isinstance(file_store, FileStateStore)
+    assert isinstance(sqlite_store, SQLiteStateStore)
+    assert (tmp_path / "state.db").exists()
+    sqlite_store.close()
+
+
+def test_draft_roundtrip(store):
+    """测试草稿读写、列出和删除"""
+    config = {
+        "draft_id": "d1",
+        "project": {"name": "测试", "width": 1920, "height": 1080, "fps": 30},
+        "tracks": [
+            {"track_type": "video", "track_index": 0, "segments": ["s1"]},
+            {"track_type": "audio", "track_index": 1, "segments": []},
+        ],
+        "status": "created",
+        "last_modified": 1.0,
+    }
+    store.save_draft("d1", config)
+
+    loaded = store.load_draft("d1")
+    assert loaded == config
+    assert store.draft_exists("d1")
+    assert store.list_drafts() == ["d1"]
+
+    loaded["tracks"].pop()
+    store.save_draft("d1", loaded)
+    assert len(store.load_draft("d1")["tracks"]) == 1
+
+    assert store.delete_draft("d1") is True
+    assert store.delete_draft("d1") is False
+    assert store.load_draft("d1") is None
+
+
+def test_segment_operations(store):
+    """测试片段读写和操作追加"""
+    segment = {
+        "segment_id": "s1",
+        "segment_type": "audio",
+        "config": {"material_url": "http://example.com/a.mp3"},
+        "download_status": "pending",
+        "operations": [],
+        "last_modified": 1.0,
+    }
+    store.save_segment("s1", segment)
+
+    for i in range(3):
+        operation = {"operation_id": f"op{i}", "operation_type": "add_fade", "data": {"i": i}}
+        segment["operations"].append(operation)
+        segment["last_modified"] = 2.0 + i
+        store.append_operation("s1", segment, operation)
+
+    loaded = store.load_segment("s1")
+    assert [op["operation_id"] for op in loaded["operations"]] == ["op0", "op1", "op2"]
+    assert loaded["last_modified"] == 4.0
+
+    segment["download_status"] = "completed"
+    store.save_segment("s1", segment)
+    loaded = store.load_segment("s1")
+    assert loaded["download_status"] == "completed"
+    assert len(loaded["operations"]) == 3
+
+    assert store.list_segment_ids() == ["s1"]
+    assert store.delete_segment("s1") is True
+    assert store.load_segment("s1") is None
+
+
+def test_file_operation_journal(tmp_path):
+    """测试文件后端的片段操作日志：追加、压缩和崩溃后重放"""
+    store = FileStateStore(str(tmp_path), compact_threshold=5)
+    segment = {"segment_id": "s1", "segment_type": "video", "operations": [], "last_modified": 1.0}
+    store.save_segment("s1", segment)
+
+    def append(i):
+        operation = {"operation_id": f"op{i}", "operation_type": "add_keyframe", "data": {"i": i}}
+        segment["operations"].append(operation)
+        segment["last_modified"] = 10.0 + i
+        store.append_operation("s1", segment, operation)
+
+    for i in range(3):
+        append(i)
+
+    # 快照未被重写，操作只进入日志
+    journal = tmp_path / "s1.ops.jsonl"
+    assert len(journal.read_text(encoding="utf-8").splitlines()) == 3
+    assert store._read_json(tmp_path / "s1.json")["operations"] == []
+    loaded = store.load_segment("s1")
+    assert [op["operation_id"] for op in loaded["operations"]] == ["op0", "op1", "op2"]
+    assert loaded["last_modified"] == 12.0
+
+    # 达到阈值后压缩为快照
+    append(3)
+    append(4)
+    assert not journal.exists()
+    assert len(store._read_json(tmp_path / "s1.json")["operations"]) == 5
+
+    # 模拟崩溃：日志尾部写了一半，且日志中包含快照里已有的操作
+    append(5)
+    with open(journal, "a", encoding="utf-8") as f:
+        f.write('{"operation": {"operation_id": "op4"}}\n{"operation": {"operation_id": "op')
+
+    reopened = FileStateStore(str(tmp_path), compact_threshold=5)
+    loaded = reopened.load_segment("s1")
+    assert [op["operation_id"] for op in loaded["operations"]] == [f"op{i}" for i in range(6)]
+    # 读取时不修改日志（尾行也可能是其他 worker 进程正在追加的记录）
+    assert not journal.read_text(encoding="utf-8").endswith("\n")
+
+    # 追加（调用方持有 segment_lock）前截断不完整的尾行
+    operation = {"operation_id": "op6", "operation_type": "add_keyframe", "data": {"i": 6}}
+    loaded["operations"].append(operation)
+    reopened.append_operation("s1", loaded, operation)
+    assert journal.read_text(encoding="utf-8").endswith("\n")
+    loaded = FileStateStore(str(tmp_path), compact_threshold=5).load_segment("s1")
+    assert [op["operation_id"] for op in loaded["operations"]] == [f"op{i}" for i in range(7)]
+
+    assert reopened.compact_segment("s1")
+    assert not journal.exists()
+    assert reopened.delete_segment("s1")
+    assert reopened.list_segment_ids() == []
+
+
+def test_file_segment_lock_per_segment(tmp_path):
+    """测试文件后端的 segment_lock 按片段加锁：不同片段、其他线程的读取不被阻塞，同一片段跨实例互斥"""
+    worker_a = FileStateStore(str(tmp_path))
+    worker_b = FileStateStore(str(tmp_path))
+    for segment_id in ("s1", "s2"):
+        worker_a.save_segment(segment_id, {"segment_id": segment_id, "segment_type": "video", "operations": []})
+
+    holding, release = threading.Event(), threading.Event()
+    acquired = []
+
+    def hold_s1():
+        with worker_a.segment_lock("s1"), worker_a.segment_lock("s1"):
+            holding.set()
+            release.wait(10)
+
+    def lock_s1_in_b():
+        with worker_b.segment_lock("s1"):
+            acquired.append(time.monotonic())
+
+    holder = threading.Thread(target=hold_s1)
+    holder.start()
+    assert holding.wait(5)
+    waiter = threading.Thread(target=lock_s1_in_b)
+    waiter.start()
+
+    # 另一个片段、同一实例的读取都不需要等待 s1 的锁
+    with worker_a.segment_lock("s2"):
+        assert worker_a.load_segment("s1") is not None
+    with worker_b.segment_lock("s2"):
+        assert worker_b.load_segment("s2") is not None
+    time.sleep(0.1)
+    assert acquired == []
+
+    released_at = time.monotonic()
+    release.set()
+    holder.join(5)
+    waiter.join(5)
+    assert acquired and acquired[0] >= released_at
+    assert worker_a._segment_locks == {} and worker_b._segment_locks == {}
+
+    assert worker_a.delete_segment("s1")
+    assert not worker_a._segment_lock_path("s1").exists()
+
+
+def test_sqlite_transaction_rollback(tmp_path):
+    """测试 SQLite 事务回滚"""
+    store = SQLiteStateStore(str(tmp_path / "state.db"))
+    store.save_draft("d1", {"draft_id": "d1", "tracks": []})
+
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.save_draft("d2", {"draft_id": "d2", "tracks": []})
+            store.delete_draft("d1")
+            raise RuntimeError("abort")
+
+    assert store.list_drafts() == ["d1"]
+    store.close()
+
+
+def test_managers_on_sqlite(tmp_path):
+    """测试管理器在 SQLite 后端上工作"""
+    store = SQLiteStateStore(str(tmp_path / "state.db"))
+    draft_mgr = DraftStateManager(str(tmp_path), store=store)
+    seg_mgr = SegmentManager(str(tmp_path), store=store)
+
+    draft_id = draft_mgr.create_draft("测试项目", 1280, 720, 30)["draft_id"]
+    segment_id = seg_mgr.create_segment("audio", {"material_url": "http://example.com/a.mp3"})["segment_id"]
+    assert seg_mgr.add_operation(segment_id, "add_fade", {"in_duration": "1s"})
+
+    config = draft_mgr.get_draft_config(draft_id)
+    config["tracks"].append({"track_type": "audio", "track_index": 0, "segments": [segment_id]})
+    assert draft_mgr.update_draft_config(draft_id, config)
+
+    # 新的管理器实例从数据库读取
+    reloaded = SegmentManager(str(tmp_path), store=store)
+    assert reloaded.get_segment(segment_id)["operations"][0]["operation_type"] == "add_fade"
+    assert DraftStateManager(str(tmp_path), store=store).get_draft_config(draft_id)["tracks"][0]["segments"] == [segment_id]
+    assert draft_mgr.list_all_drafts() == [draft_id]
+    store.close()
+
+
+def test_draft_cache_write_behind(tmp_path):
+    """测试草稿缓存失效和合并写回"""
+    store = FileStateStore(str(tmp_path))
+    manager = DraftStateManager(str(tmp_path), store=store)
+    manager.flush_mode = "write_behind"
+    manager.flush_interval = 60
+    manager.flush_max_dirty = 3
+
+    draft_id = manager.create_draft("缓存测试", 1920, 1080, 30)["draft_id"]
+
+    # 返回副本，修改不会影响缓存
+    config = manager.get_draft_config(draft_id)
+    config["tracks"].append({"track_type": "video", "segments": []})
+    assert manager.get_draft_config(draft_id)["tracks"] == []
+
+    # 写回模式下更新只进入内存
+    assert manager.update_draft_config(draft_id, config)
+    assert store.load_draft(draft_id)["tracks"] == []
+    assert len(manager.get_draft_config(draft_id)["tracks"]) == 1
+
+    # 达到脏数据阈值时自动刷新
+    for _ in range(2):
+        config = manager.get_draft_config(draft_id)
+        config["tracks"].append({"track_type": "audio", "segments": []})
+        manager.update_draft_config(draft_id, config)
+    assert len(store.load_draft(draft_id)["tracks"]) == 3
+
+    # 显式刷新
+    config["status"] = "saved"
+    manager.update_draft_config(draft_id, config)
+    assert manager.flush(draft_id) == 1
+    assert store.load_draft(draft_id)["status"] == "saved"
+    manager.close()
+
+    # 外部修改文件后缓存失效
+    external = store.load_draft(draft_id)
+    external["status"] = "external"
+    external["project"]["name"] = "外部修改后的名称"
+    store.save_draft(draft_id, external)
+    assert manager.get_draft_config(draft_id)["status"] == "external"
+
+
+def test_segment_cache_eviction(tmp_path):
+    """测试片段缓存有界淘汰，淘汰后透明地从存储后端重新加载"""
+    manager = SegmentManager(str(tmp_path), store=FileStateStore(str(tmp_path)))
+    manager.segments = LRUCache(max_entries=2)
+
+    ids = [
+        manager.create_segment("audio", {"material_url": f"http://example.com/{i}.mp3"})["segment_id"]
+        for i in range(4)
+    ]
+    assert len(manager.segments) == 2
+    assert manager.get_cache_stats()["evictions"] == 2
+
+    # 被淘汰的片段重新加载，并且可以继续追加操作
+    assert manager.add_operation(ids[0], "add_fade", {"in_duration": "1s"})
+    assert manager.get_segment(ids[0])["operations"][0]["operation_type"] == "add_fade"
+    assert len(manager.list_segments("audio")) == 4
+
+    stats = manager.get_cache_stats()
+    assert stats["hits"] > 0 and stats["misses"] > 0
+    assert stats["size"] == 2
+
+
+def test_lru_cache_ttl():
+    """测试 TTL 过期"""
+    cache = LRUCache(max_entries=10, ttl=0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_secondary_indexes(store):
+    """测试二级索引查询"""
+    for i, (segment_type, status) in enumerate([("audio", "pending"), ("video", "completed"), ("audio", "completed")]):
+        store.save_segment(f"s{i}", {
+            "segment_id": f"s{i}",
+            "segment_type": segment_type,
+            "config": {"material_url": f"http://example.com/{i}"},
+            "status": "created",
+            "download_status": status,
+            "created_timestamp": float(i),
+            "last_modified": float(i),
+            "operations": [],
+        })
+    store.save_draft("d1", {"draft_id": "d1", "last_modified": 1.0, "tracks": [
+        {"track_type": "audio", "segments": ["s0", "s2"]},
+        {"track_type": "video", "segments": ["s1"]},
+    ]})
+    store.save_draft("d2", {"draft_id": "d2", "last_modified": 2.0, "tracks": [
+        {"track_type": "audio", "segments": ["s0"]},
+    ]})
+
+    assert sorted(store.segment_drafts("s0")) == ["d1", "d2"]
+    assert store.segment_drafts("s1") == ["d1"]
+    assert store.draft_segments("d1") == ["s0", "s2", "s1"]
+    assert store.draft_segments("d1", "audio") == ["s0", "s2"]
+    assert sorted(store.segments_by_download_status("completed")) == ["s1", "s2"]
+    assert store.drafts_by_last_modified() == ["d2", "d1"]
+    assert store.drafts_by_last_modified(limit=1, descending=False) == ["d1"]
+
+    summaries = store.segment_summaries(["s1", "missing"])
+    assert list(summaries) == ["s1"]
+    assert summaries["s1"]["material_url"] == "http://example.com/1"
+    assert summaries["s1"]["segment_type"] == "video"
+
+    # 更新后索引同步
+    store.save_draft("d2", {"draft_id": "d2", "last_modified": 0.5, "tracks": []})
+    assert store.segment_drafts("s0") == ["d1"]
+    assert store.drafts_by_last_modified() == ["d1", "d2"]
+    store.delete_segment("s2")
+    assert store.segments_by_download_status("completed") == ["s1"]
+    store.delete_draft("d1")
+    assert store.segment_drafts("s0") == []
+
+
+def test_file_index_rebuild(tmp_path):
+    """测试 file 后端索引在启动时按 mtime 增量校正"""
+    store = FileStateStore(str(tmp_path))
+    store.save_segment("s1", {"segment_id": "s1", "segment_type": "audio", "download_status": "pending", "operations": []})
+    store.save_draft("d1", {"draft_id": "d1", "tracks": [{"track_type": "audio", "segments": ["s1"]}]})
+    store.close()
+    assert (tmp_path / "state.index").exists()
+
+    # 绕过存储直接修改磁盘文件（模拟索引过期或其他进程写入）
+    other = FileStateStore(str(tmp_path))
+    other._write_json(tmp_path / "s2.json", {"segment_id": "s2", "segment_type": "video", "download_status": "failed"})
+    (tmp_path / "d1" / "draft_config.json").unlink()
+
+    reopened = FileStateStore(str(tmp_path))
+    assert reopened.list_drafts() == []
+    assert sorted(reopened.list_segment_ids()) == ["s1", "s2"]
+    assert reopened.segments_by_download_status("failed") == ["s2"]
+    assert reopened.segment_drafts("s1") == []
+
+
+def test_serializer_formats_and_detection(tmp_path):
+    """测试序列化格式往返、文件头识别以及读取旧的格式化 JSON"""
+    config = {"draft_id": "d1", "project": {"name": "中文"}, "tracks": [{"segments": ["s1"]}]}
+    for fmt in ("json", "orjson", "msgpack"):
+        for compression in ("none", "gzip", "zstd"):
+            serializer = StateSerializer(fmt, compression)
+            data = serializer.dumps(config)
+            # 未压缩的 JSON 没有文件头，统一识别为 json
+            expected = "json" if serializer.name in ("json", "orjson") else serializer.name
+            assert StateSerializer.detect(data) == expected
+            # 任意序列化器都能读取其他格式写出的数据
+            assert StateSerializer().loads(data) == config
+
+    # 未压缩的 json/orjson 仍然是普通 JSON
+    assert json.loads(StateSerializer("orjson").dumps(config)) == config
+
+    # 旧版本写出的格式化 JSON 可以被新格式的存储读取，重写后使用新格式
+    legacy = FileStateStore(str(tmp_path), serializer=StateSerializer("json"))
+    legacy.save_draft("d1", config)
+    store = FileStateStore(str(tmp_path), serializer=StateSerializer("orjson", "gzip"))
+    assert store.load_draft("d1") == config
+    store.save_draft("d1", config)
+    raw = (tmp_path / "d1" / "draft_config.json").read_bytes()
+    assert StateSerializer.detect(raw) == "orjson+gzip"
+    assert store.load_draft("d1") == config
@@ -0,0 +1,137 @@
+"""
+状态清理器测试
+
+验证过期草稿、无引用片段和失去草稿的素材目录会被清理，仍在使用的状态会被保留
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.backend.database.state_store import FileStateStore
+from app.backend.utils.draft_state_manager import DraftStateManager
+from app.backend.utils.segment_manager import SegmentManager
+from app.backend.utils.state_sweeper import StateSweeper
+
+
+def _make_sweeper(tmp_path):
+    store = FileStateStore(str(tmp_path / "state"))
+    draft_manager = DraftStateManager(str(tmp_path), store=store)
+    segment_manager = SegmentManager(str(tmp_path), store=store)
+    sweeper = StateSweeper(draft_manager, segment_manager, str(tmp_path / "assets"))
+    sweeper.draft_ttl = 3600
+    sweeper.segment_ttl = 3600
+    sweeper.assets_ttl = 3600
+    sweeper.assets_quota_bytes = 0
+    return sweeper, draft_manager, segment_manager
+
+
+def _write_asset(folder: Path, size: int, mtime: float) -> None:
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / "material.bin").write_bytes(b"\0" * size)
+    os.utime(folder, (mtime, mtime))
+
+
+def test_sweep_keeps_referenced_state(tmp_path):
+    """测试清理未保存的过期草稿和无引用片段，保留已保存草稿及其片段"""
+    print("测试状态清理...")
+    sweeper, draft_manager, segment_manager = _make_sweeper(tmp_path)
+
+    saved_id = draft_manager.create_draft("已保存", 1920, 1080, 30)["draft_id"]
+    abandoned_id = draft_manager.create_draft("已放弃", 1920, 1080, 30)["draft_id"]
+    kept_segment = segment_manager.create_segment("video", {"material_url": "https://example.com/a.mp4"})["segment_id"]
+    orphan_segment = segment_manager.create_segment("audio", {"material_url": "https://example.com/b.mp3"})["segment_id"]
+
+    config = draft_manager.get_draft_config(saved_id)
+    config["tracks"] = [{"track_type": "video", "segments": [kept_segment]}]
+    config["status"] = "saved"
+    assert draft_manager.update_draft_config(saved_id, config)
+    draft_manager.flush()
+
+    # 刚创建的状态都未过期
+    report = sweeper.sweep()
+    assert report["drafts_deleted"] == 0
+    assert report["segments_deleted"] == 0
+
+    report = sweeper.sweep(now=time.time() + 7200)
+    assert report["drafts_deleted"] == 1
+    assert report["segments_deleted"] == 1
+    assert report["reclaimed_bytes"] > 0
+    assert draft_manager.get_draft_config(abandoned_id) is None
+    assert draft_manager.get_draft_config(saved_id) is not None
+    assert segment_manager.get_segment(kept_segment) is not None
+    assert segment_manager.get_segment(orphan_segment) is None
+    assert sweeper.last_report is report
+    print("✅ 状态清理测试通过\n")
+
+
+def test_sweep_assets_ttl_and_quota(tmp_path):
+    """测试素材目录按 TTL 和配额清理，跳过最近编辑中的草稿"""
+    print("测试素材目录清理...")
+    sweeper, draft_manager, _ = _make_sweeper(tmp_path)
+    assets = tmp_path / "assets"
+    now = time.time()
+
+    live_id = draft_manager.create_draft("编辑中", 1920, 1080, 30)["draft_id"]
+    old_live_id = draft_manager.create_draft("很久没打开", 1920, 1080, 30)["draft_id"]
+    draft_manager.flush()
+
+    _write_asset(assets / "gone-draft", 1000, now - 7200)       # 草稿已不存在且过期
+    _write_asset(assets / "fresh-orphan", 1000, now)            # 草稿不存在但未过期
+    _write_asset(assets / old_live_id, 4000, now - 7200)        # 草稿存在但很久未修改
+    _write_asset(assets / live_id, 4000, now)                   # 最近编辑中
+
+    sweeper.assets_quota_bytes = 6000
+    report = sweeper.sweep(now=now)
+
+    assert not (assets / "gone-draft").exists()
+    assert not (assets / old_live_id).exists()
+    assert (assets / "fresh-orphan").exists()
+    assert (assets / live_id).exists()
+    assert report["asset_dirs_deleted"] == 2
+    assert report["reclaimed_bytes"] >= 5000
+    print("✅ 素材目录清理测试通过\n")
+
+
+def test_sweep_keeps_prefetched_downloads(tmp_path):
+    """测试后台下载目录不作为草稿素材目录清理，只删除无片段引用的过期文件"""
+    print("测试清理后台下载目录...")
+    sweeper, _, segment_manager = _make_sweeper(tmp_path)
+    sweeper.assets_quota_bytes = 1
+    old = time.time() - 7200
+    prefetched = tmp_path / "assets" / "prefetched"
+    prefetched.mkdir(parents=True)
+    for name in ("used.mp3", "orphan.mp3", "recent.mp3"):
+        (prefetched / name).write_bytes(b"\0" * 100)
+    for name in ("used.mp3", "orphan.mp3"):
+        os.utime(prefetched / name, (old, old))
+    os.utime(prefetched, (old, old))
+    segment_id = segment_manager.create_segment("audio", {"material_url": "https://example.com/used.mp3"})["segment_id"]
+    assert segment_manager.update_download_status(segment_id, "completed", str(prefetched / "used.mp3"))
+
+    deleted, reclaimed = sweeper.sweep_assets(time.time())
+    assert deleted == []
+    assert reclaimed == 100
+    assert sorted(path.name for path in prefetched.iterdir()) == ["recent.mp3", "used.mp3"]
+    print("✅ 清理后台下载目录测试通过\n")
+
+
+def test_sweeper_leader_lock(tmp_path):
+    """测试多个 worker 中只有一个进程取得清理锁，持有锁的进程退出后由其他进程接手"""
+    print("测试清理锁...")
+    leader, _, _ = _make_sweeper(tmp_path)
+    follower, _, _ = _make_sweeper(tmp_path)
+    leader.lock_path = follower.lock_path = tmp_path / "state_sweeper.lock"
+
+    assert leader.acquire_leader_lock()
+    assert leader.acquire_leader_lock()
+    assert not follower.acquire_leader_lock()
+
+    # 模拟持有锁的进程退出
+    leader._lock_file.close()
+    assert follower.acquire_leader_lock()
+    print("✅ 清理锁测试通过\n")
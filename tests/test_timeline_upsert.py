@@ -0,0 +1,149 @@
+"""
+声明式时间线测试
+
+验证一次提交完整时间线、重复提交不产生写入，以及只为修改过的片段创建新片段
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import httpx
+
+from app.backend.api import draft_routes
+from app.backend.api_main import app
+
+
+def _caption(index, text=None):
+    return {
+        "key": f"caption_{index}",
+        "params": {
+            "text_content": text or f"第 {index} 句字幕",
+            "target_timerange": {"start": index * 2000000, "duration": 2000000},
+        },
+        "operations": [
+            {"operation": "add_animation", "params": {"animation_type": "TextAnimationType.TYPEWRITER", "duration": "1s"}}
+        ],
+    }
+
+
+def _timeline(captions):
+    return {
+        "tracks": [
+            {
+                "track_type": "video",
+                "segments": [
+                    {
+                        "params": {
+                            "material_url": "https://example.com/video.mp4",
+                            "target_timerange": {"start": 0, "duration": 10000000},
+                        },
+                        "operations": [{"operation": "add_fade", "params": {"in_duration": "1s", "out_duration": "0s"}}],
+                    }
+                ],
+            },
+            {"track_type": "text", "segments": captions},
+        ]
+    }
+
+
+async def _put(path, payload):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return (await client.put(path, json=payload)).json()
+
+
+def test_timeline_upsert_applies_only_changes():
+    """测试提交、重复提交和修改部分片段"""
+    print("测试声明式时间线...")
+    draft_manager = draft_routes.draft_manager
+    segment_manager = draft_routes.segment_manager
+    draft_id = draft_manager.create_draft("时间线", 1920, 1080, 30)["draft_id"]
+    path = f"/api/draft/{draft_id}/timeline"
+    captions = [_caption(index) for index in range(5)]
+
+    first = asyncio.run(_put(path, _timeline(captions)))
+    assert first["success"] is True
+    assert first["error_code"] == "SUCCESS"
+    assert first["created"] == 6 and first["reused"] == 0 and first["changed"] is True
+    assert set(first["ids"]) == {f"caption_{index}" for index in range(5)}
+
+    config = draft_manager.get_draft_config(draft_id)
+    assert [track["track_type"] for track in config["tracks"]] == ["video", "text"]
+    assert config["tracks"][1]["segments"] == [first["ids"][f"caption_{index}"] for index in range(5)]
+    caption = segment_manager.get_segment(first["ids"]["caption_0"])
+    assert [op["operation_type"] for op in caption["operations"]] == ["add_animation"]
+
+    # 重复提交：不创建片段，不修改草稿
+    again = asyncio.run(_put(path, _timeline(captions)))
+    assert again["changed"] is False and again["created"] == 0
+    assert again["version"] == first["version"]
+    assert again["ids"] == first["ids"]
+
+    # 修改一句字幕、删除一句：只新建一个片段
+    captions[2] = _caption(2, "修改后的字幕")
+    del captions[4]
+    changed = asyncio.run(_put(path, _timeline(captions)))
+    assert changed["created"] == 1
+    assert changed["reused"] == 4
+    assert changed["removed"] == 2
+    assert changed["version"] == first["version"] + 1
+    assert changed["ids"]["caption_0"] == first["ids"]["caption_0"]
+    assert changed["ids"]["caption_2"] != first["ids"]["caption_2"]
+    assert draft_manager.get_draft_config(draft_id)["tracks"][1]["segments"] == changed["tracks"][1]
+
+    for segment_id in set(first["ids"].values()) | set(changed["ids"].values()) | set(first["tracks"][0]):
+        segment_manager.delete_segment(segment_id)
+    draft_manager.delete_draft(draft_id)
+    print("✅ 声明式时间线测试通过\n")
+
+
+def test_timeline_reuses_segments_added_individually():
+    """测试通过单个端点添加的片段按内容匹配沿用"""
+    print("测试沿用已有片段...")
+    draft_manager = draft_routes.draft_manager
+    segment_manager = draft_routes.segment_manager
+    draft_id = draft_manager.create_draft("时间线沿用", 1920, 1080, 30)["draft_id"]
+
+    caption = _caption(0)
+    config = draft_routes.CreateTextSegmentRequest(**caption["params"]).dict()
+    animation = draft_routes.AddTextAnimationRequest(**caption["operations"][0]["params"]).dict()
+    segment_id = segment_manager.create_segment("text", config, [("add_animation", animation)])["segment_id"]
+    draft_manager.modify_draft(draft_id, lambda latest: draft_routes._place_segment(latest, segment_id, "text", None))
+
+    data = asyncio.run(_put(f"/api/draft/{draft_id}/timeline", {"tracks": [{"track_type": "text", "segments": [caption]}]}))
+    assert data["created"] == 0 and data["reused"] == 1
+    assert data["ids"]["caption_0"] == segment_id
+
+    segment_manager.delete_segment(segment_id)
+    draft_manager.delete_draft(draft_id)
+    print("✅ 沿用已有片段测试通过\n")
+
+
+def test_invalid_timeline_writes_nothing():
+    """测试无效时间线不写入任何状态"""
+    print("测试无效时间线...")
+    draft_manager = draft_routes.draft_manager
+    segment_manager = draft_routes.segment_manager
+    draft_id = draft_manager.create_draft("无效时间线", 1920, 1080, 30)["draft_id"]
+    segments_before = set(segment_manager.store.list_segment_ids())
+    version_before = draft_manager.get_draft_config(draft_id)["version"]
+
+    captions = [_caption(0), _caption(1)]
+    captions[1]["operations"].append({"operation": "add_fade", "params": {}})
+    data = asyncio.run(_put(f"/api/draft/{draft_id}/timeline", _timeline(captions)))
+    assert data["success"] is True
+    assert data["error_code"] == "OPERATION_NOT_SUPPORTED"
+    assert data["details"]["track"] == 1 and data["details"]["segment"] == 1
+
+    data = asyncio.run(_put(f"/api/draft/{draft_id}/timeline", {"tracks": [{"track_type": "effect", "segments": []}]}))
+    assert data["error_code"] == "INVALID_PARAMETER"
+
+    assert set(segment_manager.store.list_segment_ids()) == segments_before
+    assert draft_manager.get_draft_config(draft_id)["version"] == version_before
+
+    draft_manager.delete_draft(draft_id)
+    print("✅ 无效时间线测试通过\n")